@@ -0,0 +1,92 @@
+#! /usr/bin/python
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from elf.io import open_file
+
+from cluster_tools.utils.compression_utils import CODECS, compression_options
+
+
+def folder_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def benchmark_codec(data, chunks, compression, level, out_folder, ext, n_threads):
+    """ Write and read `data` with the given codec and return the throughputs in MB/s and the size in bytes.
+    """
+    path = os.path.join(out_folder, 'data_%s%s' % (compression, ext))
+    options = compression_options(path, {'compression': compression, 'compression_level': level})
+
+    t0 = time.time()
+    with open_file(path, 'a') as f:
+        ds = f.create_dataset('data', shape=data.shape, dtype=data.dtype, chunks=chunks, **options)
+        ds.n_threads = n_threads
+        ds[:] = data
+    t_write = time.time() - t0
+    size = folder_size(path)
+
+    t0 = time.time()
+    with open_file(path, 'r') as f:
+        ds = f['data']
+        ds.n_threads = n_threads
+        read = ds[:]
+    t_read = time.time() - t0
+    assert np.array_equal(read, data), "Data for %s does not agree" % compression
+
+    n_mb = data.nbytes / 1e6
+    return n_mb / t_write, n_mb / t_read, size
+
+
+def load_sample(path, key, roi):
+    with open_file(path, 'r') as f:
+        ds = f[key]
+        bb = tuple(slice(0, min(sh, ext)) for sh, ext in zip(ds.shape, roi))
+        return ds[bb], ds.chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark write and read throughput and size "
+                                                 "of the output compression codecs for a sample volume.")
+    parser.add_argument('path', help="path to the container with the sample volume")
+    parser.add_argument('key', help="key of the sample volume")
+    parser.add_argument('--roi', type=int, nargs='+', default=[50, 512, 512],
+                        help="shape of the sample that is loaded from the start of the volume")
+    parser.add_argument('--chunks', type=int, nargs='+', default=None,
+                        help="chunks of the benchmark datasets, by default the chunks of the volume")
+    parser.add_argument('--codecs', nargs='+', default=['raw', 'gzip', 'lz4', 'zstd'],
+                        help="the codecs to compare, must be in %s" % ', '.join(CODECS))
+    parser.add_argument('--level', type=int, default=None,
+                        help="compression level, by default the default level of each codec")
+    parser.add_argument('--format', default='n5', choices=['n5', 'zarr', 'h5'],
+                        help="file format of the benchmark datasets")
+    parser.add_argument('--n_threads', type=int, default=1)
+    parser.add_argument('--tmp_folder', default=None, help="folder for the benchmark datasets")
+    args = parser.parse_args()
+
+    data, chunks = load_sample(args.path, args.key, args.roi)
+    chunks = tuple(min(ch, sh) for ch, sh in zip(args.chunks or chunks, data.shape))
+    print("Benchmarking sample of shape %s and dtype %s with chunks %s" % (str(data.shape),
+                                                                        str(data.dtype), str(chunks)))
+
+    out_folder = tempfile.mkdtemp(dir=args.tmp_folder)
+    try:
+        print("%-8s %14s %14s %12s %8s" % ('codec', 'write [MB/s]', 'read [MB/s]', 'size [MB]', 'ratio'))
+        for compression in args.codecs:
+            write_speed, read_speed, size = benchmark_codec(data, chunks, compression, args.level,
+                                                            out_folder, '.' + args.format, args.n_threads)
+            print("%-8s %14.1f %14.1f %12.2f %8.2f" % (compression, write_speed, read_speed,
+                                                       size / 1e6, data.nbytes / size))
+    finally:
+        shutil.rmtree(out_folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#! /bin/python
+
+import os
+import sys
+import json
+import time
+
+import luigi
+
+import cluster_tools.utils.function_utils as fu
+from cluster_tools.cluster_tasks import LocalTask, SlurmTask, LSFTask
+
+
+#
+# Task with jobs that only sleep, to measure the scheduling overhead
+#
+
+class NoopTaskBase(luigi.Task):
+    """ NoopTask base class
+    """
+
+    task_name = 'noop_task'
+    src_file = os.path.abspath(__file__)
+
+    # number of jobs; each job processes a single block
+    n_jobs = luigi.IntParameter()
+    # time in seconds each job sleeps
+    job_duration = luigi.FloatParameter(default=0.)
+
+    def run_impl(self):
+        shebang = self.global_config_values()[0]
+        self.init(shebang)
+
+        config = self.get_task_config()
+        config.update({'job_duration': self.job_duration})
+
+        if self.n_retries == 0:
+            block_list = list(range(self.n_jobs))
+        else:
+            block_list = self.block_list
+        n_jobs = min(len(block_list), self.max_jobs)
+
+        self.prepare_jobs(n_jobs, block_list, config)
+        self.submit_jobs(n_jobs)
+
+        self.wait_for_jobs()
+        self.check_jobs(n_jobs)
+
+
+class NoopTaskLocal(NoopTaskBase, LocalTask):
+    """ NoopTask on local machine
+    """
+    pass
+
+
+class NoopTaskSlurm(NoopTaskBase, SlurmTask):
+    """ NoopTask on slurm cluster
+    """
+    pass
+
+
+class NoopTaskLSF(NoopTaskBase, LSFTask):
+    """ NoopTask on lsf cluster
+    """
+    pass
+
+
+def noop_task(job_id, config_path):
+    fu.log("start processing job %i" % job_id)
+    with open(config_path) as f:
+        config = json.load(f)
+    for block_id in config['block_list']:
+        fu.log("start processing block %i" % block_id)
+        time.sleep(config['job_duration'])
+        fu.log_block_success(block_id)
+    fu.log_job_success(job_id)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+    assert os.path.exists(path), path
+    job_id = int(os.path.split(path)[1].split('.')[0].split('_')[-1])
+    noop_task(job_id, path)
@@ -0,0 +1,437 @@
+#! /usr/bin/env python
+""" Local stand-in for a slurm or lsf cluster.
+
+The shims in `bin` (`sbatch`, `squeue`, `sacct`, `scancel`, `bsub`, `bjobs`, `bkill`) write
+the submitted jobs to a state folder and a scheduler process, which is started by the first
+submission and stops when it is idle, runs them as local processes.
+The scheduler simulates a queue delay and a limited number of slots and can inject job failures,
+see `DEFAULT_CONFIG`. The state folder is given by the environment variable `FAKE_CLUSTER_DIR`
+and the configuration is read from `config.json` in it, see `write_config`.
+
+The state of a job with name `<name>` (the job id or `<job id>_<array index>`) is kept in the files
+`<name>.job` (the submission), `<name>.start` (written when the job is started),
+`<name>.cancel` (written to cancel a running job) and `<name>.exit` (the exit code).
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import fcntl
+import random
+import signal
+import argparse
+import subprocess
+from contextlib import contextmanager
+
+STATE_ENV = 'FAKE_CLUSTER_DIR'
+BIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+
+DEFAULT_CONFIG = {'queue_delay': 0.,  # time in seconds a job waits in the queue before it can be started
+                  'n_slots': os.cpu_count(),  # maximal number of jobs that run at the same time
+                  'fail_rate': 0.,  # probability that a job fails without running
+                  'submit_delay': 0.,  # time in seconds a submission command takes
+                  'scheduler_interval': .05,  # interval in seconds of the scheduling loop
+                  'idle_timeout': 10.,  # time in seconds after which an idle scheduler stops
+                  'seed': None,  # seed for the failure injection
+                  'sacct_lag': False}  # whether sacct only lists the first unfinished task of an array
+
+# exit code of cancelled jobs, i.e. killed by SIGTERM
+CANCELLED_CODE = 143
+
+
+def state_dir():
+    path = os.environ.get(STATE_ENV, '/tmp/fake_cluster')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_config(folder):
+    config = dict(DEFAULT_CONFIG)
+    config_path = os.path.join(folder, 'config.json')
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config.update(json.load(f))
+    return config
+
+
+def write_config(folder, **kwargs):
+    """ Write the configuration of the fake cluster with state in `folder`, see `DEFAULT_CONFIG`.
+    """
+    os.makedirs(folder, exist_ok=True)
+    unknown = set(kwargs) - set(DEFAULT_CONFIG)
+    assert not unknown, "Invalid config keys: %s" % ', '.join(unknown)
+    with open(os.path.join(folder, 'config.json'), 'w') as f:
+        json.dump({**DEFAULT_CONFIG, **kwargs}, f)
+
+
+def _write_atomic(path, content):
+    # write to a tmp file first, so that the content is never read half-written
+    tmp_path = path + '.tmp%i' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _locked(path):
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+#
+# job state
+#
+
+def job_names(folder, job_id):
+    """ Names of the jobs for the id, which is either a job id, an array id or an array element `<id>_<index>`.
+    """
+    paths = glob.glob(os.path.join(folder, '%s.job' % job_id)) +\
+        glob.glob(os.path.join(folder, '%s_*.job' % job_id))
+    return sorted(os.path.basename(path)[:-len('.job')] for path in paths)
+
+
+def job_state(folder, name):
+    """ The state of the job, one of 'pending', 'running', 'completed', 'failed' or 'cancelled'.
+    """
+    exit_path = os.path.join(folder, '%s.exit' % name)
+    if os.path.exists(exit_path):
+        with open(exit_path) as f:
+            exit_code = int(f.read())
+        if exit_code == 0:
+            return 'completed'
+        return 'cancelled' if exit_code == CANCELLED_CODE else 'failed'
+    return 'running' if os.path.exists(os.path.join(folder, '%s.start' % name)) else 'pending'
+
+
+def job_name_of(folder, name):
+    with open(os.path.join(folder, '%s.job' % name)) as f:
+        return json.load(f)['job_name']
+
+
+def _next_job_id(folder):
+    # several jobs may be submitted at the same time
+    counter = os.path.join(folder, 'counter')
+    with _locked(counter + '.lock'):
+        job_id = int(open(counter).read()) + 1 if os.path.exists(counter) else 1
+        _write_atomic(counter, str(job_id))
+    return job_id
+
+
+def submit(folder, jobs):
+    """ Submit jobs, given as list of dicts with 'name', 'job_name', 'command', 'env', 'out', 'err' and 'append'.
+    """
+    config = read_config(folder)
+    time.sleep(config['submit_delay'])
+    submit_time = time.time()
+    for job in jobs:
+        _write_atomic(os.path.join(folder, '%s.job' % job['name']), json.dumps({**job, 'submit_time': submit_time}))
+    ensure_scheduler(folder)
+
+
+def cancel(folder, job_id):
+    for name in job_names(folder, job_id):
+        state = job_state(folder, name)
+        # pending jobs are cancelled right away, running jobs are killed by the scheduler
+        if state == 'pending':
+            _write_atomic(os.path.join(folder, '%s.exit' % name), str(CANCELLED_CODE))
+        elif state == 'running':
+            open(os.path.join(folder, '%s.cancel' % name), 'w').close()
+
+
+#
+# the scheduler
+#
+
+def _try_lock(path):
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def ensure_scheduler(folder):
+    """ Start the scheduler for the state folder if it is not running.
+
+    The scheduler holds a lock on `scheduler.lock` while it is running.
+    """
+    lock = _try_lock(os.path.join(folder, 'scheduler.lock'))
+    if lock is None:
+        return
+    lock.close()
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), folder], start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=open(os.path.join(folder, 'scheduler.err'), 'a'))
+
+
+class Scheduler:
+    """ Runs the jobs in the state folder as local processes,
+        in order of submission, after the queue delay and if a slot is free.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.config = read_config(folder)
+        self.rng = random.Random(self.config['seed'])
+        self.pending = {}
+        self.running = {}
+        self.seen = set()
+
+    def _path(self, name, ext):
+        return os.path.join(self.folder, '%s.%s' % (name, ext))
+
+    def _update_pending(self):
+        for file_name in os.listdir(self.folder):
+            if not file_name.endswith('.job') or file_name in self.seen:
+                continue
+            self.seen.add(file_name)
+            name = file_name[:-len('.job')]
+            if os.path.exists(self._path(name, 'exit')) or os.path.exists(self._path(name, 'start')):
+                continue
+            with open(self._path(name, 'job')) as f:
+                self.pending[name] = json.load(f)
+
+    def _start(self, name, job):
+        _write_atomic(self._path(name, 'start'), str(time.time()))
+        mode = 'a' if job['append'] else 'w'
+        with open(job['out'], mode) as f_out:
+            f_err = f_out if job['err'] == job['out'] else open(job['err'], mode)
+            if self.rng.random() < self.config['fail_rate']:
+                f_err.write("fake_cluster: job failed by failure injection\n")
+                _write_atomic(self._path(name, 'exit'), '1')
+            else:
+                self.running[name] = subprocess.Popen(['sh', '-c', job['command']], env=job['env'],
+                                                      start_new_session=True, stdin=subprocess.DEVNULL,
+                                                      stdout=f_out, stderr=f_err)
+            if f_err is not f_out:
+                f_err.close()
+
+    def step(self):
+        """ Finish, cancel and start jobs. Returns whether there are pending or running jobs.
+        """
+        for name, proc in list(self.running.items()):
+            if os.path.exists(self._path(name, 'cancel')) and proc.poll() is None:
+                try:
+                    os.killpg(proc.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+                proc.wait()
+                _write_atomic(self._path(name, 'exit'), str(CANCELLED_CODE))
+                del self.running[name]
+            elif proc.poll() is not None:
+                # a killed process has a negative return code
+                code = proc.returncode if proc.returncode >= 0 else 128 - proc.returncode
+                _write_atomic(self._path(name, 'exit'), str(code))
+                del self.running[name]
+
+        self._update_pending()
+        now = time.time()
+        # the jobs of an array have the same submission time and are started in order of their index
+        order = sorted(self.pending, key=lambda name: (self.pending[name]['submit_time'],
+                                                       tuple(map(int, name.split('_')))))
+        for name in order:
+            if len(self.running) >= self.config['n_slots']:
+                break
+            job = self.pending[name]
+            # the job may have been cancelled while pending
+            if os.path.exists(self._path(name, 'exit')):
+                del self.pending[name]
+                continue
+            if now - job['submit_time'] < self.config['queue_delay']:
+                # the jobs are ordered by submission, so the later jobs need to wait as well
+                break
+            del self.pending[name]
+            self._start(name, job)
+        return bool(self.pending or self.running)
+
+    def run(self):
+        last_active = time.time()
+        while True:
+            if self.step():
+                last_active = time.time()
+            elif time.time() - last_active > self.config['idle_timeout']:
+                return
+            time.sleep(self.config['scheduler_interval'])
+
+
+def run_scheduler(folder):
+    lock_path = os.path.join(folder, 'scheduler.lock')
+    lock = _try_lock(lock_path)
+    # another scheduler is running already
+    if lock is None:
+        return
+    scheduler = Scheduler(folder)
+    while True:
+        scheduler.run()
+        lock.close()
+        # a job may have been submitted after the last step, while the submission still saw the lock;
+        # in this case we continue, unless another scheduler was started in the meantime
+        scheduler.seen = set()
+        scheduler._update_pending()
+        if not scheduler.pending:
+            return
+        lock = _try_lock(lock_path)
+        if lock is None:
+            return
+
+
+#
+# slurm shims
+#
+
+def sbatch(argv):
+    parser = argparse.ArgumentParser(prog='sbatch')
+    parser.add_argument('-o', default='slurm-%j.out')
+    parser.add_argument('-e', default='slurm-%j.err')
+    parser.add_argument('-J', default='')
+    parser.add_argument('--array', default=None)
+    parser.add_argument('--parsable', action='store_true')
+    parser.add_argument('script')
+    parser.add_argument('args', nargs='*')
+    args = parser.parse_args(argv)
+
+    folder = state_dir()
+    job_id = _next_job_id(folder)
+    if args.array is None:
+        tasks = [(str(job_id), None)]
+    else:
+        first, last = map(int, args.array.split('-'))
+        tasks = [('%i_%i' % (job_id, task_id), task_id) for task_id in range(first, last + 1)]
+
+    jobs = []
+    for name, task_id in tasks:
+        env = dict(os.environ, SLURM_JOB_ID=str(job_id))
+        if task_id is not None:
+            env['SLURM_ARRAY_TASK_ID'] = str(task_id)
+        out = args.o.replace('%a', str(task_id)).replace('%j', str(job_id))
+        err = args.e.replace('%a', str(task_id)).replace('%j', str(job_id))
+        command = ' '.join(['bash', args.script] + args.args)
+        jobs.append({'name': name, 'job_name': args.J, 'command': command, 'env': env,
+                     'out': out, 'err': err, 'append': False})
+    submit(folder, jobs)
+    print(job_id if args.parsable else 'Submitted batch job %i' % job_id)
+
+
+SLURM_STATES = {'pending': 'PENDING', 'running': 'RUNNING', 'completed': 'COMPLETED',
+                'failed': 'FAILED', 'cancelled': 'CANCELLED'}
+
+
+def squeue(argv):
+    # squeue -h -o %i -j <ids>
+    folder = state_dir()
+    job_ids = argv[argv.index('-j') + 1].split(',')
+    for job_id in job_ids:
+        for name in job_names(folder, job_id):
+            if job_state(folder, name) in ('pending', 'running'):
+                print(name)
+
+
+def sacct(argv):
+    # sacct -n -X -P -o JobID,State -j <ids>
+    folder = state_dir()
+    lag = read_config(folder)['sacct_lag']
+    job_ids = argv[argv.index('-j') + 1].split(',')
+    for job_id in job_ids:
+        for name in job_names(folder, job_id):
+            state = job_state(folder, name)
+            # simulates an accounting database that does not list all running array tasks yet
+            if lag and state in ('pending', 'running') and '_' in name and not name.endswith('_0'):
+                continue
+            print('%s|%s' % (name, SLURM_STATES[state]))
+
+
+def scancel(argv):
+    folder = state_dir()
+    for job_id in argv:
+        cancel(folder, job_id)
+
+
+#
+# lsf shims
+#
+
+def bsub(argv):
+    parser = argparse.ArgumentParser(prog='bsub')
+    parser.add_argument('-n', default='1')
+    parser.add_argument('-J', default='')
+    parser.add_argument('-We', default='60')
+    parser.add_argument('-o', default='/dev/null')
+    parser.add_argument('-e', default=None)
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    folder = state_dir()
+    job_id = _next_job_id(folder)
+    # check if this is an array job, i.e. the job name is 'name[first-last]'
+    array = re.match(r'(.*)\[(\d+)-(\d+)\]$', args.J)
+    if array is None:
+        tasks = [(str(job_id), None, args.J)]
+    else:
+        name, first, last = array.group(1), int(array.group(2)), int(array.group(3))
+        tasks = [('%i_%i' % (job_id, index), index, '%s[%i]' % (name, index))
+                 for index in range(first, last + 1)]
+
+    jobs = []
+    for name, index, job_name in tasks:
+        env = dict(os.environ, LSB_JOBID=str(job_id))
+        if index is not None:
+            env['LSB_JOBINDEX'] = str(index)
+        out = args.o.replace('%I', str(index)).replace('%J', str(job_id))
+        err = out if args.e is None else args.e.replace('%I', str(index)).replace('%J', str(job_id))
+        # lsf appends to the output files
+        jobs.append({'name': name, 'job_name': job_name, 'command': ' '.join(args.command), 'env': env,
+                     'out': out, 'err': err, 'append': True})
+    submit(folder, jobs)
+    print('Job <%i> is submitted to default queue <normal>.' % job_id)
+
+
+LSF_STATES = {'pending': 'PEND', 'running': 'RUN', 'completed': 'DONE',
+              'failed': 'EXIT', 'cancelled': 'EXIT'}
+
+
+def _lsf_job_id(job_id):
+    # array elements are given as 'id[index]'
+    return job_id.replace('[', '_').rstrip(']')
+
+
+def bjobs(argv):
+    # bjobs -noheader <ids>
+    folder = state_dir()
+    job_ids = [arg for arg in argv if not arg.startswith('-')]
+    found_all = True
+    for job_id in job_ids:
+        names = job_names(folder, _lsf_job_id(job_id))
+        if not names:
+            sys.stderr.write('Job <%s> is not found\n' % job_id)
+            found_all = False
+        for name in names:
+            state = LSF_STATES[job_state(folder, name)]
+            print('%s user %s normal localhost localhost %s Jan 1 00:00' % (job_id.split('[')[0], state,
+                                                                             job_name_of(folder, name)))
+    sys.exit(0 if found_all else 255)
+
+
+def bkill(argv):
+    folder = state_dir()
+    for job_id in argv:
+        cancel(folder, _lsf_job_id(job_id))
+
+
+COMMANDS = {'sbatch': sbatch, 'squeue': squeue, 'sacct': sacct, 'scancel': scancel,
+            'bsub': bsub, 'bjobs': bjobs, 'bkill': bkill}
+
+
+def main(command, argv):
+    COMMANDS[command](argv)
+
+
+if __name__ == '__main__':
+    run_scheduler(sys.argv[1])
@@ -0,0 +1,89 @@
+#! /usr/bin/python
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+
+import cluster_tools
+
+PACKAGE_DIR = os.path.abspath(cluster_tools.__path__[0])
+ROOT_DIR = os.path.dirname(PACKAGE_DIR)
+HEAVY_DEPENDENCIES = ('vigra', 'nifty', 'elf', 'z5py', 'h5py', 'zarr', 'sklearn', 'skimage', 'fastfilters')
+
+# imports the module in a fresh interpreter and reports the import time and the heavy dependencies it loaded
+IMPORT_CODE = """
+import sys, time, json
+t0 = time.perf_counter()
+import %s
+t = time.perf_counter() - t0
+deps = sorted(set(name.split('.')[0] for name in sys.modules) & set(%r))
+print(json.dumps({'time': t, 'dependencies': deps}))
+"""
+
+
+def task_scripts():
+    """ Modules of cluster_tools that are run as job scripts, i.e. that have a `__main__` block.
+    """
+    scripts = []
+    for root, _, names in os.walk(PACKAGE_DIR):
+        for name in sorted(names):
+            if not name.endswith('.py'):
+                continue
+            path = os.path.join(root, name)
+            with open(path) as f:
+                if "if __name__ == '__main__':" not in f.read():
+                    continue
+            module = os.path.relpath(path, ROOT_DIR)[:-3].replace(os.sep, '.')
+            scripts.append(module)
+    return sorted(scripts)
+
+
+def time_import(module, n_repeats):
+    """ Time the import of `module` in `n_repeats` fresh interpreters,
+        returns the median time in seconds and the heavy dependencies that were imported.
+    """
+    # make sure that the fresh interpreters import the same cluster_tools as this script
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT_DIR] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    times = []
+    for _ in range(n_repeats):
+        result = subprocess.run([sys.executable, '-c', IMPORT_CODE % (module, HEAVY_DEPENDENCIES)],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        if result.returncode != 0:
+            error = result.stderr.decode().strip().split('\n')[-1]
+            raise RuntimeError(error)
+        record = json.loads(result.stdout.decode().strip().split('\n')[-1])
+        times.append(record['time'])
+    return float(np.median(times)), record['dependencies']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of cluster_tools and of the task scripts, "
+                                                 "i.e. the startup time of workflow construction and of the jobs.")
+    parser.add_argument('--modules', nargs='+', default=None,
+                        help="only benchmark the task scripts whose module name contains one of these strings")
+    parser.add_argument('--n_repeats', type=int, default=3,
+                        help="number of fresh interpreters per module, the median import time is reported")
+    args = parser.parse_args()
+
+    modules = task_scripts()
+    if args.modules is not None:
+        modules = [module for module in modules if any(pattern in module for pattern in args.modules)]
+    modules = ['cluster_tools'] + modules
+
+    print("%-60s %10s  %s" % ('module', 'time [s]', 'heavy dependencies'))
+    for module in modules:
+        try:
+            t, deps = time_import(module, args.n_repeats)
+        except RuntimeError as e:
+            print("%-60s %10s  %s" % (module, 'failed', str(e)))
+            continue
+        print("%-60s %10.3f  %s" % (module, t, ', '.join(deps)))
+
+
+if __name__ == '__main__':
+    main()
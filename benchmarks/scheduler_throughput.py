@@ -0,0 +1,142 @@
+#! /usr/bin/python
+
+import os
+import sys
+import json
+import shutil
+import argparse
+
+import luigi
+
+from cluster_tools.cluster_tasks import BaseClusterTask
+from cluster_tools.utils.trace_utils import read_log, task_spans
+
+from fake_cluster.scheduler import BIN_DIR, STATE_ENV, write_config
+from fake_cluster.noop_task import NoopTaskSlurm, NoopTaskLSF
+
+TASKS = {'slurm': NoopTaskSlurm, 'lsf': NoopTaskLSF}
+
+
+def write_global_config(config_dir, job_array, poll_interval, max_poll_interval, max_num_retries):
+    os.makedirs(config_dir, exist_ok=True)
+    config = BaseClusterTask.default_global_config()
+    config.update({'shebang': '#! %s' % sys.executable, 'easybuild': False, 'job_array': job_array,
+                   'poll_interval': poll_interval, 'max_poll_interval': max_poll_interval,
+                   'max_num_retries': max_num_retries})
+    with open(os.path.join(config_dir, 'global.config'), 'w') as f:
+        json.dump(config, f)
+
+
+def measure(tmp_folder, task_name):
+    """ Measure the scheduling overhead of a task from its task and job logs.
+
+    - submit: time spent in submitting the jobs, summed over the retries
+    - latency: time from the end of the last job until the task noticed that all jobs are done,
+      for the last round of jobs
+    - overhead: runtime of the task minus the time during which jobs were running
+    """
+    task_log = os.path.join(tmp_folder, task_name + '.log')
+    if not os.path.exists(task_log):
+        task_log = os.path.join(tmp_folder, task_name + '_failed.log')
+    span, phases = task_spans(read_log(task_log))
+    submit = sum(end - start for name, start, end in phases if name == 'submit')
+    wait_ends = [end for name, _, end in phases if name == 'wait']
+
+    log_dir = os.path.join(tmp_folder, 'logs')
+    job_spans = []
+    for name in os.listdir(log_dir):
+        lines = read_log(os.path.join(log_dir, name))
+        if lines:
+            job_spans.append((lines[0][0], lines[-1][0]))
+    job_spans.sort()
+
+    # the time during which at least one job was running
+    busy, current = 0., None
+    for start, end in job_spans:
+        if current is None or start > current[1]:
+            busy += 0. if current is None else current[1] - current[0]
+            current = [start, end]
+        else:
+            current[1] = max(current[1], end)
+    busy += 0. if current is None else current[1] - current[0]
+
+    latency = None
+    if wait_ends and job_spans:
+        last_jobs = [end for _, end in job_spans if end <= wait_ends[-1]]
+        latency = wait_ends[-1] - max(last_jobs) if last_jobs else None
+    return {'runtime': span[1] - span[0], 'submit': submit, 'latency': latency,
+            'overhead': span[1] - span[0] - busy, 'n_rounds': len(wait_ends)}
+
+
+def run_benchmark(target, n_jobs, job_array, args):
+    work_folder = os.path.abspath(os.path.join(args.work_folder, '%s_%i_%s' % (target, n_jobs,
+                                                                             'array' if job_array else 'single')))
+    if os.path.exists(work_folder):
+        shutil.rmtree(work_folder)
+    tmp_folder = os.path.join(work_folder, 'tmp')
+    config_dir = os.path.join(work_folder, 'configs')
+    cluster_dir = os.path.join(work_folder, 'cluster')
+    write_global_config(config_dir, job_array, args.poll_interval, args.max_poll_interval, args.max_num_retries)
+    write_config(cluster_dir, queue_delay=args.queue_delay, n_slots=args.n_slots, fail_rate=args.fail_rate,
+                 submit_delay=args.submit_delay, seed=args.seed, idle_timeout=2.)
+
+    os.environ[STATE_ENV] = cluster_dir
+    task = TASKS[target](tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=n_jobs,
+                         n_jobs=n_jobs, job_duration=args.job_duration)
+    success = luigi.build([task], local_scheduler=True)
+    result = measure(tmp_folder, task.task_name)
+    result['success'] = success
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the submission time, the latency of detecting finished "
+                                                 "jobs and the overhead per task of the slurm and lsf tasks "
+                                                 "on a local fake cluster, see fake_cluster/scheduler.py.")
+    parser.add_argument('--n_jobs', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--targets', nargs='+', default=['slurm', 'lsf'], choices=list(TASKS))
+    parser.add_argument('--modes', nargs='+', default=['single', 'array'], choices=['single', 'array'],
+                        help="submit the jobs one by one or as job array")
+    parser.add_argument('--job_duration', type=float, default=0., help="time in seconds each job sleeps")
+    parser.add_argument('--queue_delay', type=float, default=0., help="time in seconds jobs wait in the queue")
+    parser.add_argument('--n_slots', type=int, default=os.cpu_count(), help="number of jobs that run at once")
+    parser.add_argument('--fail_rate', type=float, default=0., help="probability that a job fails")
+    parser.add_argument('--submit_delay', type=float, default=0., help="time in seconds a submission takes")
+    parser.add_argument('--max_num_retries', type=int, default=0)
+    parser.add_argument('--poll_interval', type=float, default=1.)
+    parser.add_argument('--max_poll_interval', type=float, default=10.)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work_folder', default='./scheduler_benchmark')
+    parser.add_argument('--output', default=None, help="save the results as json")
+    args = parser.parse_args()
+
+    # the tasks call the shims of the fake cluster instead of the scheduler commands
+    os.environ['PATH'] = '%s:%s' % (BIN_DIR, os.environ['PATH'])
+
+    results = []
+    print("%-6s %-7s %7s %10s %10s %12s %12s %8s %8s" % ('target', 'mode', 'n_jobs', 'time [s]', 'submit [s]',
+                                                         'latency [s]', 'overhead [s]', 'rounds', 'success'))
+    try:
+        for target in args.targets:
+            for mode in args.modes:
+                for n_jobs in args.n_jobs:
+                    result = run_benchmark(target, n_jobs, mode == 'array', args)
+                    result.update({'target': target, 'mode': mode, 'n_jobs': n_jobs})
+                    results.append(result)
+                    latency = 'nan' if result['latency'] is None else '%.2f' % result['latency']
+                    print("%-6s %-7s %7i %10.2f %10.2f %12s %12.2f %8i %8s" % (target, mode, n_jobs,
+                                                                              result['runtime'],
+                                                                              result['submit'], latency,
+                                                                              result['overhead'],
+                                                                              result['n_rounds'],
+                                                                              result['success']))
+    finally:
+        shutil.rmtree(args.work_folder, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#! /usr/bin/python
+
+import argparse
+
+import numpy as np
+from scipy.ndimage import distance_transform_edt, gaussian_filter
+from elf.io import open_file
+
+# keys of the synthetic volumes in the output container
+RAW_KEY = 'volumes/raw/s0'
+BOUNDARY_KEY = 'volumes/boundaries'
+AFFINITY_KEY = 'volumes/affinities'
+GT_KEY = 'volumes/groundtruth'
+MASK_KEY = 'volumes/mask'
+OFFSETS = [[-1, 0, 0], [0, -1, 0], [0, 0, -1]]
+
+
+def voronoi_labels(shape, n_cells, rng, anisotropy=(1., 1., 1.)):
+    """ Label each voxel with the id of the closest of `n_cells` random seeds, ids start at 1.
+
+    The distances are computed with the given anisotropy, e.g. (4., 1., 1.) for
+    cells that are flat along the first axis, like in anisotropic EM.
+    """
+    seeds = np.zeros(shape, dtype='bool')
+    coords = tuple(rng.integers(0, sh, size=n_cells) for sh in shape)
+    seeds[coords] = True
+    _, indices = distance_transform_edt(~seeds, sampling=anisotropy, return_indices=True)
+    seed_ids = np.zeros(shape, dtype='uint64')
+    seed_ids[seeds] = np.arange(1, seeds.sum() + 1)
+    return seed_ids[tuple(indices)]
+
+
+def label_boundaries(labels, offsets=OFFSETS):
+    """ Boundaries between different labels for each offset, as uint8 array with one channel per offset.
+    """
+    boundaries = np.zeros((len(offsets),) + labels.shape, dtype='uint8')
+    for channel, offset in enumerate(offsets):
+        axis = int(np.nonzero(offset)[0][0])
+        shift = -offset[axis]
+        bb = tuple(slice(shift, None) if d == axis else slice(None) for d in range(labels.ndim))
+        bb_shifted = tuple(slice(None, -shift) if d == axis else slice(None) for d in range(labels.ndim))
+        boundaries[(channel,) + bb] = labels[bb] != labels[bb_shifted]
+    return boundaries
+
+
+def blurred_membranes(boundaries, sigma, noise, rng):
+    """ Blur binary boundaries to membrane probabilities in [0, 1] and add gaussian noise.
+    """
+    membranes = gaussian_filter(boundaries.astype('float32'), sigma)
+    membranes /= max(float(membranes.max()), 1e-6)
+    if noise > 0:
+        membranes += rng.normal(scale=noise, size=membranes.shape).astype('float32')
+    return np.clip(membranes, 0, 1)
+
+
+def ellipsoid_mask(shape, fraction):
+    """ Mask of the centered ellipsoid that covers about `fraction` of the volume.
+    """
+    # the ellipsoid inscribed in the volume covers pi / 6 of it, so we scale its radii to get the fraction
+    scale = min((fraction * 6 / np.pi) ** (1. / 3), 1.)
+    grid = np.ogrid[tuple(slice(0, sh) for sh in shape)]
+    dist = sum(((g - (sh - 1) / 2.) / (scale * sh / 2.)) ** 2 for g, sh in zip(grid, shape))
+    return (dist <= 1).astype('uint8')
+
+
+def generate(path, shape, chunks, n_cells, sigma=1., noise=.05, mask_fraction=.5,
+             anisotropy=(1., 1., 1.), seed=0):
+    """ Write synthetic raw data, boundaries, affinities, ground-truth and mask to the container at `path`.
+
+    The ground-truth are voronoi cells, the boundary map and affinities are
+    their blurred membranes with noise and the raw data is the inverted boundary map.
+    """
+    rng = np.random.default_rng(seed)
+    gt = voronoi_labels(shape, n_cells, rng, anisotropy)
+    affinities = blurred_membranes(label_boundaries(gt), [0] + [sigma] * len(shape), noise, rng)
+    boundaries = blurred_membranes(label_boundaries(gt).max(axis=0), sigma, noise, rng)
+    raw = (255 * (1. - boundaries)).astype('uint8')
+    mask = ellipsoid_mask(shape, mask_fraction)
+
+    chunks = tuple(min(ch, sh) for ch, sh in zip(chunks, shape))
+    with open_file(path, 'a') as f:
+        for key, data, data_chunks in ((RAW_KEY, raw, chunks),
+                                       (BOUNDARY_KEY, boundaries, chunks),
+                                       (AFFINITY_KEY, affinities, (1,) + chunks),
+                                       (GT_KEY, gt, chunks),
+                                       (MASK_KEY, mask, chunks)):
+            ds = f.require_dataset(key, shape=data.shape, dtype=data.dtype,
+                                   chunks=data_chunks, compression='gzip')
+            ds[:] = data
+        # the raw data is the first scale level of a paintera style multi-scale group
+        f[RAW_KEY].attrs['downsamplingFactors'] = [1, 1, 1]
+        f['volumes/raw'].attrs['multiScale'] = True
+    return {'shape': list(shape), 'n_cells': int(gt.max())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic raw data, boundary maps, affinities, "
+                                                 "ground-truth and mask from voronoi cells with blurred membranes.")
+    parser.add_argument('path', help="path to the output container, e.g. synthetic.n5")
+    parser.add_argument('--shape', type=int, nargs=3, default=[64, 512, 512])
+    parser.add_argument('--chunks', type=int, nargs=3, default=[32, 256, 256])
+    parser.add_argument('--n_cells', type=int, default=2000, help="number of voronoi cells")
+    parser.add_argument('--sigma', type=float, default=1., help="blur of the membranes")
+    parser.add_argument('--noise', type=float, default=.05, help="standard deviation of the noise")
+    parser.add_argument('--mask_fraction', type=float, default=.5, help="fraction of the volume inside of the mask")
+    parser.add_argument('--anisotropy', type=float, nargs=3, default=[1., 1., 1.],
+                        help="voxel size used for the distances of the voronoi cells")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    info = generate(args.path, args.shape, args.chunks, args.n_cells, args.sigma, args.noise,
+                    args.mask_fraction, args.anisotropy, args.seed)
+    print("Generated synthetic volumes of shape %s with %i cells in %s" % (str(info['shape']),
+                                                                         info['n_cells'], args.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#! /usr/bin/python
+
+import os
+import shutil
+import argparse
+import multiprocessing
+
+from elf.io import open_file
+
+from cluster_tools.utils.tuning_utils import (candidate_block_shapes, tune_block_shape,
+                                              MIN_BLOCK_VOXELS, MAX_BLOCK_VOXELS)
+
+from synthetic_data import generate, BOUNDARY_KEY
+from workflows import stage_tasks, write_configs
+
+# the stages that only read the synthetic data, so they can be run on their own
+STAGES = ('watershed', 'downscaling', 'mws')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the block shape with the highest throughput for a workflow "
+                                                 "on synthetic data and write it to the global config, "
+                                                 "see cluster_tools.utils.tuning_utils.")
+    parser.add_argument('stage', choices=STAGES)
+    parser.add_argument('--shape', type=int, nargs=3, default=[128, 1024, 1024])
+    parser.add_argument('--chunks', type=int, nargs=3, default=[16, 128, 128])
+    parser.add_argument('--roi_shape', type=int, nargs=3, default=[64, 512, 512])
+    parser.add_argument('--n_cells', type=int, default=4000, help="number of voronoi cells in the synthetic data")
+    parser.add_argument('--min_voxels', type=int, default=MIN_BLOCK_VOXELS)
+    parser.add_argument('--max_voxels', type=int, default=MAX_BLOCK_VOXELS)
+    parser.add_argument('--max_memory', type=float, default=None, help="maximal peak memory of a job in GB")
+    parser.add_argument('--max_jobs', type=int, default=min(multiprocessing.cpu_count(), 16))
+    parser.add_argument('--threads_per_job', type=int, default=1)
+    parser.add_argument('--work_folder', default='./tuning_data',
+                        help="folder for the synthetic data, the trials and the configs")
+    parser.add_argument('--keep', action='store_true', help="don't remove the synthetic data and trials afterwards")
+    args = parser.parse_args()
+
+    data_path = os.path.join(args.work_folder, 'data.n5')
+    config_dir = os.path.join(args.work_folder, 'configs')
+    if not os.path.exists(data_path):
+        print("Generating synthetic data of shape %s" % str(args.shape))
+        generate(data_path, args.shape, args.chunks, args.n_cells)
+    with open_file(data_path, 'r') as f:
+        shape = f[BOUNDARY_KEY].shape
+    write_configs(config_dir, args.chunks, args.threads_per_job)
+
+    def make_task(tmp_folder, config_dir, output_path):
+        stage_kwargs = dict(tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=args.max_jobs, target='local')
+        return stage_tasks(args.stage, data_path, output_path, stage_kwargs)
+
+    candidates = candidate_block_shapes(args.chunks, args.roi_shape, args.min_voxels, args.max_voxels)
+    try:
+        best, results = tune_block_shape(make_task, config_dir, args.work_folder, shape, args.chunks, args.roi_shape,
+                                         candidates=candidates, max_memory=args.max_memory, keep_trials=args.keep)
+        print("%-20s %12s %16s %16s" % ('block shape', 'time [s]', 'voxels / s', 'peak mem [GB]'))
+        for result in results:
+            throughput = 'failed' if result['throughput'] is None else '%.3e' % result['throughput']
+            print("%-20s %12.2f %16s %16.2f" % ('x'.join(map(str, result['block_shape'])), result['runtime'],
+                                               throughput, result['peak_memory'] / 1e9))
+        if best is None:
+            print("No block shape passed for %s" % args.stage)
+        else:
+            print("Best block shape for %s: %s, written to %s" % (args.stage, str(best),
+                                                                 os.path.join(config_dir, 'global.config')))
+    finally:
+        if not args.keep:
+            shutil.rmtree(data_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#! /usr/bin/python
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+
+import luigi
+from elf.io import open_file
+
+from cluster_tools.cluster_tasks import BaseClusterTask
+from cluster_tools.utils.parse_utils import read_telemetry
+
+from synthetic_data import generate, RAW_KEY, BOUNDARY_KEY, AFFINITY_KEY, GT_KEY, MASK_KEY, OFFSETS
+
+STAGES = ('watershed', 'graph', 'edge_features', 'edge_costs', 'multicut',
+          'relabel', 'downscaling', 'mws', 'evaluation')
+
+
+def stage_tasks(stage, data_path, out_path, stage_kwargs):
+    """ The workflow that is run for `stage` on the synthetic data.
+
+    The stages read the outputs of the previous stages, see `STAGES` for their order.
+    """
+    if stage == 'watershed':
+        from cluster_tools.watershed import WatershedWorkflow
+        return WatershedWorkflow(input_path=data_path, input_key=BOUNDARY_KEY,
+                                 output_path=out_path, output_key='watershed',
+                                 mask_path=data_path, mask_key=MASK_KEY, **stage_kwargs)
+    elif stage == 'graph':
+        from cluster_tools.graph import GraphWorkflow
+        return GraphWorkflow(input_path=out_path, input_key='watershed',
+                             graph_path=out_path, output_key='s0/graph', n_scales=1, **stage_kwargs)
+    elif stage == 'edge_features':
+        from cluster_tools.features import EdgeFeaturesWorkflow
+        return EdgeFeaturesWorkflow(input_path=data_path, input_key=BOUNDARY_KEY,
+                                    labels_path=out_path, labels_key='watershed',
+                                    graph_path=out_path, graph_key='s0/graph',
+                                    output_path=out_path, output_key='features', **stage_kwargs)
+    elif stage == 'edge_costs':
+        from cluster_tools.costs import EdgeCostsWorkflow
+        return EdgeCostsWorkflow(features_path=out_path, features_key='features',
+                                 output_path=out_path, output_key='s0/costs', **stage_kwargs)
+    elif stage == 'multicut':
+        from cluster_tools.multicut import MulticutWorkflow
+        return MulticutWorkflow(problem_path=out_path, n_scales=1,
+                                assignment_path=out_path, assignment_key='node_labels', **stage_kwargs)
+    elif stage == 'relabel':
+        from cluster_tools.relabel import RelabelWorkflow
+        return RelabelWorkflow(input_path=out_path, input_key='watershed',
+                               assignment_path=out_path, assignment_key='relabel_assignments',
+                               output_path=out_path, output_key='watershed_relabeled', **stage_kwargs)
+    elif stage == 'downscaling':
+        from cluster_tools.downscaling import DownscalingWorkflow
+        return DownscalingWorkflow(input_path=data_path, input_key=RAW_KEY,
+                                   output_path=out_path, output_key_prefix='raw',
+                                   scale_factors=[[1, 2, 2], [1, 2, 2], [2, 2, 2]],
+                                   halos=[[1, 4, 4], [1, 4, 4], [2, 4, 4]],
+                                   metadata_format='paintera', **stage_kwargs)
+    elif stage == 'mws':
+        from cluster_tools.mutex_watershed import MwsWorkflow
+        return MwsWorkflow(input_path=data_path, input_key=AFFINITY_KEY,
+                           output_path=out_path, output_key='mws', offsets=OFFSETS,
+                           mask_path=data_path, mask_key=MASK_KEY, **stage_kwargs)
+    elif stage == 'evaluation':
+        from cluster_tools.evaluation import EvaluationWorkflow
+        return EvaluationWorkflow(seg_path=out_path, seg_key='watershed_relabeled',
+                                  gt_path=data_path, gt_key=GT_KEY,
+                                  output_path=os.path.join(os.path.dirname(out_path), 'evaluation.json'),
+                                  **stage_kwargs)
+    raise ValueError("Invalid stage %s" % stage)
+
+
+def peak_memory(tmp_folder):
+    """ Largest peak memory of the jobs of all tasks in the tmp folder in bytes, from their telemetry.
+    """
+    telemetry_dir = os.path.join(tmp_folder, 'telemetry')
+    if not os.path.isdir(telemetry_dir):
+        return 0
+    return max((record.get('peak_rss', 0) for name in os.listdir(telemetry_dir) if name.endswith('.jsonl')
+                for record in read_telemetry(os.path.join(telemetry_dir, name))
+                if 'job_id' in record and record.get('status') == 'processed'), default=0)
+
+
+def run_stage(stage, data_path, out_path, n_voxels, work_folder, config_dir, max_jobs):
+    """ Run the workflow of `stage` with the local target and measure its throughput and peak memory.
+
+    Each stage has its own tmp folder, so that the telemetry of its jobs can be told apart.
+    """
+    tmp_folder = os.path.join(work_folder, 'tmp_%s' % stage)
+    stage_kwargs = dict(tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=max_jobs, target='local')
+    task = stage_tasks(stage, data_path, out_path, stage_kwargs)
+    t0 = time.time()
+    success = luigi.build([task], local_scheduler=True)
+    runtime = time.time() - t0
+    return {'success': success, 'runtime': runtime, 'voxels_per_second': n_voxels / runtime,
+            'peak_memory': peak_memory(tmp_folder)}
+
+
+def write_configs(config_dir, block_shape, threads_per_job):
+    os.makedirs(config_dir, exist_ok=True)
+    config = BaseClusterTask.default_global_config()
+    config.update({'shebang': '#! %s' % sys.executable, 'block_shape': block_shape})
+    with open(os.path.join(config_dir, 'global.config'), 'w') as f:
+        json.dump(config, f)
+    # the synthetic boundaries are already smooth, so we don't need the watershed pre-smoothing
+    from cluster_tools.watershed import WatershedWorkflow
+    ws_config = WatershedWorkflow.get_config()['watershed']
+    ws_config.update({'threads_per_job': threads_per_job, 'apply_presmooth_2d': False,
+                      'apply_dt_2d': False, 'apply_ws_2d': False, 'halo': [2, 16, 16]})
+    with open(os.path.join(config_dir, 'watershed.config'), 'w') as f:
+        json.dump(ws_config, f)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """ Compare the throughput and peak memory of each stage to the baseline.
+
+    Returns the stages that are slower or use more memory than the baseline by more than `tolerance`.
+    """
+    regressions = []
+    print("%-16s %16s %16s" % ('stage', 'speed vs base', 'memory vs base'))
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        base = baseline[stage]
+        speed_ratio = result['voxels_per_second'] / base['voxels_per_second']
+        mem_ratio = result['peak_memory'] / base['peak_memory'] if base['peak_memory'] > 0 else 1.
+        print("%-16s %16.2f %16.2f" % (stage, speed_ratio, mem_ratio))
+        if speed_ratio < 1. - tolerance or mem_ratio > 1. + tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workflows end-to-end with the local target "
+                                                 "on synthetic data, see synthetic_data.py.")
+    parser.add_argument('--shape', type=int, nargs=3, default=[64, 512, 512])
+    parser.add_argument('--n_cells', type=int, default=2000, help="number of voronoi cells in the synthetic data")
+    parser.add_argument('--block_shape', type=int, nargs=3, default=[32, 256, 256])
+    parser.add_argument('--max_jobs', type=int, default=min(multiprocessing.cpu_count(), 16))
+    parser.add_argument('--threads_per_job', type=int, default=1)
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES,
+                        help="the stages to run, they need the outputs of the previous stages")
+    parser.add_argument('--work_folder', default='./benchmark_data',
+                        help="folder for the synthetic data, the outputs and the tmp folders")
+    parser.add_argument('--keep', action='store_true', help="don't remove the work folder afterwards")
+    parser.add_argument('--output', default=None, help="save the results as json, e.g. to use them as baseline")
+    parser.add_argument('--baseline', default=None, help="json with the results of a previous run to compare to")
+    parser.add_argument('--tolerance', type=float, default=.2,
+                        help="relative loss of throughput or increase of memory that counts as regression")
+    args = parser.parse_args()
+
+    data_path = os.path.join(args.work_folder, 'data.n5')
+    out_path = os.path.join(args.work_folder, 'outputs.n5')
+    config_dir = os.path.join(args.work_folder, 'configs')
+    if not os.path.exists(data_path):
+        print("Generating synthetic data of shape %s" % str(args.shape))
+        generate(data_path, args.shape, args.block_shape, args.n_cells)
+    with open_file(data_path, 'r') as f:
+        shape = f[BOUNDARY_KEY].shape
+    n_voxels = float(shape[0] * shape[1] * shape[2])
+    write_configs(config_dir, args.block_shape, args.threads_per_job)
+
+    results = {}
+    try:
+        print("%-16s %12s %16s %16s" % ('stage', 'time [s]', 'voxels / s', 'peak mem [GB]'))
+        for stage in STAGES:
+            if stage not in args.stages:
+                continue
+            result = run_stage(stage, data_path, out_path, n_voxels, args.work_folder, config_dir, args.max_jobs)
+            if not result['success']:
+                print("%-16s %12s" % (stage, 'failed'))
+                break
+            results[stage] = result
+            print("%-16s %12.2f %16.3e %16.2f" % (stage, result['runtime'], result['voxels_per_second'],
+                                                 result['peak_memory'] / 1e9))
+    finally:
+        if not args.keep:
+            shutil.rmtree(args.work_folder)
+
+    results = {'shape': list(shape), 'block_shape': args.block_shape, 'max_jobs': args.max_jobs, 'stages': results}
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['shape'] != results['shape'] or baseline['block_shape'] != results['block_shape']:
+            print("WARNING: the baseline was run with shape %s and block shape %s" % (str(baseline['shape']),
+                                                                                     str(baseline['block_shape'])))
+        regressions = compare_to_baseline(results['stages'], baseline['stages'], args.tolerance)
+        if regressions:
+            print("Regressions in stages: %s" % ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
-from .workflows import MulticutSegmentationWorkflow
-from .workflows import LiftedMulticutSegmentationWorkflow
-from .workflows import AgglomerativeClusteringWorkflow
-from .workflows import SimpleStitchingWorkflow
-from .thresholded_components import ThresholdedComponentsWorkflow, ThresholdAndWatershedWorkflow
-
+from .utils.import_utils import lazy_exports
 from .version import __version__
+
+# the workflows and the subpackages are only imported when they are used, so that importing cluster_tools
+# (e.g. in the job scripts or to construct a single task) doesn't import the dependencies of all tasks
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.workflows': ['MulticutSegmentationWorkflow', 'LiftedMulticutSegmentationWorkflow',
+                   'AgglomerativeClusteringWorkflow', 'SimpleStitchingWorkflow'],
+    '.thresholded_components': ['ThresholdedComponentsWorkflow', 'ThresholdAndWatershedWorkflow'],
+})
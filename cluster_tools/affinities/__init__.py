@@ -1,3 +1,7 @@
-from .embedding_distances import EmbeddingDistancesLSF, EmbeddingDistancesLocal, EmbeddingDistancesSlurm
-from .gradients import GradientsLSF, GradientsLocal, GradientsSlurm
-from .insert_affinities_workflow import InsertAffinitiesWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.embedding_distances': ['EmbeddingDistancesLSF', 'EmbeddingDistancesLocal', 'EmbeddingDistancesSlurm'],
+    '.gradients': ['GradientsLSF', 'GradientsLocal', 'GradientsSlurm'],
+    '.insert_affinities_workflow': ['InsertAffinitiesWorkflow'],
+})
@@ -80,10 +80,10 @@ class GradientsBase(luigi.Task):
             out_chunks = (1,) + chunks
 
         # make output dataset
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=out_shape, dtype='float32',
-                              compression=compression, chunks=out_chunks)
+                              **compression_opts, chunks=out_chunks)
 
         block_list = vu.blocks_in_volume(shape, block_shape,
                                          roi_begin, roi_end)
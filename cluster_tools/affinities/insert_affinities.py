@@ -78,7 +78,7 @@ class InsertAffinitiesBase(luigi.Task):
         assert all(bs % ch == 0 for bs, ch in zip(block_shape, chunks[1:]))
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=tuple(shape), chunks=tuple(chunks),
-                              dtype=dtype, compression='gzip')
+                              dtype=dtype, **self.compression_options(self.output_path))
 
         shape = shape[1:]
         block_list = vu.blocks_in_volume(shape, block_shape,
@@ -10,6 +10,7 @@ from elf.segmentation.clustering import mala_clustering
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 #
@@ -152,7 +153,7 @@ def agglomerative_clustering(job_id, config_path):
         ds = f.require_dataset(assignment_key, dtype='uint64',
                                shape=node_shape,
                                chunks=chunks,
-                               compression='gzip')
+                               **compression_options(assignment_path, config))
         ds.n_threads = n_threads
         ds[:] = node_labeling
 
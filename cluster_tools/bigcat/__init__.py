@@ -1 +1,5 @@
-from .bigcat_workflow import BigcatWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.bigcat_workflow': ['BigcatWorkflow'],
+})
@@ -5,17 +5,29 @@ import json
 import time
 import fileinput
 import sys
+import traceback
+from contextlib import redirect_stdout, redirect_stderr, nullcontext
 from copy import deepcopy
 from concurrent import futures
-from subprocess import call, check_output, CalledProcessError, STDOUT
+from concurrent.futures.process import BrokenProcessPool
+from subprocess import call, check_output, run, CalledProcessError, STDOUT, PIPE, DEVNULL
 from datetime import datetime, timedelta
 from multiprocessing import cpu_count
 
 import numpy as np
 import luigi
 
-from .utils.parse_utils import parse_blocks_task, parse_job, parse_job_lsf
-from .utils.task_utils import DummyTask
+from .utils.parse_utils import (parse_blocks_task, parse_job, parse_job_lsf, parse_job_telemetry,
+                                parse_out_of_memory)
+from .utils.task_utils import DummyTask, import_task_module
+from .utils.queue_utils import BlockQueue
+from .utils.telemetry_utils import TELEMETRY_ENV, reset_telemetry
+from .utils import stats_utils
+from .utils import task_cache_utils
+from .utils import speculation_utils
+from .utils.manifest_utils import BlockManifest, config_hash, processed_blocks_since
+from .utils.compression_utils import compression_options
+from .utils.volume_utils import BLOCK_MASK_ENV, restrict_blocks_to_mask
 
 
 class FailedJobsError(Exception):
@@ -69,6 +81,40 @@ class BaseClusterTask(luigi.Task):
     allow_retry = True
     # number of retries already done
     n_retries = 0
+    # can the jobs of this task pull their blocks from a shared queue, see `utils.queue_utils`;
+    # set to true in deriving class if the implementation iterates over `blocks_for_job`
+    supports_block_queue = False
+    # path to the block queue if the current jobs were scheduled with one
+    block_queue_path = None
+    # record of the completed blocks if `block_manifest` is enabled in the global config
+    manifest = None
+    # can straggling jobs of this task be re-executed speculatively, see `_speculate`;
+    # set to false in deriving class if the jobs write results indexed by their job id
+    allow_speculation = True
+    # state of the speculative execution if `speculative_execution` is enabled in the global config
+    speculation = None
+    # can the failed blocks of this task be split into smaller blocks for a retry, see `split_blocks_for_retry`;
+    # set to true in deriving class if the jobs read `block_shape` from their config and the result
+    # does not depend on the block shape
+    supports_block_splitting = False
+    # block shape of the blocks scheduled for retries if they were split
+    retry_block_shape = None
+    # did the failed jobs run out of memory
+    out_of_memory = False
+    # can this task be fused with other blockwise tasks, see `fusion.FusedBlockwise`;
+    # set to true in deriving class if `run_impl` prepares a single set of blockwise jobs,
+    # the result for a block does not depend on other blocks of the same task
+    # and the module implements `block_processor` to process single blocks
+    fusable = False
+    # the names of the datasets (given by `<name>_path` and `<name>_key`) that are read beyond the blocks
+    # of this task, e.g. with a halo; a fused task does not fuse this task with the task writing them
+    halo_inputs = ()
+    # are the blocks of this task restricted to the block mask of the global config, see `_block_mask`;
+    # set to false in deriving class if the task must process all blocks, e.g. because it computes the mask
+    allow_block_mask = True
+    # are the blocks of the inputs checked against their chunks, see `_check_chunk_alignment`;
+    # set to false in deriving class if the task does not read its inputs with the global block shape
+    check_alignment = True
 
     #
     # API
@@ -77,8 +123,14 @@ class BaseClusterTask(luigi.Task):
     def run(self):
         self.make_dirs()
         self._write_log("Start task %s" % self.task_name)
+        cache_dir = self._task_cache_dir()
+        if cache_dir is not None:
+            self._mark_outputs(cache_dir)
         try:
-            self.run_impl()
+            with self._block_mask():
+                if self.n_retries == 0:
+                    self._check_chunk_alignment()
+                self.run_impl()
         # if a failed jobs error was raised, one or more jobs failed
         # and the log file was moved already
         except FailedJobsError as e:
@@ -94,6 +146,44 @@ class BaseClusterTask(luigi.Task):
             shutil.move(out_path, fail_path)
             raise e
         self._write_log("Done task %s" % self.task_name)
+        self._record_cached_outputs()
+
+    def complete(self):
+        if self._finished():
+            return True
+        return self._reuse_cached_outputs()
+
+    def _finished(self):
+        """ Check that the log of this task contains the message written at the end of `run`.
+
+        The log is written from the start of the task, so it also exists if the task was killed
+        while its jobs were running; in this case the task is run again and resumes from
+        the block manifest, if `block_manifest` is enabled in the global config.
+        """
+        log_path = self.output().path
+        if not os.path.exists(log_path):
+            return False
+        done_msg = "Done task %s" % self.task_name
+        with open(log_path) as f:
+            return any(line.rstrip().endswith(done_msg) for line in f)
+
+    def cache_hash(self):
+        """ Hash that identifies the result of this task.
+
+        Combines the task name and parameters, the task and global config, the modification
+        state of the datasets given by the parameters and the hashes of the dependencies.
+        """
+        global_config = self._read_config_file('global', self.default_global_config())
+        global_config = {key: val for key, val in global_config.items()
+                         if key not in task_cache_utils.UNHASHED_GLOBAL_KEYS}
+        task_config = self._read_config_file(self.task_name, self.default_task_config())
+        task_config = {key: val for key, val in task_config.items()
+                       if key not in task_cache_utils.UNHASHED_TASK_KEYS}
+        params = task_cache_utils.significant_params(self)
+        datasets = task_cache_utils.dataset_states(self.param_kwargs, self._task_cache_dir())
+        deps = [task_cache_utils.task_hash(dep) for dep in luigi.task.flatten(self.requires())]
+        return task_cache_utils.hash_values(self.task_name, params, global_config, task_config,
+                                            datasets, deps)
 
     def init(self, shebang):
         """ Init tmp dir and python scripts.
@@ -102,14 +192,20 @@ class BaseClusterTask(luigi.Task):
         """
         self._write_script_file(shebang)
 
-    @staticmethod
-    def parse_jobs(log_prefix, max_jobs):
-        passed_jobs = []
-        for job_id in range(max_jobs):
-            path = log_prefix + '%i.log' % job_id
-            if parse_job(path, job_id):
-                passed_jobs.append(job_id)
-        return passed_jobs
+    # function to check the job success from the text log
+    parse_job_log = staticmethod(parse_job)
+
+    @classmethod
+    def parse_job_success(cls, log_prefix, job_id, telemetry_prefix=None):
+        # we check the telemetry if it exists, which is much cheaper than parsing the log
+        if telemetry_prefix is not None and os.path.exists(telemetry_prefix + '%i.jsonl' % job_id):
+            return parse_job_telemetry(telemetry_prefix + '%i.jsonl' % job_id, job_id)
+        return cls.parse_job_log(log_prefix + '%i.log' % job_id, job_id)
+
+    @classmethod
+    def parse_jobs(cls, log_prefix, max_jobs, telemetry_prefix=None):
+        return [job_id for job_id in range(max_jobs)
+                if cls.parse_job_success(log_prefix, job_id, telemetry_prefix)]
 
     def check_jobs(self, n_jobs, job_prefix=None):
         """ Check for jobs that ran successfully
@@ -117,10 +213,21 @@ class BaseClusterTask(luigi.Task):
         job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
                                                                         job_prefix)
         log_prefix = os.path.join(self.tmp_folder, 'logs', '%s_' % job_name)
-        success_list = self.parse_jobs(log_prefix, n_jobs)
+        # the submit, wait and check markers are used for the timeline of the task, see `utils.trace_utils`
+        self._write_log("checking %i jobs" % n_jobs)
+        success_list = self.parse_jobs(log_prefix, n_jobs, self._telemetry_prefix(job_prefix))
+        if self.speculation is not None:
+            success_list = self._merge_speculative_jobs(success_list, log_prefix, job_prefix)
+        self._save_block_costs(job_prefix)
+        usage = self._summarize_resource_usage(job_prefix)
 
         if len(success_list) == n_jobs:
             self._write_log("%s finished successfully" % self.task_name)
+            if usage is not None:
+                self._tune_resources(usage, job_prefix)
+            # the task is done, so a rerun needs to process all blocks again
+            if self.manifest is not None:
+                self.manifest.remove()
         else:
             failed_jobs = set(range(n_jobs)) - set(success_list)
             self._write_log("%s failed for jobs:" % self.task_name)
@@ -143,6 +250,8 @@ class BaseClusterTask(luigi.Task):
 
             if retry:
                 failed_blocks = self.get_failed_blocks(n_jobs, success_list, job_prefix)
+                if self.supports_block_splitting:
+                    self.out_of_memory = self._jobs_out_of_memory(failed_jobs, job_prefix)
                 self._write_log("resubmitting %i failed blocks in %i retry attempt" % (len(failed_blocks),
                                                                                        self.n_retries + 1))
                 self.n_retries += 1
@@ -165,18 +274,74 @@ class BaseClusterTask(luigi.Task):
                                                                         job_prefix)
         # for the jobs that have completely passed, we can add the block list from the config
         passed_blocks = []
-        for job_id in passed_blocks:
+        # if the blocks were scheduled via a queue, we don't know which blocks the passed jobs
+        # have processed and need to parse the logs of all jobs instead
+        if self.block_queue_path is not None:
+            passed_jobs = []
+        for job_id in passed_jobs:
             config_path = self._config_path(job_id, job_prefix)
             with open(config_path, 'r') as f:
                 passed_blocks.extend(json.load(f)['block_list'])
 
         # for the failed jobs, we parse the output logs
         log_prefix = os.path.join(self.tmp_folder, 'logs', '%s_' % job_name)
-        passed_blocks.extend(parse_blocks_task(log_prefix, n_jobs, passed_jobs))
+        passed_blocks.extend(parse_blocks_task(log_prefix, n_jobs, passed_jobs,
+                                               self._telemetry_prefix(job_prefix)))
 
         # return the list of failed blocks
         return list(set(self.block_list) - set(passed_blocks))
 
+    def _jobs_out_of_memory(self, job_ids, job_prefix=None):
+        """ Check the logs and error logs of the given jobs for signs of running out of memory,
+            if `split_blocks_on_oom` is enabled in the global config.
+        """
+        if not self.get_global_config().get('split_blocks_on_oom', False):
+            return False
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        for job_id in job_ids:
+            log_file = os.path.join(self.tmp_folder, 'logs', '%s_%i.log' % (job_name, job_id))
+            err_file = os.path.join(self.tmp_folder, 'error_logs', '%s_%i.err' % (job_name, job_id))
+            if parse_out_of_memory(err_file) or parse_out_of_memory(log_file):
+                self._write_log("job %i ran out of memory" % job_id)
+                return True
+        return False
+
+    def split_blocks_for_retry(self, block_list, config, shape, chunks):
+        """ Split the blocks of a retry into sub-blocks of half the block shape if the failed jobs ran out of memory.
+
+        Must be called in `run_impl` for the retries of tasks that set `supports_block_splitting`.
+        Only the axes where the sub-blocks stay aligned with the output `chunks` are split,
+        so that different jobs never write to the same chunk.
+        Returns the block list and the config with the block shape for the jobs.
+
+        Arguments:
+            block_list [list] - the blocks to be retried
+            config [dict] - the config for the jobs, with the original `block_shape`
+            shape [tuple] - the (spatial) shape of the volume
+            chunks [tuple] - the (spatial) chunks of the output
+        """
+        block_shape = config['block_shape'] if self.retry_block_shape is None else self.retry_block_shape
+        if self.out_of_memory:
+            self.out_of_memory = False
+            sub_block_shape = [bs // 2 if bs > 1 and (bs // 2) % ch == 0 and bs % 2 == 0 else bs
+                               for bs, ch in zip(block_shape, chunks)]
+            if sub_block_shape == list(block_shape):
+                self._write_log("cannot split blocks of shape %s into sub-blocks aligned with the chunks %s"
+                                % (str(block_shape), str(chunks)))
+            else:
+                # the volume utils need nifty, so we only import them if the blocks are actually split
+                from .utils.volume_utils import split_blocks
+                n_blocks = len(block_list)
+                block_list = split_blocks(shape, block_shape, sub_block_shape, block_list)
+                self._write_log("jobs ran out of memory, split %i blocks of shape %s into %i blocks of shape %s"
+                                % (n_blocks, str(block_shape), len(block_list), str(sub_block_shape)))
+                block_shape = sub_block_shape
+                self.retry_block_shape = sub_block_shape
+        if self.retry_block_shape is not None:
+            config = {**config, 'block_shape': list(block_shape)}
+        return block_list, config
+
     def get_task_config(self):
         """ Get the task configuration
 
@@ -231,7 +396,25 @@ class BaseClusterTask(luigi.Task):
                 "max_num_retries": 0,
                 "block_list_path": None,
                 "easybuild": True,
-                "qos": "normal"}
+                "qos": "normal",
+                "local_worker_pool": False,
+                "dynamic_block_queue": False,
+                "job_array": False,
+                "poll_interval": 1,
+                "max_poll_interval": 10,
+                "block_stats_dir": None,
+                "compression": "gzip",
+                "compression_level": None,
+                "block_manifest": False,
+                "task_cache_dir": None,
+                "speculative_execution": False,
+                "speculation_quantile": 0.5,
+                "speculation_multiplier": 3.,
+                "tune_resources": False,
+                "split_blocks_on_oom": False,
+                "block_mask_path": None,
+                "block_mask_key": None,
+                "chunk_alignment": None}
 
     def global_config_values(self, with_block_list_path=False):
         """ Load the global config values that are needed
@@ -247,12 +430,52 @@ class BaseClusterTask(luigi.Task):
             conf = conf + (config.get("block_list_path", None),)
         return conf
 
+    def compression_config(self, task_config=None):
+        """ Return the compression for the outputs of this task
+
+        'compression' and 'compression_level' in the task config take
+        precedence over the values in the global config.
+        """
+        config = self.get_global_config()
+        compression = config.get('compression', 'gzip')
+        level = config.get('compression_level', None)
+        if task_config is not None and task_config.get('compression', None) is not None:
+            compression = task_config['compression']
+            level = task_config.get('compression_level', None)
+        return {'compression': compression, 'compression_level': level}
+
+    def compression_options(self, path, task_config=None):
+        """ Return the keyword arguments for creating an output dataset in `path`
+            with the compression for this task
+        """
+        return compression_options(path, self.compression_config(task_config))
+
     def clean_up_for_retry(self, block_list, prefix=None):
         """ Clean up before starting a retry.
         The base implementation is just a dummy.
         """
         pass
 
+    def finish_fused(self, job_name):
+        """ Finish this task after its blocks were processed by the jobs `job_name` of a fused task,
+            see `fusion.FusedBlockwise`; implement in deriving class if `run_impl` does more after `check_jobs`.
+        The base implementation is just a dummy.
+        """
+        pass
+
+    def poll_intervals(self):
+        """ Wait times (in seconds) between polling the scheduler for job status.
+
+        Starts from `poll_interval` and backs off to `max_poll_interval` from the global config,
+        so that short tasks are noticed quickly without polling the scheduler too often for long tasks.
+        """
+        config = self.get_global_config()
+        wait_time = config.get('poll_interval', 1)
+        max_wait_time = config.get('max_poll_interval', 10)
+        while True:
+            yield wait_time
+            wait_time = min(1.5 * wait_time, max_wait_time)
+
     # part of the luigi API
     def output(self):
         return luigi.LocalTarget(os.path.join(self.tmp_folder, self.task_name + '.log'))
@@ -286,21 +509,442 @@ class BaseClusterTask(luigi.Task):
         else:
             return os.path.join(self.tmp_folder, self.task_name + '_job_%s_%s.config' % (job_prefix, str(job_id)))
 
+    def _telemetry_prefix(self, job_prefix=None):
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        return os.path.join(self.tmp_folder, 'telemetry', '%s_' % job_name)
+
+    # path to the machine-readable per block and job records, see `utils.telemetry_utils`
+    def _telemetry_path(self, job_id, job_prefix=None):
+        return self._telemetry_prefix(job_prefix) + '%s.jsonl' % str(job_id)
+
+    def _clear_telemetry(self, job_prefix=None):
+        # remove the telemetry of previous runs with the same job name, because
+        # the telemetry is appended to and the job ids are reused for retries
+        prefix = self._telemetry_prefix(job_prefix)
+        telemetry_dir, file_prefix = os.path.split(prefix)
+        for name in os.listdir(telemetry_dir):
+            if name.startswith(file_prefix) and name.endswith('.jsonl') and\
+                    name[len(file_prefix):-len('.jsonl')].isdigit():
+                os.remove(os.path.join(telemetry_dir, name))
+
     # make the tmpdir and logdirs
     def make_dirs(self):
         os.makedirs(self.tmp_folder, exist_ok=True)
         os.makedirs(os.path.join(self.tmp_folder, 'logs'), exist_ok=True)
         os.makedirs(os.path.join(self.tmp_folder, 'error_logs'), exist_ok=True)
+        os.makedirs(os.path.join(self.tmp_folder, 'telemetry'), exist_ok=True)
         self._write_log('created tmp-folder and log dirs @ %s' % self.tmp_folder)
 
+    def _block_mask(self):
+        """ Restrict the blocks returned by `blocks_in_volume` to the blocks that overlap with the
+            `block_mask_path`, `block_mask_key` of the global config while running this task.
+
+        The block lists are computed once per shape and block shape and cached in the tmp folder,
+        see `volume_utils.restrict_blocks_to_mask`. The mask may have a lower resolution than the volumes.
+        """
+        config = self.get_global_config()
+        mask_path, mask_key = config.get('block_mask_path', None), config.get('block_mask_key', None)
+        if mask_path is None or not self.allow_block_mask:
+            return nullcontext()
+        self._write_log("restricting blocks to the mask %s:%s" % (mask_path, mask_key))
+        return restrict_blocks_to_mask(mask_path, mask_key, os.path.join(self.tmp_folder, 'block_masks'))
+
+    def _check_chunk_alignment(self):
+        """ Check that the blocks of this task are aligned with the chunks of its input volumes.
+
+        Depends on `chunk_alignment` in the global config: None doesn't check, 'warn' writes the
+        extra chunk reads of misaligned inputs to the log and 'error' raises an error for them.
+        """
+        config = self.get_global_config()
+        mode = config.get('chunk_alignment', None)
+        if mode is None or not self.check_alignment:
+            return
+        assert mode in ('warn', 'error'), "Invalid chunk_alignment %s, expected 'warn' or 'error'" % mode
+        from .utils import plan_utils
+        from .utils.volume_utils import blocks_in_volume
+        block_shape = config['block_shape']
+        roi_begin, roi_end = config.get('roi_begin', None), config.get('roi_end', None)
+        for name, path, key in plan_utils.dataset_params(self.param_kwargs):
+            if name.startswith('output'):
+                continue
+            info = plan_utils.dataset_info(path, key)
+            if info is None or len(info['shape']) not in (3, 4):
+                continue
+            block_list = blocks_in_volume(info['shape'][-3:], block_shape, roi_begin, roi_end,
+                                          block_list_path=config.get('block_list_path', None))
+            alignment = plan_utils.chunk_alignment(info, block_shape, block_list)
+            if alignment is None or alignment['extra_chunk_reads'] == 0:
+                continue
+            msg = ("block shape %s is not aligned with the chunks %s of %s:%s, %i of %i chunk reads are extra"
+                   % (str(block_shape), str(info['chunks']), path, key,
+                      alignment['extra_chunk_reads'], alignment['chunk_reads']))
+            if mode == 'error':
+                raise RuntimeError(msg)
+            self._write_log(msg)
+
+    def _read_config_file(self, name, default):
+        # read a config without writing to the log, because the log marks the task as complete
+        config_path = os.path.join(self.config_dir, name + '.config')
+        if not os.path.exists(config_path):
+            return default
+        with open(config_path, 'r') as f:
+            return json.load(f)
+
+    def _task_cache_dir(self):
+        return self._read_config_file('global', self.default_global_config()).get('task_cache_dir', None)
+
+    def _reuse_cached_outputs(self):
+        """ Mark the task as complete if its outputs were recorded in the task cache, if `task_cache_dir` is set.
+        """
+        cache_dir = self._task_cache_dir()
+        if cache_dir is None:
+            return False
+        task_hash = task_cache_utils.task_hash(self)
+        record = task_cache_utils.load_record(cache_dir, self.task_name, task_hash)
+        if record is None:
+            return False
+        task_cache_utils.write_reused_log(self.output().path, record,
+                                          task_cache_utils.record_path(cache_dir, self.task_name, task_hash))
+        self._write_log("Done task %s" % self.task_name)
+        return True
+
+    def _mark_outputs(self, cache_dir):
+        """ Change the task cache markers of the output datasets of this task, see `task_cache_utils.write_marker`.
+
+        This is done when the task starts and when it has finished, so that the cache records of the tasks that
+        wrote these datasets before are not reused if this task was interrupted after writing some of the outputs.
+        """
+        from .utils import plan_utils
+        for name, path, key in plan_utils.dataset_params(self.param_kwargs):
+            if name.startswith('output'):
+                task_cache_utils.write_marker(cache_dir, path, key, self.task_id)
+        # the outputs have changed, so the hashes of this task and the tasks depending on it need to be recomputed
+        task_cache_utils.clear_task_hashes()
+
+    def _record_cached_outputs(self):
+        """ Record the outputs of this task in the task cache, if `task_cache_dir` is set.
+        """
+        cache_dir = self._task_cache_dir()
+        if cache_dir is None:
+            return
+        self._mark_outputs(cache_dir)
+        task_hash = task_cache_utils.task_hash(self)
+        paths = [path for name, path in self.param_kwargs.items()
+                 if name.endswith('_path') and isinstance(path, str) and os.path.exists(path)]
+        task_cache_utils.save_record(cache_dir, self.task_name, task_hash, self.task_id,
+                                     self.output().path, paths)
+        self._write_log("recorded outputs in task cache with hash %s" % task_hash)
+
     def _write_single_job_config(self, config, job_prefix):
         config_path = self._config_path(0, job_prefix)
         with open(config_path, 'w') as f:
             json.dump(config, f)
 
+    def _load_block_costs(self, job_prefix):
+        """ Load the block runtimes from a previous run of this task, if `block_stats_dir` is set.
+        """
+        config = self.get_global_config()
+        stats_dir = config.get('block_stats_dir', None)
+        if stats_dir is None:
+            return None
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        return stats_utils.load_block_costs(stats_dir, job_name, config['block_shape'])
+
+    def _save_block_costs(self, job_prefix):
+        """ Save the block runtimes of this run to the block stats store, if `block_stats_dir` is set.
+        """
+        config = self.get_global_config()
+        stats_dir = config.get('block_stats_dir', None)
+        if stats_dir is None:
+            return
+        runtimes = stats_utils.block_runtimes_from_telemetry(self._telemetry_prefix(job_prefix))
+        if not runtimes:
+            return
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        stats_utils.save_block_costs(stats_dir, job_name, config['block_shape'], runtimes)
+
+    def _summarize_resource_usage(self, job_prefix):
+        """ Log the summary of the resources used by the finished jobs.
+        """
+        usage = stats_utils.job_usage_from_telemetry(self._telemetry_prefix(job_prefix))
+        if not usage:
+            return None
+        summary = stats_utils.summarize_job_usage(usage)
+        self._write_log("resource usage of %i jobs: max peak memory %.3f GB, max runtime %.1f s, "
+                        "mean runtime %.1f s, total cpu time %.1f s, max threads %.2f"
+                        % (summary['n_jobs'], summary['max_peak_rss'] / 1.e9, summary['max_runtime'],
+                           summary['mean_runtime'], summary['total_cpu_time'], summary['max_threads']))
+        return summary
+
+    def _tune_resources(self, usage, job_prefix):
+        """ Write the resources recommended from the job usage to the task config, if `tune_resources` is enabled.
+
+        The recommendations are kept per job prefix in 'tuned_resources', because tasks that are
+        run several times in a workflow share their config; the limits are set to the maximum of them.
+        The threads are bounded by 'configured_threads_per_job', see `stats_utils.recommend_resources`.
+        """
+        if not self.get_global_config().get('tune_resources', False):
+            return
+        task_config = self.get_task_config()
+        # remember the configured threads, so that the tuned threads can go back up to them
+        task_config.setdefault('configured_threads_per_job', task_config.get('threads_per_job', 1))
+        tuned = task_config.get('tuned_resources', {})
+        tuned['' if job_prefix is None else job_prefix] = stats_utils.recommend_resources(usage, task_config)
+        for key in ('mem_limit', 'time_limit', 'threads_per_job'):
+            task_config[key] = max(recommended[key] for recommended in tuned.values())
+        task_config['tuned_resources'] = tuned
+
+        config_path = os.path.join(self.config_dir, self.task_name + '.config')
+        tmp_path = config_path + '.tmp%i' % os.getpid()
+        with open(tmp_path, 'w') as f:
+            json.dump(task_config, f)
+        os.replace(tmp_path, config_path)
+        self._write_log("written recommended resources to %s: mem_limit %.1f GB, time_limit %i min, threads_per_job %i"
+                        % (config_path, task_config['mem_limit'], task_config['time_limit'],
+                           task_config['threads_per_job']))
+
+    def dry_run_estimate(self, datasets, stats_dir=None):
+        """ Estimate the number of jobs and blocks, the bytes read and written and the runtime
+            of this task without running it, see `WorkflowBase.dry_run`.
+
+        The blocks are computed for the shape of the first input volume of the task, the bytes from the
+        shape, dtype and chunks of its datasets. Outputs that don't exist yet have the shape of the input volume.
+        The runtime is estimated from the block runtimes or the job telemetry of a previous run,
+        the core time counts `threads_per_job` cores for the runtime of each job.
+        Tasks that are not blockwise or change the shape of the volume can override this.
+
+        Arguments:
+            datasets [dict] - the datasets estimated for the outputs of the upstream tasks,
+                indexed by path and key; the outputs of this task are added to it
+            stats_dir [str] - block stats store or tmp folder of a previous run (default: None)
+        """
+        from .utils import plan_utils
+        config = self._read_config_file('global', self.default_global_config())
+        task_config = self._read_config_file(self.task_name, self.default_task_config())
+        block_shape = config['block_shape']
+        roi_begin, roi_end = config.get('roi_begin', None), config.get('roi_end', None)
+        if roi_begin is None or roi_end is None:
+            roi_begin = roi_end = None
+        job_prefix = getattr(self, 'prefix', None) or None
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name, job_prefix)
+
+        inputs, outputs, volume_shape = [], [], None
+        for name, path, key in plan_utils.dataset_params(self.param_kwargs):
+            info = plan_utils.dataset_info(path, key) or datasets.get((path, key), None)
+            if name.startswith('output'):
+                outputs.append((path, key, info))
+                continue
+            inputs.append((path, key, info))
+            if volume_shape is None and info is not None and len(info['shape']) in (3, 4):
+                volume_shape = info['shape'][-3:]
+        for ii, (path, key, info) in enumerate(outputs):
+            if info is None and volume_shape is not None:
+                info = {'shape': list(volume_shape), 'dtype': None, 'chunks': None, 'estimated': True}
+                outputs[ii] = (path, key, info)
+            if info is not None:
+                datasets[(path, key)] = info
+
+        block_list, n_jobs = None, None
+        if volume_shape is not None:
+            from .utils.volume_utils import blocks_in_volume
+            block_list = blocks_in_volume(volume_shape, block_shape, roi_begin, roi_end,
+                                          block_list_path=config.get('block_list_path', None))
+            n_jobs = max(min(len(block_list), self.max_jobs), 1)
+
+        # the runtimes of a previous run, from the block runtimes if possible and otherwise from the jobs
+        threads = task_config.get('threads_per_job', 1)
+        wall_time, core_time, runtime_source = None, None, None
+        stats_dirs = [stats_dir, config.get('block_stats_dir', None), self.tmp_folder]
+        stats_dirs = [sdir for sdir in stats_dirs if sdir is not None and os.path.isdir(sdir)]
+        for sdir in stats_dirs:
+            runtimes = None if block_list is None else stats_utils.load_block_costs(sdir, job_name, block_shape)
+            if runtimes and block_list:
+                costs = stats_utils.block_costs(block_list, runtimes)
+                partition = stats_utils.partition_blocks_by_cost(block_list, costs, n_jobs)
+                block_costs = dict(zip(block_list, costs))
+                wall_time = max(sum(block_costs[block_id] for block_id in job_blocks) for job_blocks in partition)
+                core_time = threads * sum(costs)
+                runtime_source = 'blocks'
+                break
+            usage = stats_utils.job_usage_from_telemetry(os.path.join(sdir, 'telemetry', '%s_' % job_name))
+            if usage:
+                wall_time = max(job['runtime'] for job in usage)
+                core_time = threads * sum(job['runtime'] for job in usage)
+                runtime_source = 'jobs'
+                break
+
+        # the chunk reads of the inputs that have the shape of the blocking
+        alignments = {}
+        if block_list is not None:
+            for path, key, info in inputs:
+                if info is not None and list(info['shape'][-3:]) == list(volume_shape):
+                    alignments[(path, key)] = plan_utils.chunk_alignment(info, block_shape, block_list)
+        extra_reads = [alignment['extra_chunk_reads'] for alignment in alignments.values() if alignment is not None]
+
+        def _datasets(dsets):
+            return [dict(info or {}, path=path, key=key, alignment=alignments.get((path, key), None))
+                    for path, key, info in dsets]
+
+        return {'task': job_name, 'task_id': self.task_id,
+                'complete': self._finished(),
+                'n_jobs': n_jobs, 'n_blocks': None if block_list is None else len(block_list),
+                'bytes_read': sum(plan_utils.covered_bytes(info, roi_begin, roi_end)
+                                  for _, _, info in inputs if info is not None),
+                'bytes_written': sum(plan_utils.covered_bytes(info, roi_begin, roi_end)
+                                     for _, _, info in outputs if info is not None),
+                'extra_chunk_reads': sum(extra_reads) if extra_reads else None,
+                'wall_time': wall_time, 'core_time': core_time, 'runtime_source': runtime_source,
+                'inputs': _datasets(inputs), 'outputs': _datasets(outputs)}
+
+    def _update_manifest(self, config, job_prefix):
+        """ Load the block manifest of this task and add the blocks processed since the jobs were last scheduled.
+
+        Returns None if `block_manifest` is not enabled in the global config or the task does not allow retries.
+        """
+        global_config = self.get_global_config()
+        if not (global_config.get('block_manifest', False) and self.allow_retry):
+            return None
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        # the completed blocks are only valid for the same parameters, config and blocking
+        params = {name: value for name, value in self.to_str_params(only_significant=True).items()
+                  if name not in ('tmp_folder', 'config_dir', 'max_jobs', 'dependency')}
+        manifest = BlockManifest(os.path.join(self.tmp_folder, 'manifests', '%s.npz' % job_name),
+                                 config_hash(self.task_name, params, config, global_config['block_shape']))
+        if manifest.scheduled_at is not None:
+            log_prefix = os.path.join(self.tmp_folder, 'logs', '%s_' % job_name)
+            manifest.add(processed_blocks_since(log_prefix, self._telemetry_prefix(job_prefix),
+                                                manifest.scheduled_at))
+        return manifest
+
+    def _init_speculation(self, n_jobs):
+        """ Initialize the speculative execution of straggling jobs, if `speculative_execution` is enabled.
+
+        Only used for jobs with a static block list; jobs that pull their blocks
+        from the block queue balance their load already.
+        """
+        config = self.get_global_config()
+        if not (config.get('speculative_execution', False) and self.allow_speculation and self.allow_retry):
+            return None
+        if n_jobs < 2:
+            return None
+        return {'n_jobs': n_jobs, 'next_job_id': n_jobs,
+                'quantile': config.get('speculation_quantile', 0.5),
+                'multiplier': config.get('speculation_multiplier', 3.),
+                # original job id -> job id of the speculative copy
+                'backups': {},
+                # job id of a job that re-runs the blocks a cancelled job was writing -> original job id
+                'repairs': {},
+                # original jobs for which a copy has finished and the other one was cancelled
+                'resolved': set(),
+                'block_lists': {}}
+
+    def _job_block_list(self, job_id, job_prefix):
+        block_lists = self.speculation['block_lists']
+        if job_id not in block_lists:
+            with open(self._config_path(job_id, job_prefix), 'r') as f:
+                block_lists[job_id] = json.load(f)['block_list']
+        return block_lists[job_id]
+
+    def _submit_speculative_job(self, job_id, block_list, job_prefix):
+        """ Submit a copy of the job `job_id` that processes the given blocks, returns the new job id.
+
+        Requires `_submit_single_job` and `_cancel_job`, which are implemented by the slurm and lsf tasks.
+        """
+        new_job_id = self.speculation['next_job_id']
+        self.speculation['next_job_id'] += 1
+        with open(self._config_path(job_id, job_prefix), 'r') as f:
+            job_config = json.load(f)
+        job_config['block_list'] = block_list
+        with open(self._config_path(new_job_id, job_prefix), 'w') as f:
+            json.dump(job_config, f)
+        self.speculation['block_lists'][new_job_id] = block_list
+        self._submit_single_job(new_job_id, job_prefix)
+        return new_job_id
+
+    def _speculate(self, job_prefix=None):
+        """ Resubmit the remaining blocks of straggling jobs and cancel the slower copy once one has finished.
+
+        Called while waiting for the jobs. Straggling jobs are found by comparing their runtime
+        to the median block throughput of the finished jobs, see `utils.speculation_utils`.
+        The blocks that the cancelled copy was writing are re-run by a separate job,
+        because they may have been written only partially.
+        """
+        spec = self.speculation
+        if spec is None:
+            return
+        progress = {job_id: speculation_utils.job_progress(self._telemetry_path(job_id, job_prefix))
+                    for job_id in range(spec['n_jobs'])}
+
+        for job_id, backup_id in spec['backups'].items():
+            if job_id in spec['resolved']:
+                continue
+            backup = speculation_utils.job_progress(self._telemetry_path(backup_id, job_prefix))
+            if progress[job_id] is not None and progress[job_id]['end'] is not None:
+                loser_id, loser = backup_id, backup
+            elif backup is not None and backup['end'] is not None:
+                loser_id, loser = job_id, progress[job_id]
+            else:
+                continue
+            spec['resolved'].add(job_id)
+            self._cancel_job(loser_id)
+            marks_block_starts = any(prog is not None and prog['has_block_starts']
+                                     for prog in progress.values())
+            repair_blocks = speculation_utils.blocks_in_flight(loser, self._job_block_list(loser_id, job_prefix),
+                                                               marks_block_starts)
+            self._write_log("job %i finished first, cancelled job %i" % (backup_id if loser_id == job_id else job_id,
+                                                                        loser_id))
+            if repair_blocks:
+                repair_id = self._submit_speculative_job(job_id, repair_blocks, job_prefix)
+                spec['repairs'][repair_id] = job_id
+                self._write_log("resubmitted %i blocks that job %i was processing as job %i"
+                                % (len(repair_blocks), loser_id, repair_id))
+
+        n_blocks = {job_id: len(self._job_block_list(job_id, job_prefix)) for job_id in range(spec['n_jobs'])}
+        stragglers = speculation_utils.find_stragglers(progress, n_blocks, time.time(),
+                                                       spec['quantile'], spec['multiplier'])
+        for job_id in stragglers:
+            if job_id in spec['backups']:
+                continue
+            remaining = [block_id for block_id in self._job_block_list(job_id, job_prefix)
+                         if block_id not in progress[job_id]['processed']]
+            if not remaining:
+                continue
+            spec['backups'][job_id] = self._submit_speculative_job(job_id, remaining, job_prefix)
+            self._write_log("job %i is straggling, resubmitted its %i remaining blocks as job %i"
+                            % (job_id, len(remaining), spec['backups'][job_id]))
+
+    def _merge_speculative_jobs(self, success_list, log_prefix, job_prefix):
+        """ Count a job as passed if its speculative copy has passed and all its re-run blocks have passed.
+        """
+        spec = self.speculation
+        telemetry_prefix = self._telemetry_prefix(job_prefix)
+        passed = set(success_list)
+        for job_id, backup_id in spec['backups'].items():
+            if self.parse_job_success(log_prefix, backup_id, telemetry_prefix):
+                passed.add(job_id)
+        for repair_id, job_id in spec['repairs'].items():
+            if not self.parse_job_success(log_prefix, repair_id, telemetry_prefix):
+                passed.discard(job_id)
+        return sorted(passed)
+
     def _write_multiple_job_configs(self, n_jobs, block_list, config, job_prefix,
                                     consecutive_blocks):
 
+        # if we have the block runtimes from a previous run, we distribute
+        # the blocks such that all jobs have about the same runtime
+        runtimes = None if consecutive_blocks else self._load_block_costs(job_prefix)
+        if runtimes is not None:
+            costs = stats_utils.block_costs(block_list, runtimes)
+            partition = stats_utils.partition_blocks_by_cost(block_list, costs, n_jobs)
+            block_costs = dict(zip(block_list, costs))
+            job_costs = [sum(block_costs[block_id] for block_id in job_blocks) for job_blocks in partition]
+            self._write_log("partitioned blocks by runtimes of previous run, expected max / mean job runtime: %f / %f s"
+                            % (max(job_costs), np.mean(job_costs)))
+
         # TODO there must be a more elegant way of doing this
         if consecutive_blocks:
             # distribute blocks to jobs as equal as possible
@@ -318,7 +962,7 @@ class BaseClusterTask(luigi.Task):
             prepartiion = []
             block_id = 0
             for bpj in blocks_per_job:
-                prepartiion.append(list(range(block_id, block_id + bpj)))
+                prepartiion.append(block_list[block_id:block_id + bpj])
                 block_id += bpj
 
         # write the configurations for all jobs to the tmp folder
@@ -327,6 +971,8 @@ class BaseClusterTask(luigi.Task):
             # block_jobs consecutive
             if consecutive_blocks:
                 block_jobs = prepartiion[job_id]
+            elif runtimes is not None:
+                block_jobs = partition[job_id]
             else:
                 block_jobs = block_list[job_id::n_jobs]
             job_config = {'block_list': block_jobs, **config}
@@ -334,8 +980,36 @@ class BaseClusterTask(luigi.Task):
             with open(config_path, 'w') as f:
                 json.dump(job_config, f)
 
+    def _write_queue_job_configs(self, n_jobs, block_list, config, job_prefix):
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        queue_path = os.path.join(self.tmp_folder, '%s_block_queue.sqlite' % job_name)
+        # if we have the block runtimes from a previous run, we start with the most expensive blocks
+        runtimes = self._load_block_costs(job_prefix)
+        if runtimes is not None:
+            costs = stats_utils.block_costs(block_list, runtimes)
+            block_list = [block_list[ii] for ii in
+                          sorted(range(len(block_list)), key=lambda ii: costs[ii], reverse=True)]
+        BlockQueue.create(queue_path, block_list)
+        self.block_queue_path = queue_path
+        for job_id in range(n_jobs):
+            job_config = {'block_queue': queue_path, **config}
+            config_path = self._config_path(job_id, job_prefix)
+            with open(config_path, 'w') as f:
+                json.dump(job_config, f)
+        self._write_log('scheduled %i blocks via the block queue @ %s' % (len(block_list), queue_path))
+
     def _write_job_config(self, n_jobs, block_list, config,
                           job_prefix=None, consecutive_blocks=False):
+        self.block_queue_path = None
+        self.speculation = None
+        # jobs that create datasets need to know the compression
+        config = {**config, **self.compression_config(config)}
+        # the manifest needs the logs and telemetry of the previous jobs, so it must be updated before clearing them;
+        # it can't be used any more if the blocks were split for a retry, because the block ids have changed
+        self.manifest = None if (block_list is None or self.retry_block_shape is not None) else\
+            self._update_manifest(config, job_prefix)
+        self._clear_telemetry(job_prefix)
         # check f we have a reduce style block, that is
         # not distributed over blocks
         if block_list is None:
@@ -343,11 +1017,28 @@ class BaseClusterTask(luigi.Task):
             self._write_single_job_config(config, job_prefix)
         # otherwise, we have multiple jobs distributed over blocks
         else:
+            # if the task was interrupted before, we only need to schedule the blocks that were not completed;
+            # for retries, the block list contains only the failed blocks already
+            if self.manifest is not None:
+                if self.n_retries == 0 and self.manifest.blocks:
+                    n_blocks = len(block_list)
+                    block_list = [block_id for block_id in block_list if block_id not in self.manifest.blocks]
+                    self._write_log("skipping %i / %i blocks that were completed according to the manifest"
+                                    % (n_blocks - len(block_list), n_blocks))
+                self.manifest.scheduled_at = time.time()
+                self.manifest.save()
             # we add the block list to this class to know all the blocks
             # that were scheduled if we need to rerun this task
             self.block_list = block_list
-            self._write_multiple_job_configs(n_jobs, block_list, config,
-                                             job_prefix, consecutive_blocks)
+            # consecutive blocks need a static assignment of blocks to jobs
+            use_queue = self.supports_block_queue and not consecutive_blocks and\
+                self.get_global_config().get('dynamic_block_queue', False)
+            if use_queue:
+                self._write_queue_job_configs(n_jobs, block_list, config, job_prefix)
+            else:
+                self._write_multiple_job_configs(n_jobs, block_list, config,
+                                                 job_prefix, consecutive_blocks)
+                self.speculation = self._init_speculation(n_jobs)
         self._write_log('written config for %i jobs' % n_jobs)
 
     # copy the python script to the temp folder and replace the shebang
@@ -428,7 +1119,8 @@ class SlurmTask(BaseClusterTask):
 
         # get file paths
         trgt_file = os.path.join(self.tmp_folder, self.task_name + '.py')
-        config_tmpl = self._config_path('$1', job_prefix)
+        # the job id is passed as first argument or is given by the array task id
+        config_tmpl = self._config_path('${1:-$SLURM_ARRAY_TASK_ID}', job_prefix)
         job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
                                                                         job_prefix)
         slurm_template = ("#!/bin/bash\n"
@@ -452,6 +1144,8 @@ class SlurmTask(BaseClusterTask):
         if easybuild:
             slurm_template += "module purge\n"
             slurm_template += "module load GCC\n"
+        telemetry_tmpl = self._telemetry_path('${1:-$SLURM_ARRAY_TASK_ID}', job_prefix)
+        slurm_template += "export %s=%s\n" % (TELEMETRY_ENV, telemetry_tmpl)
         slurm_template += ("%s %s") % (trgt_file, config_tmpl)
 
         script_path = os.path.join(self.tmp_folder, 'slurm_%s.sh' % job_name)
@@ -465,56 +1159,190 @@ class SlurmTask(BaseClusterTask):
         # write the slurm script file
         self._write_slurm_file(job_prefix)
 
+    @staticmethod
+    def _parse_slurm_id(outp):
+        # NOTE: slurm ids are not always integer, so we cannot cast to int here
+        # (with --parsable, the cluster name may be appended after a semicolon)
+        return outp.split()[-1].split(';')[0]
+
+    def _submit_job_array(self, n_jobs, job_name, script_path):
+        out_file = os.path.join(self.tmp_folder, 'logs', '%s_%%a.log' % job_name)
+        err_file = os.path.join(self.tmp_folder, 'error_logs', '%s_%%a.err' % job_name)
+        command = ['sbatch', '--parsable', '--array=0-%i' % (n_jobs - 1),
+                   '-o', out_file, '-e', err_file, '-J', job_name, script_path]
+        outp = check_output(command).decode().rstrip()
+        array_id = self._parse_slurm_id(outp)
+        self._write_log("submitted %i jobs as slurm job array %s" % (n_jobs, array_id))
+        self.slurm_ids = ['%s_%i' % (array_id, job_id) for job_id in range(n_jobs)]
+        # we track the array tasks individually, because the accounting database may list only some of them
+        self._tracked_slurm_ids = list(self.slurm_ids)
+
     def submit_jobs(self, n_jobs, job_prefix=None):
         job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
                                                                         job_prefix)
         script_path = os.path.join(self.tmp_folder, 'slurm_%s.sh' % job_name)
+        self._write_log("submitting %i jobs" % n_jobs)
+        if self.get_global_config().get('job_array', False):
+            self._submit_job_array(n_jobs, job_name, script_path)
+            return
+
         self.slurm_ids = []
+        self._tracked_slurm_ids = []
         for job_id in range(n_jobs):
-            out_file = os.path.join(self.tmp_folder, 'logs', '%s_%i.log' % (job_name, job_id))
-            err_file = os.path.join(self.tmp_folder, 'error_logs', '%s_%i.err' % (job_name,
-                                                                                  job_id))
-            command = ['sbatch', '-o', out_file, '-e', err_file, '-J',
-                       '%s_%i' % (job_name, job_id), script_path, str(job_id)]
-            # call(command)
-            outp = check_output(command).decode().rstrip()
-            # get the slurm job-id
-            # NOTE: slurm ids are not always integer, so we cannot cast to int here
-            slurm_id = outp.split()[-1]
-            self.slurm_ids.append(slurm_id)
-            # print slurm message
-            print(outp)
+            self._submit_single_job(job_id, job_prefix)
+        self._write_log("submitted %i jobs" % n_jobs)
+
+    def _submit_single_job(self, job_id, job_prefix=None):
+        """ Submit the job `job_id`; its slurm id is appended to the slurm ids, so they stay indexed by job id.
+        """
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        script_path = os.path.join(self.tmp_folder, 'slurm_%s.sh' % job_name)
+        out_file = os.path.join(self.tmp_folder, 'logs', '%s_%i.log' % (job_name, job_id))
+        err_file = os.path.join(self.tmp_folder, 'error_logs', '%s_%i.err' % (job_name,
+                                                                              job_id))
+        command = ['sbatch', '-o', out_file, '-e', err_file, '-J',
+                   '%s_%i' % (job_name, job_id), script_path, str(job_id)]
+        # call(command)
+        outp = check_output(command).decode().rstrip()
+        # get the slurm job-id
+        slurm_id = self._parse_slurm_id(outp)
+        self.slurm_ids.append(slurm_id)
+        self._tracked_slurm_ids.append(slurm_id)
+        # print slurm message
+        print(outp)
+
+    def _cancel_job(self, job_id):
+        # the job may have finished already, so we don't check the return code
+        run(['scancel', self.slurm_ids[job_id]], stdout=DEVNULL, stderr=DEVNULL)
+
+    # slurm job states for jobs that are not finished yet
+    _active_states = {'PENDING', 'RUNNING', 'REQUEUED', 'REQUEUE_HOLD', 'REQUEUE_FED',
+                      'RESIZING', 'SUSPENDED', 'CONFIGURING', 'COMPLETING', 'STOPPED',
+                      'SIGNALING', 'STAGE_OUT', 'RESV_DEL_HOLD'}
+
+    @staticmethod
+    def _expand_slurm_id(slurm_id):
+        """ Expand the pending array tasks that sacct and squeue list as a range, e.g. '123_[4-6,9%2]'.
+        """
+        if not slurm_id.endswith(']') or '_[' not in slurm_id:
+            return [slurm_id]
+        array_id, task_ranges = slurm_id[:-1].split('_[')
+        # the maximal number of simultaneously running tasks is given after '%'
+        task_ranges = task_ranges.split('%')[0]
+        task_ids = []
+        for task_range in task_ranges.split(','):
+            first, _, last = task_range.partition('-')
+            last = first if last == '' else last
+            task_ids.extend('%s_%i' % (array_id, task_id) for task_id in range(int(first), int(last) + 1))
+        return task_ids
+
+    def _job_states_sacct(self, job_ids):
+        """ The states of the jobs that are listed by sacct.
+        """
+        outp = check_output(['sacct', '-n', '-X', '-P', '-o', 'JobID,State',
+                             '-j', ','.join(job_ids)]).decode()
+        outp = [out.split('|') for out in outp.split('\n') if out.strip() != '']
+        # the state may contain additional information, e.g. 'CANCELLED by 123'
+        return {slurm_id: state.split()[0] for job_id, state in outp
+                for slurm_id in self._expand_slurm_id(job_id)}
+
+    def _n_active_jobs_squeue(self, job_ids):
+        try:
+            outp = check_output(['squeue', '-h', '-o', '%i', '-j', ','.join(job_ids)],
+                                stderr=STDOUT).decode()
+        # squeue fails if none of the job ids are known anymore
+        except CalledProcessError:
+            return 0
+        active_ids = {slurm_id for out in outp.split('\n') if out.strip() != ''
+                      for slurm_id in self._expand_slurm_id(out.strip())}
+        return len(active_ids)
+
+    def _n_active_jobs(self, job_ids):
+        """ Number of jobs (or array tasks) for the given slurm ids that are not finished.
+        """
+        # query the scheduler in batches, to avoid overly long command lines
+        batch_size = 500
+        n_active = 0
+        for start in range(0, len(job_ids), batch_size):
+            batch = job_ids[start:start + batch_size]
+            # the accounting database knows about finished jobs, but may not list (all)
+            # jobs that were just submitted, so we ask squeue about the jobs it does not list
+            try:
+                states = self._job_states_sacct(batch)
+            except (CalledProcessError, FileNotFoundError):
+                states = {}
+            n_active += sum(states[job_id] in self._active_states for job_id in batch if job_id in states)
+            missing = [job_id for job_id in batch if job_id not in states]
+            if missing:
+                n_active += self._n_active_jobs_squeue(missing)
+        return n_active
 
     def wait_for_jobs(self, job_prefix=None):
-        # TODO move to some config
-        wait_time = 10
-        while True:
+        # speculative jobs are added to the tracked ids
+        job_ids = self._tracked_slurm_ids
+        for wait_time in self.poll_intervals():
             time.sleep(wait_time)
+            self._speculate(job_prefix)
+            if self._n_active_jobs(job_ids) == 0:
+                break
+
+
+# process pool that is kept alive between local tasks, see `LocalTask`
+_local_worker_pool = None
+
+
+def _get_local_worker_pool():
+    global _local_worker_pool
+    if _local_worker_pool is None:
+        _local_worker_pool = futures.ProcessPoolExecutor(cpu_count())
+    return _local_worker_pool
 
+
+def _reset_local_worker_pool():
+    global _local_worker_pool
+    if _local_worker_pool is not None:
+        _local_worker_pool.shutdown(wait=False)
+    _local_worker_pool = None
+
+
+def _run_job_in_worker(module_name, src_file, function_name, job_id,
+                       config_file, log_file, err_file, telemetry_file=None, block_mask=None):
+    """ Run a job in a (warm) worker process.
+
+    Equivalent to running the task script with the job config, but avoids
+    starting a new interpreter and re-importing all dependencies for each job.
+    """
+    # the worker does not inherit the environment of the task after it was started
+    for env_var, value in ((TELEMETRY_ENV, telemetry_file), (BLOCK_MASK_ENV, block_mask)):
+        if value is None:
+            os.environ.pop(env_var, None)
+        else:
+            os.environ[env_var] = value
+    # the telemetry path is reused if the job is retried
+    reset_telemetry()
+    with open(log_file, 'w') as f_out, open(err_file, 'w') as f_err:
+        with redirect_stdout(f_out), redirect_stderr(f_err):
             try:
-                outp = check_output(['squeue -u $USER | grep $USER'], shell=True).decode()
-            except CalledProcessError as e:
-                # handle error for empty queue
-                outp = e.output.decode().rstrip()
-                if outp == '':
-                    break
-                else:
-                    raise e
-
-            outp = [out for out in outp.split('\n') if out != '']
-            # check how many jobs there are in total, if none, stop waiting
-            n_running = len(outp)
-            if n_running == 0:
-                break
-            # if we have jobs, check how many belong to this task
-            n_running = sum([out.split()[0] in self.slurm_ids for out in outp])
-            if n_running == 0:
-                break
+                module = import_task_module(module_name, src_file)
+                getattr(module, function_name)(job_id, config_file)
+            # the job failure is detected from the log by `check_jobs`,
+            # so we only need to keep the traceback
+            except Exception:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
 
 
 class LocalTask(BaseClusterTask):
     """
     Task for running tasks locally via sub-processes
+
+    If `local_worker_pool` is set in the global config, the jobs are not run as
+    sub-processes calling the task script, but are dispatched to a pool of worker
+    processes that is kept alive between the tasks of a workflow.
+    This avoids paying the interpreter start-up and import time for every job.
     """
     # don't want to start too many local jobs, because
     # this is usually a sign that forgot to set the target
@@ -526,9 +1354,7 @@ class LocalTask(BaseClusterTask):
         # write the job configs
         self._write_job_config(n_jobs, block_list, config, job_prefix, consecutive_blocks)
 
-    def _submit(self, job_id, job_prefix):
-        script_path = os.path.join(self.tmp_folder, self.task_name + '.py')
-        assert os.path.exists(script_path), script_path
+    def _job_files(self, job_id, job_prefix):
         config_file = self._config_path(job_id, job_prefix)
         assert os.path.exists(config_file), config_file
 
@@ -538,17 +1364,55 @@ class LocalTask(BaseClusterTask):
                                 '%s_%i.log' % (job_name, job_id))
         err_file = os.path.join(self.tmp_folder, 'error_logs',
                                 '%s_%i.err' % (job_name, job_id))
+        return config_file, log_file, err_file
+
+    def _submit(self, job_id, job_prefix):
+        script_path = os.path.join(self.tmp_folder, self.task_name + '.py')
+        assert os.path.exists(script_path), script_path
+        config_file, log_file, err_file = self._job_files(job_id, job_prefix)
+        env = dict(os.environ)
+        env[TELEMETRY_ENV] = self._telemetry_path(job_id, job_prefix)
         with open(log_file, 'w') as f_out, open(err_file, 'w') as f_err:
             assert os.path.exists(script_path), script_path
-            call([script_path, config_file], stdout=f_out, stderr=f_err)
+            returncode = call([script_path, config_file], stdout=f_out, stderr=f_err, env=env)
+            # a job killed by a signal leaves no error message, e.g. if it was killed for using too much memory
+            if returncode < 0:
+                f_err.write("job was killed by signal %i\n" % -returncode)
+
+    def _submit_to_worker_pool(self, n_jobs, job_prefix):
+        pool = _get_local_worker_pool()
+        module_name = self.__class__.__module__
+        tasks = [pool.submit(_run_job_in_worker, module_name, self.src_file, self.task_name,
+                             job_id, *self._job_files(job_id, job_prefix),
+                             telemetry_file=self._telemetry_path(job_id, job_prefix),
+                             block_mask=os.environ.get(BLOCK_MASK_ENV, None))
+                 for job_id in range(n_jobs)]
+        try:
+            [t.result() for t in tasks]
+        # a worker died (e.g. because it was killed for using too much memory);
+        # the affected jobs will be marked as failed by `check_jobs`, but we need a new pool
+        except BrokenProcessPool:
+            self._write_log("local worker pool broke, it will be restarted for the next task")
+            _reset_local_worker_pool()
+            futures.wait(tasks)
+            for job_id, t in enumerate(tasks):
+                if isinstance(t.exception(), BrokenProcessPool):
+                    with open(self._job_files(job_id, job_prefix)[2], 'a') as f_err:
+                        f_err.write("job failed because the worker process terminated abruptly\n")
 
     def submit_jobs(self, n_jobs, job_prefix=None):
         assert n_jobs <= self.max_local_jobs,\
             "Trying to submit %i local jobs but limit is %i. Did you forget to set the target to slurm or lsf?" %\
             (n_jobs, self.max_local_jobs)
-        with futures.ProcessPoolExecutor(n_jobs) as pp:
-            tasks = [pp.submit(self._submit, job_id, job_prefix) for job_id in range(n_jobs)]
-            [t.result() for t in tasks]
+        # the local jobs are run while they are submitted
+        self._write_log("submitting %i jobs" % n_jobs)
+        if self.get_global_config().get('local_worker_pool', False):
+            self._submit_to_worker_pool(n_jobs, job_prefix)
+        else:
+            with futures.ProcessPoolExecutor(n_jobs) as pp:
+                tasks = [pp.submit(self._submit, job_id, job_prefix) for job_id in range(n_jobs)]
+                [t.result() for t in tasks]
+        self._write_log("submitted %i jobs" % n_jobs)
 
     # don't need to wait for process pool
     def wait_for_jobs(self, job_prefix=None):
@@ -565,6 +1429,46 @@ class LSFTask(BaseClusterTask):
         # write the job configs
         self._write_job_config(n_jobs, block_list, config, job_prefix, consecutive_blocks)
 
+    def _write_lsf_file(self, job_prefix=None):
+        # the job id is passed as first argument or is given by the (1-based) array index
+        script_path = os.path.join(self.tmp_folder, self.task_name + '.py')
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        config_tmpl = self._config_path('$JOB_ID', job_prefix)
+        log_tmpl = os.path.join(self.tmp_folder, 'logs', '%s_$JOB_ID.log' % job_name)
+        err_tmpl = os.path.join(self.tmp_folder, 'error_logs', '%s_$JOB_ID.err' % job_name)
+        telemetry_tmpl = self._telemetry_path('$JOB_ID', job_prefix)
+        lsf_template = ("#!/bin/bash\n"
+                        "JOB_ID=${1:-$((LSB_JOBINDEX - 1))}\n"
+                        "export %s=%s\n"
+                        "%s %s > %s 2> %s\n") % (TELEMETRY_ENV, telemetry_tmpl,
+                                                 script_path, config_tmpl, log_tmpl, err_tmpl)
+        lsf_path = os.path.join(self.tmp_folder, 'lsf_%s.sh' % job_name)
+        with open(lsf_path, 'w') as f:
+            f.write(lsf_template)
+        self._make_executable(lsf_path)
+        return lsf_path
+
+    @staticmethod
+    def _parse_bsub_id(outp):
+        # bsub prints 'Job <ID> is submitted to queue <QUEUE>.'
+        return int(outp.split()[1].lstrip('<').rstrip('>'))
+
+    def _submit_job_array(self, n_jobs, job_prefix, n_threads, time_limit):
+        job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
+                                                                        job_prefix)
+        lsf_path = self._write_lsf_file(job_prefix)
+        # the job logs are written by the lsf script, the lsf output only contains the lsf report
+        lsf_log = os.path.join(self.tmp_folder, 'error_logs', '%s_lsf_%%I.out' % job_name)
+        command = ['bsub', '-n', str(n_threads), '-J', '%s[1-%i]' % (job_name, n_jobs),
+                   '-We', str(time_limit), '-o', lsf_log, lsf_path]
+        outp = check_output(command).decode().rstrip()
+        array_id = self._parse_bsub_id(outp)
+        self._write_log("submitted %i jobs as lsf job array %i" % (n_jobs, array_id))
+        self.bsub_ids = [array_id]
+        self.lsf_ids = ['%i[%i]' % (array_id, job_id + 1) for job_id in range(n_jobs)]
+        self._lsf_resources = (n_threads, time_limit)
+
     def submit_jobs(self, n_jobs, job_prefix=None):
         # read the task config to get number of threads and time limit
         task_config = self.get_task_config()
@@ -574,65 +1478,81 @@ class LSFTask(BaseClusterTask):
         script_path = os.path.join(self.tmp_folder, self.task_name + '.py')
         assert os.path.exists(script_path), script_path
 
+        self._write_log("submitting %i jobs" % n_jobs)
+        if self.get_global_config().get('job_array', False):
+            self._submit_job_array(n_jobs, job_prefix, n_threads, time_limit)
+            return
+
         self.bsub_ids = []
+        self.lsf_ids = []
+        self._lsf_resources = (n_threads, time_limit)
+        for job_id in range(n_jobs):
+            self._submit_single_job(job_id, job_prefix)
+        self._write_log("submitted %i jobs" % n_jobs)
+
+    def _submit_single_job(self, job_id, job_prefix=None):
+        """ Submit the job `job_id`; its lsf id is appended to the lsf ids, so they stay indexed by job id.
+        """
+        n_threads, time_limit = self._lsf_resources
+        script_path = os.path.join(self.tmp_folder, self.task_name + '.py')
         job_name = self.task_name if job_prefix is None else '%s_%s' % (self.task_name,
                                                                         job_prefix)
-
-        for job_id in range(n_jobs):
-            config_file = self._config_path(job_id, job_prefix)
-            command = '%s %s' % (script_path, config_file)
-            log_file = os.path.join(self.tmp_folder, 'logs',
-                                    '%s_%i.log' % (job_name, job_id))
-            err_file = os.path.join(self.tmp_folder, 'error_logs',
-                                    '%s_%i.err' % (job_name, job_id))
-            bsub_command = 'bsub -n %i -J %s_%i -We %i -o %s -e %s \'%s\'' % (n_threads,
-                                                                              self.task_name,
-                                                                              job_id, time_limit,
-                                                                              log_file, err_file,
-                                                                              command)
-            # call([bsub_command], shell=True)
-            # submit job and get the bsub job id from its output
-            outp = check_output([bsub_command], shell=True).decode().rstrip()
-            bsub_id = int(outp.split()[1].lstrip('<').rstrip('>'))
-            self.bsub_ids.append(bsub_id)
-            print(outp)
+        config_file = self._config_path(job_id, job_prefix)
+        command = '%s=%s %s %s' % (TELEMETRY_ENV, self._telemetry_path(job_id, job_prefix),
+                                   script_path, config_file)
+        log_file = os.path.join(self.tmp_folder, 'logs',
+                                '%s_%i.log' % (job_name, job_id))
+        err_file = os.path.join(self.tmp_folder, 'error_logs',
+                                '%s_%i.err' % (job_name, job_id))
+        bsub_command = 'bsub -n %i -J %s_%i -We %i -o %s -e %s \'%s\'' % (n_threads,
+                                                                          self.task_name,
+                                                                          job_id, time_limit,
+                                                                          log_file, err_file,
+                                                                          command)
+        # call([bsub_command], shell=True)
+        # submit job and get the bsub job id from its output
+        outp = check_output([bsub_command], shell=True).decode().rstrip()
+        bsub_id = self._parse_bsub_id(outp)
+        self.bsub_ids.append(bsub_id)
+        self.lsf_ids.append(str(bsub_id))
+        print(outp)
+
+    def _cancel_job(self, job_id):
+        # the job may have finished already, so we don't check the return code
+        run(['bkill', self.lsf_ids[job_id]], stdout=DEVNULL, stderr=DEVNULL)
+
+    # lsf job states for jobs that are finished
+    _finished_states = {'DONE', 'EXIT'}
+
+    def _n_active_jobs(self, job_ids):
+        """ Number of jobs (or array elements) for the given lsf ids that are not finished.
+        """
+        # query the scheduler in batches, to avoid overly long command lines
+        batch_size = 500
+        n_active = 0
+        for start in range(0, len(job_ids), batch_size):
+            batch = job_ids[start:start + batch_size]
+            # bjobs exits with an error if any of the jobs is not known anymore
+            # (which happens some time after it has finished), so we don't check the return code
+            # and only parse the lines for known jobs:
+            # JOBID USER STAT QUEUE FROM_HOST EXEC_HOST JOB_NAME SUBMIT_TIME
+            outp = run(['bjobs', '-noheader'] + list(map(str, batch)),
+                       stdout=PIPE, stderr=DEVNULL).stdout.decode()
+            outp = [out.split() for out in outp.split('\n') if out.strip() != '']
+            n_active += sum(len(out) > 2 and out[2] not in self._finished_states
+                            for out in outp)
+        return n_active
 
     def wait_for_jobs(self, job_prefix=None):
-        # TODO move to some config
-        wait_time = 10
-        while True:
+        # speculative jobs are added to the bsub ids
+        for wait_time in self.poll_intervals():
             time.sleep(wait_time)
-            # parse the output from bjobs
-            try:
-                outp = check_output(['bjobs | grep $USER'], shell=True, stderr=STDOUT).decode()
-            # check if no jobs are in queue (throws an error we need to capture)
-            except CalledProcessError as e:
-                outp = e.output.decode().rstrip()
-                if outp == 'No unfinished job found':
-                    break
-                else:
-                    raise e
-
-            outp = outp.split('\n')
-            outp = [out for out in outp if out != '']
-            # check how many jobs there are in total, if none, stop waiting
-            n_running = len(outp)
-            if n_running == 0:
-                break
-            # if we have jobs, check how many belong to this task
-            n_running = sum([int(out.split()[0]) in self.bsub_ids for out in outp])
-            if n_running == 0:
+            self._speculate(job_prefix)
+            if self._n_active_jobs(self.bsub_ids) == 0:
                 break
 
     # need to override this for lsf
-    @staticmethod
-    def parse_jobs(log_prefix, max_jobs):
-        passed_jobs = []
-        for job_id in range(max_jobs):
-            path = log_prefix + '%i.log' % job_id
-            if parse_job_lsf(path, job_id):
-                passed_jobs.append(job_id)
-        return passed_jobs
+    parse_job_log = staticmethod(parse_job_lsf)
 
     # TODO I think LSF appends to the output and logfile
     # so we need to clean them up here in order to have clean logs
@@ -674,3 +1594,50 @@ class WorkflowBase(luigi.Task):
         """ Return all default configs and their save_path indexed by the task name
         """
         return {'global': BaseClusterTask.default_global_config()}
+
+    def export_trace(self, trace_path):
+        """ Export the timeline of the tasks run in the tmp folder of this workflow as chrome trace.
+
+        The trace has the spans of the tasks and their phases, the jobs and the blocks they processed,
+        see `utils.trace_utils.workflow_trace`. Open it in chrome://tracing or https://ui.perfetto.dev.
+
+        Arguments:
+            trace_path [str] - path to save the trace as json
+        """
+        from .utils import trace_utils
+        return trace_utils.export_trace(self.tmp_folder, trace_path)
+
+    def dry_run(self, report_path=None, stats_dir=None):
+        """ Estimate the jobs, blocks, I/O and runtime of the workflow without running it.
+
+        Walks the dependency graph of the workflow and estimates each task with
+        `BaseClusterTask.dry_run_estimate`. Runtimes are only estimated for tasks with telemetry of
+        a previous run, in `stats_dir`, the `block_stats_dir` of the global config or the tmp folder.
+        Tasks that are complete already are not counted in the total.
+        Prints the estimates as a table and returns them as a report.
+
+        Arguments:
+            report_path [str] - path to save the report as json (default: None)
+            stats_dir [str] - block stats store or tmp folder of a previous run (default: None)
+        """
+        from .utils import plan_utils
+        datasets = {}
+        tasks = [task.dry_run_estimate(datasets, stats_dir) for task in plan_utils.task_graph(self)
+                 if isinstance(task, BaseClusterTask)]
+
+        total = {}
+        for key in ('n_jobs', 'n_blocks', 'bytes_read', 'bytes_written', 'extra_chunk_reads',
+                    'wall_time', 'core_time'):
+            values = [task[key] for task in tasks if not task['complete'] and task[key] is not None]
+            total[key] = sum(values) if values else None
+        report = {'workflow': self.task_id, 'target': self.target, 'max_jobs': self.max_jobs,
+                  'tasks': tasks, 'total': total}
+
+        print(plan_utils.format_report(report))
+        alignment = plan_utils.format_alignment(report)
+        if alignment:
+            print(alignment)
+        if report_path is not None:
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+        return report
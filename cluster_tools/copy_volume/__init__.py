@@ -1 +1,7 @@
-from .copy_volume import CopyVolumeLocal, CopyVolumeSlurm, CopyVolumeLSF
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.copy_volume': ['CopyVolumeLocal', 'CopyVolumeSlurm', 'CopyVolumeLSF'],
+    '.rechunk': ['RechunkLocal', 'RechunkSlurm', 'RechunkLSF'],
+    '.rechunk_workflow': ['RechunkWorkflow'],
+})
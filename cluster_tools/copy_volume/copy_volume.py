@@ -26,6 +26,7 @@ class CopyVolumeBase(luigi.Task):
 
     task_name = 'copy_volume'
     src_file = os.path.abspath(__file__)
+    supports_block_splitting = True
 
     # input and output volumes
     input_path = luigi.Parameter()
@@ -42,7 +43,7 @@ class CopyVolumeBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'chunks': None, 'compression': 'gzip',
+        config.update({'chunks': None, 'compression': None,
                        'reduce_channels': None, 'map_uniform_blocks_to_background': False,
                        'value_list': None, 'offset': None, 'insert_mode': False})
         return config
@@ -100,7 +101,7 @@ class CopyVolumeBase(luigi.Task):
         if task_config.get('reduce_channels', None) is not None and len(out_shape) == 4:
             out_shape = out_shape[1:]
 
-        compression = task_config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, task_config)
         dtype = str(ds_dtype) if self.dtype is None else self.dtype
 
         chunks = task_config.pop('chunks', None)
@@ -114,7 +115,7 @@ class CopyVolumeBase(luigi.Task):
         with vu.file_reader(self.output_path) as f:
             chunks = tuple(min(ch, sh) for ch, sh in zip(chunks, out_shape))
             f.require_dataset(self.output_key, shape=out_shape, chunks=chunks,
-                              compression=compression, dtype=dtype)
+                              **compression_opts, dtype=dtype)
 
         # update the config with input and output paths and keys
         # as well as block shape
@@ -130,6 +131,7 @@ class CopyVolumeBase(luigi.Task):
         else:
             block_list = self.block_list
             self.clean_up_for_retry(block_list)
+            block_list, task_config = self.split_blocks_for_retry(block_list, task_config, shape, chunks[-3:])
         self._write_log("scheduled %i blocks to run" % len(block_list))
 
         # prime and run the jobs
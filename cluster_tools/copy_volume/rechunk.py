@@ -0,0 +1,192 @@
+#! /bin/python
+
+import os
+import sys
+import json
+from math import gcd
+
+import luigi
+
+import cluster_tools.utils.volume_utils as vu
+import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
+from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
+from cluster_tools.utils.task_utils import DummyTask
+
+
+#
+# rechunk tasks
+#
+
+class RechunkBase(luigi.Task):
+    """ rechunk base class
+    """
+
+    task_name = 'rechunk'
+    src_file = os.path.abspath(__file__)
+    # the blocks are aligned with the input and output chunks, see `rechunk_block_shape`
+    check_alignment = False
+
+    # input and output volumes
+    input_path = luigi.Parameter()
+    input_key = luigi.Parameter()
+    output_path = luigi.Parameter()
+    output_key = luigi.Parameter()
+    # the chunks of the output, for the last three (spatial) axes
+    chunks = luigi.ListParameter()
+    dependency = luigi.TaskParameter(default=DummyTask())
+
+    @staticmethod
+    def default_task_config():
+        # we use this to get also get the common default config
+        config = LocalTask.default_task_config()
+        config.update({'compression': None})
+        return config
+
+    def requires(self):
+        return self.dependency
+
+    @staticmethod
+    def rechunk_block_shape(block_shape, input_chunks, output_chunks):
+        """ Block shape for rechunking, aligned with the output chunks and, if possible, the input chunks.
+
+        Blocks that are aligned with the output chunks write whole chunks, so no two blocks write to
+        the same chunk. Blocks that are also aligned with the input chunks read every chunk only once;
+        this needs a multiple of the least common multiple of both chunks, which is only used if it is
+        not larger than the global block shape, to keep the memory per block bounded.
+        The block shape is the global block shape rounded down to a multiple of these chunks.
+        """
+        block_shape_ = []
+        for bs, ich, och in zip(block_shape, input_chunks, output_chunks):
+            lcm = ich * och // gcd(ich, och)
+            ch = lcm if lcm <= max(bs, och) else och
+            block_shape_.append(max(bs // ch, 1) * ch)
+        return block_shape_
+
+    def run_impl(self):
+        # get the global config and init configs
+        shebang, block_shape, roi_begin, roi_end = self.global_config_values()
+        self.init(shebang)
+
+        with vu.file_reader(self.input_path, 'r') as f:
+            ds = f[self.input_key]
+            shape = ds.shape
+            ds_chunks = ds.chunks
+            dtype = str(ds.dtype)
+
+        ndim = len(shape)
+        assert ndim in (3, 4), "Rechunking is only supported for 3d and 4d inputs"
+        assert len(self.chunks) == 3, "Chunks must be 3d"
+        chunks = tuple(min(ch, sh) for ch, sh in zip(self.chunks, shape[-3:]))
+        block_shape = self.rechunk_block_shape(block_shape, ds_chunks[-3:], chunks)
+        self._write_log("rechunking from %s to %s with block shape %s" % (str(ds_chunks), str(chunks),
+                                                                         str(block_shape)))
+        if ndim == 4:
+            # the channel axis is not blocked, so it is written in one chunk
+            chunks = (shape[0],) + chunks
+
+        task_config = self.get_task_config()
+        compression_opts = self.compression_options(self.output_path, task_config)
+        with vu.file_reader(self.output_path) as f:
+            f.require_dataset(self.output_key, shape=shape, chunks=chunks,
+                              dtype=dtype, **compression_opts)
+
+        # update the config with input and output paths and keys
+        # as well as block shape
+        task_config.update({'input_path': self.input_path, 'input_key': self.input_key,
+                            'output_path': self.output_path, 'output_key': self.output_key,
+                            'block_shape': block_shape})
+
+        if self.n_retries == 0:
+            block_list = vu.blocks_in_volume(shape[-3:], block_shape, roi_begin, roi_end)
+        else:
+            block_list = self.block_list
+            self.clean_up_for_retry(block_list)
+        self._write_log("scheduled %i blocks to run" % len(block_list))
+
+        # prime and run the jobs
+        n_jobs = min(len(block_list), self.max_jobs)
+        self.prepare_jobs(n_jobs, block_list, task_config)
+        self.submit_jobs(n_jobs)
+
+        # wait till jobs finish and check for job success
+        self.wait_for_jobs()
+        self.check_jobs(n_jobs)
+
+
+class RechunkLocal(RechunkBase, LocalTask):
+    """
+    rechunk on local machine
+    """
+    pass
+
+
+class RechunkSlurm(RechunkBase, SlurmTask):
+    """
+    rechunk on slurm cluster
+    """
+    pass
+
+
+class RechunkLSF(RechunkBase, LSFTask):
+    """
+    rechunk on lsf cluster
+    """
+    pass
+
+
+#
+# Implementation
+#
+
+
+def _rechunk_block(ds_in, ds_out, block_shape, shape, block_id):
+    fu.log("start processing block %i" % block_id)
+    begins, ends = vu.block_bounding_boxes(shape, block_shape, [block_id])
+    bb = tuple(slice(int(beg), int(end)) for beg, end in zip(begins[0], ends[0]))
+    if ds_in.ndim == 4:
+        bb = (slice(None),) + bb
+
+    data = ds_in[bb]
+    # don't write empty blocks, the chunks that are not written are read as zeros
+    if data.any():
+        ds_out[bb] = data
+    fu.log_block_success(block_id)
+
+
+def rechunk(job_id, config_path):
+    fu.log("start processing job %i" % job_id)
+    fu.log("reading config from %s" % config_path)
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+
+    input_path = config['input_path']
+    input_key = config['input_key']
+    output_path = config['output_path']
+    output_key = config['output_key']
+
+    block_shape = list(config['block_shape'])
+    block_list = config['block_list']
+    n_threads = config.get('threads_per_job', 1)
+
+    with vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
+        ds_in = f_in[input_key]
+        ds_out = f_out[output_key]
+        shape = list(ds_in.shape)[-3:]
+
+        pu.map_blocks(lambda block_id: _rechunk_block(ds_in, ds_out, block_shape, shape, block_id),
+                      block_list, n_threads)
+
+        # copy the attributes with job 0
+        if job_id == 0:
+            for k, v in ds_in.attrs.items():
+                ds_out.attrs[k] = v
+
+    fu.log_job_success(job_id)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+    assert os.path.exists(path), path
+    job_id = int(os.path.split(path)[1].split('.')[0].split('_')[-1])
+    rechunk(job_id, path)
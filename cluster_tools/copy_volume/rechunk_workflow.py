@@ -0,0 +1,32 @@
+import luigi
+
+from ..cluster_tasks import WorkflowBase
+from . import rechunk as rechunk_tasks
+
+
+class RechunkWorkflow(WorkflowBase):
+    """ Rewrite a dataset with new chunks, so that the tasks downstream read each block from whole chunks.
+
+    Choose the chunks to match the block shape of the downstream tasks, see `WorkflowBase.dry_run`
+    and `chunk_alignment` in the global config for the extra chunk reads of misaligned blocks.
+    """
+    input_path = luigi.Parameter()
+    input_key = luigi.Parameter()
+    output_path = luigi.Parameter()
+    output_key = luigi.Parameter()
+    # the chunks of the output, for the last three (spatial) axes
+    chunks = luigi.ListParameter()
+
+    def requires(self):
+        rechunk_task = getattr(rechunk_tasks, self._get_task_name('Rechunk'))
+        return rechunk_task(tmp_folder=self.tmp_folder, max_jobs=self.max_jobs,
+                            config_dir=self.config_dir, dependency=self.dependency,
+                            input_path=self.input_path, input_key=self.input_key,
+                            output_path=self.output_path, output_key=self.output_key,
+                            chunks=self.chunks)
+
+    @staticmethod
+    def get_config():
+        configs = super(RechunkWorkflow, RechunkWorkflow).get_config()
+        configs.update({'rechunk': rechunk_tasks.RechunkLocal.default_task_config()})
+        return configs
@@ -1 +1,5 @@
-from . costs_workflow import EdgeCostsWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.costs_workflow': ['EdgeCostsWorkflow'],
+})
@@ -56,7 +56,7 @@ class PredictBase(luigi.Task):
 
         # require output dataset
         with vu.file_reader(self.output_path) as f:
-            f.require_dataset(self.output_key, shape=(n_edges,), compression='gzip',
+            f.require_dataset(self.output_key, shape=(n_edges,), **self.compression_options(self.output_path),
                               dtype='float32', chunks=(chunk_size,))
 
         # update the config with input and output paths and keys
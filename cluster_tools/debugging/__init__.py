@@ -1,2 +1,6 @@
-from .check_ws_workflow import CheckWsWorkflow
-from .check_sub_graphs_workflow import CheckSubGraphsWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.check_ws_workflow': ['CheckWsWorkflow'],
+    '.check_sub_graphs_workflow': ['CheckSubGraphsWorkflow'],
+})
@@ -1 +1,5 @@
-from .distance_workflow import PairwiseDistanceWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.distance_workflow': ['PairwiseDistanceWorkflow'],
+})
@@ -30,6 +30,8 @@ class ObjectDistancesBase(luigi.Task):
 
     task_name = 'object_distances'
     src_file = os.path.abspath(__file__)
+    # the results are saved per job id, so the jobs can't be re-executed speculatively
+    allow_speculation = False
 
     # input and output volumes
     input_path = luigi.Parameter()
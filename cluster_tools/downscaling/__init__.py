@@ -1,3 +1,7 @@
-from . downscaling_workflow import DownscalingWorkflow, PainteraToBdvWorkflow
-from . upscaling import UpscalingLocal, UpscalingSlurm, UpscalingLSF
-from . downscaling import DownscalingLocal, DownscalingSlurm, DownscalingLSF
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.downscaling_workflow': ['DownscalingWorkflow', 'PainteraToBdvWorkflow'],
+    '.upscaling': ['UpscalingLocal', 'UpscalingSlurm', 'UpscalingLSF'],
+    '.downscaling': ['DownscalingLocal', 'DownscalingSlurm', 'DownscalingLSF'],
+})
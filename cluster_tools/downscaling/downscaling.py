@@ -20,6 +20,7 @@ from elf.util import downscale_shape as _downsample_shape
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 from cluster_tools.utils.task_utils import DummyTask
 
@@ -35,6 +36,7 @@ class DownscalingBase(luigi.Task):
 
     task_name = 'downscaling'
     src_file = os.path.abspath(__file__)
+    supports_block_splitting = True
 
     # input and output volumes
     input_path = luigi.Parameter()
@@ -61,7 +63,7 @@ class DownscalingBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'library': 'vigra', 'chunks': None, 'compression': 'gzip',
+        config.update({'library': 'vigra', 'chunks': None, 'compression': None,
                        'library_kwargs': None})
         return config
 
@@ -138,11 +140,11 @@ class DownscalingBase(luigi.Task):
             out_shape = shape
             out_chunks = chunks
 
-        compression = task_config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, task_config)
         # require output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=out_shape, chunks=out_chunks,
-                              compression=compression, dtype=dtype)
+                              **compression_opts, dtype=dtype)
 
         # update the config with input and output paths and keys
         # as well as block shape
@@ -175,6 +177,7 @@ class DownscalingBase(luigi.Task):
         else:
             block_list = self.block_list
             self.clean_up_for_retry(block_list)
+            block_list, task_config = self.split_blocks_for_retry(block_list, task_config, shape, chunks)
 
         # prime and run the jobs
         n_jobs = min(len(block_list), self.max_jobs)
@@ -226,9 +229,7 @@ def _ds_vol(x, out_shape, sampler, scale_factor, dtype):
     return out.astype(dtype)
 
 
-def _ds_block(blocking, block_id, ds_in, ds_out, scale_factor, halo, sampler):
-    fu.log("start processing block %i" % block_id)
-
+def _read_ds_block(blocking, block_id, ds_in, scale_factor, halo):
     # load the block (output dataset / downsampled) coordinates
     if halo is None:
         block = blocking.getBlock(block_id)
@@ -264,12 +265,16 @@ def _ds_block(blocking, block_id, ds_in, ds_out, scale_factor, halo, sampler):
         out_bb = (slice(None),) + out_bb
         local_bb = (slice(None),) + local_bb
     x = ds_in[in_bb]
+    return x, out_bb, local_bb, out_shape
+
 
+# returns the output bounding box and the downsampled data or None for an empty block
+def _compute_ds_block(x, out_bb, local_bb, out_shape, scale_factor, sampler):
     # don't sample empty blocks
     if np.sum(x != 0) == 0:
-        fu.log_block_success(block_id)
-        return
+        return None
 
+    ndim = x.ndim
     dtype = x.dtype
     if np.dtype(dtype) != np.dtype('float32'):
         x = x.astype('float32')
@@ -283,10 +288,18 @@ def _ds_block(blocking, block_id, ds_in, ds_out, scale_factor, halo, sampler):
         out = _ds_vol(x, out_shape, sampler, scale_factor, dtype)
 
     try:
-        ds_out[out_bb] = out[local_bb]
+        return out_bb, out[local_bb]
     except IndexError:
         raise(IndexError("%s, %s, %s" % (str(out_bb), str(local_bb), str(out.shape))))
 
+
+def _ds_block(blocking, block_id, ds_in, ds_out, scale_factor, halo, sampler):
+    fu.log("start processing block %i" % block_id)
+    output = _compute_ds_block(*_read_ds_block(blocking, block_id, ds_in, scale_factor, halo),
+                               scale_factor, sampler)
+    if output is not None:
+        out_bb, out = output
+        ds_out[out_bb] = out
     # log block success
     fu.log_block_success(block_id)
 
@@ -326,10 +339,14 @@ def _submit_blocks(ds_in, ds_out, block_shape, block_list,
     else:
         raise ValueError("Invalid library %s, only vigra and skimage are supported" % library)
 
+    # we read the next blocks and write the results in the background while downsampling,
+    # with multiple threads, the I/O of the different threads overlaps already
     if n_threads <= 1:
-        for block_id in block_list:
-            _ds_block(blocking, block_id, ds_in, ds_out,
-                      scale_factor, halo, sampler)
+        pu.run_pipelined(block_list,
+                         read_block=lambda block_id: _read_ds_block(blocking, block_id, ds_in,
+                                                                    scale_factor, halo),
+                         process_block=lambda block_id, data: _compute_ds_block(*data, scale_factor, sampler),
+                         ds_out=ds_out)
     else:
         with futures.ThreadPoolExecutor(n_threads) as tp:
             tasks = [tp.submit(_ds_block, blocking, block_id, ds_in, ds_out,
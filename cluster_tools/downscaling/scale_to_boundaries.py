@@ -82,7 +82,7 @@ class ScaleToBoundariesBase(luigi.Task):
         self._write_log("requiring output dataset @ %s:%s" % (self.output_path, self.output_key))
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, chunks=tuple(chunks),
-                              compression='gzip', dtype=dtype)
+                              **self.compression_options(self.output_path), dtype=dtype)
 
         # update the config with input and output paths and keys
         # as well as block shape
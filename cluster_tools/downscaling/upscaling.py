@@ -57,7 +57,7 @@ class UpscalingBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'library': 'vigra', 'chunks': None, 'compression': 'gzip',
+        config.update({'library': 'vigra', 'chunks': None, 'compression': None,
                        'library_kwargs': None})
         return config
 
@@ -125,12 +125,12 @@ class UpscalingBase(luigi.Task):
             assert len(chunks) == 3, "Chunks must be 3d"
         chunks = tuple(min(ch, sh) for sh, ch in zip(shape, chunks))
 
-        compression = task_config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, task_config)
         # require output dataset
         self._write_log("requiring output dataset @ %s:%s" % (self.output_path, self.output_key))
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              compression=compression, dtype=dtype)
+                              **compression_opts, dtype=dtype)
 
         # update the config with input and output paths and keys
         # as well as block shape
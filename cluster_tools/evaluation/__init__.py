@@ -1 +1,5 @@
-from .evaluation_workflow import EvaluationWorkflow, ObjectViWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.evaluation_workflow': ['EvaluationWorkflow', 'ObjectViWorkflow'],
+})
@@ -1 +1,5 @@
-from .features_workflow import EdgeFeaturesWorkflow, RegionFeaturesWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.features_workflow': ['EdgeFeaturesWorkflow', 'RegionFeaturesWorkflow'],
+})
@@ -3,6 +3,7 @@
 import os
 import sys
 import json
+from contextlib import contextmanager
 
 import numpy as np
 import luigi
@@ -11,6 +12,9 @@ import nifty.distributed as ndist
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.queue_utils as qu
+import cluster_tools.utils.cache_utils as cu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -20,6 +24,9 @@ class BlockEdgeFeaturesBase(luigi.Task):
 
     task_name = 'block_edge_features'
     src_file = os.path.abspath(__file__)
+    supports_block_queue = True
+    fusable = True
+    halo_inputs = ('input', 'labels')
 
     # input and output volumes
     input_path = luigi.Parameter()
@@ -38,7 +45,8 @@ class BlockEdgeFeaturesBase(luigi.Task):
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
         config.update({'offsets': None, 'filters': None, 'sigmas': None, 'halo': [0, 0, 0],
-                       'apply_in_2d': False, 'channel_agglomeration': 'mean'})
+                       'apply_in_2d': False, 'channel_agglomeration': 'mean',
+                       'chunk_cache_size': 0.})
         return config
 
     def clean_up_for_retry(self, block_list):
@@ -61,7 +69,7 @@ class BlockEdgeFeaturesBase(luigi.Task):
         # require the output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(output_key, shape=shape, dtype='float64',
-                              compression='gzip', chunks=tuple(block_shape))
+                              **self.compression_options(self.output_path), chunks=tuple(block_shape))
 
         # update the config with input and output paths and keys
         # as well as block shape
@@ -79,12 +87,45 @@ class BlockEdgeFeaturesBase(luigi.Task):
 
         n_jobs = min(len(block_list), self.max_jobs)
         # prime and run the jobs
-        self.prepare_jobs(n_jobs, block_list, config)
+        # neighboring blocks read overlapping chunks if we apply filters with halo,
+        # so we keep them in the same job if the chunk cache is used
+        consecutive_blocks = config.get('filters', None) is not None and config.get('chunk_cache_size', 0) > 0
+        self.prepare_jobs(n_jobs, block_list, config, consecutive_blocks=consecutive_blocks)
         self.submit_jobs(n_jobs)
 
         # wait till jobs finish and check for job success
         self.wait_for_jobs()
         self.check_jobs(n_jobs)
+        self._write_n_features(output_key, self.task_name)
+
+    def finish_fused(self, job_name):
+        self._write_n_features('s0/sub_features', job_name)
+
+    def _write_n_features(self, output_key, job_name):
+        """ Write the number of features logged by the jobs `job_name` to the output dataset.
+        """
+        log_dir = os.path.join(self.tmp_folder, 'logs')
+        prefix = job_name + '_'
+        n_feats = None
+        for name in sorted(os.listdir(log_dir)):
+            if not (name.startswith(prefix) and name.endswith('.log') and name[len(prefix):-4].isdigit()):
+                continue
+            with open(os.path.join(log_dir, name)) as f:
+                for line in f:
+                    if 'number of features:' in line:
+                        n_feats = int(line.split('number of features:')[1])
+                        break
+            if n_feats is not None:
+                break
+        # no block has edges if none of the jobs has logged the number of features
+        if n_feats is None:
+            self._write_log("no job has logged the number of features")
+            return
+        with vu.file_reader(self.output_path) as f:
+            ds = f[output_key]
+            if ds.attrs.get('n_features', None) != n_feats:
+                ds.attrs['n_features'] = n_feats
+        self._write_log("written number of features %i" % n_feats)
 
 
 class BlockEdgeFeaturesLocal(BlockEdgeFeaturesBase, LocalTask):
@@ -110,13 +151,11 @@ class BlockEdgeFeaturesLSF(BlockEdgeFeaturesBase, LSFTask):
 #
 
 
-def _accumulate(input_path, input_key,
-                labels_path, labels_key,
-                graph_path, subgraph_key,
-                output_path, output_key,
-                block_list, offsets):
-
-    fu.log("accumulate features without applying filters")
+def _accumulate_function(input_path, input_key,
+                         labels_path, labels_key,
+                         graph_path, subgraph_key,
+                         output_path, output_key,
+                         offsets):
     with vu.file_reader(input_path, 'r') as f:
         dtype = f[input_key].dtype
         input_dim = f[input_key].ndim
@@ -126,23 +165,49 @@ def _accumulate(input_path, input_key,
         fu.log('accumulate boundary map for type %s' % str(dtype))
         boundary_function = ndist.extractBlockFeaturesFromBoundaryMaps_uint8 if dtype == 'uint8' else \
             ndist.extractBlockFeaturesFromBoundaryMaps_float32
-        boundary_function(graph_path, subgraph_key,
-                          input_path, input_key,
-                          labels_path, labels_key,
-                          block_list,
-                          output_path, output_key,
-                          increaseRoi=True)
+
+        def accumulate_blocks(block_list):
+            boundary_function(graph_path, subgraph_key,
+                              input_path, input_key,
+                              labels_path, labels_key,
+                              block_list,
+                              output_path, output_key,
+                              increaseRoi=True)
     else:
         assert input_dim == 4, str(input_dim)
         fu.log('accumulate affinity map for type %s' % str(dtype))
         affinity_function = ndist.extractBlockFeaturesFromAffinityMaps_uint8 if dtype == 'uint8' else \
             ndist.extractBlockFeaturesFromAffinityMaps_float32
-        affinity_function(graph_path, subgraph_key,
-                          input_path, input_key,
-                          labels_path, labels_key,
-                          block_list,
-                          output_path, output_key,
-                          offsets)
+
+        def accumulate_blocks(block_list):
+            affinity_function(graph_path, subgraph_key,
+                              input_path, input_key,
+                              labels_path, labels_key,
+                              block_list,
+                              output_path, output_key,
+                              offsets)
+    return accumulate_blocks
+
+
+def _accumulate(input_path, input_key,
+                labels_path, labels_key,
+                graph_path, subgraph_key,
+                output_path, output_key,
+                block_batches, offsets, n_threads):
+
+    fu.log("accumulate features without applying filters")
+    accumulate_blocks = _accumulate_function(input_path, input_key,
+                                             labels_path, labels_key,
+                                             graph_path, subgraph_key,
+                                             output_path, output_key,
+                                             offsets)
+
+    def accumulate_batch(block_list):
+        accumulate_blocks(block_list)
+        [fu.log_block_success(block_id) for block_id in block_list]
+
+    # each batch writes the features of its blocks, so the batches can be processed in parallel
+    pu.map_blocks(accumulate_batch, block_batches, n_threads)
     # number of featres is 10 for both boundaries and affinities
     n_feats = 10
     return n_feats
@@ -169,19 +234,16 @@ def _accumulate_filter(input_, graph, labels, bb_local,
                                      response.min(), response.max())
 
 
-def _accumulate_block(block_id, blocking,
-                      ds_in, ds_labels, ds_edges, ds_out,
-                      filters, sigmas, halo, ignore_label,
-                      apply_in_2d, channel_agglomeration):
-
-    fu.log("start processing block %i" % block_id)
+def _compute_block_features(block_id, blocking,
+                            ds_in, ds_labels, ds_edges, ds_out,
+                            filters, sigmas, halo, ignore_label,
+                            apply_in_2d, channel_agglomeration):
     chunk_pos = blocking.blockGridPosition(block_id)
 
     # load edges and construct the graph if this block has edges
     edges = ds_edges.read_chunk(chunk_pos)
     if edges is None:
         fu.log("block %i has no edges" % block_id)
-        fu.log_block_success(block_id)
         return
     edges = edges.reshape((edges.size, 2))
     graph = ndist.Graph(edges)
@@ -234,20 +296,28 @@ def _accumulate_block(block_id, blocking,
     # save the features
     fu.log("saving feature result of shape %s" % str(edge_features.shape))
     ds_out.write_chunk(chunk_pos, edge_features.flatten(), True)
-    fu.log_block_success(block_id)
     return edge_features.shape[1]
 
 
-def _accumulate_with_filters(input_path, input_key,
-                             labels_path, labels_key,
-                             graph_path, subgraph_key,
-                             output_path, output_key,
-                             block_list, block_shape,
-                             filters, sigmas, halo,
-                             apply_in_2d, channel_agglomeration):
+def _accumulate_block(block_id, blocking,
+                      ds_in, ds_labels, ds_edges, ds_out,
+                      filters, sigmas, halo, ignore_label,
+                      apply_in_2d, channel_agglomeration):
+    fu.log("start processing block %i" % block_id)
+    n_feats = _compute_block_features(block_id, blocking,
+                                      ds_in, ds_labels, ds_edges, ds_out,
+                                      filters, sigmas, halo, ignore_label,
+                                      apply_in_2d, channel_agglomeration)
+    fu.log_block_success(block_id)
+    return n_feats
 
-    fu.log("accumulate features with applying filters:")
 
+@contextmanager
+def _open_datasets(input_path, input_key,
+                   labels_path, labels_key,
+                   graph_path, subgraph_key,
+                   output_path, output_key,
+                   block_shape):
     with vu.file_reader(input_path, 'r') as f,\
             vu.file_reader(labels_path, 'r') as fl,\
             vu.file_reader(graph_path, 'r') as fg,\
@@ -263,13 +333,79 @@ def _accumulate_with_filters(input_path, input_key,
         ds_out = fo[output_key]
 
         blocking = nt.blocking([0, 0, 0], shape, block_shape)
-        for block_id in block_list:
-            n_feats = _accumulate_block(block_id, blocking,
-                                        ds_in, ds_labels, ds_edges, ds_out,
-                                        filters, sigmas, halo, ignore_label,
-                                        apply_in_2d, channel_agglomeration)
+        yield blocking, ds_in, ds_labels, ds_edges, ds_out, ignore_label
 
-    return n_feats
+
+def _accumulate_with_filters(input_path, input_key,
+                             labels_path, labels_key,
+                             graph_path, subgraph_key,
+                             output_path, output_key,
+                             block_list, block_shape,
+                             filters, sigmas, halo,
+                             apply_in_2d, channel_agglomeration, n_threads):
+
+    fu.log("accumulate features with applying filters:")
+
+    with _open_datasets(input_path, input_key,
+                        labels_path, labels_key,
+                        graph_path, subgraph_key,
+                        output_path, output_key,
+                        block_shape) as (blocking, ds_in, ds_labels, ds_edges, ds_out, ignore_label):
+        block_feats = pu.map_blocks(lambda block_id: _accumulate_block(block_id, blocking,
+                                                                       ds_in, ds_labels, ds_edges, ds_out,
+                                                                       filters, sigmas, halo, ignore_label,
+                                                                       apply_in_2d, channel_agglomeration),
+                                    block_list, n_threads)
+
+    # blocks without edges don't return the number of features
+    block_feats = [n_feats for n_feats in block_feats if n_feats is not None]
+    return block_feats[-1] if block_feats else None
+
+
+@contextmanager
+def block_processor(config):
+    """ Yield a function that accumulates the edge features of a single block,
+        with the inputs and outputs opened once, see `fusion.FusedBlockwise`.
+
+    The number of features is logged when the processor is closed, like at the end of a job.
+    """
+    paths = (config['input_path'], config['input_key'],
+             config['labels_path'], config['labels_key'],
+             config['graph_path'], config['subgraph_key'],
+             config['output_path'], config['output_key'])
+    filters = config.get('filters', None)
+    if filters is None:
+        accumulate_blocks = _accumulate_function(*paths, config.get('offsets', None))
+        yield lambda block_id: accumulate_blocks([block_id])
+        # number of featres is 10 for both boundaries and affinities
+        n_feats = 10
+    else:
+        sigmas = config.get('sigmas', None)
+        assert config.get('offsets', None) is None, "Filters and offsets are not supported"
+        assert sigmas is not None, "Need sigma values"
+        halo = config.get('halo', [0, 0, 0])
+        apply_in_2d = config.get('apply_in_2d', False)
+        channel_agglomeration = config.get('channel_agglomeration', 'mean')
+        assert channel_agglomeration in ('mean', 'max', 'min', None)
+
+        # blocks without edges don't return the number of features
+        block_feats = set()
+        with _open_datasets(*paths, config['block_shape']) as (blocking, ds_in, ds_labels,
+                                                               ds_edges, ds_out, ignore_label):
+
+            def process_block(block_id):
+                n_feats = _compute_block_features(block_id, blocking,
+                                                  ds_in, ds_labels, ds_edges, ds_out,
+                                                  filters, sigmas, halo, ignore_label,
+                                                  apply_in_2d, channel_agglomeration)
+                if n_feats is not None:
+                    block_feats.add(n_feats)
+
+            yield process_block
+        n_feats = block_feats.pop() if block_feats else None
+
+    if n_feats is not None:
+        fu.log("number of features: %i" % n_feats)
 
 
 def block_edge_features(job_id, config_path):
@@ -281,7 +417,6 @@ def block_edge_features(job_id, config_path):
     with open(config_path, 'r') as f:
         config = json.load(f)
 
-    block_list = config['block_list']
     input_path = config['input_path']
     input_key = config['input_key']
     labels_path = config['labels_path']
@@ -299,6 +434,7 @@ def block_edge_features(job_id, config_path):
     apply_in_2d = config.get('apply_in_2d', False)
     halo = config.get('halo', [0, 0, 0])
     channel_agglomeration = config.get('channel_agglomeration', 'mean')
+    n_threads = config.get('threads_per_job', 1)
     assert channel_agglomeration in ('mean', 'max', 'min', None)
 
     if filters is None:
@@ -306,23 +442,25 @@ def block_edge_features(job_id, config_path):
                               labels_path, labels_key,
                               graph_path, subgraph_key,
                               output_path, output_key,
-                              block_list, offsets)
+                              qu.block_batches_for_job(config, batch_size=4, n_batches=n_threads),
+                              offsets, n_threads)
     else:
         assert offsets is None, "Filters and offsets are not supported"
         assert sigmas is not None, "Need sigma values"
-        n_feats = _accumulate_with_filters(input_path, input_key,
-                                           labels_path, labels_key,
-                                           graph_path, subgraph_key,
-                                           output_path, output_key,
-                                           block_list, block_shape,
-                                           filters, sigmas, halo,
-                                           apply_in_2d, channel_agglomeration)
-
-    # we need to serialize the number of features for job 0
-    if job_id == 0:
-        with vu.file_reader(output_path) as f:
-            ds = f[output_key]
-            ds.attrs['n_features'] = n_feats
+        # the chunk cache avoids reading the overlapping halos of neighboring blocks several times
+        with cu.chunk_cache(config.get('chunk_cache_size', 0)):
+            n_feats = _accumulate_with_filters(input_path, input_key,
+                                               labels_path, labels_key,
+                                               graph_path, subgraph_key,
+                                               output_path, output_key,
+                                               qu.blocks_for_job(config), block_shape,
+                                               filters, sigmas, halo,
+                                               apply_in_2d, channel_agglomeration, n_threads)
+
+    # the number of features is serialized by the task after all jobs are done, see `_write_n_features`;
+    # if the jobs wrote it, concurrent jobs could corrupt the attributes of the output dataset
+    if n_feats is not None:
+        fu.log("number of features: %i" % n_feats)
 
     fu.log_job_success(job_id)
 
@@ -20,6 +20,9 @@ class EdgeFeaturesWorkflow(WorkflowBase):
     output_path = luigi.Parameter()
     output_key = luigi.Parameter()
     max_jobs_merge = luigi.IntParameter(default=1)
+    # set to false if the block features are computed by the dependency,
+    # e.g. fused with other blockwise tasks, see `fusion.FusedBlockwise`
+    compute_block_features = luigi.BoolParameter(default=True)
 
     # for now we only support n5 / zarr input labels
     @staticmethod
@@ -32,18 +35,20 @@ class EdgeFeaturesWorkflow(WorkflowBase):
         self._check_input(self.input_path)
         self._check_input(self.labels_path)
 
-        feat_task = getattr(feat_tasks,
-                            self._get_task_name('BlockEdgeFeatures'))
-        dep = feat_task(tmp_folder=self.tmp_folder,
-                        max_jobs=self.max_jobs,
-                        config_dir=self.config_dir,
-                        input_path=self.input_path,
-                        input_key=self.input_key,
-                        labels_path=self.labels_path,
-                        labels_key=self.labels_key,
-                        graph_path=self.graph_path,
-                        output_path=self.output_path,
-                        dependency=self.dependency)
+        dep = self.dependency
+        if self.compute_block_features:
+            feat_task = getattr(feat_tasks,
+                                self._get_task_name('BlockEdgeFeatures'))
+            dep = feat_task(tmp_folder=self.tmp_folder,
+                            max_jobs=self.max_jobs,
+                            config_dir=self.config_dir,
+                            input_path=self.input_path,
+                            input_key=self.input_key,
+                            labels_path=self.labels_path,
+                            labels_key=self.labels_key,
+                            graph_path=self.graph_path,
+                            output_path=self.output_path,
+                            dependency=dep)
         merge_task = getattr(merge_tasks,
                              self._get_task_name('MergeEdgeFeatures'))
         dep = merge_task(tmp_folder=self.tmp_folder,
@@ -13,6 +13,8 @@ import nifty.distributed as ndist
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.cache_utils as cu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -37,7 +39,7 @@ class ImageFilterBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'apply_in_2d': False})
+        config.update({'apply_in_2d': False, 'chunk_cache_size': 0.})
         return config
 
     def clean_up_for_retry(self, block_list):
@@ -59,7 +61,7 @@ class ImageFilterBase(luigi.Task):
         chunks = tuple(min(bs // 2, sh) for bs, sh in zip(block_shape, shape))
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, dtype='float32',
-                              compression='gzip', chunks=chunks)
+                              **self.compression_options(self.output_path), chunks=chunks)
 
         if self.n_retries == 0:
             # get shape and make block config
@@ -71,7 +73,9 @@ class ImageFilterBase(luigi.Task):
 
         n_jobs = min(len(block_list), self.max_jobs)
         # prime and run the jobs
-        self.prepare_jobs(n_jobs, block_list, config)
+        # neighboring blocks read overlapping chunks, so we keep them in the same job if the chunk cache is used
+        self.prepare_jobs(n_jobs, block_list, config,
+                          consecutive_blocks=config.get('chunk_cache_size', 0) > 0)
         self.submit_jobs(n_jobs)
 
         # wait till jobs finish and check for job success
@@ -135,9 +139,12 @@ def image_filter(job_id, config_path):
     filter_name = config['filter_name']
     halo = config['halo']
     apply_in_2d = config.get('apply_in_2d', False)
+    n_threads = config.get('threads_per_job', 1)
 
     # iterate over blocks and apply filter
-    with vu.file_reader(input_path, 'r') as f_in,\
+    # the chunk cache avoids reading the overlapping halos of neighboring blocks several times
+    with cu.chunk_cache(config.get('chunk_cache_size', 0)),\
+        vu.file_reader(input_path, 'r') as f_in,\
         vu.file_reader(output_path) as f_out:
 
         ds_in = f_in[input_key]
@@ -146,9 +153,9 @@ def image_filter(job_id, config_path):
         shape = list(ds_in.shape)
         blocking = nt.blocking([0, 0, 0], shape, block_shape)
 
-        for block_id in block_list:
-            _apply_filter(blocking, block_id, ds_in, ds_out,
-                          halo, filter_name, sigma, apply_in_2d)
+        pu.map_blocks(lambda block_id: _apply_filter(blocking, block_id, ds_in, ds_out,
+                                                     halo, filter_name, sigma, apply_in_2d),
+                      block_list, n_threads)
 
     fu.log_job_success(job_id)
 
@@ -47,14 +47,13 @@ class MergeEdgeFeaturesBase(luigi.Task):
             n_edges = g.attrs['numberOfEdges']
         self._write_log("Merging edge features for %i edges" % n_edges)
 
-        # if we don't have a roi, we only serialize the number of blocks
-        # otherwise we serialize the blocks in roi
-        if roi_begin is None:
-            block_ids = nt.blocking([0, 0, 0], shape, block_shape).numberOfBlocks
-            self._write_log("Merging edge features for %i blocks" % block_ids)
-        else:
-            block_ids = vu.blocks_in_volume(shape, block_shape, roi_begin, roi_end)
-            self._write_log("Merging edge features for %i blocks" % len(block_ids))
+        # the blocks in the roi and the block mask, which are the blocks that have sub-features;
+        # if these are all blocks, we only serialize the number of blocks
+        block_ids = vu.blocks_in_volume(shape, block_shape, roi_begin, roi_end)
+        self._write_log("Merging edge features for %i blocks" % len(block_ids))
+        n_blocks = nt.blocking([0, 0, 0], shape, block_shape).numberOfBlocks
+        if len(block_ids) == n_blocks:
+            block_ids = n_blocks
 
         subfeat_key = 's0/sub_features'
         subgraph_key = 's0/sub_graphs'
@@ -67,7 +66,7 @@ class MergeEdgeFeaturesBase(luigi.Task):
             feat_shape = (n_edges, n_features)
             feat_chunks = (chunk_size, 1)
             f.require_dataset(self.output_key, dtype='float64', shape=feat_shape,
-                              chunks=feat_chunks, compression='gzip')
+                              chunks=feat_chunks, **self.compression_options(self.output_path))
 
         # update the task config
         config.update({'graph_path': self.graph_path, 'subgraph_key': subgraph_key,
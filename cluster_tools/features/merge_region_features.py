@@ -51,7 +51,7 @@ class MergeRegionFeaturesBase(luigi.Task):
         # require the output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, dtype='float32', shape=(self.number_of_labels, n_features),
-                              chunks=(chunk_size, 1), compression='gzip')
+                              chunks=(chunk_size, 1), **self.compression_options(self.output_path))
 
         # update the task config
         config.update({'output_path': self.output_path, 'output_key': self.output_key,
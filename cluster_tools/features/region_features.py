@@ -15,6 +15,7 @@ import vigra
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -80,7 +81,7 @@ class RegionFeaturesBase(luigi.Task):
 
         # require the temporary output data-set
         f_out = z5py.File(output_path)
-        f_out.require_dataset(output_key, shape=shape, compression='gzip',
+        f_out.require_dataset(output_key, shape=shape, **self.compression_options(output_path),
                               chunks=tuple(block_shape), dtype='float32')
 
         if self.n_retries == 0:
@@ -211,6 +212,7 @@ def region_features(job_id, config_path):
     block_shape = config['block_shape']
     channel = config['channel']
     ignore_label = config['ignore_label']
+    n_threads = config.get('threads_per_job', 1)
 
     # TODO there are some issues with min and max I don't understand
     # feature_names = ['count', 'mean', 'minimum', 'maximum']
@@ -227,11 +229,11 @@ def region_features(job_id, config_path):
         shape = ds_out.shape
         blocking = nt.blocking([0, 0, 0], shape, block_shape)
 
-        for block_id in block_list:
-            _block_features(block_id, blocking,
-                            ds_in, ds_labels, ds_out,
-                            ignore_label, channel,
-                            feature_names)
+        pu.map_blocks(lambda block_id: _block_features(block_id, blocking,
+                                                       ds_in, ds_labels, ds_out,
+                                                       ignore_label, channel,
+                                                       feature_names),
+                      block_list, n_threads)
 
         # write the feature names in job 0
         if job_id == 0:
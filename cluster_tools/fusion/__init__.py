@@ -0,0 +1,5 @@
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.fused_blockwise': ['FusedBlockwiseLocal', 'FusedBlockwiseSlurm', 'FusedBlockwiseLSF'],
+})
@@ -0,0 +1,345 @@
+#! /bin/python
+
+import os
+import sys
+import json
+import shutil
+from contextlib import contextmanager, ExitStack
+
+import luigi
+
+import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.queue_utils as qu
+import cluster_tools.utils.cache_utils as cu
+import cluster_tools.utils.plan_utils as plan_utils
+from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
+from cluster_tools.utils.task_utils import import_task_module
+
+
+#
+# Fused Blockwise Tasks
+#
+
+class StagesParameter(luigi.Parameter):
+    """ Parameter for the tuple of tasks to fuse
+    """
+    def normalize(self, x):
+        return tuple(x)
+
+
+class _StageCaptured(Exception):
+    """ Raised to stop `run_impl` of a stage once it has prepared its jobs
+    """
+    pass
+
+
+class FusedBlockwiseBase(luigi.Task):
+    """ FusedBlockwise base class
+
+    Runs a chain of blockwise tasks that share the same blocking in one set of jobs:
+    each job processes a block through all stages before moving on to the next block,
+    and opens the inputs and outputs of the stages only once, see `block_processor`
+    in the modules of the fusable tasks.
+    Data that the stages read through `volume_utils.file_reader` is served from the chunk cache
+    if it was read or written by a previous stage; data that is read by nifty is only
+    in the file system cache, which still avoids the disk if the stages follow each other closely.
+
+    A stage that reads the output of a previous stage with halo (see `halo_inputs`) needs the
+    neighboring blocks of this output, so the chain is split into segments before such a stage;
+    the segments are run one after the other, each with its own set of jobs.
+
+    The stages must be tasks with `fusable = True` that are set up with the same
+    tmp folder and config dir. Stages can depend on each other; dependencies on tasks
+    that are not part of the chain become dependencies of the fused task.
+    The outputs (logs) of the stages are written once their segment has finished.
+    Later tasks must depend on the fused task rather than on the stages: luigi checks
+    if the stages are complete before the fused task has run, so it would run them separately.
+
+    The blocks and config of a stage are captured by running its `run_impl` with `prepare_jobs`
+    and `output` replaced: `prepare_jobs` records its arguments and aborts `run_impl` with `_StageCaptured`.
+    This relies on the contract of `fusable` tasks: everything `run_impl` does before `prepare_jobs`
+    (e.g. creating the output datasets) is done when the stage is captured, so it must not depend on
+    the results of previous stages, and `prepare_jobs` must be called exactly once. A stage that fails
+    before `prepare_jobs` fails the fused task, and a task that does not call `prepare_jobs` at all
+    would run for real, so all stages are checked to be `fusable` before any stage is captured.
+
+    Example:
+        ws_task = WatershedLocal(tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=max_jobs, ...)
+        graph_task = InitialSubGraphsLocal(tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=max_jobs,
+                                           dependency=ws_task, ...)
+        feat_task = BlockEdgeFeaturesLocal(tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=max_jobs,
+                                           dependency=graph_task, ...)
+        fused_task = FusedBlockwiseLocal(tmp_folder=tmp_folder, config_dir=config_dir, max_jobs=max_jobs,
+                                         stages=(ws_task, graph_task, feat_task))
+    """
+
+    task_name = 'fused_blockwise'
+    src_file = os.path.abspath(__file__)
+    supports_block_queue = True
+
+    # the tasks to fuse, in the order they are applied to each block
+    stages = StagesParameter()
+
+    # information about the captured stages, needed to rerun failed blocks
+    stage_infos = None
+    # all blocks of the stages and the stage ids of the segments, see `_segments`
+    all_blocks = None
+    segments = None
+    # the segment that is currently run
+    segment_id = None
+
+    def _job_prefix(self, stages):
+        return '_'.join(stage.task_name for stage in stages)
+
+    def requires(self):
+        deps = []
+        for stage in self.stages:
+            for dep in luigi.task.flatten(stage.requires()):
+                if dep not in self.stages and dep not in deps:
+                    deps.append(dep)
+        return deps
+
+    def output(self):
+        return luigi.LocalTarget(os.path.join(self.tmp_folder,
+                                              '%s_%s.log' % (self.task_name, self._job_prefix(self.stages))))
+
+    @staticmethod
+    def default_task_config():
+        # we use this to get also get the common default config
+        config = LocalTask.default_task_config()
+        # size of the chunk cache in GB, set to 0 to disable it
+        config.update({'chunk_cache_size': 1.})
+        return config
+
+    def get_task_config(self):
+        """ Get the task configuration
+
+        By default, the job resources are chosen such that all stages
+        can run in one job; values in 'config_dir/fused_blockwise.config' take precedence.
+        """
+        config = self.default_task_config()
+        if self.stage_infos is not None:
+            stage_configs = [info['config'] for info in self.stage_infos]
+            config.update({'threads_per_job': max(conf.get('threads_per_job', 1) for conf in stage_configs),
+                           'mem_limit': max(conf.get('mem_limit', 1.) for conf in stage_configs),
+                           'time_limit': sum(conf.get('time_limit', 60) for conf in stage_configs)})
+        config_path = os.path.join(self.config_dir, self.task_name + '.config')
+        if os.path.exists(config_path):
+            self._write_log("reading task config from %s" % config_path)
+            with open(config_path, 'r') as f:
+                config.update(json.load(f))
+        return config
+
+    def _stage_log_path(self, stage):
+        # the stages write to a temporary log, which becomes the
+        # stage output once the segment of the stage has finished
+        return os.path.join(self.tmp_folder, '%s_fused.log' % stage.task_name)
+
+    @contextmanager
+    def _stage_log(self, stage):
+        log_path = self._stage_log_path(stage)
+        stage.output = lambda: luigi.LocalTarget(log_path)
+        try:
+            yield log_path
+        finally:
+            del stage.output
+
+    def _capture_stage(self, stage):
+        """ Run `run_impl` of the stage until it prepares its jobs
+            and return the blocks and config it would have scheduled.
+        """
+        assert getattr(stage, 'fusable', False), "Task %s cannot be fused" % stage.task_name
+        captured = {}
+
+        def prepare_jobs(n_jobs, block_list, config, job_prefix=None, consecutive_blocks=False):
+            captured.update({'block_list': block_list, 'config': config})
+            raise _StageCaptured()
+
+        if os.path.exists(self._stage_log_path(stage)):
+            os.remove(self._stage_log_path(stage))
+        stage.prepare_jobs = prepare_jobs
+        try:
+            with self._stage_log(stage):
+                stage.make_dirs()
+                stage._write_log("Start task %s fused in %s" % (stage.task_name, self.output().path))
+                stage.run_impl()
+        except _StageCaptured:
+            pass
+        finally:
+            del stage.prepare_jobs
+
+        if not captured or captured['block_list'] is None:
+            raise RuntimeError("Stage %s does not schedule blockwise jobs and cannot be fused" % stage.task_name)
+
+        return {'task_name': stage.task_name,
+                'module': stage.__class__.__module__,
+                'src_file': stage.src_file,
+                'config': {**captured['config'], **stage.compression_config(captured['config'])},
+                'block_list': captured['block_list']}
+
+    def _capture_stages(self):
+        # check all stages before capturing any of them, see `_capture_stage`
+        for stage in self.stages:
+            assert getattr(stage, 'fusable', False), "Task %s cannot be fused" % stage.task_name
+            if stage.tmp_folder != self.tmp_folder:
+                raise ValueError("Stage %s does not have the same tmp folder as the fused task" % stage.task_name)
+        stage_infos = [self._capture_stage(stage) for stage in self.stages]
+
+        block_list = stage_infos[0]['block_list']
+        block_shapes = set(tuple(info['config']['block_shape']) for info in stage_infos
+                           if 'block_shape' in info['config'])
+        if len(block_shapes) > 1:
+            raise ValueError("Fused stages must have the same block shape, got %s" % str(block_shapes))
+        for info in stage_infos[1:]:
+            if set(info['block_list']) != set(block_list):
+                raise ValueError("Fused stages must process the same blocks, but %s and %s don't"
+                                 % (stage_infos[0]['task_name'], info['task_name']))
+        for info in stage_infos:
+            info.pop('block_list')
+        return block_list, stage_infos
+
+    def _segments(self):
+        """ Split the stages into segments of stages that can be fused.
+
+        A new segment starts with a stage that reads the output of a stage
+        of the current segment with halo, see `halo_inputs`.
+        """
+        def _datasets(stage, names):
+            return set((os.path.abspath(path), key.strip('/'))
+                       for name, path, key in plan_utils.dataset_params(stage.param_kwargs) if names(name))
+
+        segments, written = [], set()
+        for stage_id, stage in enumerate(self.stages):
+            halo_inputs = _datasets(stage, lambda name: name in stage.halo_inputs)
+            if not segments or halo_inputs & written:
+                segments.append([])
+                written = set()
+            segments[-1].append(stage_id)
+            written |= _datasets(stage, lambda name: name.startswith('output'))
+        return segments
+
+    def _finish_stages(self, segment_id):
+        stages = [self.stages[stage_id] for stage_id in self.segments[segment_id]]
+        job_name = '%s_%s' % (self.task_name, self._job_prefix(stages))
+        for stage in stages:
+            with self._stage_log(stage) as log_path:
+                stage.finish_fused(job_name)
+                stage._write_log("fused in %s" % self.output().path)
+                stage._write_log("Done task %s" % stage.task_name)
+            shutil.move(log_path, stage.output().path)
+
+    def _fail_stages(self):
+        for stage in self.stages:
+            log_path = self._stage_log_path(stage)
+            # the stage has finished in a previous segment
+            if not os.path.exists(log_path):
+                continue
+            fail_path = stage.output().path[:-4] + '_failed.log'
+            with self._stage_log(stage):
+                stage._write_log("fused task %s failed, move log to %s" % (self.output().path, fail_path))
+            shutil.move(log_path, fail_path)
+
+    def _run_segment(self, block_list):
+        stages = [self.stages[stage_id] for stage_id in self.segments[self.segment_id]]
+        job_prefix = self._job_prefix(stages)
+
+        config = self.get_task_config()
+        config.update({'stages': [self.stage_infos[stage_id] for stage_id in self.segments[self.segment_id]]})
+        self._write_log('fusing stages %s for %i blocks' % (', '.join(stage.task_name for stage in stages),
+                                                            len(block_list)))
+
+        n_jobs = min(len(block_list), self.max_jobs)
+        # prime and run the jobs
+        # neighboring blocks read overlapping chunks, so we keep them in the same job if the chunk cache is used
+        self.prepare_jobs(n_jobs, block_list, config, job_prefix,
+                          consecutive_blocks=config.get('chunk_cache_size', 0) > 0)
+        self.submit_jobs(n_jobs, job_prefix)
+
+        # wait till jobs finish and check for job success
+        self.wait_for_jobs(job_prefix)
+        self.check_jobs(n_jobs, job_prefix)
+
+    def run_impl(self):
+        try:
+            # get the global config and init configs
+            shebang = self.global_config_values()[0]
+            self.init(shebang)
+
+            if self.n_retries == 0:
+                self.all_blocks, self.stage_infos = self._capture_stages()
+                self.segments = self._segments()
+                self.segment_id = 0
+                block_list = self.all_blocks
+            # retries run the failed blocks of the current segment and then the remaining segments
+            else:
+                block_list = self.block_list
+
+            while self.segment_id < len(self.segments):
+                segment_id = self.segment_id
+                self._run_segment(block_list)
+                # a retry in `check_jobs` has run the remaining segments already
+                if self.segment_id != segment_id:
+                    return
+                self._finish_stages(segment_id)
+                self.segment_id += 1
+                block_list = self.all_blocks
+        # if the jobs or the set-up of the stages have failed, we need to fail the stages too
+        except Exception as e:
+            self._fail_stages()
+            raise e
+
+
+class FusedBlockwiseLocal(FusedBlockwiseBase, LocalTask):
+    """ FusedBlockwise on local machine
+    """
+    pass
+
+
+class FusedBlockwiseSlurm(FusedBlockwiseBase, SlurmTask):
+    """ FusedBlockwise on slurm cluster
+    """
+    pass
+
+
+class FusedBlockwiseLSF(FusedBlockwiseBase, LSFTask):
+    """ FusedBlockwise on lsf cluster
+    """
+    pass
+
+
+#
+# Implementation
+#
+
+
+def fused_blockwise(job_id, config_path):
+
+    fu.log("start processing job %i" % job_id)
+    fu.log("reading config from %s" % config_path)
+
+    # get the config
+    with open(config_path) as f:
+        config = json.load(f)
+
+    # the chunk cache serves the data that was read or written by the previous stages for a block
+    with cu.chunk_cache(config.get('chunk_cache_size', 0)), ExitStack() as stack:
+        processors = []
+        for stage in config['stages']:
+            fu.log("set up stage %s" % stage['task_name'])
+            module = import_task_module(stage['module'], stage['src_file'])
+            processors.append(stack.enter_context(module.block_processor(stage['config'])))
+
+        for block_id in qu.blocks_for_job(config):
+            fu.log("start processing block %i" % block_id)
+            for process_block in processors:
+                process_block(block_id)
+            fu.log_block_success(block_id)
+
+    fu.log_job_success(job_id)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+    assert os.path.exists(path), path
+    job_id = int(os.path.split(path)[1].split('.')[0].split('_')[-1])
+    fused_blockwise(job_id, path)
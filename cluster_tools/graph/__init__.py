@@ -1 +1,5 @@
-from .graph_workflow import GraphWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.graph_workflow': ['GraphWorkflow'],
+})
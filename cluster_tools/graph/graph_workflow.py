@@ -12,6 +12,9 @@ class GraphWorkflow(WorkflowBase):
     graph_path = luigi.Parameter()
     output_key = luigi.Parameter()
     n_scales = luigi.IntParameter(default=1)
+    # set to false if the sub-graphs are computed by the dependency,
+    # e.g. fused with other blockwise tasks, see `fusion.FusedBlockwise`
+    compute_sub_graphs = luigi.BoolParameter(default=True)
 
     # for now we only support n5 / zarr input labels
     def _check_input(self):
@@ -22,15 +25,17 @@ class GraphWorkflow(WorkflowBase):
     def requires(self):
         self._check_input()
 
-        initial_task = getattr(initial_tasks,
-                               self._get_task_name('InitialSubGraphs'))
-        dep = initial_task(tmp_folder=self.tmp_folder,
-                           max_jobs=self.max_jobs,
-                           config_dir=self.config_dir,
-                           input_path=self.input_path,
-                           input_key=self.input_key,
-                           graph_path=self.graph_path,
-                           dependency=self.dependency)
+        dep = self.dependency
+        if self.compute_sub_graphs:
+            initial_task = getattr(initial_tasks,
+                                   self._get_task_name('InitialSubGraphs'))
+            dep = initial_task(tmp_folder=self.tmp_folder,
+                               max_jobs=self.max_jobs,
+                               config_dir=self.config_dir,
+                               input_path=self.input_path,
+                               input_key=self.input_key,
+                               graph_path=self.graph_path,
+                               dependency=dep)
         merge_task = getattr(merge_tasks,
                              self._get_task_name('MergeSubGraphs'))
         for scale in range(1, self.n_scales):
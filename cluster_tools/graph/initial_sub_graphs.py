@@ -3,6 +3,7 @@
 import os
 import sys
 import json
+from contextlib import contextmanager
 
 import luigi
 import nifty.tools as nt
@@ -24,6 +25,8 @@ class InitialSubGraphsBase(luigi.Task):
 
     task_name = 'initial_sub_graphs'
     src_file = os.path.abspath(__file__)
+    fusable = True
+    halo_inputs = ('input',)
 
     # input volumes and graph
     input_path = luigi.Parameter()
@@ -70,9 +73,9 @@ class InitialSubGraphsBase(luigi.Task):
             g.attrs['ignore_label'] = config['ignore_label']
 
             g.require_dataset('nodes', shape=shape, chunks=block_shape,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.graph_path), dtype='uint64')
             g.require_dataset('edges', shape=shape, chunks=block_shape,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.graph_path), dtype='uint64')
 
         if self.n_retries == 0:
             block_list = vu.blocks_in_volume(shape, block_shape, roi_begin, roi_end)
@@ -113,9 +116,8 @@ class InitialSubGraphsLSF(InitialSubGraphsBase, LSFTask):
 #
 
 
-def _graph_block(block_id, blocking, input_path, input_key, graph_path,
-                 ignore_label):
-    fu.log("start processing block %i" % block_id)
+def _extract_sub_graph(block_id, blocking, input_path, input_key, graph_path,
+                       ignore_label):
     block = blocking.getBlock(block_id)
     # we only need the halo into one direction,
     # hence we use the outer-block only for the end coordinate
@@ -127,10 +129,35 @@ def _graph_block(block_id, blocking, input_path, input_key, graph_path,
                                       ignore_label,
                                       increaseRoi=True,
                                       serializeToVarlen=True)
+
+
+def _graph_block(block_id, blocking, input_path, input_key, graph_path,
+                 ignore_label):
+    fu.log("start processing block %i" % block_id)
+    _extract_sub_graph(block_id, blocking, input_path, input_key, graph_path,
+                       ignore_label)
     # log block success
     fu.log_block_success(block_id)
 
 
+def _get_blocking(config):
+    shape = vu.get_shape(config['input_path'], config['input_key'])
+    return nt.blocking(roiBegin=[0, 0, 0],
+                       roiEnd=list(shape),
+                       blockShape=list(config['block_shape']))
+
+
+@contextmanager
+def block_processor(config):
+    """ Yield a function that extracts the sub-graph of a single block, see `fusion.FusedBlockwise`.
+    """
+    blocking = _get_blocking(config)
+    ignore_label = config.get('ignore_label', True)
+    yield lambda block_id: _extract_sub_graph(block_id, blocking,
+                                              config['input_path'], config['input_key'],
+                                              config['graph_path'], ignore_label)
+
+
 def initial_sub_graphs(job_id, config_path):
 
     fu.log("start processing job %i" % job_id)
@@ -141,15 +168,11 @@ def initial_sub_graphs(job_id, config_path):
         config = json.load(f)
     input_path = config['input_path']
     input_key = config['input_key']
-    block_shape = config['block_shape']
     block_list = config['block_list']
     graph_path = config['graph_path']
     ignore_label = config.get('ignore_label', True)
 
-    shape = vu.get_shape(input_path, input_key)
-    blocking = nt.blocking(roiBegin=[0, 0, 0],
-                           roiEnd=list(shape),
-                           blockShape=list(block_shape))
+    blocking = _get_blocking(config)
 
     for block_id in block_list:
         _graph_block(block_id, blocking, input_path, input_key, graph_path,
@@ -50,7 +50,7 @@ class MapEdgeIdsBase(luigi.Task):
             chunks = g['edges'].chunks
 
             g.require_dataset('edge_ids', shape=shape, chunks=chunks,
-                              dtype='uint64', compression='gzip')
+                              dtype='uint64', **self.compression_options(self.graph_path))
 
         factor = 2**self.scale
         block_shape = tuple(sh * factor for sh in block_shape)
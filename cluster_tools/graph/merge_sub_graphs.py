@@ -44,10 +44,10 @@ class MergeSubGraphsBase(luigi.Task):
         output_key = 's%i/sub_graphs' % self.scale
         node_key = os.path.join(output_key, 'nodes')
         f.require_dataset(node_key, shape=shape, chunks=block_shape,
-                          compression='gzip', dtype='uint64')
+                          **self.compression_options(self.graph_path), dtype='uint64')
         edge_key = os.path.join(output_key, 'edges')
         f.require_dataset(edge_key, shape=shape, chunks=block_shape,
-                          compression='gzip', dtype='uint64')
+                          **self.compression_options(self.graph_path), dtype='uint64')
 
     def run_impl(self):
         # get the global config and init configs
@@ -71,7 +71,7 @@ class MergeSubGraphsBase(luigi.Task):
         # as well as block shape
         config.update({'graph_path': self.graph_path, 'block_shape': block_shape,
                        'scale': self.scale, 'merge_complete_graph': self.merge_complete_graph,
-                       'output_key': self.output_key})
+                       'output_key': self.output_key, 'roi_begin': roi_begin, 'roi_end': roi_end})
 
         factor = 2**self.scale
         block_shape = tuple(sh * factor for sh in block_shape)
@@ -137,16 +137,19 @@ def _merge_graph(graph_path, output_key, scale,
         f[output_key].attrs['shape'] = shape
 
 
-def _merge_subblocks(block_id, blocking, previous_blocking, graph_path, output_key, scale):
+def _merge_subblocks(block_id, blocking, previous_blocking, previous_blocks,
+                     graph_path, output_key, scale):
     fu.log("start processing block %i" % block_id)
     block = blocking.getBlock(block_id)
     input_key = 's%i/sub_graphs' % (scale - 1,)
     block_list = previous_blocking.getBlockIdsInBoundingBox(roiBegin=block.begin,
                                                             roiEnd=block.end,
                                                             blockHalo=[0, 0, 0])
+    # only the blocks of the previous scale in the roi and the block mask have sub-graphs
+    block_list = [sub_block_id for sub_block_id in block_list.tolist() if sub_block_id in previous_blocks]
     ndist.mergeSubgraphs(graph_path,
                          subgraphKey=input_key,
-                         blockIds=block_list.tolist(),
+                         blockIds=block_list,
                          outKey=output_key, serializeToVarlen=True)
     # log block success
     fu.log_block_success(block_id)
@@ -188,8 +191,10 @@ def merge_sub_graphs(job_id, config_path):
         previous_blocking = nt.blocking(roiBegin=[0, 0, 0],
                                         roiEnd=list(shape),
                                         blockShape=previous_block_shape)
+        previous_blocks = set(vu.blocks_in_volume(shape, previous_block_shape,
+                                                  config.get('roi_begin', None), config.get('roi_end', None)))
         for block_id in block_list:
-            _merge_subblocks(block_id, blocking, previous_blocking,
+            _merge_subblocks(block_id, blocking, previous_blocking, previous_blocks,
                              graph_path, output_key, scale)
 
     fu.log_job_success(job_id)
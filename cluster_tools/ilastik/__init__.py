@@ -1,2 +1,6 @@
-from .ilastik_workflow import IlastikPredictionWorkflow, IlastikCarvingWorkflow
-from .stack_predictions import StackPredictionsLocal, StackPredictionsSlurm, StackPredictionsLSF
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.ilastik_workflow': ['IlastikPredictionWorkflow', 'IlastikCarvingWorkflow'],
+    '.stack_predictions': ['StackPredictionsLocal', 'StackPredictionsSlurm', 'StackPredictionsLSF'],
+})
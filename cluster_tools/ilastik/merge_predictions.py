@@ -50,7 +50,7 @@ class MergePredictionsBase(luigi.Task):
             chunks = (1,) + chunks
 
         with vu.file_reader(self.output_path) as f:
-            f.require_dataset(self.output_key, shape=shape, compression='gzip',
+            f.require_dataset(self.output_key, shape=shape, **self.compression_options(self.output_path),
                               dtype='float32', chunks=chunks)
 
         # update the config with input and output paths and keys
@@ -71,7 +71,7 @@ class PredictionBase(luigi.Task):
             dtype = config.get('dtype', 'float32')
             with vu.file_reader(self.output_path) as f:
                 f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                                  dtype=dtype, compression='gzip')
+                                  dtype=dtype, **self.compression_options(self.output_path))
 
         n_jobs = min(len(block_list), self.max_jobs)
         # prime and run the jobs
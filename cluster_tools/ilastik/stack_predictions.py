@@ -63,7 +63,7 @@ class StackPredictionsBase(luigi.Task):
 
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=out_shape, chunks=chunks,
-                              dtype=self.dtype, compression='gzip')
+                              dtype=self.dtype, **self.compression_options(self.output_path))
 
         n_jobs = min(len(block_list), self.max_jobs)
         # prime and run the jobs
@@ -1,3 +1,7 @@
-from .inference import InferenceLSF, InferenceLocal, InferenceSlurm
-from .multiscale_inference import MultiscaleInferenceLSF, MultiscaleInferenceLocal, MultiscaleInferenceSlurm
-from .multiscale_inference_vis import view_multiscale_inputs
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.inference': ['InferenceLSF', 'InferenceLocal', 'InferenceSlurm'],
+    '.multiscale_inference': ['MultiscaleInferenceLSF', 'MultiscaleInferenceLocal', 'MultiscaleInferenceSlurm'],
+    '.multiscale_inference_vis': ['view_multiscale_inputs'],
+})
@@ -12,6 +12,8 @@ import nifty.tools as nt
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.queue_utils as qu
+import cluster_tools.utils.cache_utils as cu
 from cluster_tools.utils.task_utils import DummyTask
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 from cluster_tools.inference.frameworks import get_predictor, get_preprocessor
@@ -29,6 +31,8 @@ class InferenceBase(luigi.Task):
 
     task_name = 'inference'
     src_file = os.path.abspath(__file__)
+    supports_block_queue = True
+    supports_block_splitting = True
 
     # input volume, output volume and inference parameter
     input_path = luigi.Parameter()
@@ -50,11 +54,11 @@ class InferenceBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'dtype': 'uint8', 'compression': 'gzip', 'chunks': None,
+        config.update({'dtype': 'uint8', 'compression': None, 'chunks': None,
                        'device_mapping': None, 'use_best': True, 'tda_config': {},
                        'prep_model': None, "gpu_type": "2080Ti",
                        'channel_accumulation': None, 'mixed_precision': False,
-                       'preprocess_kwargs': {}})
+                       'preprocess_kwargs': {}, 'chunk_cache_size': 0.})
         return config
 
     def clean_up_for_retry(self, block_list):
@@ -75,7 +79,7 @@ class InferenceBase(luigi.Task):
         # load the task config
         config = self.get_task_config()
         dtype = config.pop('dtype', 'uint8')
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         chunks = config.pop('chunks', None)
         assert dtype in ('uint8', 'float32')
 
@@ -107,7 +111,7 @@ class InferenceBase(luigi.Task):
                     out_chunks = chunks
 
                 f.require_dataset(out_key, shape=out_shape,
-                                  chunks=out_chunks, dtype=dtype, compression=compression)
+                                  chunks=out_chunks, dtype=dtype, **compression_opts)
 
         # update the config
         config.update({'input_path': self.input_path, 'input_key': self.input_key,
@@ -125,10 +129,13 @@ class InferenceBase(luigi.Task):
         else:
             block_list = self.block_list
             self.clean_up_for_retry(block_list)
+            block_list, config = self.split_blocks_for_retry(block_list, config, shape, chunks)
 
         n_jobs = min(len(block_list), self.max_jobs)
         # prime and run the jobs
-        self.prepare_jobs(n_jobs, block_list, config)
+        # neighboring blocks read overlapping chunks, so we keep them in the same job if the chunk cache is used
+        self.prepare_jobs(n_jobs, block_list, config,
+                          consecutive_blocks=config.get('chunk_cache_size', 0) > 0)
         self.submit_jobs(n_jobs)
 
         # wait till jobs finish and check for job success
@@ -214,7 +221,7 @@ def _to_uint8(data, float_range=(0., 1.), safe_scale=True):
     return np.clip((data*mult+add).round(), 0, 255).astype('uint8')
 
 
-def _run_inference(blocking, block_list, halo, ds_in, ds_out, mask,
+def _run_inference(blocking, block_batches, halo, ds_in, ds_out, mask,
                    preprocess, predict, channel_mapping, channel_accumulation,
                    n_threads):
 
@@ -316,15 +323,18 @@ def _run_inference(blocking, block_list, halo, ds_in, ds_out, mask,
         return 1
 
     # iterate over the blocks in block list, get the input data and predict
-    results = []
-    for block_id in block_list:
-        res = tz.pipe(block_id, log1, load_input,
-                      preprocess_impl, predict_impl,
-                      write_output, log2)
-        results.append(res)
+    n_success = 0
+    for block_list in block_batches:
+        results = []
+        for block_id in block_list:
+            res = tz.pipe(block_id, log1, load_input,
+                          preprocess_impl, predict_impl,
+                          write_output, log2)
+            results.append(res)
 
-    success = dask.compute(*results, scheduler='threads', num_workers=n_threads)
-    fu.log('Finished prediction for %i blocks' % sum(success))
+        success = dask.compute(*results, scheduler='threads', num_workers=n_threads)
+        n_success += sum(success)
+    fu.log('Finished prediction for %i blocks' % n_success)
 
 
 def inference(job_id, config_path):
@@ -340,7 +350,6 @@ def inference(job_id, config_path):
     output_path = config['output_path']
     checkpoint_path = config['checkpoint_path']
     block_shape = config['block_shape']
-    block_list = config['block_list']
     halo = config['halo']
     framework = config['framework']
     n_threads = config['threads_per_job']
@@ -387,7 +396,10 @@ def inference(job_id, config_path):
                            roiEnd=list(shape),
                            blockShape=list(block_shape))
 
-    with vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
+    # the chunk cache avoids reading the overlapping halos of neighboring blocks several times,
+    # it is shared by all threads
+    with cu.chunk_cache(config.get('chunk_cache_size', 0)),\
+            vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
 
         ds_in = f_in[input_key]
         ds_out = [f_out[key] for key in output_keys]
@@ -399,7 +411,9 @@ def inference(job_id, config_path):
             fu.log("Have loaded mask")
         else:
             mask = None
-        _run_inference(blocking, block_list, halo, ds_in, ds_out, mask,
+        # if the blocks are pulled from a queue, we pull enough blocks to keep all threads busy
+        block_batches = qu.block_batches_for_job(config, batch_size=2 * n_threads)
+        _run_inference(blocking, block_batches, halo, ds_in, ds_out, mask,
                        preprocess, predict, channel_mapping,
                        channel_accumulation, n_threads)
     fu.log_job_success(job_id)
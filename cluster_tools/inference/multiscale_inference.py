@@ -56,7 +56,7 @@ class MultiscaleInferenceBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'dtype': 'uint8', 'compression': 'gzip', 'chunks': None,
+        config.update({'dtype': 'uint8', 'compression': None, 'chunks': None,
                        'gpu_type': '2080Ti', 'device_mapping': None,
                        'use_best': True, 'prep_model': None, 'channel_accumulation': None})
         return config
@@ -70,7 +70,7 @@ class MultiscaleInferenceBase(luigi.Task):
         # load the task config
         config = self.get_task_config()
         dtype = config.pop('dtype', 'uint8')
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         chunks = config.pop('chunks', None)
         assert dtype in ('uint8', 'float32')
 
@@ -119,7 +119,7 @@ class MultiscaleInferenceBase(luigi.Task):
                         this_key = os.path.join(out_key, scale)
                         f.require_dataset(this_key, shape=out_shape,
                                           chunks=out_chunks, dtype=dtype,
-                                          compression=compression)
+                                          **compression_opts)
                 else:
                     if n_channels > 1 and channel_accumulation is None:
                         out_shape = (n_channels,) + shape
@@ -129,7 +129,7 @@ class MultiscaleInferenceBase(luigi.Task):
                         out_chunks = chunks
 
                     f.require_dataset(out_key, shape=out_shape,
-                                      chunks=out_chunks, dtype=dtype, compression=compression)
+                                      chunks=out_chunks, dtype=dtype, **compression_opts)
 
         # update the config
         config.update({'input_path': self.input_path, 'input_key': self.input_key,
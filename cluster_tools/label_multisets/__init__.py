@@ -1 +1,5 @@
-from .label_multiset_workflow import LabelMultisetWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.label_multiset_workflow': ['LabelMultisetWorkflow'],
+})
@@ -9,6 +9,7 @@ import nifty.tools as nt
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 # this is a task called by multiple processes,
@@ -150,6 +151,7 @@ def create_multiset(job_id, config_path):
 
     block_shape = list(config['block_shape'])
     block_list = config['block_list']
+    n_threads = config.get('threads_per_job', 1)
 
     # read the output config
     output_path = config['output_path']
@@ -166,8 +168,8 @@ def create_multiset(job_id, config_path):
             ds_in = LabelMultisetWrapper(ds_in)
         ds_out = f_out[output_key]
 
-        for block_id in block_list:
-            _create_multiset_block(blocking, block_id, ds_in, ds_out)
+        pu.map_blocks(lambda block_id: _create_multiset_block(blocking, block_id, ds_in, ds_out),
+                      block_list, n_threads)
 
         if job_id == 0:
             max_id = ds_in.attrs['maxId']
@@ -1 +1,5 @@
-from .learning_workflow import LearningWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.learning_workflow': ['LearningWorkflow'],
+})
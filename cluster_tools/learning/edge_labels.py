@@ -9,6 +9,7 @@ import luigi
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -119,7 +120,7 @@ def edge_labels(job_id, config_path):
     chunks = (min(262144, n_edges),)
     with vu.file_reader(output_path) as f:
         f.create_dataset(output_key, data=edge_labels,
-                         chunks=chunks, compression='gzip')
+                         chunks=chunks, **compression_options(output_path, config))
 
     fu.log_job_success(job_id)
 
@@ -1 +1,5 @@
-from .lifted_feature_workflow import LiftedFeaturesFromNodeLabelsWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.lifted_feature_workflow': ['LiftedFeaturesFromNodeLabelsWorkflow'],
+})
@@ -7,6 +7,7 @@ import luigi
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 #
@@ -121,7 +122,7 @@ def clear_lifted_edges_from_labels(job_id, config_path):
         # remove the old dataset
         del f[lifted_edge_key]
         ds = f.create_dataset(lifted_edge_key, shape=lifted_edges.shape, chunks=chunks,
-                              compression='gzip', dtype=lifted_edges.dtype)
+                              **compression_options(lifted_edge_path, config), dtype=lifted_edges.dtype)
         ds.n_threads = n_threads
         ds[:] = lifted_edges
 
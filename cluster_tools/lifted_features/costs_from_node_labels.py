@@ -64,7 +64,7 @@ class CostsFromNodeLabelsBase(luigi.Task):
         chunk_size = min(262144, n_lifted_edges)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=(n_lifted_edges,),
-                              chunks=(chunk_size,), compression='gzip',
+                              chunks=(chunk_size,), **self.compression_options(self.output_path),
                               dtype='float32')
 
         # update the config with input and graph paths and keys
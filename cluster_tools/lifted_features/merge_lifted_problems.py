@@ -9,6 +9,7 @@ import z5py
 import luigi
 
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -126,14 +127,14 @@ def merge_lifted_problems(job_id, config_path):
 
     edge_out_key = edge_root % out_prefix
     edge_chunks = (min(len(edges), 100000), 2)
-    ds_edges_out = f.require_dataset(edge_out_key, shape=edges.shape, compression='gzip',
+    ds_edges_out = f.require_dataset(edge_out_key, shape=edges.shape, **compression_options(path, config),
                                      dtype=edges.dtype, chunks=edge_chunks)
     ds_edges_out.n_threads = n_threads
     ds_edges_out[:] = edges
 
     cost_out_key = cost_root % out_prefix
     cost_chunks = (min(len(costs), 100000),)
-    ds_costs_out = f.require_dataset(cost_out_key, shape=costs.shape, compression='gzip',
+    ds_costs_out = f.require_dataset(cost_out_key, shape=costs.shape, **compression_options(path, config),
                                      dtype=costs.dtype, chunks=cost_chunks)
     ds_costs_out.n_threads = n_threads
     ds_costs_out[:] = costs
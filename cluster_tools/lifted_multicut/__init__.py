@@ -1 +1,6 @@
-from .lifted_multicut_workflow import LiftedMulticutWorkflow, SubLiftedSolutionsWorkflow, ReducedLiftedSolutionWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.lifted_multicut_workflow': ['LiftedMulticutWorkflow', 'SubLiftedSolutionsWorkflow',
+                                  'ReducedLiftedSolutionWorkflow'],
+})
@@ -16,6 +16,7 @@ from vigra.analysis import relabelConsecutive
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 #
@@ -223,7 +224,8 @@ def _serialize_new_problem(problem_path,
                            new_lifted_uvs, new_lifted_costs,
                            shape, scale, initial_block_shape,
                            n_threads, roi_begin, roi_end,
-                           lifted_prefix):
+                           lifted_prefix,
+                           compression_opts):
 
     assert len(new_costs) == len(new_uv_ids)
     assert len(new_lifted_uvs) == len(new_lifted_costs)
@@ -283,7 +285,7 @@ def _serialize_new_problem(problem_path,
         ser_chunks = (min(data.shape[0], 262144), 2) if data.ndim == 2 else\
             (min(data.shape[0], 262144),)
         ds_ser = out_group.require_dataset(name, dtype=dtype, shape=data.shape,
-                                           chunks=ser_chunks, compression='gzip')
+                                           chunks=ser_chunks, **compression_opts)
         ds_ser.n_threads = n_threads
         ds_ser[:] = data
 
@@ -411,7 +413,8 @@ def reduce_lifted_problem(job_id, config_path):
                                          new_lifted_uvs, new_lifted_costs,
                                          shape, scale, initial_block_shape,
                                          n_threads, roi_begin, roi_end,
-                                         lifted_prefix)
+                                         lifted_prefix,
+                                         compression_options(problem_path, config))
 
     fu.log("Reduced graph from %i to %i nodes; %i to %i edges; %i to %i lifted edges." % (n_nodes, n_new_nodes,
                                                                                           n_edges, n_new_edges,
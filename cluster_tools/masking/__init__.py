@@ -1 +1,5 @@
-from .minfilter import MinfilterLocal, MinfilterSlurm, MinfilterLSF
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.minfilter': ['MinfilterLocal', 'MinfilterSlurm', 'MinfilterLSF'],
+})
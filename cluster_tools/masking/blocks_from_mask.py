@@ -3,12 +3,8 @@
 import os
 import sys
 import json
-from concurrent import futures
 
-import numpy as np
 import luigi
-import nifty.tools as nt
-from elf.wrapper.resized_volume import ResizedVolume
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
@@ -78,23 +74,6 @@ class BlocksFromMaskLSF(BlocksFromMaskBase, LSFTask):
 #
 
 
-def _get_blocks_in_mask(mask, blocking, n_threads):
-
-    def check_block(block_id):
-        block = blocking.getBlock(block_id)
-        bb = vu.block_to_bb(block)
-        mask_bb = mask[bb]
-        return block_id if np.sum(mask_bb) > 0 else None
-
-    with futures.ThreadPoolExecutor(n_threads) as tp:
-        tasks = [tp.submit(check_block, block_id)
-                 for block_id in range(blocking.numberOfBlocks)]
-        blocks_in_mask = [t.result() for t in tasks]
-    blocks_in_mask = [block_id for block_id
-                      in blocks_in_mask if block_id is not None]
-    return blocks_in_mask
-
-
 def blocks_from_mask(job_id, config_path):
 
     fu.log("start processing job %i" % job_id)
@@ -110,15 +89,9 @@ def blocks_from_mask(job_id, config_path):
     block_shape = config['block_shape']
     n_threads = config.get('threads_per_job', 1)
 
-    # NOTE we assume that the mask is small and will fit into memory
-    with vu.file_reader(mask_path, 'r') as f:
-        ds = f[mask_key]
-        ds.n_threads = n_threads
-        mask_data = ds[:]
-    mask = ResizedVolume(mask_data, tuple(shape))
-
-    blocking = nt.blocking([0, 0, 0], shape, list(block_shape))
-    blocks_in_mask = _get_blocks_in_mask(mask, blocking, n_threads)
+    # NOTE we assume that the mask is small and will fit into memory;
+    # the blocks are checked at the resolution of the mask, see vu.blocks_in_mask
+    blocks_in_mask = vu.blocks_in_mask(mask_path, mask_key, shape, block_shape, n_threads=n_threads)
 
     with open(output_path, 'w') as f:
         json.dump(blocks_in_mask, f)
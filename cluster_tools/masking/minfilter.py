@@ -24,6 +24,8 @@ class MinfilterBase(luigi.Task):
 
     task_name = 'minfilter'
     src_file = os.path.abspath(__file__)
+    # the minfilter computes a mask, so it must not be restricted to the block mask
+    allow_block_mask = False
 
     # input and output volumes
     input_path = luigi.Parameter()
@@ -60,7 +62,7 @@ class MinfilterBase(luigi.Task):
         chunks = tuple(bs // 2 for bs in block_shape)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.output_path), dtype='uint64')
 
         # update the config with input and output paths and keys
         # as well as block shape
@@ -1 +1,5 @@
-from .mesh_workflow import MeshWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.mesh_workflow': ['MeshWorkflow'],
+})
@@ -10,6 +10,7 @@ import nifty.distributed as ndist
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -61,7 +62,7 @@ class BlockMorphologyBase(luigi.Task):
             f.require_dataset(self.output_key, shape=shape,
                               dtype='float64',
                               chunks=tuple(block_shape),
-                              compression='gzip')
+                              **self.compression_options(self.output_path))
 
         if self.n_retries == 0:
             block_list = vu.blocks_in_volume(shape, block_shape,
@@ -153,6 +154,7 @@ def block_morphology(job_id, config_path):
 
     block_shape = config['block_shape']
     block_list = config['block_list']
+    n_threads = config.get('threads_per_job', 1)
 
     with vu.file_reader(input_path, 'r') as f:
         shape = f[input_key].shape
@@ -163,9 +165,9 @@ def block_morphology(job_id, config_path):
 
     with vu.file_reader(input_path, 'r') as f_in:
         ds_in = f_in[input_key]
-        [_morphology_for_block(block_id, blocking, ds_in,
-                               output_path, output_key)
-         for block_id in block_list]
+        pu.map_blocks(lambda block_id: _morphology_for_block(block_id, blocking, ds_in,
+                                                             output_path, output_key),
+                      block_list, n_threads)
     fu.log_job_success(job_id)
 
 
@@ -52,7 +52,7 @@ class MergeMorphologyBase(luigi.Task):
         # create output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=out_shape,
-                              chunks=out_chunks, compression='gzip',
+                              chunks=out_chunks, **self.compression_options(self.output_path),
                               dtype='float64')
 
         # update the config with input and graph paths and keys
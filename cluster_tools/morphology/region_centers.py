@@ -60,7 +60,7 @@ class RegionCentersBase(luigi.Task):
         # require output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=(number_of_labels, 3),
-                              chunks=(id_chunks, 3), dtype='float32', compression='gzip')
+                              chunks=(id_chunks, 3), dtype='float32', **self.compression_options(self.output_path))
 
         # update the config with input and graph paths and keys
         # as well as block shape
@@ -16,6 +16,7 @@ from vigra.analysis import relabelConsecutive
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 #
@@ -222,7 +223,8 @@ def _serialize_new_problem(problem_path,
                            node_labeling, edge_labeling,
                            new_costs, new_initial_node_labeling,
                            shape, scale, initial_block_shape,
-                           n_threads, roi_begin, roi_end):
+                           n_threads, roi_begin, roi_end,
+                           compression_opts):
 
     next_scale = scale + 1
     f_out = z5py.File(problem_path)
@@ -274,7 +276,7 @@ def _serialize_new_problem(problem_path,
         ser_chunks = (min(data.shape[0], 262144), 2) if data.ndim == 2 else\
             (min(data.shape[0], 262144),)
         ds_ser = out_group.require_dataset(name, dtype=dtype, shape=data.shape,
-                                           chunks=ser_chunks, compression='gzip')
+                                           chunks=ser_chunks, **compression_opts)
         ds_ser.n_threads = n_threads
         ds_ser[:] = data
 
@@ -369,7 +371,8 @@ def reduce_problem(job_id, config_path):
                                          node_labeling, edge_labeling,
                                          new_costs, new_initial_node_labeling,
                                          shape, scale, initial_block_shape,
-                                         n_threads, roi_begin, roi_end)
+                                         n_threads, roi_begin, roi_end,
+                                         compression_options(problem_path, config))
 
     fu.log("Reduced graph from %i to %i nodes; %i to %i edges." % (n_nodes, n_new_nodes,
                                                                    n_edges, n_new_edges))
@@ -11,6 +11,7 @@ from elf.segmentation.multicut import get_multicut_solver
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 #
@@ -177,7 +178,7 @@ def solve_global(job_id, config_path):
         ds = f.require_dataset(assignment_key, dtype='uint64',
                                shape=node_shape,
                                chunks=chunks,
-                               compression='gzip')
+                               **compression_options(assignment_path, config))
         ds.n_threads = n_threads
         ds[:] = initial_node_labeling
 
@@ -82,7 +82,7 @@ class SubSolutionsBase(luigi.Task):
         # make output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, dtype='uint64',
-                              chunks=(25, 256, 256), compression='gzip')
+                              chunks=(25, 256, 256), **self.compression_options(self.output_path))
 
         factor = 2**self.scale
         block_shape = tuple(bs * factor for bs in block_shape)
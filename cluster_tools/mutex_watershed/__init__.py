@@ -1 +1,5 @@
-from .mws_workflow import TwoPassMwsWorkflow, MwsWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.mws_workflow': ['TwoPassMwsWorkflow', 'MwsWorkflow'],
+})
@@ -12,6 +12,8 @@ from elf.segmentation.mutex_watershed import mutex_watershed
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.cache_utils as cu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -41,7 +43,7 @@ class MwsBlocksBase(luigi.Task):
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
         config.update({'strides': [1, 1, 1], 'randomize_strides': False,
-                       'size_filter': 25, 'noise_level': 0.})
+                       'size_filter': 25, 'noise_level': 0., 'chunk_cache_size': 0.})
         return config
 
     def requires(self):
@@ -81,17 +83,19 @@ class MwsBlocksBase(luigi.Task):
         chunks = tuple(min(ch, sh) for ch, sh in zip(chunks, shape))
 
         # make output dataset
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key,  shape=shape, dtype='uint64',
-                              compression=compression, chunks=chunks)
+                              **compression_opts, chunks=chunks)
 
         block_list = vu.blocks_in_volume(shape, block_shape, roi_begin, roi_end,
                                          block_list_path=block_list_path)
 
         n_jobs = min(len(block_list), self.max_jobs)
         # prime and run the jobs
-        self.prepare_jobs(n_jobs, block_list, config)
+        # neighboring blocks read overlapping chunks, so we keep them in the same job if the chunk cache is used
+        self.prepare_jobs(n_jobs, block_list, config,
+                          consecutive_blocks=config.get('chunk_cache_size', 0) > 0)
         self.submit_jobs(n_jobs)
         # wait till jobs finish and check for job success
         self.wait_for_jobs()
@@ -193,11 +197,14 @@ def mws_blocks(job_id, config_path):
     noise_level = config['noise_level']
 
     halo = config['halo']
+    n_threads = config.get('threads_per_job', 1)
 
     mask_path = config.get('mask_path', '')
     mask_key = config.get('mask_key', '')
 
-    with vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
+    # the chunk cache avoids reading the overlapping halos of neighboring blocks several times
+    with cu.chunk_cache(config.get('chunk_cache_size', 0)),\
+            vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
 
         ds_in = f_in[input_key]
         ds_out = f_out[output_key]
@@ -210,11 +217,12 @@ def mws_blocks(job_id, config_path):
         else:
             mask = None
 
-        [_mws_block(block_id, blocking,
-                    ds_in, ds_out,
-                    mask, offsets,
-                    strides, randomize_strides,
-                    halo, noise_level) for block_id in block_list]
+        pu.map_blocks(lambda block_id: _mws_block(block_id, blocking,
+                                                  ds_in, ds_out,
+                                                  mask, offsets,
+                                                  strides, randomize_strides,
+                                                  halo, noise_level),
+                      block_list, n_threads)
     fu.log_job_success(job_id)
 
 
@@ -12,6 +12,7 @@ import numpy as np
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -148,7 +149,7 @@ def two_pass_assignments(job_id, config_path):
     with vu.file_reader(assignments_path) as f:
         chunk_size = min(int(1e6), len(node_labels))
         chunks = (chunk_size,)
-        ds = f.create_dataset(assignments_key, data=node_labels, compression='gzip',
+        ds = f.create_dataset(assignments_key, data=node_labels, **compression_options(assignments_path, config),
                               chunks=chunks)
 
     fu.log_job_success(job_id)
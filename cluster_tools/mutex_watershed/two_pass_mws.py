@@ -92,10 +92,10 @@ class TwoPassMwsBase(luigi.Task):
         chunks = tuple(min(ch, sh) for ch, sh in zip(chunks, shape))
 
         # make output dataset
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key,  shape=shape, dtype='uint64',
-                              compression=compression, chunks=chunks)
+                              **compression_opts, chunks=chunks)
 
         blocking = nt.blocking([0, 0, 0], list(shape), list(block_shape))
         block_lists = vu.make_checkerboard_block_lists(blocking, roi_begin, roi_end)
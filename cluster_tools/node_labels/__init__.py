@@ -1 +1,5 @@
-from .node_label_workflow import NodeLabelWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.node_label_workflow': ['NodeLabelWorkflow'],
+})
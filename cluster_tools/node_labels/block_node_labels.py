@@ -13,6 +13,7 @@ from elf.io.label_multiset_wrapper import LabelMultisetWrapper
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -80,7 +81,7 @@ class BlockNodeLabelsBase(luigi.Task):
             ds_out = f.require_dataset(self.output_key, shape=shape,
                                        dtype='uint64',
                                        chunks=chunks,
-                                       compression='gzip')
+                                       **self.compression_options(self.output_path))
             # need to serialize the label max-id here for
             # the merge_node_labels task
             ds_out.attrs['maxId'] = int(max_id)
@@ -184,6 +185,7 @@ def block_node_labels(job_id, config_path):
     block_shape = config['block_shape']
     block_list = config['block_list']
     ignore_label = config['ignore_label']
+    n_threads = config.get('threads_per_job', 1)
 
     with vu.file_reader(ws_path, 'r') as f:
         shape = f[ws_key].shape
@@ -215,10 +217,10 @@ def block_node_labels(job_id, config_path):
         ds_ws = f_in[ws_key]
         if ds_ws.attrs.get('isLabelMultiset', False):
             ds_ws = LabelMultisetWrapper(ds_ws)
-        [_labels_for_block(block_id, blocking,
-                           ds_ws, output_path, output_key,
-                           labels, ignore_label)
-         for block_id in block_list]
+        pu.map_blocks(lambda block_id: _labels_for_block(block_id, blocking,
+                                                         ds_ws, output_path, output_key,
+                                                         labels, ignore_label),
+                      block_list, n_threads)
 
     f_lab.close()
     fu.log_job_success(job_id)
@@ -73,7 +73,7 @@ class MergeNodeLabelsBase(luigi.Task):
         # create output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=node_shape,
-                              chunks=node_chunks, compression='gzip',
+                              chunks=node_chunks, **self.compression_options(self.output_path),
                               dtype='uint64')
 
         # prime and run the jobs
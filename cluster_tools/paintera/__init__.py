@@ -1 +1,5 @@
-from .conversion_workflow import ConversionWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.conversion_workflow': ['ConversionWorkflow'],
+})
@@ -1,6 +1,7 @@
-from .postprocess_workflow import SizeFilterWorkflow
-from .postprocess_workflow import FilterLabelsWorkflow
-from .postprocess_workflow import FilterByThresholdWorkflow
-from .postprocess_workflow import FilterOrphansWorkflow
-from .postprocess_workflow import SizeFilterAndGraphWatershedWorkflow
-from .postprocess_workflow import ConnectedComponentsWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.postprocess_workflow': ['SizeFilterWorkflow', 'FilterLabelsWorkflow', 'FilterByThresholdWorkflow',
+                              'FilterOrphansWorkflow', 'SizeFilterAndGraphWatershedWorkflow',
+                              'ConnectedComponentsWorkflow'],
+})
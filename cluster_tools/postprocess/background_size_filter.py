@@ -63,7 +63,7 @@ class BackgroundSizeFilterBase(luigi.Task):
             if self.output_key in f:
                 chunks = f[self.output_key].chunks
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              dtype='uint64', compression='gzip')
+                              dtype='uint64', **self.compression_options(self.output_path))
 
         # we don't need any additional config besides the paths
         res_path = self._parse_log(self.input().path)
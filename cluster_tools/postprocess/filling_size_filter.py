@@ -65,7 +65,7 @@ class FillingSizeFilterBase(luigi.Task):
         with vu.file_reader(self.output_path) as f:
             if self.output_key not in f:
                 f.require_dataset(self.output_key, shape=shape, chunks=tuple(block_shape),
-                                  dtype='uint64', compression='gzip')
+                                  dtype='uint64', **self.compression_options(self.output_path))
 
         # we don't need any additional config besides the paths
         res_path = self._parse_log(self.input().path)
@@ -61,7 +61,7 @@ class FilterBlocksBase(luigi.Task):
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape,
                               dtype='uint64', chunks=chunks,
-                              compression='gzip')
+                              **self.compression_options(self.output_path))
 
         if self.n_retries == 0:
             block_list = vu.blocks_in_volume(shape, block_shape, roi_begin, roi_end,
@@ -9,6 +9,7 @@ import vigra
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 PAINTERA_IGNORE_ID = 18446744073709551615
@@ -140,7 +141,7 @@ def graph_connected_components(job_id, config_path):
 
     with vu.file_reader(output_path) as f:
         ds_out = f.require_dataset(output_key, shape=assignments.shape,
-                                   chunks=chunks, compression='gzip',
+                                   chunks=chunks, **compression_options(output_path, config),
                                    dtype='uint64')
         ds_out.n_threads = n_threads
         ds_out[:] = assignments
@@ -11,6 +11,7 @@ import nifty
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -180,7 +181,7 @@ def graph_watershed_assignments(job_id, config_path):
 
     with vu.file_reader(output_path) as f:
         ds = f.require_dataset(output_key, shape=assignments.shape, chunks=chunks,
-                               compression='gzip', dtype='uint64')
+                               **compression_options(output_path, config), dtype='uint64')
         ds.n_threads = n_threads
         ds[:] = assignments
 
@@ -12,6 +12,7 @@ import nifty.tools as nt
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -146,7 +147,7 @@ def orphan_assignments(job_id, config_path):
 
     with vu.file_reader(output_path) as f:
         ds = f.require_dataset(output_key, shape=assignments.shape, chunks=chunks,
-                               compression='gzip', dtype='uint64')
+                               **compression_options(output_path, config), dtype='uint64')
         ds[:] = assignments
 
     fu.log_job_success(job_id)
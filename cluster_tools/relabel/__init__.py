@@ -1 +1,5 @@
-from .relabel_workflow import RelabelWorkflow, UniqueWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.relabel_workflow': ['RelabelWorkflow', 'UniqueWorkflow'],
+})
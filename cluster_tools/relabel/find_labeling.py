@@ -10,6 +10,7 @@ import numpy as np
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -120,7 +121,7 @@ def find_labeling(job_id, config_path):
         chunk_size = min(int(1e6), len(assignments))
         chunks = (chunk_size, 2)
         ds = vu.force_dataset(f, assignment_key, shape=assignments.shape, dtype='uint64',
-                              compression='gzip', chunks=chunks)
+                              **compression_options(assignment_path, config), chunks=chunks)
         ds.n_threads = n_threads
         ds[:] = assignments
 
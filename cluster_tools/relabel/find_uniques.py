@@ -25,6 +25,8 @@ class FindUniquesBase(luigi.Task):
 
     task_name = 'find_uniques'
     src_file = os.path.abspath(__file__)
+    # the results are saved per job id, so the jobs can't be re-executed speculatively
+    allow_speculation = False
 
     input_path = luigi.Parameter()
     input_key = luigi.Parameter()
@@ -10,6 +10,7 @@ import numpy as np
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -111,7 +112,7 @@ def merge_uniques(job_id, config_path):
         chunk_size = min(int(1e6), len(uniques))
         chunks = (chunk_size,)
         ds = f.create_dataset(output_key, shape=uniques.shape, dtype='uint64',
-                              compression='gzip', chunks=chunks)
+                              **compression_options(output_path, config), chunks=chunks)
         ds.n_threads = n_threads
         ds[:] = uniques
 
@@ -64,7 +64,7 @@ class SkeletonizeBase(luigi.Task):
         # require output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=(self.number_of_labels,),
-                              chunks=(1,), compression='gzip', dtype='uint64')
+                              chunks=(1,), **self.compression_options(self.output_path), dtype='uint64')
         # update the config
         config.update({'number_of_labels': self.number_of_labels,
                        'block_len': block_len})
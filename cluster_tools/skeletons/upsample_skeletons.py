@@ -65,7 +65,7 @@ class UpsampleSkeletonsBase(luigi.Task):
         chunks = (25, 256, 256)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.output_path), dtype='uint64')
 
         # update the config with input and output paths and keys
         # as well as block shape
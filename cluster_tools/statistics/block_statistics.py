@@ -23,6 +23,8 @@ class BlockStatisticsBase(luigi.Task):
 
     task_name = 'block_statistics'
     src_file = os.path.abspath(__file__)
+    # the results are saved per job id, so the jobs can't be re-executed speculatively
+    allow_speculation = False
 
     path = luigi.Parameter()
     key = luigi.Parameter()
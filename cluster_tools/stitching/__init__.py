@@ -1 +1,5 @@
-from .stitching_workflows import StitchingAssignmentsWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.stitching_workflows': ['StitchingAssignmentsWorkflow'],
+})
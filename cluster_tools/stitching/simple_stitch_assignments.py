@@ -10,6 +10,7 @@ import numpy as np
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -132,7 +133,7 @@ def simple_stitch_assignments(job_id, config_path):
         with vu.file_reader(assignments_path) as f:
             chunks = (min(int(1e6), len(merge_edges)),)
             ds = f.require_dataset(assignments_key, shape=merge_edges.shape,
-                                   compression='gzip',
+                                   **compression_options(assignments_path, config),
                                    chunks=chunks, dtype='uint8')
             ds[:] = merge_edges.astype('uint8')
         fu.log_job_success(job_id)
@@ -155,8 +156,8 @@ def simple_stitch_assignments(job_id, config_path):
 
     with vu.file_reader(assignments_path) as f:
         chunks = (min(int(1e5), len(node_labeling)),)
-        ds = f.require_dataset(assignments_key, shape=node_labeling.shape, compression='gzip',
-                               chunks=chunks, dtype='uint64')
+        ds = f.require_dataset(assignments_key, shape=node_labeling.shape, chunks=chunks, dtype='uint64',
+                               **compression_options(assignments_path, config))
         ds[:] = node_labeling
 
     fu.log_job_success(job_id)
@@ -9,6 +9,7 @@ import nifty.distributed as ndist
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -114,7 +115,7 @@ def simple_stitch_edges(job_id, config_path):
 
     with vu.file_reader(out_path) as f:
         chunks = (min(int(1e6), len(res)),)
-        vu.force_dataset(f, out_key, data=res.astype('uint8'), compression='gzip',
+        vu.force_dataset(f, out_key, data=res.astype('uint8'), **compression_options(out_path, config),
                          chunks=chunks, shape=res.shape)
 
     fu.log_job_success(job_id)
@@ -9,6 +9,7 @@ import numpy as np
 import nifty
 import vigra
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 import cluster_tools.utils.volume_utils as vu
 from elf.segmentation.multicut import get_multicut_solver, transform_probabilities_to_costs
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
@@ -154,7 +155,7 @@ def stitching_multicut(job_id, config_path):
     with vu.file_reader(output_path) as f:
         chunks = (min(int(1e6), len(node_labels)),)
         ds = f.require_dataset(output_key, shape=node_labels.shape, chunks=chunks,
-                               compression='gzip', dtype=node_labels.dtype)
+                               **compression_options(output_path, config), dtype=node_labels.dtype)
         ds.n_threads = n_threads
         ds[:] = node_labels
 
@@ -1 +1,5 @@
-from .thresholded_components_workflow import ThresholdedComponentsWorkflow, ThresholdAndWatershedWorkflow
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.thresholded_components_workflow': ['ThresholdedComponentsWorkflow', 'ThresholdAndWatershedWorkflow'],
+})
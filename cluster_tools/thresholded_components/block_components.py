@@ -11,6 +11,7 @@ from skimage.morphology import label
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -100,10 +101,10 @@ class BlockComponentsBase(luigi.Task):
         chunks = tuple(min(ch, sh) for ch, sh in zip(chunks, shape))
 
         # make output dataset
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key,  shape=shape, dtype='uint64',
-                              compression=compression, chunks=chunks)
+                              **compression_opts, chunks=chunks)
 
         block_list = vu.blocks_in_volume(shape, block_shape,
                                          roi_begin, roi_end)
@@ -140,63 +141,18 @@ class BlockComponentsLSF(BlockComponentsBase, LSFTask):
     pass
 
 
-def _cc_block(block_id, blocking,
-              ds_in, ds_out, threshold,
-              threshold_mode, channel, sigma):
-    fu.log("start processing block %i" % block_id)
-    block = blocking.getBlock(block_id)
-
-    bb = vu.block_to_bb(block)
-    if channel is None:
-        input_ = ds_in[bb]
-    else:
-        channel_ = [channel] if isinstance(channel, int) else channel
-        in_shape = (len(channel_),) + tuple(b.stop - b.start for b in bb)
-        input_ = np.zeros(in_shape, dtype=ds_in.dtype)
-        for chan_id, chan in enumerate(channel_):
-            bb_inp = (slice(chan, chan + 1),) + bb
-            input_[chan_id] = ds_in[bb_inp].squeeze()
-        input_ = np.mean(input_, axis=0)
-
-    input_ = vu.normalize(input_)
-    if sigma > 0:
-        input_ = vu.apply_filter(input_, 'gaussianSmoothing', sigma)
-        input_ = vu.normalize(input_)
-
-    if threshold_mode == 'greater':
-        input_ = input_ > threshold
-    elif threshold_mode == 'less':
-        input_ = input_ < threshold
-    elif threshold_mode == 'equal':
-        input_ = input_ == threshold
-    else:
-        raise RuntimeError("Thresholding Mode %s not supported" % threshold_mode)
-
-    if np.sum(input_) == 0:
-        fu.log_block_success(block_id)
-        return 0
-
-    components = label(input_)
-    ds_out[bb] = components
-    fu.log_block_success(block_id)
-    return int(components.max()) + 1
-
-
-def _cc_block_with_mask(block_id, blocking,
-                        ds_in, ds_out, threshold,
-                        threshold_mode, mask,
-                        channel, sigma):
-    fu.log("start processing block %i" % block_id)
+def _read_cc_block(block_id, blocking, ds_in, mask, channel):
     block = blocking.getBlock(block_id)
     bb = vu.block_to_bb(block)
 
     # get the mask and check if we have any pixels
-    in_mask = mask[bb].astype('bool')
-    if np.sum(in_mask) == 0:
-        fu.log_block_success(block_id)
-        return 0
+    if mask is None:
+        in_mask = None
+    else:
+        in_mask = mask[bb].astype('bool')
+        if np.sum(in_mask) == 0:
+            return None
 
-    bb = vu.block_to_bb(block)
     if channel is None:
         input_ = ds_in[bb]
     else:
@@ -207,7 +163,11 @@ def _cc_block_with_mask(block_id, blocking,
             bb_inp = (slice(chan, chan + 1),) + bb
             input_[chan_id] = ds_in[bb_inp].squeeze()
         input_ = np.mean(input_, axis=0)
+    return bb, input_, in_mask
+
 
+# returns the connected components or None if there is no foreground
+def _cc_block(input_, in_mask, threshold, threshold_mode, sigma):
     input_ = vu.normalize(input_)
     if sigma > 0:
         input_ = vu.apply_filter(input_, 'gaussianSmoothing', sigma)
@@ -222,15 +182,12 @@ def _cc_block_with_mask(block_id, blocking,
     else:
         raise RuntimeError("Thresholding Mode %s not supported" % threshold_mode)
 
-    input_[np.logical_not(in_mask)] = 0
+    if in_mask is not None:
+        input_[np.logical_not(in_mask)] = 0
     if np.sum(input_) == 0:
-        fu.log_block_success(block_id)
-        return 0
+        return None
 
-    components = label(input_)
-    ds_out[bb] = components
-    fu.log_block_success(block_id)
-    return int(components.max()) + 1
+    return label(input_)
 
 
 def block_components(job_id, config_path):
@@ -273,17 +230,28 @@ def block_components(job_id, config_path):
 
         if mask_path != '':
             mask = vu.load_mask(mask_path, mask_key, shape)
-            offsets = [_cc_block_with_mask(block_id, blocking,
-                                           ds_in, ds_out, threshold,
-                                           threshold_mode, mask, channel,
-                                           sigma) for block_id in block_list]
-
         else:
-            offsets = [_cc_block(block_id, blocking,
-                                 ds_in, ds_out, threshold,
-                                 threshold_mode, channel, sigma) for block_id in block_list]
-
-    offset_dict = {block_id: off for block_id, off in zip(block_list, offsets)}
+            mask = None
+
+        offsets = {}
+
+        def process_block(block_id, data):
+            components = None if data is None else _cc_block(data[1], data[2], threshold,
+                                                             threshold_mode, sigma)
+            if components is None:
+                offsets[block_id] = 0
+                return None
+            offsets[block_id] = int(components.max()) + 1
+            return data[0], components
+
+        # we read the next blocks and write the results in the background while computing the components,
+        # with multiple threads, the I/O of the different threads overlaps already
+        pu.run_pipelined(block_list,
+                         read_block=lambda block_id: _read_cc_block(block_id, blocking, ds_in, mask, channel),
+                         process_block=process_block, ds_out=ds_out,
+                         n_threads=config.get('threads_per_job', 1))
+
+    offset_dict = {block_id: offsets[block_id] for block_id in block_list}
     save_path = os.path.join(tmp_folder,
                              'connected_components_offsets_%i.json' % job_id)
     with open(save_path, 'w') as f:
@@ -11,6 +11,7 @@ import nifty.tools as nt
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -150,6 +151,7 @@ def block_faces(job_id, config_path):
     tmp_folder = config['tmp_folder']
     offsets_path = config['offsets_path']
     block_shape = config['block_shape']
+    n_threads = config.get('threads_per_job', 1)
 
     with open(offsets_path) as f:
         offsets_dict = json.load(f)
@@ -162,9 +164,9 @@ def block_faces(job_id, config_path):
         shape = list(ds.shape)
 
         blocking = nt.blocking([0, 0, 0], shape, block_shape)
-        assignments = [_process_faces(block_id, blocking, ds,
-                                      offsets, empty_blocks)
-                       for block_id in block_list]
+        assignments = pu.map_blocks(lambda block_id: _process_faces(block_id, blocking, ds,
+                                                                    offsets, empty_blocks),
+                                    block_list, n_threads)
     # filter out empty assignments
     assignments = [ass for ass in assignments if ass is not None]
     if assignments:
@@ -12,6 +12,7 @@ import nifty.ufd as nufd
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+from cluster_tools.utils.compression_utils import compression_options
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -136,7 +137,7 @@ def merge_assignments(job_id, config_path):
     chunks = (min(65334, n_labels),)
     with vu.file_reader(output_path) as f:
         f.create_dataset(output_key, data=label_assignments,
-                         compression='gzip', chunks=chunks)
+                         **compression_options(output_path, config), chunks=chunks)
 
     fu.log_job_success(job_id)
 
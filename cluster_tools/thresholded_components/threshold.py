@@ -88,10 +88,10 @@ class ThresholdBase(luigi.Task):
         chunks = tuple(min(ch, sh) for ch, sh in zip(chunks, shape))
 
         # make output dataset
-        compression = config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, config)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key,  shape=shape, dtype='uint8',
-                              compression=compression, chunks=chunks)
+                              **compression_opts, chunks=chunks)
 
         block_list = vu.blocks_in_volume(shape, block_shape, roi_begin, roi_end,
                                          block_list_path=block_list_path)
@@ -1,4 +1,6 @@
-from .transformation_workflows import (AffineTransformationWorkflow,
-                                       LinearTransformationWorkflow,
-                                       TransformixCoordinateTransformationWorkflow,
-                                       TransformixTransformationWorkflow)
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.transformation_workflows': ['AffineTransformationWorkflow', 'LinearTransformationWorkflow',
+                                  'TransformixCoordinateTransformationWorkflow', 'TransformixTransformationWorkflow'],
+})
@@ -43,7 +43,7 @@ class AffineBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'chunks': None, 'compression': 'gzip',
+        config.update({'chunks': None, 'compression': None,
                        'fill_value': 0, 'sigma_anti_aliasing': None})
         return config
 
@@ -68,7 +68,7 @@ class AffineBase(luigi.Task):
 
         # load the config
         task_config = self.get_task_config()
-        compression = task_config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, task_config)
         chunks = task_config.pop('chunks', None)
         if chunks is None:
             chunks = block_shape
@@ -76,7 +76,7 @@ class AffineBase(luigi.Task):
         # require output dataset
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=self.shape, chunks=tuple(chunks),
-                              compression=compression, dtype=dtype)
+                              **compression_opts, dtype=dtype)
 
         # update the config with input and output paths and keys
         # as well as block shape
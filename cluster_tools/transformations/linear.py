@@ -38,7 +38,7 @@ class LinearBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'chunks': None, 'compression': 'gzip'})
+        config.update({'chunks': None, 'compression': None})
         return config
 
     def requires(self):
@@ -60,7 +60,7 @@ class LinearBase(luigi.Task):
 
         # load the config
         task_config = self.get_task_config()
-        compression = task_config.pop('compression', 'gzip')
+        compression_opts = self.compression_options(self.output_path, task_config)
         chunks = task_config.pop('chunks', None)
         if chunks is None:
             chunks = tuple(bs // 2 for bs in block_shape)
@@ -69,7 +69,7 @@ class LinearBase(luigi.Task):
             # require output dataset
             with vu.file_reader(self.output_path) as f:
                 f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                                  compression=compression, dtype=dtype)
+                                  **compression_opts, dtype=dtype)
 
         # update the config with input and output paths and keys
         # as well as block shape
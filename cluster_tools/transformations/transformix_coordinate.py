@@ -41,7 +41,7 @@ class TransformixCoordinateBase(luigi.Task):
     def default_task_config():
         # we use this to get also get the common default config
         config = LocalTask.default_task_config()
-        config.update({'chunks': None, 'compression': 'gzip'})
+        config.update({'chunks': None, 'compression': None})
         return config
 
     def requires(self):
@@ -105,11 +105,11 @@ class TransformixCoordinateBase(luigi.Task):
         chunks = config['chunks']
         if chunks is None:
             chunks = block_shape
-        compression = config['compression']
+        compression_opts = self.compression_options(self.output_path, config)
 
         with open_file(self.output_path, 'a') as f:
             f.require_dataset(self.output_key, shape=self.shape, chunks=tuple(chunks),
-                              compression=compression, dtype=dtype)
+                              **compression_opts, dtype=dtype)
 
         trafo_file = self.update_transformations()
         # we don't need any additional config besides the paths
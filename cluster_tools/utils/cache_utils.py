@@ -0,0 +1,283 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import product
+
+import numpy as np
+
+
+class ChunkCache:
+    """ LRU cache for decompressed chunks, bounded by the number of bytes it holds.
+
+    The cache is thread-safe, so it can be shared by all threads of a job.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+        # events for the chunks that are currently being loaded
+        self._loading = {}
+
+    def get(self, key):
+        with self._lock:
+            chunk = self._chunks.get(key, None)
+            if chunk is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._chunks.move_to_end(key)
+            return chunk
+
+    def get_or_load(self, key, load):
+        """ Get the chunk from the cache or load it with `load` and put it into the cache.
+
+        If several threads request the same chunk at the same time,
+        it is only loaded once and the other threads wait for it.
+        """
+        with self._lock:
+            chunk = self._chunks.get(key, None)
+            if chunk is not None:
+                self.hits += 1
+                self._chunks.move_to_end(key)
+                return chunk
+            event = self._loading.get(key, None)
+            is_loading = event is not None
+            if is_loading:
+                self.hits += 1
+            else:
+                self.misses += 1
+                event = threading.Event()
+                self._loading[key] = event
+
+        if is_loading:
+            event.wait()
+            with self._lock:
+                chunk = self._chunks.get(key, None)
+            # the chunk was not cached (because it is too large or was evicted already)
+            return load() if chunk is None else chunk
+
+        try:
+            chunk = load()
+            self.put(key, chunk)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+        return chunk
+
+    def put(self, key, chunk):
+        # we don't cache chunks that would evict the whole cache
+        if chunk.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            prev = self._chunks.pop(key, None)
+            if prev is not None:
+                self.n_bytes -= prev.nbytes
+            self._chunks[key] = chunk
+            self.n_bytes += chunk.nbytes
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self._chunks.popitem(last=False)
+                self.n_bytes -= evicted.nbytes
+
+    def invalidate(self, key):
+        with self._lock:
+            prev = self._chunks.pop(key, None)
+            if prev is not None:
+                self.n_bytes -= prev.nbytes
+
+    def invalidate_prefix(self, prefix):
+        """ Invalidate all chunks with keys starting with `prefix`.
+        """
+        with self._lock:
+            keys = [key for key in self._chunks if key[:len(prefix)] == prefix]
+            for key in keys:
+                self.n_bytes -= self._chunks.pop(key).nbytes
+
+    def __len__(self):
+        return len(self._chunks)
+
+
+class CachedDataset:
+    """ Wraps a chunked dataset so that reads are served from a `ChunkCache`.
+
+    Reads with slices (and integers) are assembled from whole chunks; other reads are passed
+    to the dataset. Writes are passed to the dataset as well; chunks that are fully covered by
+    a write are put into the cache, other chunks overlapping the write are invalidated.
+    """
+    _own_attributes = ('_ds', '_cache', '_cache_key')
+
+    def __init__(self, ds, cache, cache_key):
+        object.__setattr__(self, '_ds', ds)
+        object.__setattr__(self, '_cache', cache)
+        object.__setattr__(self, '_cache_key', cache_key)
+
+    def __getattr__(self, name):
+        return getattr(self._ds, name)
+
+    def __setattr__(self, name, value):
+        if name in self._own_attributes:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._ds, name, value)
+
+    def __len__(self):
+        return len(self._ds)
+
+    def _normalize_index(self, index):
+        """ Return the bounding box and the axes to squeeze for index
+            or None if index is not supported by the cache.
+        """
+        index = index if isinstance(index, tuple) else (index,)
+        if any(ind is Ellipsis for ind in index):
+            if sum(ind is Ellipsis for ind in index) > 1:
+                return None
+            pos = next(ii for ii, ind in enumerate(index) if ind is Ellipsis)
+            fill = (slice(None),) * (self._ds.ndim - len(index) + 1)
+            index = index[:pos] + fill + index[pos + 1:]
+        index = index + (slice(None),) * (self._ds.ndim - len(index))
+        if len(index) != self._ds.ndim:
+            return None
+
+        bb, squeeze = [], []
+        for axis, (ind, dim) in enumerate(zip(index, self._ds.shape)):
+            if isinstance(ind, (int, np.integer)):
+                ind = int(ind) + dim if ind < 0 else int(ind)
+                if not 0 <= ind < dim:
+                    return None
+                bb.append(slice(ind, ind + 1))
+                squeeze.append(axis)
+            elif isinstance(ind, slice):
+                if ind.step not in (None, 1):
+                    return None
+                start, stop, _ = ind.indices(dim)
+                bb.append(slice(start, max(start, stop)))
+            else:
+                return None
+        return tuple(bb), tuple(squeeze)
+
+    def _chunk_ids(self, bb):
+        chunks = self._ds.chunks
+        ranges = [range(b.start // ch, (b.stop - 1) // ch + 1) if b.stop > b.start else range(0)
+                  for b, ch in zip(bb, chunks)]
+        return product(*ranges)
+
+    def _chunk_bb(self, chunk_id):
+        return tuple(slice(cid * ch, min((cid + 1) * ch, sh))
+                     for cid, ch, sh in zip(chunk_id, self._ds.chunks, self._ds.shape))
+
+    def _read_chunk(self, chunk_id):
+        key = self._cache_key + (chunk_id,)
+        return self._cache.get_or_load(key, lambda: np.asarray(self._ds[self._chunk_bb(chunk_id)]))
+
+    def __getitem__(self, index):
+        normalized = self._normalize_index(index)
+        if normalized is None:
+            return self._ds[index]
+        bb, squeeze = normalized
+
+        out = np.empty(tuple(b.stop - b.start for b in bb), dtype=self._ds.dtype)
+        for chunk_id in self._chunk_ids(bb):
+            chunk_bb = self._chunk_bb(chunk_id)
+            # the overlap of request and chunk in global coordinates
+            overlap = tuple(slice(max(b.start, cb.start), min(b.stop, cb.stop))
+                            for b, cb in zip(bb, chunk_bb))
+            out_bb = tuple(slice(ov.start - b.start, ov.stop - b.start) for ov, b in zip(overlap, bb))
+            chunk_local_bb = tuple(slice(ov.start - cb.start, ov.stop - cb.start)
+                                   for ov, cb in zip(overlap, chunk_bb))
+            out[out_bb] = self._read_chunk(chunk_id)[chunk_local_bb]
+        return out.squeeze(axis=squeeze) if squeeze else out
+
+    def __setitem__(self, index, value):
+        self._ds[index] = value
+        normalized = self._normalize_index(index)
+        # we don't know which chunks were written, so we need to drop all chunks of this dataset
+        if normalized is None:
+            self._cache.invalidate_prefix(self._cache_key)
+            return
+        bb, squeeze = normalized
+        value = np.asarray(value)
+        shape = tuple(b.stop - b.start for b in bb)
+        for chunk_id in self._chunk_ids(bb):
+            key = self._cache_key + (chunk_id,)
+            chunk_bb = self._chunk_bb(chunk_id)
+            covered = all(b.start <= cb.start and cb.stop <= b.stop for b, cb in zip(bb, chunk_bb))
+            if covered:
+                local_bb = tuple(slice(cb.start - b.start, cb.stop - b.start) for cb, b in zip(chunk_bb, bb))
+                chunk = np.broadcast_to(value, shape) if value.shape != shape else value
+                self._cache.put(key, np.array(chunk[local_bb], dtype=self._ds.dtype))
+            else:
+                self._cache.invalidate(key)
+
+
+class CachedFile:
+    """ Wraps a file so that the chunked datasets it returns read through a `ChunkCache`.
+    """
+    def __init__(self, f, path, cache):
+        self._f = f
+        self._path = os.path.abspath(path)
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self._f.__exit__(*args)
+
+    def __contains__(self, key):
+        return key in self._f
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __getitem__(self, key):
+        obj = self._f[key]
+        if getattr(obj, 'chunks', None) is None or not hasattr(obj, 'shape'):
+            return obj
+        return CachedDataset(obj, self._cache, (self._path, key.strip('/')))
+
+
+# the cache shared by all files opened via `volume_utils.file_reader` in this process
+_chunk_cache = None
+
+
+def enable_chunk_cache(max_bytes):
+    """ Enable the chunk cache for all datasets opened via `volume_utils.file_reader` in this process.
+    """
+    global _chunk_cache
+    _chunk_cache = ChunkCache(max_bytes)
+    return _chunk_cache
+
+
+def disable_chunk_cache():
+    global _chunk_cache
+    _chunk_cache = None
+
+
+def get_chunk_cache():
+    return _chunk_cache
+
+
+@contextmanager
+def chunk_cache(size):
+    """ Enable the chunk cache with `size` GB for all datasets opened via
+        `volume_utils.file_reader` in this context.
+
+    Does nothing if `size` is 0 or if the cache is already enabled, e.g. by a fused job.
+    Use it to avoid decompressing the same chunks several times in jobs
+    that read overlapping blocks, e.g. blocks with halo.
+    """
+    if size <= 0 or _chunk_cache is not None:
+        yield _chunk_cache
+        return
+    cache = enable_chunk_cache(int(size * 1e9))
+    try:
+        yield cache
+    finally:
+        disable_chunk_cache()
@@ -0,0 +1,59 @@
+import os
+
+# hdf5 supports only gzip and lzf natively, the other codecs need hdf5plugin
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+HDF5_EXTENSIONS = ('.h5', '.hdf5', '.hdf')
+
+# the supported codecs, lz4 and zstd are used via blosc
+CODECS = ('raw', 'gzip', 'lzf', 'blosc', 'lz4', 'zstd')
+DEFAULT_LEVELS = {'gzip': 5, 'blosc': 5, 'lz4': 5, 'zstd': 3}
+
+
+def _blosc_codec(compression):
+    # plain 'blosc' uses lz4, which is the fastest codec blosc provides
+    return 'lz4' if compression == 'blosc' else compression
+
+
+def _h5_options(compression, level):
+    if compression == 'raw':
+        return {'compression': None}
+    if compression == 'lzf':
+        return {'compression': 'lzf'}
+    if compression == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': level}
+    if hdf5plugin is None:
+        raise ValueError("Compression %s for hdf5 needs hdf5plugin, which is not available" % compression)
+    return dict(hdf5plugin.Blosc(cname=_blosc_codec(compression), clevel=level,
+                                 shuffle=hdf5plugin.Blosc.SHUFFLE))
+
+
+def _n5_options(compression, level):
+    if compression == 'raw':
+        return {'compression': 'raw'}
+    if compression == 'lzf':
+        raise ValueError("Compression lzf is only supported for hdf5")
+    if compression == 'gzip':
+        return {'compression': 'gzip', 'level': level}
+    return {'compression': 'blosc', 'codec': _blosc_codec(compression), 'level': level, 'shuffle': 1}
+
+
+def compression_options(path, config):
+    """ Keyword arguments for creating a dataset in the file at `path`
+        with the codec given by 'compression' and 'compression_level' in `config`.
+
+    The codec must be one of `CODECS`, the level defaults to the codec's default level.
+    The options are translated to the h5py arguments for hdf5 files and to
+    the z5py arguments for n5 and zarr files.
+    """
+    compression = config.get('compression', None) or 'gzip'
+    if compression not in CODECS:
+        raise ValueError("Invalid compression %s, expected one of %s" % (compression, ', '.join(CODECS)))
+    level = config.get('compression_level', None)
+    if level is None:
+        level = DEFAULT_LEVELS.get(compression, None)
+    is_h5 = os.path.splitext(path.rstrip('/'))[1].lower() in HDF5_EXTENSIONS
+    return _h5_options(compression, level) if is_h5 else _n5_options(compression, level)
@@ -1,19 +1,41 @@
 from datetime import datetime
 from subprocess import check_output
 
+from .telemetry_utils import get_telemetry, resource_usage
+
 
 # TODO log-levels
 # stdout is always piped to file, sowe can use it as logging
 def log(msg):
     print("%s: %s" % (str(datetime.now()), msg))
-
-
+    # the first log message starts the telemetry of the job and
+    # the block start marker is used to time the block
+    telemetry = get_telemetry()
+    if telemetry is not None and msg.startswith("start processing block"):
+        try:
+            block_id = int(msg.split()[3])
+        except (IndexError, ValueError):
+            block_id = None
+        telemetry.block_start(block_id)
+
+
+# in addition to the log message, block and job success are written
+# to the machine-readable telemetry of the job, see `telemetry_utils`
 def log_block_success(block_id):
     print("%s: processed block %i" % (str(datetime.now()), block_id))
+    telemetry = get_telemetry()
+    if telemetry is not None:
+        telemetry.block_success(block_id)
 
 
 def log_job_success(job_id):
+    telemetry = get_telemetry()
+    # the resource usage is logged first, because the job success must be the last line of the log
+    job_peak_rss, cpu_time = resource_usage() if telemetry is None else telemetry.job_usage()
+    print("%s: peak memory %.3f GB, cpu time %.1f s" % (str(datetime.now()), job_peak_rss / 1.e9, cpu_time))
     print("%s: processed job %i" % (str(datetime.now()), job_id))
+    if telemetry is not None:
+        telemetry.job_success(job_id)
 
 
 # woot, there is no native tail in python ???
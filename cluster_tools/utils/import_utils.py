@@ -0,0 +1,40 @@
+import sys
+import importlib
+
+
+def lazy_exports(package, exports):
+    """ Module level `__getattr__`, `__dir__` and `__all__` for a package that imports its exports on first use.
+
+    Importing the package itself is cheap then; the (heavy) dependencies of a module are only imported
+    when one of its exports is used. Submodules are also imported on attribute access,
+    e.g. `cluster_tools.watershed` after `import cluster_tools`.
+
+    Arguments:
+        package [str] - name of the package, i.e. `__name__` in its `__init__`
+        exports [dict] - maps the (relative) modules of the package to the names they export
+    """
+    modules = {name: module for module, names in exports.items() for name in names}
+
+    def __getattr__(name):
+        if name.startswith('__'):
+            raise AttributeError("module %r has no attribute %r" % (package, name))
+        if name in modules:
+            value = getattr(importlib.import_module(modules[name], package), name)
+        else:
+            submodule = '%s.%s' % (package, name)
+            try:
+                value = importlib.import_module(submodule)
+            except ModuleNotFoundError as e:
+                # only a missing submodule means that the attribute does not exist,
+                # missing dependencies of the submodule are raised as they are
+                if e.name != submodule:
+                    raise
+                raise AttributeError("module %r has no attribute %r" % (package, name)) from None
+        # bind the value to the package, so that it is only looked up once
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(sys.modules[package].__dict__) | set(modules))
+
+    return __getattr__, __dir__, list(modules)
@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+
+from .parse_utils import parse_blocks, parse_blocks_telemetry
+
+
+def config_hash(*configs):
+    """ Hash json serializable configurations.
+    """
+    serialized = json.dumps(configs, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def processed_blocks_since(log_prefix, telemetry_prefix, since):
+    """ Return the blocks logged as processed in all job logs with the given prefix
+        that were written after `since` (in seconds since the epoch).
+
+    Reads the job telemetry if available and the text log otherwise.
+    """
+    log_dir, log_name = os.path.split(log_prefix)
+    pattern = re.compile(r'%s(\d+)\.log$' % re.escape(log_name))
+    job_ids = [int(m.group(1)) for m in map(pattern.match, os.listdir(log_dir)) if m is not None]
+    if telemetry_prefix is not None:
+        telemetry_dir, telemetry_name = os.path.split(telemetry_prefix)
+        pattern = re.compile(r'%s(\d+)\.jsonl$' % re.escape(telemetry_name))
+        if os.path.isdir(telemetry_dir):
+            job_ids.extend(int(m.group(1)) for m in map(pattern.match, os.listdir(telemetry_dir))
+                           if m is not None)
+
+    blocks = set()
+    for job_id in set(job_ids):
+        telemetry_file = None if telemetry_prefix is None else telemetry_prefix + '%i.jsonl' % job_id
+        log_file = log_prefix + '%i.log' % job_id
+        if telemetry_file is not None and os.path.exists(telemetry_file):
+            if os.path.getmtime(telemetry_file) >= since:
+                blocks.update(parse_blocks_telemetry(telemetry_file))
+        elif os.path.exists(log_file) and os.path.getmtime(log_file) >= since:
+            blocks.update(parse_blocks(log_file))
+    return blocks
+
+
+class BlockManifest:
+    """ Persistent record of the blocks of a task that were completed.
+
+    The blocks are stored as a bitmap together with the hash of the
+    configuration they were computed with; if the stored hash differs from
+    `config_hash`, the manifest starts out empty.
+    """
+    def __init__(self, path, config_hash):
+        self.path = path
+        self.config_hash = config_hash
+        self.blocks = set()
+        # time when the jobs of this task were last scheduled
+        self.scheduled_at = None
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with np.load(self.path) as f:
+            if str(f['config_hash']) != self.config_hash:
+                return
+            bitmap = np.unpackbits(f['bitmap'])
+            self.blocks = set(np.flatnonzero(bitmap).tolist())
+            scheduled_at = float(f['scheduled_at'])
+            self.scheduled_at = None if np.isnan(scheduled_at) else scheduled_at
+
+    def add(self, block_ids):
+        self.blocks.update(int(block_id) for block_id in block_ids)
+
+    def save(self):
+        bitmap = np.zeros(max(self.blocks) + 1 if self.blocks else 0, dtype='bool')
+        bitmap[list(self.blocks)] = True
+        scheduled_at = np.nan if self.scheduled_at is None else self.scheduled_at
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # write to a temporary file first, so that a crash does not leave an incomplete manifest
+        tmp_path = self.path + '.tmp%i.npz' % os.getpid()
+        np.savez(tmp_path, bitmap=np.packbits(bitmap), config_hash=self.config_hash,
+                 scheduled_at=scheduled_at)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,4 +1,5 @@
 import os
+import json
 import datetime
 from subprocess import CalledProcessError
 
@@ -48,15 +49,22 @@ def parse_runtime(log_file):
     return diff
 
 
-def parse_runtime_task(log_prefix, max_jobs, return_summary=True):
+def parse_runtime_task(log_prefix, max_jobs, return_summary=True, telemetry_prefix=None):
     """ Parse all runtimes for jobs of a task and retrurn summary
+
+    If `telemetry_prefix` is given, the runtimes are read from the job telemetry if available.
     """
     runtimes = []
     for job_id in range(max_jobs):
-        path = log_prefix + '%i.log' % job_id
-        if not os.path.exists(path):
-            break
-        runtimes.append(parse_runtime(path))
+        runtime = None
+        if telemetry_prefix is not None:
+            runtime = parse_runtime_telemetry(telemetry_prefix + '%i.jsonl' % job_id)
+        if runtime is None:
+            path = log_prefix + '%i.log' % job_id
+            if not os.path.exists(path):
+                break
+            runtime = parse_runtime(path)
+        runtimes.append(runtime)
     if return_summary:
         return (np.mean(runtimes), np.std(runtimes), len(runtimes))
     else:
@@ -115,6 +123,22 @@ def parse_job_lsf(log_file, job_id):
     return False
 
 
+# messages that indicate that a job ran out of memory:
+# python errors, the oom killer (slurm), the memory limit (lsf) and jobs killed by SIGKILL (local)
+OOM_PATTERNS = ('MemoryError', 'oom-kill', 'oom_kill', 'Out Of Memory', 'OUT_OF_MEMORY',
+                'TERM_MEMLIMIT', 'killed by signal 9', 'terminated abruptly')
+
+
+def parse_out_of_memory(log_file):
+    """ Parse log or error file to check whether the corresponding
+        job ran out of memory
+    """
+    if not os.path.exists(log_file):
+        return False
+    with open(log_file, 'r', errors='replace') as f:
+        return any(pattern in line for line in f for pattern in OOM_PATTERNS)
+
+
 ########################
 # Parse processed blocks
 ########################
@@ -135,8 +159,10 @@ def parse_blocks(log_file):
     return blocks
 
 
-def parse_blocks_task(log_prefix, max_jobs, complete_job_list=[]):
+def parse_blocks_task(log_prefix, max_jobs, complete_job_list=[], telemetry_prefix=None):
     """ Parlse all processed blocks for jobs of a task
+
+    If `telemetry_prefix` is given, the blocks are read from the job telemetry if available.
     """
     blocks = []
     for job_id in range(max_jobs):
@@ -145,6 +171,12 @@ def parse_blocks_task(log_prefix, max_jobs, complete_job_list=[]):
         if job_id in complete_job_list:
             continue
 
+        if telemetry_prefix is not None:
+            telemetry_file = telemetry_prefix + '%i.jsonl' % job_id
+            if os.path.exists(telemetry_file):
+                blocks.extend(parse_blocks_telemetry(telemetry_file))
+                continue
+
         log_file = log_prefix + '%i.log' % job_id
         # log might not exist, even if this is not the last job
         if not os.path.exists(log_file):
@@ -152,3 +184,52 @@ def parse_blocks_task(log_prefix, max_jobs, complete_job_list=[]):
         blocks.extend(parse_blocks(log_file))
 
     return blocks
+
+
+#################
+# Parse telemetry
+#################
+
+
+def read_telemetry(path):
+    """ Read all records from a job telemetry file, see `telemetry_utils`
+    """
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            # a job that was killed while writing may leave an incomplete line
+            except ValueError:
+                continue
+    return records
+
+
+def parse_job_telemetry(path, job_id):
+    """ Parse telemetry file to check whether the corresponding
+        job was finished successfully
+    """
+    if not os.path.exists(path):
+        return False
+    return any(record.get('job_id') == job_id and record.get('status') == 'processed'
+               for record in read_telemetry(path))
+
+
+def parse_blocks_telemetry(path):
+    """ Parse telemetry file to return the blocks that were
+        marked as processed
+    """
+    return [record['block_id'] for record in read_telemetry(path)
+            if 'block_id' in record and record.get('status') == 'processed']
+
+
+def parse_runtime_telemetry(path):
+    """ Parse the job run-time from a telemetry file,
+        returns None if the job has not finished successfully
+    """
+    if not os.path.exists(path):
+        return None
+    job_records = [record for record in read_telemetry(path) if 'job_id' in record]
+    if not job_records:
+        return None
+    return job_records[-1]['end'] - job_records[-1]['start']
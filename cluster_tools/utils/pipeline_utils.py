@@ -0,0 +1,159 @@
+import queue
+import threading
+from collections import deque
+from concurrent import futures
+
+from . import function_utils as fu
+
+
+class BlockWriter:
+    """ Writes block outputs in a background thread.
+
+    At most `max_pending` outputs are queued; `submit` blocks if the queue is full,
+    so the memory used for pending outputs is bounded.
+    A block is logged as processed once its output was written.
+    """
+    def __init__(self, ds_out, max_pending=2):
+        self.ds_out = ds_out
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._write_blocks, daemon=True)
+        self._thread.start()
+
+    def _write_blocks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # after an error we only drain the queue, the error is raised by `submit` or `close`
+            if self._error is not None:
+                continue
+            block_id, output = item
+            try:
+                if output is not None:
+                    bb, data = output
+                    self.ds_out[bb] = data
+                fu.log_block_success(block_id)
+            except Exception as e:
+                self._error = e
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, block_id, output):
+        """ Write `output`, which is a tuple of bounding box and data or None if nothing needs to be written.
+        """
+        self._check_error()
+        self._queue.put((block_id, output))
+
+    def close(self):
+        """ Wait for all pending writes.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._check_error()
+
+
+def prefetch_blocks(block_ids, read_block, n_prefetch=2):
+    """ Iterate over `(block_id, read_block(block_id))`, reading the next `n_prefetch` blocks in background threads.
+    """
+    block_ids = iter(block_ids)
+    with futures.ThreadPoolExecutor(n_prefetch) as tp:
+        pending = deque()
+
+        def submit_next():
+            block_id = next(block_ids, None)
+            if block_id is not None:
+                pending.append((block_id, tp.submit(read_block, block_id)))
+
+        for _ in range(n_prefetch):
+            submit_next()
+        while pending:
+            block_id, task = pending.popleft()
+            data = task.result()
+            submit_next()
+            yield block_id, data
+
+
+def map_blocks(process_block, block_ids, n_threads=1):
+    """ Apply `process_block(block_id)` to all blocks with `n_threads` threads and return the results in order.
+
+    The next block is only taken from `block_ids` once a thread is available, so blocks are not
+    popped from a dynamic block queue (see `queue_utils.blocks_for_job`) before they can be processed.
+    """
+    if n_threads <= 1:
+        return [process_block(block_id) for block_id in block_ids]
+
+    block_ids = iter(block_ids)
+    results = []
+    with futures.ThreadPoolExecutor(n_threads) as tp:
+        # maps the running tasks to the position of their block
+        pending = {}
+
+        def submit_next():
+            block_id = next(block_ids, None)
+            if block_id is not None:
+                pending[tp.submit(process_block, block_id)] = len(results)
+                results.append(None)
+
+        for _ in range(n_threads):
+            submit_next()
+        while pending:
+            done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for task in done:
+                # raises the error of a failed block, the blocks that are still running are finished first
+                results[pending.pop(task)] = task.result()
+                submit_next()
+    return results
+
+
+def run_pipelined(block_ids, read_block, process_block, ds_out,
+                  n_prefetch=2, max_pending_writes=2, n_threads=1):
+    """ Process blocks with read-ahead and write-behind, so that I/O overlaps with computation.
+
+    With `n_threads` > 1, the blocks are processed by a thread pool instead, where each thread
+    reads, processes and writes one block at a time; the I/O of the different threads overlaps already.
+
+    Arguments:
+        block_ids [iterable] - the blocks to process.
+        read_block [callable] - reads the input of a block, `read_block(block_id)`;
+            called in background threads for the next `n_prefetch` blocks.
+        process_block [callable] - computes the output of a block, `process_block(block_id, data)`;
+            called in this thread, must return a tuple of output bounding box and data
+            or None if nothing needs to be written.
+        ds_out [dataset] - the output dataset, which is written by a background thread.
+        n_prefetch [int] - number of blocks that are read ahead (default: 2)
+        max_pending_writes [int] - number of outputs that can wait for being written (default: 2)
+        n_threads [int] - number of threads for processing blocks in parallel (default: 1)
+    """
+
+    def _read_block(block_id):
+        fu.log("start processing block %i" % block_id)
+        return read_block(block_id)
+
+    if n_threads > 1:
+        def _process_block(block_id):
+            output = process_block(block_id, _read_block(block_id))
+            if output is not None:
+                bb, data = output
+                ds_out[bb] = data
+            fu.log_block_success(block_id)
+
+        map_blocks(_process_block, block_ids, n_threads)
+        return
+
+    writer = BlockWriter(ds_out, max_pending_writes)
+    try:
+        for block_id, data in prefetch_blocks(block_ids, _read_block, n_prefetch):
+            writer.submit(block_id, process_block(block_id, data))
+    except BaseException as e:
+        # we always wait for the pending writes, so that all blocks that were written are logged,
+        # but an error in writing them must not replace the error that stopped the processing
+        try:
+            writer.close()
+        except Exception as close_error:
+            if close_error is not e:
+                fu.log("error while writing the pending blocks: %s" % str(close_error))
+        raise
+    writer.close()
@@ -0,0 +1,157 @@
+import os
+from itertools import product
+
+import luigi
+import numpy as np
+
+# bytes per voxel for outputs that don't exist yet; most of the blockwise tasks write uint64 labels
+ESTIMATED_ITEMSIZE = 8
+
+
+def task_graph(task):
+    """ All tasks in the dependency graph of `task`, in an order where each task comes after its dependencies.
+    """
+    order, seen = [], set()
+
+    def visit(current):
+        if current.task_id in seen:
+            return
+        seen.add(current.task_id)
+        for dep in luigi.task.flatten(current.requires()):
+            visit(dep)
+        order.append(current)
+
+    visit(task)
+    return order
+
+
+def dataset_params(params):
+    """ The datasets given by `<name>_path` and `<name>_key` in the parameters of a task.
+
+    Returns a list of `(name, path, key)`; datasets that start with `output` are written by the task,
+    all others are assumed to be read.
+    """
+    datasets = []
+    for name, path in params.items():
+        if not (name.endswith('_path') and isinstance(path, str) and path != ''):
+            continue
+        key = params.get(name[:-len('_path')] + '_key', None)
+        if isinstance(key, str) and key != '':
+            datasets.append((name[:-len('_path')], path, key))
+    return datasets
+
+
+def dataset_info(path, key):
+    """ Shape, dtype and chunks of a dataset, None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    from .volume_utils import file_reader
+    with file_reader(path, 'r') as f:
+        if key not in f:
+            return None
+        ds = f[key]
+        chunks = getattr(ds, 'chunks', None)
+        return {'shape': list(ds.shape), 'dtype': str(ds.dtype),
+                'chunks': None if chunks is None else list(chunks)}
+
+
+def covered_bytes(info, roi_begin=None, roi_end=None):
+    """ Number of (uncompressed) bytes of a dataset in the roi, counting all chunks that overlap with it.
+
+    The roi refers to the last three (spatial) axes, leading channel axes are always covered completely.
+    Datasets with less than three axes (e.g. graphs or features) are always covered completely.
+    """
+    shape = info['shape']
+    chunks = info.get('chunks', None) or [1] * len(shape)
+    itemsize = np.dtype(info['dtype']).itemsize if info.get('dtype') else ESTIMATED_ITEMSIZE
+    n_channel_axes = len(shape) - 3
+    extent = []
+    for axis, (sh, ch) in enumerate(zip(shape, chunks)):
+        begin, end = 0, sh
+        spatial_axis = axis - n_channel_axes
+        if n_channel_axes >= 0 and spatial_axis >= 0 and roi_begin is not None:
+            begin = roi_begin[spatial_axis] or 0
+            end = sh if roi_end[spatial_axis] is None else min(roi_end[spatial_axis], sh)
+        # expand to the chunks that are overlapping the roi
+        begin = (begin // ch) * ch
+        end = min(-(-end // ch) * ch, sh)
+        extent.append(max(end - begin, 0))
+    return int(np.prod(extent)) * itemsize
+
+
+def _covered_chunks(chunk_begins, chunk_ends, chunks_per_axis):
+    """ Number of chunks covered by the union of the boxes `[chunk_begins[i], chunk_ends[i])` of the chunk grid.
+    """
+    # mark the boxes in a difference array of the chunk grid and integrate it
+    ndim = len(chunks_per_axis)
+    diff = np.zeros(tuple(n + 1 for n in chunks_per_axis), dtype='int64')
+    for corner in product((0, 1), repeat=ndim):
+        index = tuple(chunk_ends[:, d] if upper else chunk_begins[:, d] for d, upper in enumerate(corner))
+        sign = 1 if sum(corner) % 2 == 0 else -1
+        np.add.at(diff, index, sign)
+    for axis in range(ndim):
+        np.cumsum(diff, axis=axis, out=diff)
+    return int(np.count_nonzero(diff))
+
+
+def chunk_alignment(info, block_shape, block_list):
+    """ Chunk reads of the blocks in `block_list` of a dataset, compared to reading each chunk once.
+
+    Blocks that are not aligned with the chunks touch up to 8 chunks and read chunks that overlap with
+    neighboring blocks again; blocks that are smaller than the chunks read the same chunk several times.
+    Returns a dict with the number of `chunk_reads` and the `extra_chunk_reads` over the number of chunks
+    covered by the blocks, or None if the dataset has no chunks or is not a 3d or 4d volume.
+    The blocking refers to the last three (spatial) axes of the dataset.
+    """
+    shape, chunks = info['shape'], info.get('chunks', None)
+    if chunks is None or len(shape) not in (3, 4):
+        return None
+    from .volume_utils import block_bounding_boxes
+    shape, chunks = np.array(shape[-3:], dtype='int64'), np.array(chunks[-3:], dtype='int64')
+    begins, ends = block_bounding_boxes(shape, block_shape, block_list)
+    chunk_begins = begins // chunks
+    chunk_ends = -(-ends // chunks)
+    chunk_reads = int(np.prod(chunk_ends - chunk_begins, axis=1).sum())
+    covered = _covered_chunks(chunk_begins, chunk_ends, -(-shape // chunks)) if len(begins) else 0
+    return {'block_shape': list(block_shape), 'chunk_reads': chunk_reads,
+            'extra_chunk_reads': chunk_reads - covered}
+
+
+def format_report(report):
+    """ Format the tasks of a dry-run report as a table.
+    """
+    def fmt(value, scale, precision):
+        return '-' if value is None else '%.*f' % (precision, value / scale)
+
+    header = '%-40s %6s %8s %10s %10s %10s %10s' % ('task', 'jobs', 'blocks', 'read [GB]', 'write [GB]',
+                                                    'wall [min]', 'core [h]')
+    lines = [header, '-' * len(header)]
+    rows = report['tasks'] + [dict(report['total'], task='total')]
+    for row in rows:
+        name = row['task'] + (' (done)' if row.get('complete', False) else '')
+        lines.append('%-40s %6s %8s %10s %10s %10s %10s' % (
+            name[:40], '-' if row.get('n_jobs') is None else row['n_jobs'],
+            '-' if row.get('n_blocks') is None else row['n_blocks'],
+            fmt(row['bytes_read'], 1.e9, 2), fmt(row['bytes_written'], 1.e9, 2),
+            fmt(row['wall_time'], 60., 1), fmt(row['core_time'], 3600., 2)))
+    return '\n'.join(lines)
+
+
+def format_alignment(report):
+    """ Format the datasets of a dry-run report that are read with blocks that are not aligned with their chunks.
+    """
+    lines = []
+    for row in report['tasks']:
+        for dataset in row.get('inputs', []):
+            alignment = dataset.get('alignment', None)
+            if alignment is None or alignment['extra_chunk_reads'] == 0:
+                continue
+            n_chunks = alignment['chunk_reads'] - alignment['extra_chunk_reads']
+            lines.append('%s: %s:%s with chunks %s and block shape %s, %i extra chunk reads (%.0f %%)' % (
+                row['task'], dataset['path'], dataset['key'], str(dataset['chunks']), str(alignment['block_shape']),
+                alignment['extra_chunk_reads'], 100. * alignment['extra_chunk_reads'] / max(n_chunks, 1)))
+    if not lines:
+        return ''
+    return '\n'.join(['blocks that are not aligned with the chunks of their inputs, '
+                      'see copy_volume.RechunkWorkflow:'] + lines)
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+
+# NOTE sqlite relies on file locks to synchronize the access of different processes;
+# these are not reliable on all network file systems, so the tmp folder should be on a
+# file system with proper locking (most NFS v4 and parallel file systems are fine).
+
+
+class BlockQueue:
+    """ Queue of block ids that is shared by all jobs of a task.
+
+    Jobs pop block ids from the queue until it is empty, so that jobs
+    with cheap blocks process more of them.
+    The queue is stored in a sqlite database in the tmp folder.
+    """
+    timeout = 120.
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def create(cls, path, block_list):
+        """ Create a new queue holding the blocks in `block_list`.
+
+        Blocks are popped in the order of `block_list`.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        with sqlite3.connect(path, timeout=cls.timeout) as con:
+            con.execute("CREATE TABLE blocks (position INTEGER PRIMARY KEY, block_id INTEGER)")
+            con.executemany("INSERT INTO blocks (position, block_id) VALUES (?, ?)",
+                            enumerate(block_list))
+        return cls(path)
+
+    def pop(self, n_blocks=1):
+        """ Pop up to `n_blocks` block ids, returns an empty list if the queue is exhausted.
+        """
+        con = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            # lock the database for writing before we read, so that no other
+            # job can pop the same blocks
+            con.execute("BEGIN IMMEDIATE")
+            rows = con.execute("SELECT position, block_id FROM blocks ORDER BY position LIMIT ?",
+                               (n_blocks,)).fetchall()
+            if rows:
+                con.execute("DELETE FROM blocks WHERE position <= ?", (rows[-1][0],))
+            con.execute("COMMIT")
+        finally:
+            con.close()
+        return [row[1] for row in rows]
+
+    def __len__(self):
+        with sqlite3.connect(self.path, timeout=self.timeout) as con:
+            return con.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    def __iter__(self):
+        while True:
+            blocks = self.pop()
+            if not blocks:
+                return
+            yield blocks[0]
+
+
+def blocks_for_job(config):
+    """ Iterate over the blocks that should be processed by a job.
+
+    Pops blocks from the task's block queue if the job was scheduled
+    with a dynamic block queue and otherwise iterates over the block list in the config.
+    """
+    queue_path = config.get('block_queue', None)
+    if queue_path is None:
+        return iter(config['block_list'])
+    return iter(BlockQueue(queue_path))
+
+
+def block_batches_for_job(config, batch_size, n_batches=1):
+    """ Iterate over batches of blocks that should be processed by a job.
+
+    Pops batches of `batch_size` blocks from the task's block queue if the job was scheduled
+    with a dynamic block queue and otherwise splits the block list in the config into
+    `n_batches` batches of (almost) the same size.
+    """
+    queue_path = config.get('block_queue', None)
+    if queue_path is None:
+        block_list = config['block_list']
+        n_batches = max(min(n_batches, len(block_list)), 1)
+        for batch_id in range(n_batches):
+            yield block_list[batch_id * len(block_list) // n_batches:(batch_id + 1) * len(block_list) // n_batches]
+        return
+
+    queue = BlockQueue(queue_path)
+    while True:
+        blocks = queue.pop(batch_size)
+        if not blocks:
+            return
+        yield blocks
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from .parse_utils import read_telemetry
+
+
+def job_progress(telemetry_path):
+    """ Progress of a (running) job from its telemetry file, None if the job has not started yet.
+
+    Returns a dict with the start and end time of the job (end is None while it is running),
+    the blocks that were processed and the blocks that were started but not processed.
+    `has_block_starts` indicates whether the job has marked the start of any block.
+    """
+    if not os.path.exists(telemetry_path):
+        return None
+    progress = {'start': None, 'end': None, 'processed': set(), 'running': set(),
+                'has_block_starts': False}
+    for record in read_telemetry(telemetry_path):
+        status = record.get('status')
+        if 'block_id' in record:
+            if status == 'started':
+                progress['has_block_starts'] = True
+                progress['running'].add(record['block_id'])
+            elif status == 'processed':
+                progress['processed'].add(record['block_id'])
+        elif 'job_id' in record:
+            if status == 'processed':
+                progress['start'], progress['end'] = record['start'], record['end']
+        elif status == 'started' and progress['start'] is None:
+            progress['start'] = record['start']
+    if progress['start'] is None:
+        return None
+    progress['running'] -= progress['processed']
+    return progress
+
+
+def find_stragglers(progress, n_blocks, now, quantile=0.5, multiplier=3.):
+    """ Find the jobs that fall far behind the median block throughput of the finished jobs.
+
+    Arguments:
+        progress [dict] - progress of the jobs, see `job_progress`
+        n_blocks [dict] - number of blocks scheduled for each job
+        now [float] - current time
+        quantile [float] - fraction of the jobs that need to be finished before looking for stragglers
+        multiplier [float] - a job is a straggler if it runs longer than `multiplier` times
+            the runtime expected from the median block throughput
+    """
+    finished = [prog for prog in progress.values() if prog is not None and prog['end'] is not None]
+    if len(finished) == 0 or len(finished) < quantile * len(n_blocks):
+        return []
+    throughputs = [len(prog['processed']) / (prog['end'] - prog['start'])
+                   for prog in finished if prog['processed'] and prog['end'] > prog['start']]
+    if not throughputs:
+        return []
+    median_throughput = np.median(throughputs)
+    return [job_id for job_id, prog in progress.items()
+            if prog is not None and prog['end'] is None and
+            now - prog['start'] > multiplier * n_blocks[job_id] / median_throughput]
+
+
+def blocks_in_flight(progress, block_list, marks_block_starts=True):
+    """ Blocks of a cancelled job that may have been written only partially.
+
+    If the task does not mark the start of its blocks, all blocks the job has not processed are returned.
+    """
+    if progress is None:
+        return []
+    if marks_block_starts:
+        return [block_id for block_id in block_list if block_id in progress['running']]
+    return [block_id for block_id in block_list if block_id not in progress['processed']]
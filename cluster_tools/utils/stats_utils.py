@@ -0,0 +1,171 @@
+import os
+import json
+import math
+import heapq
+
+import numpy as np
+
+from .parse_utils import read_telemetry
+
+
+def block_runtimes_from_telemetry(telemetry_prefix):
+    """ Read the runtimes of all processed blocks from the telemetry files with the given prefix.
+    """
+    telemetry_dir, file_prefix = os.path.split(telemetry_prefix)
+    runtimes = {}
+    if not os.path.isdir(telemetry_dir):
+        return runtimes
+    for name in os.listdir(telemetry_dir):
+        if not (name.startswith(file_prefix) and name.endswith('.jsonl')):
+            continue
+        # make sure that we don't read the telemetry of a different task with the same prefix
+        if not name[len(file_prefix):-len('.jsonl')].isdigit():
+            continue
+        for record in read_telemetry(os.path.join(telemetry_dir, name)):
+            if 'block_id' in record and record.get('status') == 'processed':
+                runtimes[record['block_id']] = record['end'] - record['start']
+    return runtimes
+
+
+def load_block_costs(stats_dir, job_name, block_shape):
+    """ Load the per block runtimes for a task from a previous run.
+
+    `stats_dir` can either be a block stats store, holding the runtimes
+    in `<job_name>.json`, or the tmp folder of an earlier run.
+    Returns None if no runtimes are available or they were
+    recorded for a different block shape.
+    """
+    stats_path = os.path.join(stats_dir, '%s.json' % job_name)
+    if os.path.exists(stats_path):
+        with open(stats_path) as f:
+            stats = json.load(f)
+        if list(stats['block_shape']) != list(block_shape):
+            return None
+        runtimes = {int(block_id): runtime for block_id, runtime in stats['runtimes'].items()}
+    else:
+        telemetry_prefix = os.path.join(stats_dir, 'telemetry', '%s_' % job_name)
+        runtimes = block_runtimes_from_telemetry(telemetry_prefix)
+    return runtimes if runtimes else None
+
+
+def save_block_costs(stats_dir, job_name, block_shape, runtimes):
+    """ Save the per block runtimes for a task to the block stats store.
+
+    The runtimes are merged with the runtimes already stored for this task,
+    so that retries and partial runs update the stats.
+    """
+    os.makedirs(stats_dir, exist_ok=True)
+    stats_path = os.path.join(stats_dir, '%s.json' % job_name)
+    stats = {'block_shape': list(block_shape), 'runtimes': {}}
+    if os.path.exists(stats_path):
+        with open(stats_path) as f:
+            prev_stats = json.load(f)
+        if list(prev_stats['block_shape']) == list(block_shape):
+            stats = prev_stats
+    stats['runtimes'].update({str(block_id): runtime for block_id, runtime in runtimes.items()})
+    # write to a temporary file first, so that concurrent tasks don't see an incomplete file
+    tmp_path = stats_path + '.tmp%i' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, stats_path)
+
+
+def block_costs(block_list, runtimes):
+    """ Costs for the blocks in `block_list`.
+
+    Blocks without recorded runtime get the median runtime.
+    """
+    default_cost = float(np.median(list(runtimes.values())))
+    return [runtimes.get(block_id, default_cost) for block_id in block_list]
+
+
+def partition_blocks_by_cost(block_list, costs, n_jobs):
+    """ Partition blocks into `n_jobs` lists with equal total cost.
+
+    Uses greedy longest-processing-time bin-packing: the blocks are assigned in
+    order of descending cost to the job with the smallest total cost so far.
+    The blocks of each job are sorted by id.
+    """
+    jobs = [[] for _ in range(n_jobs)]
+    loads = [(0., job_id) for job_id in range(n_jobs)]
+    order = sorted(range(len(block_list)), key=lambda ii: costs[ii], reverse=True)
+    for ii in order:
+        load, job_id = heapq.heappop(loads)
+        jobs[job_id].append(block_list[ii])
+        heapq.heappush(loads, (load + costs[ii], job_id))
+    return [sorted(job_blocks) for job_blocks in jobs]
+
+
+#
+# resources of the jobs
+#
+
+# safety margins for the recommended resources
+MEM_MARGIN = 1.25
+TIME_MARGIN = 1.5
+# minimal time limit in minutes, to allow for variations in the load of the cluster
+MIN_TIME_LIMIT = 5
+# cpu time per runtime that is attributed to overhead rather than to an additional thread
+THREAD_OVERHEAD = 0.1
+# jobs that keep less than half a core busy are waiting for I/O
+IO_BOUND_THREADS = 0.5
+
+
+def job_usage_from_telemetry(telemetry_prefix):
+    """ Read the runtime, peak memory and cpu time of the finished jobs from the telemetry files with the given prefix.
+    """
+    telemetry_dir, file_prefix = os.path.split(telemetry_prefix)
+    usage = []
+    if not os.path.isdir(telemetry_dir):
+        return usage
+    for name in sorted(os.listdir(telemetry_dir)):
+        if not (name.startswith(file_prefix) and name.endswith('.jsonl')):
+            continue
+        if not name[len(file_prefix):-len('.jsonl')].isdigit():
+            continue
+        for record in read_telemetry(os.path.join(telemetry_dir, name)):
+            if 'job_id' in record and record.get('status') == 'processed':
+                usage.append({'job_id': record['job_id'], 'runtime': record['end'] - record['start'],
+                              'peak_rss': record.get('peak_rss', 0), 'cpu_time': record.get('cpu_time', 0.)})
+    return usage
+
+
+def summarize_job_usage(usage):
+    """ Summarize the resource usage of jobs, see `job_usage_from_telemetry`.
+
+    The number of threads used by a job is estimated from its cpu time divided by its runtime.
+    """
+    runtimes = [job['runtime'] for job in usage]
+    threads = [job['cpu_time'] / job['runtime'] for job in usage if job['runtime'] > 0]
+    return {'n_jobs': len(usage),
+            'max_peak_rss': max(job['peak_rss'] for job in usage),
+            'max_runtime': max(runtimes), 'mean_runtime': float(np.mean(runtimes)),
+            'total_cpu_time': sum(job['cpu_time'] for job in usage),
+            'max_threads': max(threads) if threads else 1.}
+
+
+def recommend_resources(summary, task_config):
+    """ Recommend `mem_limit` (in GB), `time_limit` (in minutes) and `threads_per_job`
+        for the next run of a task from the summary of its job usage.
+
+    The threads are never increased beyond the configured threads per job, which are kept in
+    `configured_threads_per_job` once the threads were tuned. They are reset to the configured ones
+    if the jobs used all their threads, because they may profit from more, and kept if the jobs
+    were I/O bound, because their cpu time then does not tell how many threads they can use.
+    NOTE the time limit is only valid for the same number of jobs.
+    """
+    mem_limit = MEM_MARGIN * summary['max_peak_rss'] / 1.e9
+    # the slurm memory limit is given in full GB above 1 GB and otherwise in MB
+    mem_limit = float(math.ceil(mem_limit)) if mem_limit > 1 else math.ceil(10 * mem_limit) / 10.
+    time_limit = max(int(math.ceil(TIME_MARGIN * summary['max_runtime'] / 60.)), MIN_TIME_LIMIT)
+
+    current_threads = task_config.get('threads_per_job', 1)
+    configured_threads = task_config.get('configured_threads_per_job', current_threads)
+    if summary['max_threads'] < IO_BOUND_THREADS:
+        threads = current_threads
+    elif summary['max_threads'] > current_threads - THREAD_OVERHEAD:
+        threads = configured_threads
+    else:
+        threads = max(int(math.ceil(summary['max_threads'] - THREAD_OVERHEAD)), 1)
+    threads = min(threads, configured_threads)
+    return {'mem_limit': mem_limit, 'time_limit': time_limit, 'threads_per_job': threads}
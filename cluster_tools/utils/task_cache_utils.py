@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+
+import luigi
+
+# parameters that determine where and how a task is run, but not its result
+UNHASHED_PARAMS = ('tmp_folder', 'config_dir', 'max_jobs', 'target', 'dependency')
+# global and task config values that don't change the result of a task
+UNHASHED_GLOBAL_KEYS = ('shebang', 'groupname', 'partition', 'qos', 'easybuild', 'max_num_retries',
+                        'local_worker_pool', 'dynamic_block_queue', 'job_array', 'poll_interval',
+                        'max_poll_interval', 'block_stats_dir', 'block_manifest', 'task_cache_dir',
+                        'speculative_execution', 'speculation_quantile', 'speculation_multiplier',
+                        'tune_resources', 'split_blocks_on_oom')
+UNHASHED_TASK_KEYS = ('threads_per_job', 'time_limit', 'mem_limit', 'qos', 'slurm_requirements',
+                      'chunk_cache_size', 'tuned_resources', 'configured_threads_per_job')
+
+
+def hash_values(*values):
+    """ Hash json serializable values.
+    """
+    serialized = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def significant_params(task):
+    """ The parameters of a luigi task that determine its result.
+    """
+    return {name: value for name, value in task.to_str_params(only_significant=True).items()
+            if name not in UNHASHED_PARAMS}
+
+
+# the hashes of the tasks that were computed by this process, see `task_hash`
+_task_hashes = {}
+
+
+def clear_task_hashes():
+    """ Clear the hashes computed by `task_hash`; needs to be called when a task has written its outputs.
+    """
+    _task_hashes.clear()
+
+
+def marker_path(cache_dir, path, key):
+    return os.path.join(cache_dir, 'datasets', '%s.marker' % hash_values(os.path.abspath(path), key.strip('/')))
+
+
+def write_marker(cache_dir, path, key, task_id):
+    """ Write the marker of the dataset `key` in `path`, which changes each time a task has written it.
+    """
+    marker = marker_path(cache_dir, path, key)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    tmp_path = marker + '.tmp%i' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump({'task_id': task_id, 'time': time.time()}, f)
+    os.replace(tmp_path, marker)
+
+
+def _read_marker(cache_dir, path, key):
+    if cache_dir is None:
+        return None
+    marker = marker_path(cache_dir, path, key)
+    if not os.path.exists(marker):
+        return None
+    with open(marker) as f:
+        return json.load(f)['time']
+
+
+def dataset_state(path, key, cache_dir=None):
+    """ Modification state of the dataset `key` in `path`, None if it does not exist.
+
+    The state is derived from the dataset metadata (size and modification time of `attributes.json`
+    or `.zarray` for n5 and zarr, shape and dtype for hdf5) and the marker written by the last task
+    that wrote the dataset if `cache_dir` is given, see `write_marker`; writing other datasets in the
+    same container does not change it. The chunks are not checked, because this would need to
+    stat all chunk files, so changes to the data that are not made by a task are not detected.
+    """
+    marker = _read_marker(cache_dir, path, key)
+    if os.path.isfile(path):
+        from .volume_utils import file_reader
+        with file_reader(path, 'r') as f:
+            if key not in f:
+                return None
+            ds = f[key]
+            return [list(ds.shape), str(ds.dtype), marker]
+    ds_path = os.path.join(path, key)
+    if not os.path.exists(ds_path):
+        return None
+    for name in ('attributes.json', '.zarray'):
+        meta_path = os.path.join(ds_path, name)
+        if os.path.exists(meta_path):
+            stat = os.stat(meta_path)
+            return [stat.st_size, stat.st_mtime_ns, marker]
+    return [None, None, marker]
+
+
+def dataset_states(params, cache_dir=None):
+    """ Modification states of the datasets given by `<name>_path` and `<name>_key` in `params`.
+
+    Paths without a key are not included: they usually refer to containers that are shared
+    by several tasks, so their state changes also if other datasets in them are written.
+    """
+    states = {}
+    for name, path in params.items():
+        if not (name.endswith('_path') and isinstance(path, str)):
+            continue
+        key = params.get(name[:-len('_path')] + '_key', None)
+        if isinstance(key, str):
+            states[name] = dataset_state(path, key, cache_dir)
+    return states
+
+
+def task_hash(task):
+    """ Hash of a luigi task, its parameters and the tasks it depends on.
+
+    Tasks can compute their own hash with `cache_hash`, e.g. to include their configuration.
+    The hash is computed once per task and process, because luigi checks if the tasks are complete
+    many times; call `clear_task_hashes` if the outputs of a task have changed.
+    """
+    task_id = task.task_id
+    if task_id not in _task_hashes:
+        if hasattr(task, 'cache_hash'):
+            _task_hashes[task_id] = task.cache_hash()
+        else:
+            deps = [task_hash(dep) for dep in luigi.task.flatten(task.requires())]
+            _task_hashes[task_id] = hash_values(task.get_task_family(), significant_params(task), deps)
+    return _task_hashes[task_id]
+
+
+def record_path(cache_dir, task_name, task_hash):
+    return os.path.join(cache_dir, task_name, '%s.json' % task_hash)
+
+
+def load_record(cache_dir, task_name, task_hash):
+    """ Load the cache record for a task with the given hash,
+        None if there is no record or the recorded outputs don't exist any more.
+    """
+    path = record_path(cache_dir, task_name, task_hash)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        record = json.load(f)
+    if not all(os.path.exists(out_path) for out_path in record['paths']):
+        return None
+    return record
+
+
+def save_record(cache_dir, task_name, task_hash, task_id, log_path, paths):
+    """ Save the cache record for a task that has finished successfully.
+    """
+    path = record_path(cache_dir, task_name, task_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    record = {'task_id': task_id, 'log': os.path.abspath(log_path), 'time': time.time(),
+              'paths': [os.path.abspath(p) for p in paths]}
+    # write to a temporary file first, so that concurrent workflows don't see an incomplete record
+    tmp_path = path + '.tmp%i' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)
+
+
+def write_reused_log(log_path, record, record_file):
+    """ Write the log of a task whose outputs are reused from the cache.
+    """
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'a') as f:
+        f.write('%s: reusing outputs of task %s from cache record %s (original log: %s)\n'
+                % (str(datetime.now()), record['task_id'], record_file, record['log']))
@@ -1,5 +1,11 @@
+import importlib
+import importlib.util
+
 import luigi
 
+# task modules that were already imported in this (worker) process
+_task_modules = {}
+
 
 class DummyTarget(luigi.Target):
     """ Dummy target that always exists
@@ -13,3 +19,24 @@ class DummyTask(luigi.Task):
     """
     def output(self):
         return DummyTarget()
+
+
+def import_task_module(module_name, src_file):
+    """ Import the module of a task, given by the module name and source file of the task class.
+
+    Tasks defined in a script that is run directly have the module name '__main__'
+    and can't be imported by their module name, so they are loaded from the source file instead.
+    The modules are cached per process and identified by their name and source file,
+    because tasks from different scripts all have the module name '__main__'.
+    """
+    module = _task_modules.get((module_name, src_file))
+    if module is not None:
+        return module
+    if module_name == '__main__':
+        spec = importlib.util.spec_from_file_location('_cluster_tools_task_%i' % len(_task_modules), src_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    _task_modules[(module_name, src_file)] = module
+    return module
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+# environment variable that holds the path of the telemetry file for the current job,
+# it is set by the cluster tasks when submitting the job
+TELEMETRY_ENV = 'CLUSTER_TOOLS_TELEMETRY'
+
+
+def _io_counters():
+    """ Bytes read and written by this process so far.
+
+    NOTE these are process-wide counters, so the per-block values are only approximate
+    for jobs that process several blocks in parallel threads.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def current_rss():
+    """ Current resident set size of this process in bytes, 0 if it is not available.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    # the value is given in kilobytes
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def peak_rss():
+    """ Peak resident set size of this process in bytes.
+    """
+    # ru_maxrss is given in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def resource_usage():
+    """ Peak resident set size in bytes and cpu time in seconds
+        of this process and its sub-processes that have finished.
+
+    NOTE the peak memory of sub-processes is the peak of the largest one, not of their sum.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    return max(own.ru_maxrss, children.ru_maxrss) * 1024, cpu_time
+
+
+class Telemetry:
+    """ Writes one json record per processed block and job to the telemetry file of a job.
+
+    In addition, the start of the job and of each block with a known id are recorded
+    with the status "started".
+
+    The start of a block is marked by the "start processing block" log message.
+    If it is missing, the start is the end of the last event in the same thread, so that
+    the telemetry can be collected for all tasks that call `log_block_success` without
+    additional markers.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start = time.time()
+        self.start_io = _io_counters()
+        # the cpu time is counted from the start of the job, because a worker process may run several jobs;
+        # the peak memory is the peak of the whole process, so we also sample the current memory, see `peak_rss`
+        self.start_peak_rss, self.start_cpu_time = resource_usage()
+        self.sampled_rss = current_rss()
+        # start of the blocks that are currently processed, the block may be
+        # finished by a different thread than the one that started it (e.g. a background writer)
+        self.block_starts = {}
+        # mark the start of the job, so that the progress of running jobs can be monitored
+        self._write({'start': self.start, 'status': 'started'})
+
+    def _last_event(self):
+        if not hasattr(self.local, 'last_time'):
+            self.local.last_time = self.start
+            self.local.last_io = self.start_io
+        return self.local.last_time, self.local.last_io
+
+    def peak_rss(self):
+        """ Peak resident set size of the job in bytes.
+
+        If the peak of the process was reached by an earlier job of the same worker process,
+        we only know the largest current resident set size that was sampled at the block boundaries.
+        """
+        job_peak_rss = resource_usage()[0]
+        rss = current_rss()
+        with self.lock:
+            self.sampled_rss = max(self.sampled_rss, rss)
+            sampled_rss = self.sampled_rss
+        return job_peak_rss if job_peak_rss > self.start_peak_rss else sampled_rss
+
+    def _write(self, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+    def block_start(self, block_id=None):
+        rss = current_rss()
+        with self.lock:
+            self.sampled_rss = max(self.sampled_rss, rss)
+        self.local.last_time = time.time()
+        self.local.last_io = _io_counters()
+        if block_id is not None:
+            with self.lock:
+                self.block_starts[block_id] = (self.local.last_time, self.local.last_io)
+            # the blocks that are in progress are needed to clean up after cancelling a job
+            self._write({'block_id': int(block_id), 'start': self.local.last_time, 'status': 'started'})
+
+    def block_success(self, block_id):
+        with self.lock:
+            block_start = self.block_starts.pop(block_id, None)
+        start, (read0, written0) = self._last_event() if block_start is None else block_start
+        end = time.time()
+        read1, written1 = _io_counters()
+        self.local.last_time, self.local.last_io = end, (read1, written1)
+        self._write({'block_id': int(block_id), 'start': start, 'end': end,
+                     'bytes_read': read1 - read0, 'bytes_written': written1 - written0,
+                     'peak_rss': self.peak_rss(), 'status': 'processed'})
+
+    def job_usage(self):
+        """ Peak memory and cpu time of the job, see `peak_rss` and `resource_usage`.
+        """
+        job_peak_rss = self.peak_rss()
+        return job_peak_rss, resource_usage()[1] - self.start_cpu_time
+
+    def job_success(self, job_id):
+        read1, written1 = _io_counters()
+        job_peak_rss, cpu_time = self.job_usage()
+        self._write({'job_id': int(job_id), 'start': self.start, 'end': time.time(),
+                     'bytes_read': read1 - self.start_io[0],
+                     'bytes_written': written1 - self.start_io[1],
+                     'peak_rss': job_peak_rss, 'cpu_time': cpu_time, 'status': 'processed'})
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """ Get the telemetry writer for the current job or None if telemetry is not enabled.
+    """
+    global _telemetry
+    path = os.environ.get(TELEMETRY_ENV, '')
+    if path == '':
+        return None
+    # the telemetry path changes if several jobs are run by the same process (local worker pool)
+    with _telemetry_lock:
+        if _telemetry is None or _telemetry.path != path:
+            _telemetry = Telemetry(path)
+    return _telemetry
+
+
+def reset_telemetry():
+    """ Start a new telemetry for the next job run by this process, even if it has the same path.
+    """
+    global _telemetry
+    with _telemetry_lock:
+        _telemetry = None
+
+
+@contextmanager
+def telemetry_for(path):
+    """ Write the telemetry to `path` in this context, e.g. for the stage of a fused job.
+
+    The telemetry of the enclosing job is restored afterwards, including the start of its current block.
+    """
+    global _telemetry
+    prev_path = os.environ.get(TELEMETRY_ENV, None)
+    with _telemetry_lock:
+        prev_telemetry = _telemetry
+    os.environ[TELEMETRY_ENV] = path
+    try:
+        yield get_telemetry()
+    finally:
+        if prev_path is None:
+            os.environ.pop(TELEMETRY_ENV)
+        else:
+            os.environ[TELEMETRY_ENV] = prev_path
+        with _telemetry_lock:
+            _telemetry = prev_telemetry
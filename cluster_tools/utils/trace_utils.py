@@ -0,0 +1,195 @@
+import os
+import re
+import json
+from datetime import datetime
+
+# log lines start with the time stamp written by `function_utils.log` and `BaseClusterTask._write_log`;
+# other lines, e.g. the report that lsf appends to the job logs, are ignored
+LOG_LINE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?): (.*)$')
+
+# messages of the task log that end a phase of the task and the name of the phase
+PHASE_ENDS = (('written config for', 'prepare'),
+              ('submitted', 'submit'),
+              ('checking', 'wait'),
+              ('finished successfully', 'check'),
+              ('failed for jobs', 'check'))
+# messages of the task log that start a phase, the time since the end of the last phase is not part of it
+PHASE_STARTS = ('submitting',)
+
+
+def _parse_time(stamp):
+    fmt = '%Y-%m-%d %H:%M:%S.%f' if '.' in stamp else '%Y-%m-%d %H:%M:%S'
+    return datetime.strptime(stamp, fmt).timestamp()
+
+
+def read_log(path):
+    """ Read the time stamps and messages of a task or job log.
+    """
+    lines = []
+    with open(path, 'r') as f:
+        for line in f:
+            match = LOG_LINE.match(line.rstrip('\n'))
+            if match is not None:
+                lines.append((_parse_time(match.group(1)), match.group(2)))
+    return lines
+
+
+def task_spans(lines):
+    """ Spans of the task and of its phases (prepare, submit, wait, check) from the task log.
+
+    Returns the span of the task as `(start, end)` and the phase spans as a list of `(name, start, end)`.
+    A task that submits several rounds of jobs has phases for each round.
+    """
+    if not lines:
+        return None, []
+    phases = []
+    phase_start = lines[0][0]
+    for t, msg in lines:
+        if msg.startswith(PHASE_STARTS):
+            phase_start = t
+            continue
+        for prefix, name in PHASE_ENDS:
+            # the check messages start with the task name
+            if msg.startswith(prefix) or (name == 'check' and prefix in msg):
+                phases.append((name, phase_start, t))
+                phase_start = t
+                break
+    return (lines[0][0], lines[-1][0]), phases
+
+
+def block_spans(lines):
+    """ Spans of the blocks of a job from the "start processing block" and "processed block" markers of its log.
+
+    Returns a list of `(block_id, start, end)`. Blocks without start marker start at the last
+    marker of the job, like in the telemetry.
+    """
+    spans = []
+    starts = {}
+    last_time = lines[0][0] if lines else None
+    for t, msg in lines:
+        words = msg.split()
+        if msg.startswith('start processing block') and len(words) > 3 and words[3].isdigit():
+            starts[int(words[3])] = t
+        elif msg.startswith('processed block') and len(words) > 2 and words[2].isdigit():
+            block_id = int(words[2])
+            spans.append((block_id, starts.pop(block_id, last_time), t))
+        else:
+            continue
+        last_time = t
+    return spans
+
+
+def _lanes(spans):
+    """ Assign the spans to lanes, so that the spans in each lane don't overlap.
+
+    Blocks that are processed in parallel threads of a job overlap, but the spans
+    of a single track in the trace viewer must be nested.
+    """
+    lane_ends = []
+    lanes = []
+    for span in sorted(spans, key=lambda span: span[1]):
+        for lane, end in enumerate(lane_ends):
+            if end <= span[1]:
+                break
+        else:
+            lane = len(lane_ends)
+            lane_ends.append(0.)
+        lane_ends[lane] = span[2]
+        lanes.append((lane, span))
+    return lanes
+
+
+def _job_logs(log_dir, task_names):
+    """ Map the job logs to their task. Returns a dict of task name to a list of `(job name, log path)`.
+    """
+    # check the longer names first, in case a task name is the prefix of another one
+    names = sorted(task_names, key=len, reverse=True)
+    job_logs = {name: [] for name in task_names}
+    if not os.path.isdir(log_dir):
+        return job_logs
+    for file_name in sorted(os.listdir(log_dir)):
+        if not file_name.endswith('.log'):
+            continue
+        job_name = file_name[:-len('.log')]
+        for name in names:
+            if job_name.startswith(name + '_') and job_name.split('_')[-1].isdigit():
+                job_logs[name].append((job_name[len(name) + 1:], os.path.join(log_dir, file_name)))
+                break
+    return job_logs
+
+
+def _span_event(name, cat, start, end, pid, tid, t0, args=None):
+    event = {'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+             'ts': (start - t0) * 1e6, 'dur': max(end - start, 0.) * 1e6}
+    if args:
+        event['args'] = args
+    return event
+
+
+def _name_event(kind, name, pid, tid=0):
+    return {'name': kind, 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+
+
+def workflow_trace(tmp_folder):
+    """ Build a chrome trace of all tasks run in `tmp_folder` from the task and job logs.
+
+    Each task is a process in the trace: its first track holds the task span and the spans
+    of its phases, the other tracks hold the blocks of each job. The log format is the same
+    for all targets, so this works for local, slurm and lsf runs.
+    Open the trace in chrome://tracing or https://ui.perfetto.dev.
+    """
+    task_logs = {}
+    for file_name in sorted(os.listdir(tmp_folder)):
+        if not file_name.endswith('.log'):
+            continue
+        name = file_name[:-len('.log')]
+        # the log of a task that failed is moved
+        if name.endswith('_failed'):
+            name = name[:-len('_failed')]
+        task_logs[name] = sorted(task_logs.get(name, []) + read_log(os.path.join(tmp_folder, file_name)))
+    job_logs = _job_logs(os.path.join(tmp_folder, 'logs'), task_logs.keys())
+    job_lines = {name: [(job_name, read_log(path)) for job_name, path in logs]
+                 for name, logs in job_logs.items()}
+
+    times = [lines[0][0] for lines in task_logs.values() if lines]
+    times += [lines[0][0] for logs in job_lines.values() for _, lines in logs if lines]
+    if not times:
+        return {'traceEvents': []}
+    t0 = min(times)
+
+    events = []
+    # order the tasks by their start
+    order = sorted(task_logs, key=lambda name: task_logs[name][0][0] if task_logs[name] else float('inf'))
+    for pid, name in enumerate(order, 1):
+        events.append(_name_event('process_name', name, pid))
+        events.append({'name': 'process_sort_index', 'ph': 'M', 'pid': pid, 'args': {'sort_index': pid}})
+        events.append(_name_event('thread_name', 'task', pid, 0))
+        span, phases = task_spans(task_logs[name])
+        if span is not None:
+            events.append(_span_event(name, 'task', span[0], span[1], pid, 0, t0))
+        events.extend(_span_event(phase, 'phase', start, end, pid, 0, t0) for phase, start, end in phases)
+
+        tid = 1
+        for job_name, lines in job_lines[name]:
+            if not lines:
+                continue
+            lanes = _lanes(block_spans(lines))
+            n_lanes = max((lane for lane, _ in lanes), default=0) + 1
+            for lane in range(n_lanes):
+                track = 'job %s' % job_name if lane == 0 else 'job %s (%i)' % (job_name, lane)
+                events.append(_name_event('thread_name', track, pid, tid + lane))
+            events.append(_span_event('job %s' % job_name, 'job', lines[0][0], lines[-1][0], pid, tid, t0))
+            events.extend(_span_event('block %i' % block_id, 'block', start, end, pid, tid + lane, t0,
+                                      {'block_id': block_id})
+                          for lane, (block_id, start, end) in lanes)
+            tid += n_lanes
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def export_trace(tmp_folder, trace_path):
+    """ Write the chrome trace of all tasks run in `tmp_folder` to `trace_path`, see `workflow_trace`.
+    """
+    trace = workflow_trace(tmp_folder)
+    with open(trace_path, 'w') as f:
+        json.dump(trace, f)
+    return trace
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import shutil
+from itertools import product
+
+import luigi
+
+from .parse_utils import read_telemetry
+
+# bounds for the number of voxels of the candidate block shapes
+MIN_BLOCK_VOXELS = 2 ** 20
+MAX_BLOCK_VOXELS = 2 ** 27
+
+
+def candidate_block_shapes(chunks, roi_shape, min_voxels=MIN_BLOCK_VOXELS, max_voxels=MAX_BLOCK_VOXELS):
+    """ Grid of candidate block shapes that are aligned with the chunks.
+
+    Along each axis the candidates are the chunk size times a power of two, up to the size of the roi.
+    Block shapes with less than `min_voxels` or more than `max_voxels` voxels are discarded, unless
+    no candidate is left, in which case the largest one below `min_voxels` or the smallest one is kept.
+    """
+    axis_sizes = []
+    for ch, sh in zip(chunks, roi_shape):
+        sizes = [ch]
+        while 2 * sizes[-1] <= sh:
+            sizes.append(2 * sizes[-1])
+        axis_sizes.append(sizes)
+    candidates = [list(block_shape) for block_shape in product(*axis_sizes)]
+
+    def n_voxels(block_shape):
+        n = 1
+        for bs in block_shape:
+            n *= bs
+        return n
+
+    in_bounds = [block_shape for block_shape in candidates if min_voxels <= n_voxels(block_shape) <= max_voxels]
+    if in_bounds:
+        return in_bounds
+    too_small = [block_shape for block_shape in candidates if n_voxels(block_shape) < min_voxels]
+    return [max(too_small, key=n_voxels)] if too_small else [min(candidates, key=n_voxels)]
+
+
+def sample_roi(shape, roi_shape, chunks, roi_begin=None):
+    """ Roi of `roi_shape` for tuning, in the center of the volume if `roi_begin` is not given.
+
+    The roi begin is rounded down to the chunks, so that the blocks of all candidates are aligned with them.
+    """
+    if roi_begin is None:
+        roi_begin = [max(sh - rs, 0) // 2 for sh, rs in zip(shape, roi_shape)]
+    roi_begin = [(rb // ch) * ch for rb, ch in zip(roi_begin, chunks)]
+    roi_end = [min(rb + rs, sh) for rb, rs, sh in zip(roi_begin, roi_shape, shape)]
+    return roi_begin, roi_end
+
+
+def processed_voxels(shape, block_shape, roi_begin, roi_end):
+    """ Number of voxels in the blocks that overlap with the roi, which are processed by a blockwise task.
+    """
+    from .volume_utils import blocks_in_volume, block_bounding_boxes
+    block_list = blocks_in_volume(shape, block_shape, roi_begin, roi_end)
+    begins, ends = block_bounding_boxes(shape, block_shape, block_list)
+    return int((ends - begins).prod(axis=1).sum())
+
+
+def job_usage(tmp_folder):
+    """ Runtime and peak memory of all finished jobs run in `tmp_folder`, from their telemetry.
+    """
+    telemetry_dir = os.path.join(tmp_folder, 'telemetry')
+    if not os.path.isdir(telemetry_dir):
+        return []
+    return [{'runtime': record['end'] - record['start'], 'peak_rss': record.get('peak_rss', 0)}
+            for name in sorted(os.listdir(telemetry_dir)) if name.endswith('.jsonl')
+            for record in read_telemetry(os.path.join(telemetry_dir, name))
+            if 'job_id' in record and record.get('status') == 'processed']
+
+
+def _write_trial_configs(config_dir, trial_config_dir, block_shape, roi_begin, roi_end):
+    # copy the task configs and set the block shape and the roi in the global config
+    os.makedirs(trial_config_dir, exist_ok=True)
+    for name in os.listdir(config_dir):
+        if name.endswith('.config') and name != 'global.config':
+            shutil.copy(os.path.join(config_dir, name), os.path.join(trial_config_dir, name))
+    from ..cluster_tasks import BaseClusterTask
+    config = BaseClusterTask.default_global_config()
+    global_config_path = os.path.join(config_dir, 'global.config')
+    if os.path.exists(global_config_path):
+        with open(global_config_path) as f:
+            config.update(json.load(f))
+    # the outputs of previous runs must not be reused, otherwise the jobs are not run;
+    # the jobs must not run in warm worker processes, because their memory is not released
+    # between the trials, so the peak memory of a trial would depend on the previous trials
+    config.update({'block_shape': list(block_shape), 'roi_begin': list(roi_begin), 'roi_end': list(roi_end),
+                   'block_list_path': None, 'task_cache_dir': None, 'block_manifest': False,
+                   'local_worker_pool': False})
+    with open(os.path.join(trial_config_dir, 'global.config'), 'w') as f:
+        json.dump(config, f)
+
+
+def run_trial(make_task, config_dir, trial_dir, shape, block_shape, roi_begin, roi_end):
+    """ Run the task returned by `make_task` with `block_shape` on the roi and measure it.
+
+    The throughput is the number of processed voxels divided by the summed runtime of the jobs,
+    so it does not depend on the number of jobs that run in parallel or on the scheduling overhead.
+    """
+    trial_config_dir = os.path.join(trial_dir, 'configs')
+    tmp_folder = os.path.join(trial_dir, 'tmp')
+    _write_trial_configs(config_dir, trial_config_dir, block_shape, roi_begin, roi_end)
+    task = make_task(tmp_folder=tmp_folder, config_dir=trial_config_dir,
+                     output_path=os.path.join(trial_dir, 'data.n5'))
+
+    t0 = time.time()
+    success = luigi.build([task], local_scheduler=True)
+    runtime = time.time() - t0
+
+    usage = job_usage(tmp_folder)
+    job_runtime = sum(job['runtime'] for job in usage)
+    n_voxels = processed_voxels(shape, block_shape, roi_begin, roi_end)
+    return {'block_shape': list(block_shape), 'success': bool(success), 'runtime': runtime,
+            'n_jobs': len(usage), 'n_voxels': n_voxels, 'job_runtime': job_runtime,
+            'throughput': n_voxels / job_runtime if job_runtime > 0 else None,
+            'peak_memory': max((job['peak_rss'] for job in usage), default=0)}
+
+
+def best_block_shape(results, max_memory=None):
+    """ The block shape with the highest throughput of the successful trials whose jobs
+        stay below `max_memory` (in GB), None if there is no such trial.
+    """
+    valid = [result for result in results if result['success'] and result['throughput'] is not None
+             and (max_memory is None or result['peak_memory'] <= max_memory * 1.e9)]
+    if not valid:
+        return None
+    return max(valid, key=lambda result: result['throughput'])['block_shape']
+
+
+def write_block_shape(config_dir, block_shape):
+    """ Write `block_shape` to the global config in `config_dir`, keeping its other values.
+    """
+    config_path = os.path.join(config_dir, 'global.config')
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+    else:
+        from ..cluster_tasks import BaseClusterTask
+        config = BaseClusterTask.default_global_config()
+    config['block_shape'] = list(block_shape)
+    tmp_path = config_path + '.tmp%i' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f)
+    os.replace(tmp_path, config_path)
+
+
+def tune_block_shape(make_task, config_dir, work_dir, shape, chunks, roi_shape,
+                     roi_begin=None, candidates=None, max_memory=None, write_config=True, keep_trials=False):
+    """ Find the block shape with the highest throughput for a task or workflow and write it to the global config.
+
+    Runs the task on a sample roi once for each candidate block shape, with the task configs from
+    `config_dir`, and measures the throughput and peak memory of its jobs from their telemetry.
+    Use a separate config dir for each workflow, so that e.g. watershed and inference runs get different
+    block shapes. The target of the task should be local or a cluster that is not shared, so that the
+    runtimes of the trials can be compared.
+
+    Arguments:
+        make_task [callable] - returns the task for a trial, called with the keyword arguments
+            `tmp_folder`, `config_dir` and `output_path`; the outputs of the task must be written to
+            `output_path`, because each trial needs its own outputs
+        config_dir [str] - directory with the global and task configs
+        work_dir [str] - directory for the trials and the report
+        shape [list[int]] - shape of the volume the task is run on
+        chunks [list[int]] - chunks of the input volume, the candidates are aligned with them
+        roi_shape [list[int]] - shape of the sample roi
+        roi_begin [list[int]] - begin of the sample roi, in the center of the volume by default (default: None)
+        candidates [list[list[int]]] - candidate block shapes, see `candidate_block_shapes` (default: None)
+        max_memory [float] - maximal peak memory of a job in GB, e.g. the memory per core
+            of the cluster nodes (default: None)
+        write_config [bool] - write the best block shape to the global config (default: True)
+        keep_trials [bool] - keep the tmp folders and outputs of the trials (default: False)
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    chunks = list(chunks)[-3:]
+    roi_begin, roi_end = sample_roi(shape, roi_shape, chunks, roi_begin)
+    if candidates is None:
+        candidates = candidate_block_shapes(chunks, [re - rb for rb, re in zip(roi_begin, roi_end)])
+
+    results = []
+    for block_shape in candidates:
+        trial_dir = os.path.join(work_dir, 'block_shape_%s' % '_'.join(map(str, block_shape)))
+        if os.path.exists(trial_dir):
+            shutil.rmtree(trial_dir)
+        results.append(run_trial(make_task, config_dir, trial_dir, shape, block_shape, roi_begin, roi_end))
+        if not keep_trials:
+            shutil.rmtree(trial_dir, ignore_errors=True)
+
+    best = best_block_shape(results, max_memory)
+    report = {'shape': list(shape), 'chunks': chunks, 'roi_begin': roi_begin, 'roi_end': roi_end,
+              'max_memory': max_memory, 'best_block_shape': best, 'trials': results}
+    with open(os.path.join(work_dir, 'block_shape_tuning.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    if best is not None and write_config:
+        write_block_shape(config_dir, best)
+    return best, results
@@ -1,25 +1,39 @@
 import os
 import json
+import hashlib
+from contextlib import contextmanager
+from functools import lru_cache
 from itertools import product
 
-import elf.io
 import numpy as np
-import vigra
 
-from elf.wrapper.resized_volume import ResizedVolume
-from scipy.ndimage.morphology import binary_erosion
-from nifty.tools import blocking
+from .cache_utils import CachedFile, get_chunk_cache
 
-# use vigra filters as fallback if we don't have
-# fastfilters available
-try:
-    import fastfilters as ff
-except ImportError:
-    import vigra.filters as ff
+# NOTE elf, nifty, vigra and scipy are imported by the functions that use them,
+# so that importing the volume utils (e.g. to construct tasks or in the job scripts) stays cheap
+
+# environment variable that holds the mask restricting the blocks returned by `blocks_in_volume`,
+# it is set by the cluster tasks if `block_mask_path` is given in the global config
+BLOCK_MASK_ENV = 'CLUSTER_TOOLS_BLOCK_MASK'
+
+
+@lru_cache(maxsize=None)
+def _filter_module():
+    # use vigra filters as fallback if we don't have
+    # fastfilters available
+    try:
+        import fastfilters as ff
+    except ImportError:
+        import vigra.filters as ff
+    return ff
 
 
 def file_reader(path, mode='a'):
-    return elf.io.open_file(path, mode=mode)
+    import elf.io
+    f = elf.io.open_file(path, mode=mode)
+    # if the chunk cache is enabled, chunked datasets read from the cache, see `cache_utils`
+    cache = get_chunk_cache()
+    return f if cache is None else CachedFile(f, path, cache)
 
 
 def get_shape(path, key):
@@ -28,9 +42,8 @@ def get_shape(path, key):
     return shape
 
 
-def blocks_in_volume(shape, block_shape,
-                     roi_begin=None, roi_end=None,
-                     block_list_path=None, return_blocking=False):
+def _blocks_in_volume(shape, block_shape, roi_begin, roi_end, block_list_path):
+    from nifty.tools import blocking
     assert len(shape) == len(block_shape), '%i; %i' % (len(shape), len(block_shape))
     assert (roi_begin is None) == (roi_end is None)
     have_roi = roi_begin is not None
@@ -44,10 +57,7 @@ def blocks_in_volume(shape, block_shape,
     # we don't have a roi and don't have a block_list_path
     # -> return all block_ids
     if not have_roi and not block_list_path:
-        if return_blocking:
-            return list(range(blocking_.numberOfBlocks)), blocking_
-        else:
-            return list(range(blocking_.numberOfBlocks))
+        return list(range(blocking_.numberOfBlocks)), blocking_
 
     # if we have a roi load the blocks in roi
     if have_roi:
@@ -66,13 +76,168 @@ def blocks_in_volume(shape, block_shape,
             block_list = np.intersect1d(list_from_path, block_list).tolist()
         else:
             block_list = list_from_path
+    return block_list, blocking_
+
 
+def blocks_in_volume(shape, block_shape,
+                     roi_begin=None, roi_end=None,
+                     block_list_path=None, return_blocking=False):
+    """ Ids of the blocks of the blocking of `shape` with `block_shape`,
+        restricted to the roi and the block list in `block_list_path`.
+
+    If a block mask is set, see `restrict_blocks_to_mask`, only the blocks
+    that overlap with the mask are returned.
+    """
+    block_list, blocking_ = _blocks_in_volume(shape, block_shape, roi_begin, roi_end, block_list_path)
+    mask_blocks = _blocks_in_block_mask(shape, block_shape)
+    if mask_blocks is not None:
+        block_list = [block_id for block_id in block_list if block_id in mask_blocks]
     if return_blocking:
         return block_list, blocking_
     else:
         return block_list
 
 
+def block_bounding_boxes(shape, block_shape, block_list=None):
+    """ Begins and ends of the blocks in `block_list` (default: all blocks) of the blocking
+        of `shape` with `block_shape`, as arrays of shape `(n_blocks, ndim)`.
+
+    The block ids are in C-order of the block grid, like in `nifty.tools.blocking`.
+    """
+    shape, block_shape = np.array(shape, dtype='int64'), np.array(block_shape, dtype='int64')
+    blocks_per_axis = tuple((shape + block_shape - 1) // block_shape)
+    if block_list is None:
+        block_list = np.arange(int(np.prod(blocks_per_axis)))
+    block_list = np.array(block_list, dtype='int64')
+    grid = np.stack(np.unravel_index(block_list, blocks_per_axis), axis=1).reshape((len(block_list), len(shape)))
+    begins = grid * block_shape
+    ends = np.minimum(begins + block_shape, shape)
+    return begins, ends
+
+
+def _box_sums(mask, begins, ends):
+    """ Sums of `mask` over the boxes `[begins[i], ends[i])`, computed with a summed-area table.
+    """
+    ndim = mask.ndim
+    dtype = 'int32' if mask.size < np.iinfo('int32').max else 'int64'
+    sat = np.zeros(tuple(sh + 1 for sh in mask.shape), dtype=dtype)
+    sat[(slice(1, None),) * ndim] = mask
+    for axis in range(ndim):
+        np.cumsum(sat, axis=axis, out=sat)
+    # inclusion-exclusion over the corners of the boxes
+    sums = np.zeros(len(begins), dtype='int64')
+    for corner in product((0, 1), repeat=ndim):
+        index = tuple(ends[:, d] if upper else begins[:, d] for d, upper in enumerate(corner))
+        sign = 1 if (ndim - sum(corner)) % 2 == 0 else -1
+        sums += sign * sat[index].astype('int64')
+    return sums
+
+
+def blocks_in_mask(mask_path, mask_key, shape, block_shape, n_threads=1):
+    """ Ids of the blocks of the blocking of `shape` with `block_shape` that overlap with the mask.
+
+    The mask may have a lower resolution than `shape`. In this case the block bounding boxes are
+    projected to the mask and the mask is summed over them with a summed-area table, so the mask
+    is never interpolated. A block is in the mask if any mask voxel that it touches is set, i.e. if
+    it overlaps with the volume covered by a set mask voxel.
+    NOTE if the mask shape does not divide the shape, this is a superset of the blocks that contain
+    a foreground voxel of the interpolated mask (see `load_mask`): the blocks at the boundary of the
+    mask may touch a set mask voxel without containing a volume voxel that is mapped to it.
+    """
+    with file_reader(mask_path, 'r') as f:
+        ds = f[mask_key]
+        mask_shape = ds.shape
+        # we don't load a mask at full resolution, which may be too large for memory
+        if tuple(mask_shape) != tuple(shape):
+            ds.n_threads = n_threads
+            mask = ds[:] > 0
+
+    begins, ends = block_bounding_boxes(shape, block_shape)
+    if tuple(mask_shape) == tuple(shape):
+        mask = load_mask(mask_path, mask_key, tuple(shape))
+        return [block_id for block_id, (beg, end) in enumerate(zip(begins, ends))
+                if np.any(mask[tuple(slice(b, e) for b, e in zip(beg, end))])]
+
+    # project the bounding boxes to the mask, rounding outwards
+    shape, mask_shape = np.array(shape, dtype='int64'), np.array(mask_shape, dtype='int64')
+    mask_begins = (begins * mask_shape) // shape
+    mask_ends = -((-ends * mask_shape) // shape)
+    mask_ends = np.clip(np.maximum(mask_ends, mask_begins + 1), 0, mask_shape)
+    return np.nonzero(_box_sums(mask, mask_begins, mask_ends) > 0)[0].tolist()
+
+
+def cached_blocks_in_mask(mask_path, mask_key, shape, block_shape, cache_dir):
+    """ `blocks_in_mask` with the result cached in `cache_dir`, keyed by the mask, shape and block shape.
+
+    NOTE the cache is not invalidated if the mask changes.
+    """
+    cache_key = json.dumps([os.path.abspath(mask_path), mask_key, list(shape), list(block_shape)])
+    cache_path = os.path.join(cache_dir, 'mask_blocks_%s.json' % hashlib.sha1(cache_key.encode('utf-8')).hexdigest())
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+    block_list = blocks_in_mask(mask_path, mask_key, shape, block_shape)
+    os.makedirs(cache_dir, exist_ok=True)
+    # several jobs may compute the same block list, so we write to a tmp file first
+    tmp_path = cache_path + '.tmp%i' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump(block_list, f)
+    os.replace(tmp_path, cache_path)
+    return block_list
+
+
+@contextmanager
+def restrict_blocks_to_mask(mask_path, mask_key, cache_dir):
+    """ Restrict the blocks returned by `blocks_in_volume` to the blocks that overlap with the mask in this context.
+
+    The mask is passed on to the jobs in the environment, so that they see the same blocks.
+    The block lists are cached in `cache_dir`, see `cached_blocks_in_mask`.
+    """
+    prev = os.environ.get(BLOCK_MASK_ENV, None)
+    os.environ[BLOCK_MASK_ENV] = json.dumps({'mask_path': mask_path, 'mask_key': mask_key, 'cache_dir': cache_dir})
+    try:
+        yield
+    finally:
+        if prev is None:
+            os.environ.pop(BLOCK_MASK_ENV)
+        else:
+            os.environ[BLOCK_MASK_ENV] = prev
+
+
+def _blocks_in_block_mask(shape, block_shape):
+    block_mask = os.environ.get(BLOCK_MASK_ENV, '')
+    if block_mask == '':
+        return None
+    block_mask = json.loads(block_mask)
+    # blockings that don't have the dimension of the mask, e.g. over node or edge ids, are not restricted
+    if len(get_shape(block_mask['mask_path'], block_mask['mask_key'])) != len(shape):
+        return None
+    return set(cached_blocks_in_mask(block_mask['mask_path'], block_mask['mask_key'],
+                                     shape, block_shape, block_mask['cache_dir']))
+
+
+def split_blocks(shape, block_shape, sub_block_shape, block_list):
+    """ Ids of the blocks with `sub_block_shape` that cover the blocks with `block_shape` in `block_list`.
+
+    `block_shape` must be divisible by `sub_block_shape`, so that each sub-block is contained in one block.
+    """
+    assert all(bs % sbs == 0 for bs, sbs in zip(block_shape, sub_block_shape)), "%s, %s" % (str(block_shape),
+                                                                                          str(sub_block_shape))
+    from nifty.tools import blocking
+    blocking_ = blocking([0] * len(shape), list(shape), list(block_shape))
+    sub_blocking = blocking([0] * len(shape), list(shape), list(sub_block_shape))
+    sub_block_list = []
+    for block_id in block_list:
+        block = blocking_.getBlock(block_id)
+        sub_block_ids = sub_blocking.getBlockIdsOverlappingBoundingBox(list(block.begin), list(block.end))
+        # only keep the sub-blocks that start in this block, in case the bounding box end is inclusive
+        for sub_id in sub_block_ids.tolist():
+            sub_begin = sub_blocking.getBlock(sub_id).begin
+            if all(beg <= sbeg < end for beg, sbeg, end in zip(block.begin, sub_begin, block.end)):
+                sub_block_list.append(sub_id)
+    return sorted(set(sub_block_list))
+
+
 def block_to_bb(block):
     return tuple(slice(beg, end) for beg, end in zip(block.begin, block.end))
 
@@ -82,15 +247,16 @@ def apply_filter(input_, filter_name, sigma, apply_in_2d=False):
     if isinstance(sigma, (tuple, list)):
         assert len(sigma) == input_.ndim
         assert not apply_in_2d
+        import vigra
         filt = getattr(vigra.filters, filter_name)
         return filt(input_, sigma)
     # apply 2d filter to individual slices
     elif apply_in_2d:
-        filt = getattr(ff, filter_name)
+        filt = getattr(_filter_module(), filter_name)
         return np.concatenate([filt(in_z, sigma)[None] for in_z in input_], axis=0)
     # apply 3d fillter
     else:
-        filt = getattr(ff, filter_name)
+        filt = getattr(_filter_module(), filter_name)
         return filt(input_, sigma)
 
 
@@ -180,6 +346,7 @@ def load_mask(mask_path, mask_key, shape):
     else:
         with file_reader(mask_path, 'r') as f_mask:
             mask = f_mask[mask_key][:].astype('bool')
+        from elf.wrapper.resized_volume import ResizedVolume
         mask = ResizedVolume(mask, shape=shape, order=0)
     return mask
 
@@ -258,6 +425,7 @@ def mask_corners(input_, halo):
 
 
 def preserving_erosion(mask, erode_by):
+    from scipy.ndimage.morphology import binary_erosion
     eroded = binary_erosion(mask, iterations=erode_by)
     n_foreground = eroded.sum()
     while n_foreground == 0:
@@ -270,6 +438,7 @@ def preserving_erosion(mask, erode_by):
 
 
 def fit_seeds(objs, obj_ids, bg_id, erode_by, max_erode):
+    from scipy.ndimage.morphology import binary_erosion
     background = objs == 0
     seeds = bg_id * binary_erosion(background, iterations=max_erode)
     seeds = seeds.astype('uint32')
@@ -286,6 +455,7 @@ def fit_seeds(objs, obj_ids, bg_id, erode_by, max_erode):
 
 
 def fit_to_hmap_2d(objs, hmap, erode_by, max_erode, obj_ids, bg_id):
+    import vigra
 
     # make the seeds by binary erosion of background and foreground
     seeds = np.zeros_like(hmap, dtype='uint32')
@@ -316,6 +486,7 @@ def fit_to_hmap_2d(objs, hmap, erode_by, max_erode, obj_ids, bg_id):
 
 
 def fit_to_hmap_3d(objs, hmap, erode_by, max_erode, obj_ids, bg_id):
+    import vigra
     seeds = fit_seeds(objs, obj_ids, bg_id, erode_by, max_erode)
 
     # apply dt before watershed
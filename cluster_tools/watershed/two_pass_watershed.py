@@ -81,7 +81,7 @@ class TwoPassWatershedBase(luigi.Task):
         chunks = tuple(bs // 2 for bs in block_shape)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.output_path), dtype='uint64')
 
         # update the config with input and output paths and keys
         # as well as block shape
@@ -3,6 +3,7 @@
 import os
 import sys
 import json
+from contextlib import contextmanager
 
 # this is a task called by multiple processes,
 # so we need to restrict the number of threads used by numpy
@@ -25,6 +26,9 @@ except ImportError:
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.queue_utils as qu
+import cluster_tools.utils.cache_utils as cu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
 
@@ -38,6 +42,9 @@ class WatershedBase(luigi.Task):
 
     task_name = 'watershed'
     src_file = os.path.abspath(__file__)
+    supports_block_queue = True
+    fusable = True
+    halo_inputs = ('input', 'mask')
 
     # input and output volumes
     input_path = luigi.Parameter()
@@ -57,7 +64,8 @@ class WatershedBase(luigi.Task):
                        'sigma_weights': 2., 'halo': [0, 0, 0],
                        'channel_begin': 0, 'channel_end': None,
                        'agglomerate_channels': 'mean', 'alpha': 0.8,
-                       'invert_inputs': False, 'non_maximum_suppression': False})
+                       'invert_inputs': False, 'non_maximum_suppression': False,
+                       'chunk_cache_size': 0.})
         return config
 
     def clean_up_for_retry(self, block_list):
@@ -82,7 +90,7 @@ class WatershedBase(luigi.Task):
         chunks = tuple(bs // 2 for bs in block_shape)
         with vu.file_reader(self.output_path) as f:
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.output_path), dtype='uint64')
 
         # update the config with input and output paths and keys
         # as well as block shape
@@ -103,7 +111,9 @@ class WatershedBase(luigi.Task):
         n_jobs = min(len(block_list), self.max_jobs)
 
         # prime and run the jobs
-        self.prepare_jobs(n_jobs, block_list, ws_config)
+        # neighboring blocks read overlapping chunks, so we keep them in the same job if the chunk cache is used
+        self.prepare_jobs(n_jobs, block_list, ws_config,
+                          consecutive_blocks=ws_config.get('chunk_cache_size', 0) > 0)
         self.submit_jobs(n_jobs)
 
         # wait till jobs finish and check for job success
@@ -283,8 +293,7 @@ def _read_data(ds_in, input_bb, config):
     return input_
 
 
-def _ws_block(blocking, block_id, ds_in, ds_out, mask, config):
-    fu.log("start processing block %i" % block_id)
+def _read_ws_block(blocking, block_id, ds_in, mask, config):
     input_bb, inner_bb, output_bb = _get_bbs(blocking, block_id,
                                              config)
     # get the mask and check if we have any pixels
@@ -294,14 +303,20 @@ def _ws_block(blocking, block_id, ds_in, ds_out, mask, config):
         in_mask = mask[input_bb].astype('bool')
         out_mask = in_mask[inner_bb]
         if np.sum(out_mask) == 0:
-            fu.log_block_success(block_id)
-            return
+            return None
 
     # read the input
     input_ = _read_data(ds_in, input_bb, config)
     if in_mask is not None:
         # mask the input
         input_[np.logical_not(in_mask)] = 1
+    return input_, in_mask
+
+
+# returns the output bounding box and the watershed for this block
+def _compute_ws_block(blocking, block_id, input_, in_mask, config):
+    input_bb, inner_bb, output_bb = _get_bbs(blocking, block_id,
+                                             config)
 
     # get offset to make new seeds unique between blocks
     # (we need to relabel later to make processing efficient !)
@@ -316,11 +331,9 @@ def _ws_block(blocking, block_id, ds_in, ds_out, mask, config):
         # (potentially corrected for the mask)
         out_shape = tuple(obb.stop - obb.start for obb in output_bb)
         ws = offset * np.ones(out_shape, dtype='uint64')
-        if mask is not None:
-            ws[np.logical_not(out_mask)] = 0
-        ds_out[output_bb] = ws
-        fu.log_block_success(block_id)
-        return
+        if in_mask is not None:
+            ws[np.logical_not(in_mask[inner_bb])] = 0
+        return output_bb, ws
 
     # -> apply ws and write the results to the inner volume
     ws = _apply_watershed(input_, dt, config, in_mask)
@@ -339,49 +352,77 @@ def _ws_block(blocking, block_id, ds_in, ds_out, mask, config):
     else:
         ws[in_mask] += offset
 
-    # write result and log block success
-    ds_out[output_bb] = ws
+    return output_bb, ws
+
+
+def _ws_block(blocking, block_id, ds_in, ds_out, mask, config):
+    fu.log("start processing block %i" % block_id)
+    data = _read_ws_block(blocking, block_id, ds_in, mask, config)
+    if data is not None:
+        output_bb, ws = _compute_ws_block(blocking, block_id, *data, config)
+        ds_out[output_bb] = ws
     fu.log_block_success(block_id)
 
 
+def _get_blocking(config):
+    shape = list(vu.get_shape(config['input_path'], config['input_key']))
+    if len(shape) == 4:
+        shape = shape[1:]
+    return shape, nt.blocking([0, 0, 0], shape, list(config['block_shape']))
+
+
+def _get_datasets(f_in, f_out, shape, config):
+    ds_in = f_in[config['input_key']]
+    assert ds_in.ndim in (3, 4)
+    ds_out = f_out[config['output_key']]
+    assert ds_out.ndim == 3
+
+    if 'mask_path' in config:
+        mask = vu.load_mask(config['mask_path'], config['mask_key'], shape)
+    else:
+        mask = None
+    return ds_in, ds_out, mask
+
+
+@contextmanager
+def block_processor(config):
+    """ Yield a function that computes the watershed for a single block,
+        with the inputs and outputs opened once, see `fusion.FusedBlockwise`.
+    """
+    shape, blocking = _get_blocking(config)
+    with vu.file_reader(config['input_path'], 'r') as f_in, vu.file_reader(config['output_path']) as f_out:
+        ds_in, ds_out, mask = _get_datasets(f_in, f_out, shape, config)
+
+        def process_block(block_id):
+            data = _read_ws_block(blocking, block_id, ds_in, mask, config)
+            if data is not None:
+                output_bb, ws = _compute_ws_block(blocking, block_id, *data, config)
+                ds_out[output_bb] = ws
+
+        yield process_block
+
+
 def watershed(job_id, config_path):
     fu.log("start processing job %i" % job_id)
     fu.log("reading config from %s" % config_path)
     with open(config_path, 'r') as f:
         config = json.load(f)
 
-    # read the input cofig
-    input_path = config['input_path']
-    input_key = config['input_key']
-    shape = list(vu.get_shape(input_path, input_key))
-    if len(shape) == 4:
-        shape = shape[1:]
-
-    block_shape = list(config['block_shape'])
-    block_list = config['block_list']
-
-    # read the output config
-    output_path = config['output_path']
-    output_key = config['output_key']
-
     # get the blocking
-    blocking = nt.blocking([0, 0, 0], shape, block_shape)
+    shape, blocking = _get_blocking(config)
 
     # submit blocks
-    with vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
-        ds_in = f_in[input_key]
-        assert ds_in.ndim in (3, 4)
-        ds_out = f_out[output_key]
-        assert ds_out.ndim == 3
-
-        if 'mask_path' in config:
-            mask_path = config['mask_path']
-            mask_key = config['mask_key']
-            mask = vu.load_mask(mask_path, mask_key, shape)
-        else:
-            mask = None
-        for block_id in block_list:
-            _ws_block(blocking, block_id, ds_in, ds_out, mask, config)
+    # the chunk cache avoids reading the overlapping halos of neighboring blocks several times
+    with cu.chunk_cache(config.get('chunk_cache_size', 0)),\
+            vu.file_reader(config['input_path'], 'r') as f_in, vu.file_reader(config['output_path']) as f_out:
+        ds_in, ds_out, mask = _get_datasets(f_in, f_out, shape, config)
+        # we read the next blocks and write the results in the background while computing the watershed,
+        # with multiple threads, the I/O of the different threads overlaps already
+        pu.run_pipelined(qu.blocks_for_job(config),
+                         read_block=lambda block_id: _read_ws_block(blocking, block_id, ds_in, mask, config),
+                         process_block=lambda block_id, data: None if data is None else
+                         _compute_ws_block(blocking, block_id, *data, config),
+                         ds_out=ds_out, n_threads=config.get('threads_per_job', 1))
 
     # log success
     fu.log_job_success(job_id)
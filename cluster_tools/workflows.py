@@ -15,6 +15,9 @@ from .lifted_multicut import LiftedMulticutWorkflow
 
 from .debugging import CheckSubGraphsWorkflow
 from . import write as write_tasks
+from .graph import initial_sub_graphs as graph_tasks
+from .features import block_edge_features as feat_tasks
+from .fusion import fused_blockwise as fusion_tasks
 
 #
 from .agglomerative_clustering import agglomerative_clustering as agglomerate_tasks
@@ -41,23 +44,56 @@ class ProblemWorkflow(WorkflowBase):
     compute_costs = luigi.BoolParameter(default=True)
     # do we run sanity checks ?
     sanity_checks = luigi.BoolParameter(default=False)
+    # do we compute the sub-graphs and block features in one set of jobs, see `fusion.FusedBlockwise`
+    fuse_blockwise = luigi.BoolParameter(default=False)
 
     # hard-coded keys
     graph_key = 's0/graph'
     features_key = 'features'
     costs_key = 's0/costs'
 
+    def _fused_blockwise(self):
+        graph_task = getattr(graph_tasks,
+                             self._get_task_name('InitialSubGraphs'))
+        graph_task = graph_task(tmp_folder=self.tmp_folder,
+                                max_jobs=self.max_jobs,
+                                config_dir=self.config_dir,
+                                input_path=self.ws_path,
+                                input_key=self.ws_key,
+                                graph_path=self.problem_path,
+                                dependency=self.dependency)
+        feat_task = getattr(feat_tasks,
+                            self._get_task_name('BlockEdgeFeatures'))
+        feat_task = feat_task(tmp_folder=self.tmp_folder,
+                              max_jobs=self.max_jobs,
+                              config_dir=self.config_dir,
+                              input_path=self.input_path,
+                              input_key=self.input_key,
+                              labels_path=self.ws_path,
+                              labels_key=self.ws_key,
+                              graph_path=self.problem_path,
+                              output_path=self.problem_path,
+                              dependency=graph_task)
+        fused_task = getattr(fusion_tasks,
+                             self._get_task_name('FusedBlockwise'))
+        return fused_task(tmp_folder=self.tmp_folder,
+                          max_jobs=self.max_jobs,
+                          config_dir=self.config_dir,
+                          stages=(graph_task, feat_task))
+
     def requires(self):
+        dep = self._fused_blockwise() if self.fuse_blockwise else self.dependency
         dep = GraphWorkflow(tmp_folder=self.tmp_folder,
                             max_jobs=self.max_jobs,
                             config_dir=self.config_dir,
                             target=self.target,
-                            dependency=self.dependency,
+                            dependency=dep,
                             input_path=self.ws_path,
                             input_key=self.ws_key,
                             graph_path=self.problem_path,
                             output_key=self.graph_key,
-                            n_scales=1)
+                            n_scales=1,
+                            compute_sub_graphs=not self.fuse_blockwise)
         # sanity check the subgraph
         if self.sanity_checks:
             subgraph_key = 's0/sub_graphs'
@@ -83,7 +119,8 @@ class ProblemWorkflow(WorkflowBase):
                                    graph_key=self.graph_key,
                                    output_path=self.problem_path,
                                    output_key=self.features_key,
-                                   max_jobs_merge=self.max_jobs_merge)
+                                   max_jobs_merge=self.max_jobs_merge,
+                                   compute_block_features=not self.fuse_blockwise)
         if self.compute_costs:
             dep = EdgeCostsWorkflow(tmp_folder=self.tmp_folder,
                                     max_jobs=self.max_jobs,
@@ -103,7 +140,8 @@ class ProblemWorkflow(WorkflowBase):
     def get_config():
         config = {**GraphWorkflow.get_config(),
                   **EdgeFeaturesWorkflow.get_config(),
-                  **EdgeCostsWorkflow.get_config()}
+                  **EdgeCostsWorkflow.get_config(),
+                  'fused_blockwise': fusion_tasks.FusedBlockwiseLocal.default_task_config()}
         return config
 
 
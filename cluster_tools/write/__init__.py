@@ -1 +1,5 @@
-from .write import WriteLocal, WriteSlurm, WriteLSF
+from ..utils.import_utils import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+    '.write': ['WriteLocal', 'WriteSlurm', 'WriteLSF'],
+})
@@ -18,6 +18,7 @@ import nifty.tools as nt
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
+import cluster_tools.utils.pipeline_utils as pu
 from cluster_tools.utils.task_utils import DummyTask
 from cluster_tools.cluster_tasks import SlurmTask, LocalTask, LSFTask
 
@@ -32,6 +33,7 @@ class WriteBase(luigi.Task):
     """
     task_name = 'write'
     src_file = os.path.abspath(__file__)
+    supports_block_splitting = True
 
     # path and key to input and output datasets
     input_path = luigi.Parameter()
@@ -88,7 +90,7 @@ class WriteBase(luigi.Task):
             assert all(bs % ch == 0 for bs, ch in zip(block_shape, chunks)), "%s, %s" % (str(block_shape),
                                                                                          str(chunks))
             f.require_dataset(self.output_key, shape=shape, chunks=chunks,
-                              compression='gzip', dtype='uint64')
+                              **self.compression_options(self.output_path), dtype='uint64')
 
         # check if input and output datasets are identical
         in_place = (self.input_path == self.output_path) and (self.input_key == self.output_key)
@@ -114,6 +116,11 @@ class WriteBase(luigi.Task):
         else:
             block_list = self.block_list
             self.clean_up_for_retry(block_list, self.identifier)
+            block_list, config = self.split_blocks_for_retry(block_list, config, shape, chunks)
+            # the offsets are indexed by the ids of the original blocks, so the jobs need their shape
+            # to find the offsets of split blocks
+            if self.offset_path != '':
+                config.update({'offset_block_shape': block_shape})
         self._write_log('scheduling %i blocks to be processed' % len(block_list))
 
         n_jobs = min(len(block_list), self.max_jobs)
@@ -182,62 +189,93 @@ def _apply_node_labels(seg, node_labels, allow_empty_assignments):
     return seg
 
 
-def _write_block_with_offsets(ds_in, ds_out, blocking, block_id,
-                              node_labels, offsets, allow_empty_assignments):
-    fu.log("start processing block %i" % block_id)
-    off = offsets[block_id]
+def _read_block(ds_in, blocking, block_id):
     block = blocking.getBlock(block_id)
     bb = vu.block_to_bb(block)
-    seg = ds_in[bb]
+    return bb, ds_in[bb]
+
 
+# returns the bounding box and the relabeled block or None for an empty block
+def _relabel_block(bb, seg, node_labels, allow_empty_assignments, offset=None):
     # check if this block is empty and don't write if it is
     mask = seg != 0
     if np.sum(mask) == 0:
-        fu.log_block_success(block_id)
-        return
+        return None
 
-    seg[mask] += off
+    if offset is not None:
+        seg[mask] += offset
     seg = _apply_node_labels(seg, node_labels, allow_empty_assignments)
-    ds_out[bb] = seg
+    return bb, seg
+
+
+def _write_block_with_offsets(ds_in, ds_out, blocking, block_id,
+                              node_labels, offset, allow_empty_assignments):
+    fu.log("start processing block %i" % block_id)
+    output = _relabel_block(*_read_block(ds_in, blocking, block_id),
+                            node_labels, allow_empty_assignments, offset)
+    if output is not None:
+        bb, seg = output
+        ds_out[bb] = seg
     fu.log_block_success(block_id)
 
 
 def _write_with_offsets(ds_in, ds_out, blocking, block_list,
                         n_threads, node_labels, offset_path,
-                        allow_empty_assignments):
+                        allow_empty_assignments, offset_block_shape):
 
     fu.log("loading offsets from %s" % offset_path)
     with open(offset_path) as f:
         offset_config = json.load(f)
         offsets = offset_config['offsets']
-        empty_blocks = offset_config['empty_blocks']
+        empty_blocks = set(offset_config['empty_blocks'])
+
+    # the blocks may be sub-blocks of the blocks the offsets were computed for, if they were split in a retry
+    offset_blocking = nt.blocking([0, 0, 0], list(ds_in.shape), list(offset_block_shape))
+    offset_ids = {block_id: offset_blocking.coordinatesToBlockId(list(blocking.getBlock(block_id).begin))
+                  for block_id in block_list}
+    block_list = [block_id for block_id in block_list if offset_ids[block_id] not in empty_blocks]
+    # we read the next blocks and write the results in the background while relabeling,
+    # with multiple threads, the I/O of the different threads overlaps already
+    if n_threads <= 1:
+        pu.run_pipelined(block_list,
+                         read_block=lambda block_id: _read_block(ds_in, blocking, block_id),
+                         process_block=lambda block_id, data: _relabel_block(*data, node_labels,
+                                                                             allow_empty_assignments,
+                                                                             offsets[offset_ids[block_id]]),
+                         ds_out=ds_out)
+        return
 
     with futures.ThreadPoolExecutor(n_threads) as tp:
         tasks = [tp.submit(_write_block_with_offsets, ds_in, ds_out,
-                           blocking, block_id, node_labels, offsets,
+                           blocking, block_id, node_labels, offsets[offset_ids[block_id]],
                            allow_empty_assignments)
-                 for block_id in block_list if block_id not in empty_blocks]
+                 for block_id in block_list]
         [t.result() for t in tasks]
 
 
 def _write_block(ds_in, ds_out, blocking, block_id, node_labels,
                  allow_empty_assignments):
     fu.log("start processing block %i" % block_id)
-    block = blocking.getBlock(block_id)
-    bb = vu.block_to_bb(block)
-    seg = ds_in[bb]
-    # check if this block is empty and don't write if it is
-    if np.sum(seg != 0) == 0:
-        fu.log_block_success(block_id)
-        return
-
-    seg = _apply_node_labels(seg, node_labels, allow_empty_assignments)
-    ds_out[bb] = seg
+    output = _relabel_block(*_read_block(ds_in, blocking, block_id),
+                            node_labels, allow_empty_assignments)
+    if output is not None:
+        bb, seg = output
+        ds_out[bb] = seg
     fu.log_block_success(block_id)
 
 
 def _write(ds_in, ds_out, blocking, block_list,
            n_threads, node_labels, allow_empty_assignments):
+    # we read the next blocks and write the results in the background while relabeling,
+    # with multiple threads, the I/O of the different threads overlaps already
+    if n_threads <= 1:
+        pu.run_pipelined(block_list,
+                         read_block=lambda block_id: _read_block(ds_in, blocking, block_id),
+                         process_block=lambda block_id, data: _relabel_block(*data, node_labels,
+                                                                             allow_empty_assignments),
+                         ds_out=ds_out)
+        return
+
     with futures.ThreadPoolExecutor(n_threads) as tp:
         tasks = [tp.submit(_write_block, ds_in, ds_out,
                            blocking, block_id, node_labels,
@@ -319,6 +357,7 @@ def write(job_id, config_path):
     node_labels = _load_assignments(assignment_path, assignment_key, n_threads)
 
     offset_path = config.get('offset_path', None)
+    offset_block_shape = config.get('offset_block_shape', block_shape)
 
     # if we write in-place, we only need to open one file and one dataset
     if in_place:
@@ -335,7 +374,8 @@ def write(job_id, config_path):
                 _write(ds_in, ds_out, blocking, block_list, n_threads, node_labels, allow_empty_assignments)
             else:
                 _write_with_offsets(ds_in, ds_out, blocking, block_list,
-                                    n_threads, node_labels, offset_path, allow_empty_assignments)
+                                    n_threads, node_labels, offset_path, allow_empty_assignments,
+                                    offset_block_shape)
         # write the max-label
         # for job 0
         if job_id == 0:
@@ -361,7 +401,7 @@ def write(job_id, config_path):
                 else:
                     _write_with_offsets(ds_in, ds_out, blocking, block_list,
                                         n_threads, node_labels, offset_path,
-                                        allow_empty_assignments)
+                                        allow_empty_assignments, offset_block_shape)
         else:
             with vu.file_reader(input_path, 'r') as f_in, vu.file_reader(output_path) as f_out:
                 ds_in = f_in[input_key]
@@ -378,7 +418,7 @@ def write(job_id, config_path):
                 else:
                     _write_with_offsets(ds_in, ds_out, blocking, block_list,
                                         n_threads, node_labels, offset_path,
-                                        allow_empty_assignments)
+                                        allow_empty_assignments, offset_block_shape)
         # write the max-label
         # for job 0
         if job_id == 0:
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import luigi
+import z5py
+
+try:
+    from ..base import BaseTest
+except ValueError:
+    sys.path.append('..')
+    from base import BaseTest
+
+
+class TestRechunk(BaseTest):
+    input_key = 'data'
+    output_key = 'rechunked'
+    shape = (64, 300, 300)
+
+    def setUp(self):
+        super().setUp()
+        self.input_path = os.path.join(self.tmp_folder, 'input.n5')
+        self.data = np.random.randint(0, 1000, size=self.shape).astype('uint32')
+        # some of the blocks are empty
+        self.data[:32, :128, :128] = 0
+        with z5py.File(self.input_path) as f:
+            f.create_dataset(self.input_key, data=self.data, chunks=(10, 100, 100))
+
+    def test_rechunk(self):
+        from cluster_tools.copy_volume import RechunkWorkflow
+        chunks = [32, 64, 64]
+        task = RechunkWorkflow(tmp_folder=self.tmp_folder, config_dir=self.config_folder,
+                               max_jobs=self.max_jobs, target=self.target,
+                               input_path=self.input_path, input_key=self.input_key,
+                               output_path=self.output_path, output_key=self.output_key,
+                               chunks=chunks)
+        ret = luigi.build([task], local_scheduler=True)
+        self.assertTrue(ret)
+
+        with z5py.File(self.output_path, 'r') as f:
+            ds = f[self.output_key]
+            self.assertEqual(ds.chunks, tuple(chunks))
+            res = ds[:]
+        self.assertTrue(np.array_equal(res, self.data))
+
+    def test_rechunk_block_shape(self):
+        from cluster_tools.copy_volume.rechunk import RechunkBase
+        self.assertEqual(RechunkBase.rechunk_block_shape([32, 256, 256], [10, 100, 100], [32, 64, 64]),
+                         [32, 256, 256])
+        self.assertEqual(RechunkBase.rechunk_block_shape([32, 256, 256], [16, 64, 64], [32, 128, 128]),
+                         [32, 256, 256])
+        self.assertEqual(RechunkBase.rechunk_block_shape([32, 256, 256], [16, 64, 64], [32, 96, 96]),
+                         [32, 192, 192])
+        self.assertEqual(RechunkBase.rechunk_block_shape([32, 256, 256], [16, 64, 64], [64, 128, 128]),
+                         [64, 256, 256])
+
+
+if __name__ == '__main__':
+    unittest.main()
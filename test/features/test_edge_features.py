@@ -127,6 +127,35 @@ class TestEdgeFeatures(BaseTest):
                             offsets=self.offsets, min=0., max=1.)
         self.check_results(self.aff_key, feat_func)
 
+    def test_block_queue_n_features(self):
+        from cluster_tools.features import EdgeFeaturesWorkflow
+        task = EdgeFeaturesWorkflow
+
+        # the jobs pull their blocks from the queue, the number of features is written once by the task
+        with open(os.path.join(self.config_folder, 'global.config')) as f:
+            config = json.load(f)
+        config['dynamic_block_queue'] = True
+        with open(os.path.join(self.config_folder, 'global.config'), 'w') as f:
+            json.dump(config, f)
+
+        ret = luigi.build([task(input_path=self.input_path,
+                                input_key=self.boundary_key,
+                                labels_path=self.input_path,
+                                labels_key=self.ws_key,
+                                graph_path=self.output_path,
+                                graph_key=self.graph_key,
+                                output_path=self.output_path,
+                                output_key=self.output_key,
+                                config_dir=self.config_folder,
+                                tmp_folder=self.tmp_folder,
+                                target=self.target,
+                                max_jobs=self.max_jobs)],
+                          local_scheduler=True)
+        self.assertTrue(ret)
+        with z5py.File(self.output_path, 'r') as f:
+            self.assertEqual(f['s0/sub_features'].attrs['n_features'], 10)
+            self.assertEqual(f[self.output_key].shape[1], 10)
+
     # TODO implement
     def test_features_from_filters(self):
         pass
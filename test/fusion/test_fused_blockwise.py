@@ -0,0 +1,171 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import luigi
+import z5py
+
+import nifty.tools as nt
+from cluster_tools.utils.task_utils import DummyTask
+
+try:
+    from ..base import BaseTest
+except ValueError:
+    sys.path.append('..')
+    from base import BaseTest
+
+
+class TestFusedBlockwise(BaseTest):
+    ref_path = './tmp/ref.n5'
+    ws_out_key = 'ws'
+
+    def _stages(self, tmp_folder, graph_path):
+        from cluster_tools.graph.initial_sub_graphs import InitialSubGraphsLocal
+        from cluster_tools.features.block_edge_features import BlockEdgeFeaturesLocal
+        graph_task = InitialSubGraphsLocal(tmp_folder=tmp_folder,
+                                           config_dir=self.config_folder,
+                                           max_jobs=self.max_jobs,
+                                           input_path=self.input_path,
+                                           input_key=self.ws_key,
+                                           graph_path=graph_path,
+                                           dependency=DummyTask())
+        feat_task = BlockEdgeFeaturesLocal(tmp_folder=tmp_folder,
+                                           config_dir=self.config_folder,
+                                           max_jobs=self.max_jobs,
+                                           input_path=self.input_path,
+                                           input_key=self.boundary_key,
+                                           labels_path=self.input_path,
+                                           labels_key=self.ws_key,
+                                           graph_path=graph_path,
+                                           output_path=graph_path,
+                                           dependency=graph_task)
+        return graph_task, feat_task
+
+    def _chain(self, tmp_folder, path):
+        from cluster_tools.watershed.watershed import WatershedLocal
+        from cluster_tools.graph.initial_sub_graphs import InitialSubGraphsLocal
+        from cluster_tools.features.block_edge_features import BlockEdgeFeaturesLocal
+        ws_task = WatershedLocal(tmp_folder=tmp_folder,
+                                 config_dir=self.config_folder,
+                                 max_jobs=self.max_jobs,
+                                 input_path=self.input_path,
+                                 input_key=self.boundary_key,
+                                 output_path=path,
+                                 output_key=self.ws_out_key)
+        graph_task = InitialSubGraphsLocal(tmp_folder=tmp_folder,
+                                           config_dir=self.config_folder,
+                                           max_jobs=self.max_jobs,
+                                           input_path=path,
+                                           input_key=self.ws_out_key,
+                                           graph_path=path,
+                                           dependency=ws_task)
+        feat_task = BlockEdgeFeaturesLocal(tmp_folder=tmp_folder,
+                                           config_dir=self.config_folder,
+                                           max_jobs=self.max_jobs,
+                                           input_path=self.input_path,
+                                           input_key=self.boundary_key,
+                                           labels_path=path,
+                                           labels_key=self.ws_out_key,
+                                           graph_path=path,
+                                           output_path=path,
+                                           dependency=graph_task)
+        return ws_task, graph_task, feat_task
+
+    def _check_chunks(self, path, ref_path, keys):
+        f = z5py.File(path, 'r')
+        f_ref = z5py.File(ref_path, 'r')
+        shape = z5py.File(self.input_path, 'r')[self.ws_key].shape
+        blocking = nt.blocking([0, 0, 0], list(shape), self.block_shape)
+        for key in keys:
+            ds, ds_ref = f[key], f_ref[key]
+            for block_id in range(blocking.numberOfBlocks):
+                chunk_id = blocking.blockGridPosition(block_id)
+                chunk, chunk_ref = ds.read_chunk(chunk_id), ds_ref.read_chunk(chunk_id)
+                if chunk_ref is None:
+                    self.assertIsNone(chunk)
+                else:
+                    self.assertTrue(np.allclose(chunk, chunk_ref))
+        self.assertEqual(f['s0/sub_features'].attrs['n_features'],
+                         f_ref['s0/sub_features'].attrs['n_features'])
+
+    def test_fused_blockwise(self):
+        from cluster_tools.fusion import FusedBlockwiseLocal
+
+        # run the stages one after the other to get the reference result
+        _, ref_task = self._stages(os.path.join(self.tmp_folder, 'ref'), self.ref_path)
+        ret = luigi.build([ref_task], local_scheduler=True)
+        self.assertTrue(ret)
+
+        stages = self._stages(self.tmp_folder, self.output_path)
+        task = FusedBlockwiseLocal(tmp_folder=self.tmp_folder,
+                                   config_dir=self.config_folder,
+                                   max_jobs=self.max_jobs,
+                                   stages=stages)
+        ret = luigi.build([task], local_scheduler=True)
+        self.assertTrue(ret)
+        # the stages must be complete after the fused task
+        self.assertTrue(all(stage.complete() for stage in stages))
+        self._check_chunks(self.output_path, self.ref_path,
+                           ('s0/sub_graphs/nodes', 's0/sub_graphs/edges', 's0/sub_features'))
+
+    def test_fused_chain(self):
+        from cluster_tools.fusion import FusedBlockwiseLocal
+
+        ref_task = self._chain(os.path.join(self.tmp_folder, 'ref'), self.ref_path)[-1]
+        ret = luigi.build([ref_task], local_scheduler=True)
+        self.assertTrue(ret)
+
+        stages = self._chain(self.tmp_folder, self.output_path)
+        task = FusedBlockwiseLocal(tmp_folder=self.tmp_folder,
+                                   config_dir=self.config_folder,
+                                   max_jobs=self.max_jobs,
+                                   stages=stages)
+        ret = luigi.build([task], local_scheduler=True)
+        self.assertTrue(ret)
+        self.assertTrue(all(stage.complete() for stage in stages))
+
+        # the sub-graphs need the watershed of the neighboring blocks,
+        # so the watershed is run in its own jobs before the graph and features are fused
+        log_dir = os.path.join(self.tmp_folder, 'logs')
+        self.assertTrue(os.path.exists(os.path.join(log_dir, 'fused_blockwise_watershed_0.log')))
+        self.assertTrue(os.path.exists(os.path.join(log_dir,
+                                                    'fused_blockwise_initial_sub_graphs_block_edge_features_0.log')))
+
+        with z5py.File(self.output_path, 'r') as f, z5py.File(self.ref_path, 'r') as f_ref:
+            self.assertTrue(np.array_equal(f[self.ws_out_key][:], f_ref[self.ws_out_key][:]))
+        self._check_chunks(self.output_path, self.ref_path,
+                           ('s0/sub_graphs/nodes', 's0/sub_graphs/edges', 's0/sub_features'))
+
+    def test_problem_workflow(self):
+        from cluster_tools.workflows import ProblemWorkflow
+        import nifty.distributed as ndist
+
+        def _run(tmp_folder, problem_path, fuse_blockwise):
+            task = ProblemWorkflow(input_path=self.input_path, input_key=self.boundary_key,
+                                   ws_path=self.input_path, ws_key=self.ws_key,
+                                   problem_path=problem_path, compute_costs=False,
+                                   fuse_blockwise=fuse_blockwise,
+                                   config_dir=self.config_folder, tmp_folder=tmp_folder,
+                                   target=self.target, max_jobs=self.max_jobs)
+            return luigi.build([task], local_scheduler=True)
+
+        self.assertTrue(_run(os.path.join(self.tmp_folder, 'ref'), self.ref_path, False))
+        self.assertTrue(_run(self.tmp_folder, self.output_path, True))
+
+        # the sub-graphs and block features were computed by the fused task only
+        log_dir = os.path.join(self.tmp_folder, 'logs')
+        self.assertFalse(os.path.exists(os.path.join(log_dir, 'initial_sub_graphs_0.log')))
+        self.assertFalse(os.path.exists(os.path.join(log_dir, 'block_edge_features_0.log')))
+
+        graph = ndist.Graph(self.output_path, ProblemWorkflow.graph_key)
+        graph_ref = ndist.Graph(self.ref_path, ProblemWorkflow.graph_key)
+        self.assertTrue(np.array_equal(graph.uvIds(), graph_ref.uvIds()))
+        with z5py.File(self.output_path, 'r') as f, z5py.File(self.ref_path, 'r') as f_ref:
+            features = f[ProblemWorkflow.features_key][:]
+            features_ref = f_ref[ProblemWorkflow.features_key][:]
+        self.assertTrue(np.allclose(features, features_ref))
+
+
+if __name__ == '__main__':
+    unittest.main()
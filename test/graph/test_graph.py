@@ -160,6 +160,73 @@ class TestGraph(BaseTest):
         self.check_subresults(self.label_multiset_key_ref)
         self.check_result(self.label_multiset_key_ref)
 
+    def test_graph_block_mask(self):
+        from cluster_tools.features import EdgeFeaturesWorkflow
+        from cluster_tools.graph import GraphWorkflow
+        from cluster_tools.utils.volume_utils import blocks_in_mask
+
+        # low resolution mask that covers the lower corner of the volume
+        with z5py.File(self.input_path, 'r') as f:
+            ds_ws = f[self.input_key]
+            ds_ws.n_threads = 8
+            seg = ds_ws[:]
+        shape = seg.shape
+        mask = np.zeros(tuple(sh // 2 for sh in shape), dtype='uint8')
+        mask[:mask.shape[0] // 2, :mask.shape[1] // 2] = 1
+        mask_path = os.path.join(self.tmp_folder, 'mask.n5')
+        with z5py.File(mask_path) as f:
+            f.create_dataset('mask', data=mask, chunks=(16, 128, 128))
+
+        config_path = os.path.join(self.config_folder, 'global.config')
+        with open(config_path) as f:
+            global_config = json.load(f)
+        global_config.update({'block_mask_path': mask_path, 'block_mask_key': 'mask'})
+        with open(config_path, 'w') as f:
+            json.dump(global_config, f)
+        task_config = GraphWorkflow.get_config()['initial_sub_graphs']
+        task_config['ignore_label'] = False
+        with open(os.path.join(self.config_folder, 'initial_sub_graphs.config'), 'w') as f:
+            json.dump(task_config, f)
+
+        # the merge steps must only use the sub-results of the blocks in the mask
+        feature_key = 'features'
+        graph_task = GraphWorkflow(input_path=self.input_path, input_key=self.input_key,
+                                   graph_path=self.output_path, output_key=self.output_key,
+                                   n_scales=2, config_dir=self.config_folder,
+                                   tmp_folder=self.tmp_folder, target=self.target,
+                                   max_jobs=self.max_jobs)
+        feature_task = EdgeFeaturesWorkflow(input_path=self.input_path, input_key=self.boundary_key,
+                                            labels_path=self.input_path, labels_key=self.input_key,
+                                            graph_path=self.output_path, graph_key=self.output_key,
+                                            output_path=self.output_path, output_key=feature_key,
+                                            config_dir=self.config_folder, tmp_folder=self.tmp_folder,
+                                            target=self.target, max_jobs=self.max_jobs,
+                                            dependency=graph_task)
+        ret = luigi.build([feature_task], local_scheduler=True)
+        self.assertTrue(ret)
+
+        # the expected edges are the edges of the blocks in the mask, with a halo to the lower blocks
+        block_list = blocks_in_mask(mask_path, 'mask', shape, self.block_shape)
+        blocking = nt.blocking([0, 0, 0], list(shape), self.block_shape)
+        self.assertGreater(len(block_list), 0)
+        self.assertLess(len(block_list), blocking.numberOfBlocks)
+        uv_ids = []
+        for block_id in block_list:
+            block = blocking.getBlockWithHalo(block_id, [1, 1, 1])
+            bb = tuple(slice(beg, end) for beg, end in zip(block.outerBlock.begin, block.innerBlock.end))
+            seg_block = seg[bb]
+            rag = nrag.gridRag(seg_block, numberOfLabels=int(seg_block.max()) + 1)
+            uv_ids.append(rag.uvIds())
+        expected_uv_ids = np.unique(np.concatenate(uv_ids, axis=0), axis=0)
+
+        graph = ndist.Graph(self.output_path, self.output_key)
+        self.assertTrue(np.array_equal(graph.uvIds(), expected_uv_ids))
+        with z5py.File(self.output_path, 'r') as f:
+            features = f[feature_key][:]
+        self.assertEqual(len(features), len(expected_uv_ids))
+        # all edges have features, i.e. a non-zero size
+        self.assertTrue((features[:, -1] > 0).all())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+import os
+import json
+import unittest
+import sys
+
+import numpy as np
+import luigi
+import z5py
+
+try:
+    from ..base import BaseTest
+except ValueError:
+    sys.path.append('..')
+    from base import BaseTest
+
+try:
+    from ..retry.failing_task import FailingTaskLSF
+except (ValueError, ImportError):
+    sys.path.append('../retry')
+    from failing_task import FailingTaskLSF
+
+
+class TestLSF(BaseTest):
+    """ Test the lsf submission with stand-in scripts for
+    `bsub` and `bjobs` that run the jobs locally.
+    """
+    output_key = 'data'
+    shape = (100, 1024, 1024)
+    # the shims of the local fake cluster used by the benchmarks
+    shim_dir = os.path.join(os.path.split(os.path.abspath(__file__))[0],
+                            '..', '..', 'benchmarks', 'fake_cluster', 'bin')
+
+    def setUp(self):
+        super().setUp()
+        self.cluster_dir = os.path.abspath(os.path.join(self.tmp_folder, 'fake_cluster'))
+        self.env = dict(os.environ)
+        os.environ['PATH'] = '%s:%s' % (self.shim_dir, os.environ['PATH'])
+        os.environ['FAKE_CLUSTER_DIR'] = self.cluster_dir
+
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config.update({'max_num_retries': 2})
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.env)
+        super().tearDown()
+
+    def _update_config(self, **kwargs):
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config.update(kwargs)
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+
+    def _run_failing_task(self):
+        task = FailingTaskLSF
+        ret = luigi.build([task(output_path=self.output_path,
+                                output_key=self.output_key,
+                                shape=self.shape,
+                                config_dir=self.config_folder,
+                                tmp_folder=self.tmp_folder,
+                                max_jobs=self.max_jobs)], local_scheduler=True)
+        self.assertTrue(ret)
+        with z5py.File(self.output_path) as f:
+            data = f[self.output_key][:]
+        self.assertTrue(np.allclose(data, 1))
+
+    def test_single_jobs(self):
+        self._run_failing_task()
+
+    def test_job_array(self):
+        self._update_config(job_array=True)
+        self._run_failing_task()
+        # make sure that we have submitted a single array per try (first run + retry)
+        with open(os.path.join(self.cluster_dir, 'counter')) as f:
+            n_submissions = int(f.read())
+        self.assertEqual(n_submissions, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,7 @@ import nifty.tools as nt
 
 import cluster_tools.utils.volume_utils as vu
 import cluster_tools.utils.function_utils as fu
-from cluster_tools.cluster_tasks import LocalTask
+from cluster_tools.cluster_tasks import LocalTask, SlurmTask, LSFTask
 
 
 #
@@ -30,9 +30,8 @@ class FailingTaskBase(luigi.Task):
     def clean_up_for_retry(self, block_list):
         super().clean_up_for_retry(block_list)
 
-    def run(self):
+    def run_impl(self):
         # get the global config and init configs
-        self.make_dirs()
         shebang, block_shape, roi_begin, roi_end = self.global_config_values()
         self.init(shebang)
 
@@ -69,6 +68,18 @@ class FailingTaskLocal(FailingTaskBase, LocalTask):
     pass
 
 
+class FailingTaskSlurm(FailingTaskBase, SlurmTask):
+    """ FailingTask on slurm cluster
+    """
+    pass
+
+
+class FailingTaskLSF(FailingTaskBase, LSFTask):
+    """ FailingTask on lsf cluster
+    """
+    pass
+
+
 def _failing_block(block_id, blocking, ds, n_retries):
     # fail for odd block ids if we are in the first try
     if n_retries == 0 and block_id % 2 == 1:
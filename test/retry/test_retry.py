@@ -7,6 +7,9 @@ import numpy as np
 import luigi
 import z5py
 
+import cluster_tools.utils.volume_utils as vu
+from cluster_tools.utils.manifest_utils import processed_blocks_since
+
 try:
     from ..base import BaseTest
 except ValueError:
@@ -20,6 +23,18 @@ except ImportError:
     from failing_task import FailingTaskLocal
 
 
+class DriverKilled(BaseException):
+    """ Stands in for the driver process being killed, which does not clean up the task log.
+    """
+
+
+class AbortedTaskLocal(FailingTaskLocal):
+    """ FailingTask whose driver is killed after the jobs have finished
+    """
+    def check_jobs(self, n_jobs, job_prefix=None):
+        raise DriverKilled()
+
+
 class TestRetry(BaseTest):
     output_key = 'data'
     shape = (100, 1024, 1024)
@@ -33,7 +48,7 @@ class TestRetry(BaseTest):
         with open(conf_path, 'w') as f:
             json.dump(global_config, f)
 
-    def test_retry(self):
+    def _run_failing_task(self):
         task = FailingTaskLocal
         ret = luigi.build([task(output_path=self.output_path,
                                 output_key=self.output_key,
@@ -46,6 +61,95 @@ class TestRetry(BaseTest):
             data = f[self.output_key][:]
         self.assertTrue(np.allclose(data, 1))
 
+    def test_retry(self):
+        self._run_failing_task()
+
+    def test_retry_worker_pool(self):
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config['local_worker_pool'] = True
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+        self._run_failing_task()
+
+    def test_worker_modules(self):
+        from cluster_tools.utils.task_utils import import_task_module
+        # tasks defined in scripts that are run directly all have the module name '__main__'
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        modules = []
+        for name in ('script_a', 'script_b'):
+            src_file = os.path.abspath(os.path.join(self.tmp_folder, '%s.py' % name))
+            with open(src_file, 'w') as f:
+                f.write("def job_function():\n    return '%s'\n" % name)
+            modules.append(import_task_module('__main__', src_file))
+        self.assertEqual([module.job_function() for module in modules], ['script_a', 'script_b'])
+
+    def test_resume_from_manifest(self):
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config.update({'max_num_retries': 0, 'block_manifest': True})
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+
+        def run_task():
+            return luigi.build([FailingTaskLocal(output_path=self.output_path,
+                                                 output_key=self.output_key,
+                                                 shape=self.shape,
+                                                 config_dir=self.config_folder,
+                                                 tmp_folder=self.tmp_folder,
+                                                 max_jobs=self.max_jobs)], local_scheduler=True)
+
+        # the first run fails for the odd blocks
+        self.assertFalse(run_task())
+        os.remove(os.path.join(self.tmp_folder, 'failing_task_failed.log'))
+
+        # the second run only schedules the blocks that have failed
+        self.assertFalse(run_task())
+        scheduled_blocks = []
+        for job_id in range(self.max_jobs):
+            config_path = os.path.join(self.tmp_folder, 'failing_task_job_%i.config' % job_id)
+            with open(config_path) as f:
+                scheduled_blocks.extend(json.load(f)['block_list'])
+        self.assertGreater(len(scheduled_blocks), 0)
+        self.assertTrue(all(block_id % 2 == 1 for block_id in scheduled_blocks))
+
+    def test_resume_after_abort(self):
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config.update({'max_num_retries': 1, 'block_manifest': True})
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+        params = dict(output_path=self.output_path, output_key=self.output_key,
+                      shape=self.shape, config_dir=self.config_folder,
+                      tmp_folder=self.tmp_folder, max_jobs=self.max_jobs)
+
+        # the driver is killed after the jobs of the first run have processed the even blocks
+        task = AbortedTaskLocal(**params)
+        with self.assertRaises(DriverKilled):
+            task.run()
+        self.assertTrue(os.path.exists(task.output().path))
+        self.assertFalse(task.complete())
+        processed = processed_blocks_since(os.path.join(self.tmp_folder, 'logs', 'failing_task_'),
+                                           os.path.join(self.tmp_folder, 'telemetry', 'failing_task_'), 0)
+        self.assertGreater(len(processed), 0)
+
+        # the task is run again and only schedules the blocks that were not processed
+        task = FailingTaskLocal(**params)
+        self.assertFalse(task.complete())
+        self.assertTrue(luigi.build([task], local_scheduler=True))
+        self.assertTrue(task.complete())
+        n_blocks = len(vu.blocks_in_volume(self.shape, self.block_shape))
+        with open(task.output().path) as f:
+            log = f.read()
+        self.assertIn("skipping %i / %i blocks that were completed according to the manifest"
+                      % (len(processed), n_blocks), log)
+        with z5py.File(self.output_path) as f:
+            data = f[self.output_key][:]
+        self.assertTrue(np.allclose(data, 1))
+
 
 if __name__ == '__main__':
     unittest.main()
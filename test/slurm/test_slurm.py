@@ -0,0 +1,108 @@
+import os
+import json
+import unittest
+import sys
+
+import numpy as np
+import luigi
+import z5py
+
+try:
+    from ..base import BaseTest
+except ValueError:
+    sys.path.append('..')
+    from base import BaseTest
+
+try:
+    from ..retry.failing_task import FailingTaskSlurm
+except (ValueError, ImportError):
+    sys.path.append('../retry')
+    from failing_task import FailingTaskSlurm
+
+
+class TestSlurm(BaseTest):
+    """ Test the slurm submission with stand-in scripts for
+    `sbatch`, `squeue` and `sacct` that run the jobs locally.
+    """
+    output_key = 'data'
+    shape = (100, 1024, 1024)
+    # the shims of the local fake cluster used by the benchmarks
+    shim_dir = os.path.join(os.path.split(os.path.abspath(__file__))[0],
+                            '..', '..', 'benchmarks', 'fake_cluster', 'bin')
+
+    def setUp(self):
+        super().setUp()
+        self.cluster_dir = os.path.abspath(os.path.join(self.tmp_folder, 'fake_cluster'))
+        self.env = dict(os.environ)
+        os.environ['PATH'] = '%s:%s' % (self.shim_dir, os.environ['PATH'])
+        os.environ['FAKE_CLUSTER_DIR'] = self.cluster_dir
+
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config.update({'max_num_retries': 2, 'easybuild': False})
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.env)
+        super().tearDown()
+
+    def _update_config(self, **kwargs):
+        conf_path = os.path.join(self.config_folder, 'global.config')
+        with open(conf_path) as f:
+            global_config = json.load(f)
+        global_config.update(kwargs)
+        with open(conf_path, 'w') as f:
+            json.dump(global_config, f)
+
+    def _run_failing_task(self):
+        task = FailingTaskSlurm
+        ret = luigi.build([task(output_path=self.output_path,
+                                output_key=self.output_key,
+                                shape=self.shape,
+                                config_dir=self.config_folder,
+                                tmp_folder=self.tmp_folder,
+                                max_jobs=self.max_jobs)], local_scheduler=True)
+        self.assertTrue(ret)
+        with z5py.File(self.output_path) as f:
+            data = f[self.output_key][:]
+        self.assertTrue(np.allclose(data, 1))
+
+    def test_single_jobs(self):
+        self._run_failing_task()
+
+    def test_job_array(self):
+        self._update_config(job_array=True)
+        self._run_failing_task()
+        # make sure that we have submitted a single array per try (first run + retry)
+        with open(os.path.join(self.cluster_dir, 'counter')) as f:
+            n_submissions = int(f.read())
+        self.assertEqual(n_submissions, 2)
+
+    def test_n_active_jobs(self):
+        task = FailingTaskSlurm(output_path=self.output_path, output_key=self.output_key,
+                                shape=self.shape, config_dir=self.config_folder,
+                                tmp_folder=self.tmp_folder, max_jobs=self.max_jobs)
+        os.makedirs(self.cluster_dir, exist_ok=True)
+        # array with a finished first task and two running tasks, which are not listed by sacct
+        with open(os.path.join(self.cluster_dir, 'config.json'), 'w') as f:
+            json.dump({'sacct_lag': True}, f)
+        for task_id in range(3):
+            open(os.path.join(self.cluster_dir, '7_%i.job' % task_id), 'w').close()
+        with open(os.path.join(self.cluster_dir, '7_0.exit'), 'w') as f:
+            f.write('0')
+        job_ids = ['7_%i' % task_id for task_id in range(3)]
+        self.assertEqual(task._n_active_jobs(job_ids), 2)
+        for task_id in (1, 2):
+            with open(os.path.join(self.cluster_dir, '7_%i.exit' % task_id), 'w') as f:
+                f.write('0')
+        self.assertEqual(task._n_active_jobs(job_ids), 0)
+        # pending array tasks are listed as a range
+        self.assertEqual(task._expand_slurm_id('12_[4-6,9%2]'), ['12_4', '12_5', '12_6', '12_9'])
+        self.assertEqual(task._expand_slurm_id('12_3'), ['12_3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
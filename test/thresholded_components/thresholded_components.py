@@ -23,9 +23,9 @@ class TestThresholdedComponents(BaseTest):
     output_key = 'data'
     assignment_key = 'assignments'
 
-    def _check_result(self, mode, check_for_equality=True, threshold=.5):
+    def _check_result(self, mode, check_for_equality=True, threshold=.5, output_key=None):
         with z5py.File(self.output_path) as f:
-            res = f[self.output_key][:]
+            res = f[self.output_key if output_key is None else output_key][:]
         with z5py.File(self.input_path) as f:
             inp = f[self.input_key][:]
 
@@ -65,6 +65,41 @@ class TestThresholdedComponents(BaseTest):
     def test_equal(self):
         self._test_mode('equal', threshold=0)
 
+    def test_split_retry(self):
+        from cluster_tools.thresholded_components import ThresholdedComponentsWorkflow
+        from cluster_tools.write import WriteLocal
+        workflow = ThresholdedComponentsWorkflow(tmp_folder=self.tmp_folder,
+                                                 config_dir=self.config_folder,
+                                                 target='local', max_jobs=self.max_jobs,
+                                                 input_path=self.input_path,
+                                                 input_key=self.input_key,
+                                                 output_path=self.output_path,
+                                                 output_key=self.output_key,
+                                                 assignment_key=self.assignment_key,
+                                                 threshold=.5)
+        # run the workflow up to the write task, which is run as a retry with split blocks
+        write_task = workflow.requires()
+        ret = luigi.build([write_task.dependency], local_scheduler=True)
+        self.assertTrue(ret)
+
+        with z5py.File(self.input_path) as f:
+            shape = f[self.input_key].shape
+        split_key = 'split'
+        task = WriteLocal(tmp_folder=self.tmp_folder, config_dir=self.config_folder,
+                          max_jobs=self.max_jobs, input_path=self.output_path,
+                          input_key=self.output_key, output_path=self.output_path,
+                          output_key=split_key, assignment_path=self.output_path,
+                          assignment_key=self.assignment_key, identifier='split',
+                          offset_path=write_task.offset_path)
+        task.n_retries = 1
+        task.block_list = list(range(nt.blocking([0, 0, 0], list(shape), self.block_shape).numberOfBlocks))
+        task.out_of_memory = True
+        ret = luigi.build([task], local_scheduler=True)
+        self.assertTrue(ret)
+        with open(os.path.join(self.tmp_folder, 'write_split.log')) as f:
+            self.assertIn('jobs ran out of memory, split', f.read())
+        self._check_result('greater', output_key=split_key)
+
     @unittest.skip("debugging test")
     def test_first_stage(self):
         from cluster_tools.thresholded_components.block_components import BlockComponentsLocal
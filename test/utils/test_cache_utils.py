@@ -0,0 +1,99 @@
+import os
+import unittest
+from concurrent import futures
+from shutil import rmtree
+
+import numpy as np
+import h5py
+
+
+class TestCacheUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+    path = './tmp/data.h5'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_chunk_cache(self):
+        from cluster_tools.utils.cache_utils import ChunkCache
+        chunk = np.zeros(100, dtype='uint8')
+        cache = ChunkCache(max_bytes=250)
+        cache.put('a', chunk)
+        cache.put('b', chunk.copy())
+        self.assertIsNotNone(cache.get('a'))
+        # 'b' is the least recently used chunk and must be evicted
+        cache.put('c', chunk.copy())
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.n_bytes, 250)
+
+    def test_cached_dataset(self):
+        from cluster_tools.utils.cache_utils import ChunkCache, CachedDataset
+        shape, chunks = (33, 64, 70), (8, 16, 16)
+        data = np.random.rand(*shape).astype('float32')
+        with h5py.File(self.path, 'w') as f:
+            ds = f.create_dataset('data', data=data, chunks=chunks)
+            cache = ChunkCache(max_bytes=int(1e9))
+            ds_cached = CachedDataset(ds, cache, ('data',))
+
+            indices = [np.s_[:], np.s_[3:17, 5:40, 60:], np.s_[7, :, 3:9], np.s_[..., 20:30],
+                       np.s_[-5:, 2, -1], np.s_[::2, :4, :4]]
+            for index in indices:
+                self.assertTrue(np.array_equal(ds_cached[index], data[index]))
+            self.assertGreater(cache.hits, 0)
+            self.assertEqual(ds_cached.shape, shape)
+
+            # writes must update or invalidate the cached chunks
+            ds_cached[0:8, 0:16, 0:16] = 1.
+            data[0:8, 0:16, 0:16] = 1.
+            ds_cached[4:20, 10:30, 5:17] = np.ones((16, 20, 12), dtype='float32')
+            data[4:20, 10:30, 5:17] = 1.
+            self.assertTrue(np.array_equal(ds_cached[:], data))
+            self.assertTrue(np.array_equal(ds[:], data))
+
+    def test_cached_dataset_threaded(self):
+        from cluster_tools.utils.cache_utils import ChunkCache, CachedDataset
+        shape, chunks = (64, 64, 64), (16, 16, 16)
+        data = np.random.rand(*shape).astype('float32')
+        with h5py.File(self.path, 'w') as f:
+            ds = f.create_dataset('data', data=data, chunks=chunks)
+            cache = ChunkCache(max_bytes=int(1e9))
+            ds_cached = CachedDataset(ds, cache, ('data',))
+
+            # read overlapping blocks with halo from several threads
+            block_shape, halo = 16, 8
+            bbs = [tuple(slice(max(0, b * block_shape - halo), min(64, (b + 1) * block_shape + halo))
+                         for b in block_pos)
+                   for block_pos in np.ndindex(4, 4, 4)]
+
+            def check_bb(bb):
+                return np.array_equal(ds_cached[bb], data[bb])
+
+            with futures.ThreadPoolExecutor(8) as tp:
+                results = list(tp.map(check_bb, bbs))
+            self.assertTrue(all(results))
+            # every chunk must be loaded exactly once
+            self.assertEqual(cache.misses, 4 ** 3)
+
+    def test_chunk_cache_context(self):
+        from cluster_tools.utils.cache_utils import chunk_cache, get_chunk_cache
+        with chunk_cache(0) as cache:
+            self.assertIsNone(cache)
+        with chunk_cache(.1) as cache:
+            self.assertIs(get_chunk_cache(), cache)
+            # nested contexts (e.g. a task in a fused job) use the outer cache
+            with chunk_cache(.2) as inner_cache:
+                self.assertIs(inner_cache, cache)
+            self.assertIs(get_chunk_cache(), cache)
+        self.assertIsNone(get_chunk_cache())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import unittest
+from shutil import rmtree
+
+import numpy as np
+
+
+class TestCompressionUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_n5_options(self):
+        from cluster_tools.utils.compression_utils import compression_options
+        path = os.path.join(self.tmp_dir, 'data.n5')
+        self.assertEqual(compression_options(path, {}), {'compression': 'gzip', 'level': 5})
+        self.assertEqual(compression_options(path, {'compression': None}), {'compression': 'gzip', 'level': 5})
+        self.assertEqual(compression_options(path, {'compression': 'raw'}), {'compression': 'raw'})
+        self.assertEqual(compression_options(path, {'compression': 'zstd', 'compression_level': 1}),
+                         {'compression': 'blosc', 'codec': 'zstd', 'level': 1, 'shuffle': 1})
+        self.assertEqual(compression_options(path, {'compression': 'blosc'})['codec'], 'lz4')
+        with self.assertRaises(ValueError):
+            compression_options(path, {'compression': 'lzf'})
+        with self.assertRaises(ValueError):
+            compression_options(path, {'compression': 'snappy'})
+
+    def test_h5_options(self):
+        import h5py
+        from cluster_tools.utils.compression_utils import compression_options
+        path = os.path.join(self.tmp_dir, 'data.h5')
+        data = np.random.randint(0, 10, size=(32, 32, 32)).astype('uint64')
+        for compression in ('raw', 'gzip', 'lzf'):
+            options = compression_options(path, {'compression': compression, 'compression_level': 1})
+            with h5py.File(path, 'a') as f:
+                ds = f.create_dataset(compression, data=data, chunks=(16, 16, 16), **options)
+                self.assertEqual(ds.compression, None if compression == 'raw' else compression)
+            with h5py.File(path, 'r') as f:
+                self.assertTrue(np.array_equal(f[compression][:], data))
+
+
+if __name__ == '__main__':
+    unittest.main()
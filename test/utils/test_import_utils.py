@@ -0,0 +1,30 @@
+import sys
+import json
+import unittest
+import subprocess
+
+
+class TestImportUtils(unittest.TestCase):
+
+    def test_lazy_package_import(self):
+        # import cluster_tools in a fresh interpreter, so that modules imported by other tests don't interfere
+        code = ("import sys, json; import cluster_tools; import cluster_tools.utils.volume_utils; "
+                "print(json.dumps(sorted(set(name.split('.')[0] for name in sys.modules))))")
+        out = subprocess.check_output([sys.executable, '-c', code])
+        modules = json.loads(out.decode().strip().split('\n')[-1])
+        for dependency in ('vigra', 'nifty', 'elf', 'z5py', 'sklearn'):
+            self.assertNotIn(dependency, modules)
+
+    def test_lazy_exports(self):
+        import cluster_tools
+        self.assertIn('MulticutSegmentationWorkflow', dir(cluster_tools))
+        self.assertIn('ThresholdedComponentsWorkflow', cluster_tools.__all__)
+        # submodules are imported on attribute access
+        self.assertEqual(cluster_tools.utils.__name__, 'cluster_tools.utils')
+        with self.assertRaises(AttributeError):
+            cluster_tools.not_a_module
+        self.assertFalse(hasattr(cluster_tools, '__not_a_module__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import time
+import unittest
+from shutil import rmtree
+
+
+class TestManifestUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(os.path.join(self.tmp_dir, 'logs'), exist_ok=True)
+        os.makedirs(os.path.join(self.tmp_dir, 'telemetry'), exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_manifest(self):
+        from cluster_tools.utils.manifest_utils import BlockManifest, config_hash
+        path = os.path.join(self.tmp_dir, 'manifests', 'task.npz')
+        conf_hash = config_hash('task', {'threshold': 0.5}, [10, 10, 10])
+        self.assertEqual(conf_hash, config_hash('task', {'threshold': 0.5}, [10, 10, 10]))
+        self.assertNotEqual(conf_hash, config_hash('task', {'threshold': 0.6}, [10, 10, 10]))
+
+        manifest = BlockManifest(path, conf_hash)
+        self.assertEqual(manifest.blocks, set())
+        self.assertIsNone(manifest.scheduled_at)
+        manifest.add([3, 17, 1000])
+        manifest.scheduled_at = 42.
+        manifest.save()
+
+        manifest = BlockManifest(path, conf_hash)
+        self.assertEqual(manifest.blocks, {3, 17, 1000})
+        self.assertEqual(manifest.scheduled_at, 42.)
+
+        # the blocks of a different config are not valid
+        manifest = BlockManifest(path, config_hash('task', {'threshold': 0.6}, [10, 10, 10]))
+        self.assertEqual(manifest.blocks, set())
+        manifest.remove()
+        self.assertFalse(os.path.exists(path))
+
+    def test_processed_blocks_since(self):
+        from cluster_tools.utils.manifest_utils import processed_blocks_since
+        log_prefix = os.path.join(self.tmp_dir, 'logs', 'task_')
+        telemetry_prefix = os.path.join(self.tmp_dir, 'telemetry', 'task_')
+
+        def write_log(job_id, blocks):
+            with open(log_prefix + '%i.log' % job_id, 'w') as f:
+                for block_id in blocks:
+                    f.write('2020-01-01 00:00:00.0: processed block %i\n' % block_id)
+
+        # a log written before the jobs were scheduled
+        write_log(0, [0, 1])
+        since = time.time() + 1
+        os.utime(log_prefix + '0.log', (since - 10, since - 10))
+        write_log(1, [2, 3])
+        os.utime(log_prefix + '1.log', (since + 1, since + 1))
+        # a log of a different task with the same prefix
+        with open(os.path.join(self.tmp_dir, 'logs', 'task_merge_0.log'), 'w') as f:
+            f.write('2020-01-01 00:00:00.0: processed block 4\n')
+        # the telemetry takes precedence over the log
+        write_log(2, [5])
+        with open(telemetry_prefix + '2.jsonl', 'w') as f:
+            f.write('{"block_id": 5, "status": "processed"}\n{"block_id": 6, "status": "processed"}\n')
+        for path in (log_prefix + '2.log', telemetry_prefix + '2.jsonl'):
+            os.utime(path, (since + 1, since + 1))
+
+        self.assertEqual(processed_blocks_since(log_prefix, telemetry_prefix, since), {2, 3, 5, 6})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import unittest
+from shutil import rmtree
+
+import numpy as np
+import h5py
+
+
+class TestPipelineUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+    path = './tmp/data.h5'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        from cluster_tools.utils.telemetry_utils import reset_telemetry
+        os.environ.pop('CLUSTER_TOOLS_TELEMETRY', None)
+        # the telemetry of a test must not be reused by the next test that writes to the same path
+        reset_telemetry()
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def _run(self, fail_block=None, n_threads=1):
+        from cluster_tools.utils.pipeline_utils import run_pipelined
+        block_shape = 10
+        data = np.random.rand(100, 20).astype('float32')
+        with h5py.File(self.path, 'w') as f:
+            ds_in = f.create_dataset('in', data=data, chunks=(10, 20))
+            ds_out = f.create_dataset('out', shape=data.shape, dtype='float32', chunks=(10, 20))
+
+            def read_block(block_id):
+                bb = np.s_[block_id * block_shape:(block_id + 1) * block_shape, :]
+                return bb, ds_in[bb]
+
+            def process_block(block_id, data):
+                if block_id == fail_block:
+                    raise RuntimeError("Failed block %i" % block_id)
+                # odd blocks are skipped
+                if block_id % 2 == 1:
+                    return None
+                bb, block_data = data
+                return bb, 2 * block_data
+
+            run_pipelined(range(10), read_block, process_block, ds_out, n_prefetch=3, n_threads=n_threads)
+            return data, ds_out[:]
+
+    def test_run_pipelined(self):
+        from cluster_tools.utils.parse_utils import parse_blocks_telemetry
+        telemetry_path = os.path.join(self.tmp_dir, 'job_0.jsonl')
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = telemetry_path
+        data, out = self._run()
+        expected = np.zeros_like(data)
+        for block_id in range(0, 10, 2):
+            bb = np.s_[block_id * 10:(block_id + 1) * 10, :]
+            expected[bb] = 2 * data[bb]
+        self.assertTrue(np.allclose(out, expected))
+        self.assertEqual(sorted(parse_blocks_telemetry(telemetry_path)), list(range(10)))
+
+    def test_run_pipelined_threads(self):
+        from cluster_tools.utils.parse_utils import parse_blocks_telemetry
+        telemetry_path = os.path.join(self.tmp_dir, 'job_0.jsonl')
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = telemetry_path
+        data, out = self._run(n_threads=4)
+        self.assertTrue(np.allclose(out[:10], 2 * data[:10]))
+        self.assertTrue(np.allclose(out[10:20], 0))
+        self.assertEqual(sorted(parse_blocks_telemetry(telemetry_path)), list(range(10)))
+        with self.assertRaises(RuntimeError):
+            self._run(fail_block=5, n_threads=4)
+
+    def test_map_blocks(self):
+        from cluster_tools.utils.pipeline_utils import map_blocks
+        taken = []
+
+        def block_ids():
+            for block_id in range(20):
+                taken.append(block_id)
+                yield block_id
+
+        def process_block(block_id):
+            # the blocks are only taken once a thread is available
+            self.assertLessEqual(len(taken), block_id + 3)
+            return 2 * block_id
+
+        self.assertEqual(map_blocks(process_block, block_ids(), n_threads=3), [2 * i for i in range(20)])
+        self.assertEqual(map_blocks(lambda block_id: 2 * block_id, range(5)), [2 * i for i in range(5)])
+
+    def test_run_pipelined_failure(self):
+        from cluster_tools.utils.parse_utils import parse_blocks_telemetry
+        telemetry_path = os.path.join(self.tmp_dir, 'job_0.jsonl')
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = telemetry_path
+        with self.assertRaises(RuntimeError):
+            self._run(fail_block=5)
+        # the blocks before the failed block must have been written and logged
+        self.assertEqual(sorted(parse_blocks_telemetry(telemetry_path)), list(range(5)))
+
+    def test_run_pipelined_write_failure(self):
+        from cluster_tools.utils.pipeline_utils import run_pipelined
+
+        class FailingDataset:
+            def __setitem__(self, bb, data):
+                raise OSError("Failed write")
+
+        def process_block(block_id, data):
+            if block_id == 1:
+                raise RuntimeError("Failed block %i" % block_id)
+            return np.s_[block_id:block_id + 1], data
+
+        # the error of the pending write must not replace the processing error
+        with self.assertRaises(RuntimeError):
+            run_pipelined(range(3), lambda block_id: np.zeros(1), process_block, FailingDataset())
+
+
+if __name__ == '__main__':
+    unittest.main()
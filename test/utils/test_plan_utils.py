@@ -0,0 +1,126 @@
+import os
+import unittest
+from shutil import rmtree
+
+import h5py
+import luigi
+
+
+class TaskA(luigi.Task):
+    pass
+
+
+class TaskB(luigi.Task):
+    def requires(self):
+        return TaskA()
+
+
+class TaskC(luigi.Task):
+    def requires(self):
+        return [TaskA(), TaskB()]
+
+
+class TestPlanUtils(unittest.TestCase):
+    tmp_folder = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_folder, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_folder)
+        except OSError:
+            pass
+
+    def test_task_graph(self):
+        from cluster_tools.utils.plan_utils import task_graph
+        tasks = task_graph(TaskC())
+        self.assertEqual([type(task) for task in tasks], [TaskA, TaskB, TaskC])
+
+    def test_dataset_params(self):
+        from cluster_tools.utils.plan_utils import dataset_params
+        params = {'input_path': 'a.h5', 'input_key': 'raw', 'output_path': 'b.h5', 'output_key': 'seg',
+                  'mask_path': '', 'mask_key': '', 'tmp_folder': 'tmp', 'max_jobs': 4}
+        self.assertEqual(sorted(dataset_params(params)),
+                         [('input', 'a.h5', 'raw'), ('output', 'b.h5', 'seg')])
+
+    def test_dataset_info(self):
+        from cluster_tools.utils.plan_utils import dataset_info
+        path = os.path.join(self.tmp_folder, 'data.h5')
+        with h5py.File(path, 'w') as f:
+            f.create_dataset('raw', shape=(32, 64, 64), dtype='uint8', chunks=(16, 32, 32))
+        self.assertEqual(dataset_info(path, 'raw'),
+                         {'shape': [32, 64, 64], 'dtype': 'uint8', 'chunks': [16, 32, 32]})
+        self.assertIsNone(dataset_info(path, 'seg'))
+        self.assertIsNone(dataset_info(os.path.join(self.tmp_folder, 'none.h5'), 'raw'))
+
+    def test_covered_bytes(self):
+        from cluster_tools.utils.plan_utils import covered_bytes, ESTIMATED_ITEMSIZE
+        info = {'shape': [32, 64, 64], 'dtype': 'float32', 'chunks': [16, 32, 32]}
+        self.assertEqual(covered_bytes(info), 32 * 64 * 64 * 4)
+        # the roi is expanded to the overlapping chunks
+        self.assertEqual(covered_bytes(info, [0, 0, 0], [8, 40, 64]), 16 * 64 * 64 * 4)
+        self.assertEqual(covered_bytes(info, [20, None, None], [None, None, None]), 16 * 64 * 64 * 4)
+        # leading channel axes are covered completely
+        info = {'shape': [3, 32, 64, 64], 'dtype': 'uint8', 'chunks': [1, 16, 32, 32]}
+        self.assertEqual(covered_bytes(info, [0, 0, 0], [16, 32, 32]), 3 * 16 * 32 * 32)
+        # unknown dtype and chunks
+        info = {'shape': [32, 64, 64], 'dtype': None, 'chunks': None}
+        self.assertEqual(covered_bytes(info, [0, 0, 0], [10, 10, 10]), 1000 * ESTIMATED_ITEMSIZE)
+        # roi is ignored for non-volumetric data
+        info = {'shape': [100, 2], 'dtype': 'uint64', 'chunks': None}
+        self.assertEqual(covered_bytes(info, [0, 0, 0], [10, 10, 10]), 200 * 8)
+
+    def test_chunk_alignment(self):
+        from cluster_tools.utils.plan_utils import chunk_alignment
+        info = {'shape': [64, 128, 128], 'dtype': 'uint8', 'chunks': [32, 64, 64]}
+        # aligned blocks read each chunk once
+        self.assertEqual(chunk_alignment(info, [32, 64, 64], list(range(8))),
+                         {'block_shape': [32, 64, 64], 'chunk_reads': 8, 'extra_chunk_reads': 0})
+        self.assertEqual(chunk_alignment(info, [64, 128, 128], [0])['extra_chunk_reads'], 0)
+        # blocks that are smaller than the chunks read them several times
+        self.assertEqual(chunk_alignment(info, [16, 64, 64], list(range(16))),
+                         {'block_shape': [16, 64, 64], 'chunk_reads': 16, 'extra_chunk_reads': 8})
+        # misaligned blocks: 2 blocks along each axis, the first one reads 2 chunks
+        # and the second one 1 chunk along each axis
+        alignment = chunk_alignment(info, [40, 80, 80], list(range(8)))
+        self.assertEqual(alignment['chunk_reads'], 27)
+        self.assertEqual(alignment['extra_chunk_reads'], 27 - 8)
+        # only a part of the blocks
+        self.assertEqual(chunk_alignment(info, [40, 80, 80], [0])['extra_chunk_reads'], 0)
+        self.assertEqual(chunk_alignment(info, [40, 80, 80], [7])['extra_chunk_reads'], 0)
+        self.assertEqual(chunk_alignment(info, [40, 80, 80], [0, 7])['extra_chunk_reads'], 1)
+        self.assertEqual(chunk_alignment(info, [40, 80, 80], [0, 1])['extra_chunk_reads'], 4)
+        # the blocking refers to the spatial axes
+        info = {'shape': [3, 64, 128, 128], 'dtype': 'uint8', 'chunks': [1, 32, 64, 64]}
+        self.assertEqual(chunk_alignment(info, [32, 64, 64], list(range(8)))['extra_chunk_reads'], 0)
+        self.assertIsNone(chunk_alignment({'shape': [100, 2], 'chunks': [10, 2]}, [10, 10, 10], [0]))
+        self.assertIsNone(chunk_alignment({'shape': [64, 64, 64], 'chunks': None}, [10, 10, 10], [0]))
+
+    def test_format_report(self):
+        from cluster_tools.utils.plan_utils import format_report
+        row = {'n_jobs': 4, 'n_blocks': 8, 'bytes_read': 2.e9, 'bytes_written': None,
+               'wall_time': 120., 'core_time': 7200.}
+        report = {'tasks': [dict(row, task='task_a', complete=True), dict(row, task='task_b', complete=False)],
+                  'total': row}
+        lines = format_report(report).split('\n')
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[2].startswith('task_a (done)'))
+        self.assertEqual(lines[4].split(), ['total', '4', '8', '2.00', '-', '2.0', '2.00'])
+
+    def test_format_alignment(self):
+        from cluster_tools.utils.plan_utils import format_alignment
+        dataset = {'path': 'a.n5', 'key': 'raw', 'chunks': [32, 64, 64],
+                   'alignment': {'block_shape': [40, 80, 80], 'chunk_reads': 27, 'extra_chunk_reads': 19}}
+        aligned = dict(dataset, alignment=dict(dataset['alignment'], extra_chunk_reads=0))
+        report = {'tasks': [{'task': 'task_a', 'inputs': [dataset, aligned]},
+                            {'task': 'task_b', 'inputs': [aligned, dict(dataset, alignment=None)]}]}
+        lines = format_alignment(report).split('\n')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('task_a: a.n5:raw'))
+        self.assertIn('19 extra chunk reads', lines[1])
+        self.assertEqual(format_alignment({'tasks': [{'task': 'task_b', 'inputs': [aligned]}]}), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+from concurrent import futures
+from shutil import rmtree
+
+
+def _pop_all(queue_path):
+    from cluster_tools.utils.queue_utils import BlockQueue
+    return list(BlockQueue(queue_path))
+
+
+class TestQueueUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_block_queue(self):
+        from cluster_tools.utils.queue_utils import BlockQueue
+        path = os.path.join(self.tmp_dir, 'queue.sqlite')
+        block_list = list(range(10))
+        queue = BlockQueue.create(path, block_list)
+        self.assertEqual(len(queue), 10)
+        self.assertEqual(queue.pop(3), [0, 1, 2])
+        self.assertEqual(list(queue), block_list[3:])
+        self.assertEqual(queue.pop(), [])
+
+    def test_block_queue_concurrent(self):
+        from cluster_tools.utils.queue_utils import BlockQueue
+        path = os.path.join(self.tmp_dir, 'queue.sqlite')
+        block_list = list(range(500))
+        BlockQueue.create(path, block_list)
+        n_jobs = 8
+        with futures.ProcessPoolExecutor(n_jobs) as pp:
+            tasks = [pp.submit(_pop_all, path) for _ in range(n_jobs)]
+            popped = [t.result() for t in tasks]
+        # every block must have been popped by exactly one job
+        popped = [block_id for job_blocks in popped for block_id in job_blocks]
+        self.assertEqual(sorted(popped), block_list)
+
+    def test_blocks_for_job(self):
+        from cluster_tools.utils.queue_utils import (BlockQueue, blocks_for_job,
+                                                     block_batches_for_job)
+        block_list = list(range(7))
+        self.assertEqual(list(blocks_for_job({'block_list': block_list})), block_list)
+        self.assertEqual(list(block_batches_for_job({'block_list': block_list}, 2)), [block_list])
+        batches = list(block_batches_for_job({'block_list': block_list}, 2, n_batches=3))
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(sum(batches, []), block_list)
+
+        path = os.path.join(self.tmp_dir, 'queue.sqlite')
+        BlockQueue.create(path, block_list)
+        batches = list(block_batches_for_job({'block_queue': path}, 3))
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+
+if __name__ == '__main__':
+    unittest.main()
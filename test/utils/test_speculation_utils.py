@@ -0,0 +1,67 @@
+import os
+import json
+import unittest
+from shutil import rmtree
+
+
+class TestSpeculationUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def _write_telemetry(self, job_id, start, blocks, running=[], end=None):
+        path = os.path.join(self.tmp_dir, 'job_%i.jsonl' % job_id)
+        records = [{'start': start, 'status': 'started'}]
+        for block_id in blocks:
+            records.append({'block_id': block_id, 'start': start, 'status': 'started'})
+            records.append({'block_id': block_id, 'start': start, 'end': start + 1, 'status': 'processed'})
+        records.extend({'block_id': block_id, 'start': start, 'status': 'started'} for block_id in running)
+        if end is not None:
+            records.append({'job_id': job_id, 'start': start, 'end': end, 'status': 'processed'})
+        with open(path, 'w') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in records))
+        return path
+
+    def test_job_progress(self):
+        from cluster_tools.utils.speculation_utils import job_progress
+        self.assertIsNone(job_progress(os.path.join(self.tmp_dir, 'job_9.jsonl')))
+        progress = job_progress(self._write_telemetry(0, 10., [1, 2], running=[3]))
+        self.assertEqual(progress['start'], 10.)
+        self.assertIsNone(progress['end'])
+        self.assertEqual(progress['processed'], {1, 2})
+        self.assertEqual(progress['running'], {3})
+        progress = job_progress(self._write_telemetry(1, 10., [1, 2, 3], end=13.))
+        self.assertEqual(progress['end'], 13.)
+        self.assertEqual(progress['running'], set())
+
+    def test_find_stragglers(self):
+        from cluster_tools.utils.speculation_utils import find_stragglers, job_progress
+        # finished jobs process 1 block per second
+        progress = {job_id: job_progress(self._write_telemetry(job_id, 0., [job_id * 10, job_id * 10 + 1],
+                                                               end=2.))
+                    for job_id in range(3)}
+        progress[3] = job_progress(self._write_telemetry(3, 0., [30], running=[31]))
+        progress[4] = None
+        n_blocks = {job_id: 2 for job_id in range(5)}
+        self.assertEqual(find_stragglers(progress, n_blocks, now=5.), [])
+        self.assertEqual(find_stragglers(progress, n_blocks, now=7.), [3])
+        # not enough jobs have finished yet
+        self.assertEqual(find_stragglers(progress, n_blocks, now=7., quantile=0.8), [])
+
+    def test_blocks_in_flight(self):
+        from cluster_tools.utils.speculation_utils import blocks_in_flight, job_progress
+        progress = job_progress(self._write_telemetry(0, 0., [1, 2], running=[3]))
+        self.assertEqual(blocks_in_flight(progress, [1, 2, 3, 4]), [3])
+        self.assertEqual(blocks_in_flight(progress, [1, 2, 3, 4], marks_block_starts=False), [3, 4])
+        self.assertEqual(blocks_in_flight(None, [1, 2, 3, 4]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import unittest
+from shutil import rmtree
+
+import numpy as np
+
+
+class TestStatsUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_partition_blocks_by_cost(self):
+        from cluster_tools.utils.stats_utils import partition_blocks_by_cost
+        np.random.seed(42)
+        n_blocks, n_jobs = 200, 8
+        block_list = list(range(n_blocks))
+        # heavy-tailed block costs, like blocks with and without foreground
+        costs = np.random.exponential(size=n_blocks).tolist()
+        partition = partition_blocks_by_cost(block_list, costs, n_jobs)
+        self.assertEqual(len(partition), n_jobs)
+        self.assertEqual(sorted(sum(partition, [])), block_list)
+
+        job_costs = [sum(costs[block_id] for block_id in job_blocks) for job_blocks in partition]
+        strided_costs = [sum(costs[job_id::n_jobs]) for job_id in range(n_jobs)]
+        self.assertLess(max(job_costs), max(strided_costs))
+        # LPT guarantees that the max is at most the mean plus the largest single cost
+        self.assertLessEqual(max(job_costs), np.mean(job_costs) + max(costs))
+
+    def test_block_costs_io(self):
+        from cluster_tools.utils.stats_utils import (load_block_costs, save_block_costs,
+                                                     block_costs)
+        stats_dir = os.path.join(self.tmp_dir, 'stats')
+        block_shape = [10, 10, 10]
+        self.assertIsNone(load_block_costs(stats_dir, 'task', block_shape))
+        save_block_costs(stats_dir, 'task', block_shape, {0: 1., 1: 2.})
+        save_block_costs(stats_dir, 'task', block_shape, {1: 4., 2: 3.})
+        runtimes = load_block_costs(stats_dir, 'task', block_shape)
+        self.assertEqual(runtimes, {0: 1., 1: 4., 2: 3.})
+        # runtimes for a different block shape must not be used
+        self.assertIsNone(load_block_costs(stats_dir, 'task', [20, 20, 20]))
+        self.assertEqual(block_costs([0, 1, 5], runtimes), [1., 4., 3.])
+
+    def test_block_costs_from_tmp_folder(self):
+        import cluster_tools.utils.function_utils as fu
+        from cluster_tools.utils.stats_utils import load_block_costs
+        telemetry_dir = os.path.join(self.tmp_dir, 'telemetry')
+        os.makedirs(telemetry_dir)
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = os.path.join(telemetry_dir, 'task_0.jsonl')
+        try:
+            for block_id in range(3):
+                fu.log("start processing block %i" % block_id)
+                fu.log_block_success(block_id)
+        finally:
+            os.environ.pop('CLUSTER_TOOLS_TELEMETRY')
+        runtimes = load_block_costs(self.tmp_dir, 'task', [10, 10, 10])
+        self.assertEqual(sorted(runtimes.keys()), [0, 1, 2])
+
+    def test_recommend_resources(self):
+        import cluster_tools.utils.function_utils as fu
+        from cluster_tools.utils.stats_utils import (job_usage_from_telemetry, summarize_job_usage,
+                                                     recommend_resources)
+        telemetry_dir = os.path.join(self.tmp_dir, 'telemetry')
+        os.makedirs(telemetry_dir)
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = os.path.join(telemetry_dir, 'task_0.jsonl')
+        try:
+            fu.log("start processing job 0")
+            fu.log_job_success(0)
+        finally:
+            os.environ.pop('CLUSTER_TOOLS_TELEMETRY')
+        usage = job_usage_from_telemetry(os.path.join(telemetry_dir, 'task_'))
+        self.assertEqual(len(usage), 1)
+        self.assertGreater(usage[0]['peak_rss'], 0)
+        self.assertGreaterEqual(usage[0]['cpu_time'], 0)
+
+        usage = [{'job_id': 0, 'runtime': 600., 'peak_rss': 2.1e9, 'cpu_time': 1150.},
+                 {'job_id': 1, 'runtime': 1200., 'peak_rss': 1.e9, 'cpu_time': 1200.}]
+        summary = summarize_job_usage(usage)
+        self.assertEqual(summary['max_runtime'], 1200.)
+        self.assertAlmostEqual(summary['max_threads'], 1150. / 600.)
+        recommended = recommend_resources(summary, {'threads_per_job': 8})
+        self.assertEqual(recommended, {'mem_limit': 3., 'time_limit': 30, 'threads_per_job': 2})
+        # the threads are not increased beyond the configured ones
+        recommended = recommend_resources(summary, {'threads_per_job': 1})
+        self.assertEqual(recommended['threads_per_job'], 1)
+        # the threads go back up to the configured ones if the jobs used all their threads
+        recommended = recommend_resources(summary, {'threads_per_job': 2, 'configured_threads_per_job': 8})
+        self.assertEqual(recommended['threads_per_job'], 8)
+        # and are not decreased for I/O bound jobs
+        io_bound = summarize_job_usage([{'job_id': 0, 'runtime': 600., 'peak_rss': 1.e9, 'cpu_time': 60.}])
+        recommended = recommend_resources(io_bound, {'threads_per_job': 4, 'configured_threads_per_job': 8})
+        self.assertEqual(recommended['threads_per_job'], 4)
+        # small jobs get the minimal time limit and a memory limit in steps of 100 MB
+        recommended = recommend_resources({**summary, 'max_runtime': 5., 'max_peak_rss': 2.e8}, {})
+        self.assertEqual(recommended['time_limit'], 5)
+        self.assertAlmostEqual(recommended['mem_limit'], 0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import json
+import unittest
+from shutil import rmtree
+
+import luigi
+
+from cluster_tools.cluster_tasks import LocalTask
+
+
+class CountingTask(LocalTask):
+    """ Task that counts how often it was run, without submitting any jobs.
+    """
+    task_name = 'counting_task'
+    src_file = os.path.abspath(__file__)
+
+    input_path = luigi.Parameter()
+    input_key = luigi.Parameter()
+    output_path = luigi.Parameter()
+
+    def run_impl(self):
+        config = self.get_task_config()
+        n_runs = 0
+        if os.path.exists(self.output_path):
+            with open(self.output_path) as f:
+                n_runs = json.load(f)['n_runs']
+        with open(self.output_path, 'w') as f:
+            json.dump({'n_runs': n_runs + 1, 'threshold': config.get('threshold', None)}, f)
+
+
+class WritingTask(LocalTask):
+    """ Task that rewrites a dataset, without submitting any jobs.
+    """
+    task_name = 'writing_task'
+    src_file = os.path.abspath(__file__)
+
+    output_path = luigi.Parameter()
+    output_key = luigi.Parameter()
+
+    def run_impl(self):
+        with open(os.path.join(self.output_path, self.output_key, '0', '0'), 'wb') as f:
+            f.write(b'written')
+
+
+class TestTaskCacheUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        self.config_dir = os.path.join(self.tmp_dir, 'configs')
+        os.makedirs(self.config_dir, exist_ok=True)
+        # a fake n5 dataset with one chunk
+        self.input_path = os.path.join(self.tmp_dir, 'data.n5')
+        os.makedirs(os.path.join(self.input_path, 'raw', '0'), exist_ok=True)
+        self._write_attributes({'dimensions': [1]})
+        self._write_chunk(b'abc')
+        self.output_path = os.path.join(self.tmp_dir, 'out.json')
+        self.cache_dir = os.path.join(self.tmp_dir, 'task_cache')
+        global_config = LocalTask.default_global_config()
+        global_config['task_cache_dir'] = self.cache_dir
+        with open(os.path.join(self.config_dir, 'global.config'), 'w') as f:
+            json.dump(global_config, f)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def _write_attributes(self, attrs):
+        with open(os.path.join(self.input_path, 'raw', 'attributes.json'), 'w') as f:
+            json.dump(attrs, f)
+
+    def _write_chunk(self, data):
+        with open(os.path.join(self.input_path, 'raw', '0', '0'), 'wb') as f:
+            f.write(data)
+
+    def _run(self, tmp_folder):
+        task = CountingTask(tmp_folder=os.path.join(self.tmp_dir, tmp_folder), config_dir=self.config_dir,
+                            max_jobs=1, input_path=self.input_path, input_key='raw',
+                            output_path=self.output_path)
+        self.assertTrue(luigi.build([task], local_scheduler=True))
+        with open(self.output_path) as f:
+            return json.load(f)['n_runs']
+
+    def test_dataset_state(self):
+        from cluster_tools.utils.task_cache_utils import dataset_state, write_marker
+        state = dataset_state(self.input_path, 'raw', self.cache_dir)
+        self.assertEqual(dataset_state(self.input_path, 'raw', self.cache_dir), state)
+        # the chunks are not checked
+        self._write_chunk(b'abcd')
+        self.assertEqual(dataset_state(self.input_path, 'raw', self.cache_dir), state)
+        # the metadata and the marker of the last task writing the dataset are
+        self._write_attributes({'dimensions': [1], 'dataType': 'uint8'})
+        self.assertNotEqual(dataset_state(self.input_path, 'raw', self.cache_dir), state)
+        state = dataset_state(self.input_path, 'raw', self.cache_dir)
+        write_marker(self.cache_dir, self.input_path, 'raw', 'writing_task')
+        self.assertNotEqual(dataset_state(self.input_path, 'raw', self.cache_dir), state)
+        self.assertIsNone(dataset_state(self.input_path, 'seg'))
+
+    def test_task_hash(self):
+        from cluster_tools.utils.task_cache_utils import task_hash, clear_task_hashes
+        task = CountingTask(tmp_folder=os.path.join(self.tmp_dir, 'tmp0'), config_dir=self.config_dir,
+                            max_jobs=1, input_path=self.input_path, input_key='raw',
+                            output_path=self.output_path)
+        clear_task_hashes()
+        hash_ = task_hash(task)
+        # the hash is computed once, until the hashes are cleared because a task has written its outputs
+        self._write_attributes({'dimensions': [2]})
+        self.assertEqual(task_hash(task), hash_)
+        clear_task_hashes()
+        self.assertNotEqual(task_hash(task), hash_)
+
+    def test_task_cache(self):
+        self.assertEqual(self._run('tmp0'), 1)
+        # same task in a new tmp folder: the outputs are reused
+        self.assertEqual(self._run('tmp1'), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'tmp1', 'counting_task.log')))
+
+        # changing the task config invalidates the cache
+        with open(os.path.join(self.config_dir, 'counting_task.config'), 'w') as f:
+            json.dump({'threshold': 0.5}, f)
+        self.assertEqual(self._run('tmp2'), 2)
+        self.assertEqual(self._run('tmp3'), 2)
+
+        # a task writing the input invalidates the cache
+        task = WritingTask(tmp_folder=os.path.join(self.tmp_dir, 'tmp_write'), config_dir=self.config_dir,
+                           max_jobs=1, output_path=self.input_path, output_key='raw')
+        self.assertTrue(luigi.build([task], local_scheduler=True))
+        self.assertEqual(self._run('tmp4'), 3)
+
+        # changing only the resources does not
+        with open(os.path.join(self.config_dir, 'counting_task.config'), 'w') as f:
+            json.dump({'threshold': 0.5, 'threads_per_job': 8}, f)
+        self.assertEqual(self._run('tmp5'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import json
+import unittest
+from shutil import rmtree
+
+
+def allocating_job(job_id, config_path):
+    """ Job that holds `n_bytes` in memory while processing its block.
+    """
+    import cluster_tools.utils.function_utils as fu
+    with open(config_path) as f:
+        n_bytes = json.load(f)['n_bytes']
+    fu.log("start processing job %i" % job_id)
+    fu.log("start processing block 0")
+    data = b'x' * n_bytes
+    fu.log_block_success(0)
+    del data
+    fu.log_job_success(job_id)
+
+
+class TestTelemetryUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        from cluster_tools.utils.telemetry_utils import reset_telemetry
+        os.environ.pop('CLUSTER_TOOLS_TELEMETRY', None)
+        # the telemetry of a test must not be reused by the next test that writes to the same path
+        reset_telemetry()
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_telemetry(self):
+        import cluster_tools.utils.function_utils as fu
+        from cluster_tools.utils.parse_utils import (parse_blocks_telemetry,
+                                                     parse_job_telemetry,
+                                                     parse_runtime_telemetry,
+                                                     read_telemetry)
+        path = os.path.join(self.tmp_dir, 'job_0.jsonl')
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = path
+
+        fu.log("start processing job 0")
+        for block_id in (3, 5, 7):
+            fu.log("start processing block %i" % block_id)
+            fu.log_block_success(block_id)
+        self.assertFalse(parse_job_telemetry(path, 0))
+        fu.log_job_success(0)
+
+        self.assertEqual(parse_blocks_telemetry(path), [3, 5, 7])
+        self.assertTrue(parse_job_telemetry(path, 0))
+        self.assertFalse(parse_job_telemetry(path, 1))
+        self.assertGreaterEqual(parse_runtime_telemetry(path), 0)
+
+        records = read_telemetry(path)
+        # the start of the job and the blocks are recorded as well
+        started = [record for record in records if record['status'] == 'started']
+        self.assertEqual([record.get('block_id') for record in started], [None, 3, 5, 7])
+        records = [record for record in records if record['status'] == 'processed']
+        self.assertEqual(len(records), 4)
+        for record in records:
+            for key in ('start', 'end', 'bytes_read', 'bytes_written', 'peak_rss'):
+                self.assertIn(key, record)
+            self.assertLessEqual(record['start'], record['end'])
+        self.assertGreaterEqual(records[-1]['cpu_time'], 0)
+
+    def test_telemetry_for(self):
+        import cluster_tools.utils.function_utils as fu
+        from cluster_tools.utils.parse_utils import read_telemetry
+        from cluster_tools.utils.telemetry_utils import telemetry_for
+        path = os.path.join(self.tmp_dir, 'job_0.jsonl')
+        stage_path = os.path.join(self.tmp_dir, 'stage_0.jsonl')
+        os.environ['CLUSTER_TOOLS_TELEMETRY'] = path
+
+        fu.log("start processing block 1")
+        with telemetry_for(stage_path):
+            fu.log("start processing block 1")
+            fu.log_block_success(1)
+        self.assertEqual(os.environ['CLUSTER_TOOLS_TELEMETRY'], path)
+        fu.log_block_success(1)
+
+        stage_record = read_telemetry(stage_path)[-1]
+        record = read_telemetry(path)[-1]
+        self.assertEqual(record['status'], 'processed')
+        # the block start of the enclosing job is kept
+        self.assertLessEqual(record['start'], stage_record['start'])
+
+    def test_peak_rss_worker(self):
+        from cluster_tools.cluster_tasks import _run_job_in_worker
+        from cluster_tools.utils.parse_utils import read_telemetry
+
+        # run a large and a small job one after the other in this process, like in a worker of the local pool
+        peaks = []
+        for job_id, n_bytes in enumerate((512 * 1024 ** 2, 1024 ** 2)):
+            config_path = os.path.join(self.tmp_dir, 'job_%i.config' % job_id)
+            with open(config_path, 'w') as f:
+                json.dump({'n_bytes': n_bytes}, f)
+            telemetry_path = os.path.join(self.tmp_dir, 'job_%i.jsonl' % job_id)
+            _run_job_in_worker('__main__', os.path.abspath(__file__), 'allocating_job', job_id, config_path,
+                               os.path.join(self.tmp_dir, 'job_%i.log' % job_id),
+                               os.path.join(self.tmp_dir, 'job_%i.err' % job_id),
+                               telemetry_file=telemetry_path)
+            records = [record for record in read_telemetry(telemetry_path) if record['status'] == 'processed']
+            self.assertEqual(len(records), 2)
+            peaks.append(records[-1]['peak_rss'])
+
+        self.assertGreater(peaks[0], 512 * 1024 ** 2)
+        # the peak of the first job is not attributed to the second one
+        self.assertLess(peaks[1], peaks[0] - 256 * 1024 ** 2)
+
+    def test_telemetry_disabled(self):
+        from cluster_tools.utils.telemetry_utils import get_telemetry
+        os.environ.pop('CLUSTER_TOOLS_TELEMETRY', None)
+        self.assertIsNone(get_telemetry())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import json
+import unittest
+from shutil import rmtree
+
+
+class TestTraceUtils(unittest.TestCase):
+    tmp_folder = './tmp'
+
+    def setUp(self):
+        os.makedirs(os.path.join(self.tmp_folder, 'logs'), exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_folder)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _write(path, lines):
+        with open(path, 'w') as f:
+            for second, msg in lines:
+                f.write('2020-01-01 12:00:%02i.500000: %s\n' % (second, msg))
+
+    def _write_logs(self):
+        self._write(os.path.join(self.tmp_folder, 'watershed.log'),
+                    [(0, 'Start task watershed'), (1, 'written config for 2 jobs'),
+                     (2, 'submitting 2 jobs'), (3, 'submitted 2 jobs'),
+                     (9, 'checking 2 jobs'), (10, 'watershed finished successfully'),
+                     (10, 'Done task watershed')])
+        self._write(os.path.join(self.tmp_folder, 'logs', 'watershed_0.log'),
+                    [(3, 'start processing job 0'),
+                     (3, 'start processing block 0'), (4, 'start processing block 2'),
+                     (5, 'processed block 0'), (6, 'processed block 2'),
+                     (6, 'processed job 0')])
+        with open(os.path.join(self.tmp_folder, 'logs', 'watershed_1.log'), 'a') as f:
+            f.write('Sender: LSF System\n')
+        self._write(os.path.join(self.tmp_folder, 'logs', 'watershed_1.log'),
+                    [(3, 'start processing job 1'), (4, 'processed block 1'),
+                     (8, 'processed block 3'), (8, 'processed job 1')])
+        # the job logs of a task whose name starts with the name of the other task
+        self._write(os.path.join(self.tmp_folder, 'watershed_two.log'),
+                    [(10, 'Start task watershed_two'), (12, 'Done task watershed_two')])
+        self._write(os.path.join(self.tmp_folder, 'logs', 'watershed_two_pass1_0.log'),
+                    [(10, 'start processing job 0'), (11, 'processed block 0')])
+
+    def test_spans(self):
+        from cluster_tools.utils.trace_utils import read_log, task_spans, block_spans
+        self._write_logs()
+        span, phases = task_spans(read_log(os.path.join(self.tmp_folder, 'watershed.log')))
+        self.assertEqual(span[1] - span[0], 10)
+        self.assertEqual([phase[0] for phase in phases], ['prepare', 'submit', 'wait', 'check'])
+        self.assertEqual([phase[2] - phase[1] for phase in phases], [1, 1, 6, 1])
+
+        lines = read_log(os.path.join(self.tmp_folder, 'logs', 'watershed_1.log'))
+        self.assertEqual(len(lines), 4)
+        spans = block_spans(lines)
+        self.assertEqual([span[0] for span in spans], [1, 3])
+        self.assertEqual([span[2] - span[1] for span in spans], [1, 4])
+
+    def test_export_trace(self):
+        from cluster_tools.utils.trace_utils import export_trace
+        self._write_logs()
+        trace_path = os.path.join(self.tmp_folder, 'trace.json')
+        export_trace(self.tmp_folder, trace_path)
+        with open(trace_path) as f:
+            events = json.load(f)['traceEvents']
+
+        processes = {event['pid']: event['args']['name'] for event in events if event['name'] == 'process_name'}
+        self.assertEqual(sorted(processes.values()), ['watershed', 'watershed_two'])
+        pids = {name: pid for pid, name in processes.items()}
+
+        blocks = [event for event in events if event.get('cat') == 'block']
+        ws_blocks = [event for event in blocks if event['pid'] == pids['watershed']]
+        self.assertEqual(sorted(event['args']['block_id'] for event in ws_blocks), [0, 1, 2, 3])
+        two_blocks = [event for event in blocks if event['pid'] == pids['watershed_two']]
+        self.assertEqual(len(two_blocks), 1)
+
+        # the overlapping blocks of job 0 are in different tracks
+        block0, block2 = sorted([event for event in ws_blocks if event['args']['block_id'] in (0, 2)],
+                                key=lambda event: event['args']['block_id'])
+        self.assertNotEqual(block0['tid'], block2['tid'])
+        tracks = [event['args']['name'] for event in events
+                  if event['name'] == 'thread_name' and event['pid'] == pids['watershed']]
+        self.assertEqual(sorted(tracks), ['job 0', 'job 0 (1)', 'job 1', 'task'])
+        self.assertEqual(min(event['ts'] for event in events if event['ph'] == 'X'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
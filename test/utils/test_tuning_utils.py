@@ -0,0 +1,67 @@
+import os
+import json
+import unittest
+from shutil import rmtree
+
+
+class TestTuningUtils(unittest.TestCase):
+    tmp_dir = './tmp'
+
+    def setUp(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_dir)
+        except OSError:
+            pass
+
+    def test_candidate_block_shapes(self):
+        from cluster_tools.utils.tuning_utils import candidate_block_shapes
+        candidates = candidate_block_shapes([16, 64, 64], [64, 256, 512], min_voxels=0, max_voxels=2 ** 30)
+        self.assertEqual(len(candidates), 3 * 3 * 4)
+        self.assertIn([64, 256, 512], candidates)
+        for block_shape in candidates:
+            self.assertTrue(all(bs % ch == 0 for bs, ch in zip(block_shape, [16, 64, 64])))
+
+        candidates = candidate_block_shapes([16, 64, 64], [64, 256, 512], min_voxels=2 ** 20, max_voxels=2 ** 21)
+        self.assertTrue(all(2 ** 20 <= bs[0] * bs[1] * bs[2] <= 2 ** 21 for bs in candidates))
+        # no candidate within the bounds
+        self.assertEqual(candidate_block_shapes([16, 64, 64], [32, 64, 64], min_voxels=2 ** 20),
+                         [[32, 64, 64]])
+        self.assertEqual(candidate_block_shapes([16, 64, 64], [32, 64, 64], min_voxels=0, max_voxels=2 ** 10),
+                         [[16, 64, 64]])
+
+    def test_sample_roi(self):
+        from cluster_tools.utils.tuning_utils import sample_roi
+        roi_begin, roi_end = sample_roi([100, 1000, 1000], [50, 256, 256], [10, 64, 64])
+        self.assertEqual(roi_begin, [20, 320, 320])
+        self.assertEqual(roi_end, [70, 576, 576])
+        roi_begin, roi_end = sample_roi([100, 1000, 1000], [50, 256, 256], [10, 64, 64], roi_begin=[95, 0, 900])
+        self.assertEqual(roi_begin, [90, 0, 896])
+        self.assertEqual(roi_end, [100, 256, 1000])
+
+    def test_best_block_shape(self):
+        from cluster_tools.utils.tuning_utils import best_block_shape
+        results = [{'block_shape': [16, 64, 64], 'success': True, 'throughput': 1.e6, 'peak_memory': 1.e8},
+                   {'block_shape': [32, 128, 128], 'success': True, 'throughput': 2.e6, 'peak_memory': 1.e9},
+                   {'block_shape': [64, 256, 256], 'success': True, 'throughput': 3.e6, 'peak_memory': 8.e9},
+                   {'block_shape': [64, 512, 512], 'success': False, 'throughput': None, 'peak_memory': 0}]
+        self.assertEqual(best_block_shape(results), [64, 256, 256])
+        self.assertEqual(best_block_shape(results, max_memory=4.), [32, 128, 128])
+        self.assertIsNone(best_block_shape(results, max_memory=.01))
+
+    def test_write_block_shape(self):
+        from cluster_tools.utils.tuning_utils import write_block_shape
+        config_path = os.path.join(self.tmp_dir, 'global.config')
+        with open(config_path, 'w') as f:
+            json.dump({'block_shape': [50, 512, 512], 'shebang': '#! /usr/bin/python'}, f)
+        write_block_shape(self.tmp_dir, [32, 256, 256])
+        with open(config_path) as f:
+            config = json.load(f)
+        self.assertEqual(config, {'block_shape': [32, 256, 256], 'shebang': '#! /usr/bin/python'})
+        self.assertEqual(os.listdir(self.tmp_dir), ['global.config'])
+
+
+if __name__ == '__main__':
+    unittest.main()
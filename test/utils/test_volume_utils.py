@@ -94,6 +94,115 @@ class TestVolumeUtils(unittest.TestCase):
             bb = tuple(slice(rb, re) for rb, re in zip(roi_begin, roi_end))
             check_block_list(blocking, block_list, ds, bb)
 
+    def test_split_blocks(self):
+        from cluster_tools.utils.volume_utils import blocks_in_volume, split_blocks
+        shape = (100, 130, 90)
+        block_shape = (32, 64, 64)
+        sub_block_shape = (16, 32, 64)
+        block_list, blocking = blocks_in_volume(shape, block_shape, return_blocking=True)
+        _, sub_blocking = blocks_in_volume(shape, sub_block_shape, return_blocking=True)
+
+        def covered(blocking_, block_ids):
+            mask = np.zeros(shape, dtype='bool')
+            for block_id in block_ids:
+                block = blocking_.getBlock(block_id)
+                mask[tuple(slice(beg, end) for beg, end in zip(block.begin, block.end))] = True
+            return mask
+
+        # the sub-blocks of all blocks are all sub-blocks
+        self.assertEqual(split_blocks(shape, block_shape, sub_block_shape, block_list),
+                         list(range(sub_blocking.numberOfBlocks)))
+        # the sub-blocks of some blocks cover exactly these blocks
+        some_blocks = block_list[1::3]
+        sub_blocks = split_blocks(shape, block_shape, sub_block_shape, some_blocks)
+        self.assertTrue(np.array_equal(covered(blocking, some_blocks), covered(sub_blocking, sub_blocks)))
+
+    def test_blocks_in_mask(self):
+        from cluster_tools.utils.volume_utils import blocks_in_mask, blocks_in_volume, file_reader
+        shape = (60, 125, 130)
+        block_shape = (16, 32, 32)
+        scale = (4, 5, 5)
+        mask = np.random.rand(15, 25, 26) > .995
+        full_mask = mask
+        for axis, factor in enumerate(scale):
+            full_mask = np.repeat(full_mask, factor, axis=axis)
+        self.assertEqual(full_mask.shape, shape)
+        mask_path = os.path.join(self.tmp_dir, 'mask.n5')
+        with file_reader(mask_path) as f:
+            f.create_dataset('mask', data=mask.astype('uint8'), chunks=(8, 8, 8))
+            f.create_dataset('full_mask', data=full_mask.astype('uint8'), chunks=(16, 32, 32))
+
+        # the mask upsampled by an integer factor covers the same blocks
+        all_blocks, blocking = blocks_in_volume(shape, block_shape, return_blocking=True)
+        expected = [block_id for block_id in all_blocks
+                    if full_mask[tuple(slice(beg, end) for beg, end
+                                       in zip(blocking.getBlock(block_id).begin,
+                                              blocking.getBlock(block_id).end))].any()]
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), len(all_blocks))
+        self.assertEqual(blocks_in_mask(mask_path, 'mask', shape, block_shape), expected)
+        self.assertEqual(blocks_in_mask(mask_path, 'full_mask', shape, block_shape), expected)
+
+    def test_blocks_in_mask_non_integer_scale(self):
+        from cluster_tools.utils.volume_utils import blocks_in_mask, blocks_in_volume, file_reader, load_mask
+        shape = (50, 97, 130)
+        block_shape = (16, 32, 32)
+        mask = np.random.rand(13, 31, 40) > .99
+        mask_path = os.path.join(self.tmp_dir, 'mask.n5')
+        with file_reader(mask_path) as f:
+            f.create_dataset('mask', data=mask.astype('uint8'), chunks=(8, 8, 8))
+        block_list = blocks_in_mask(mask_path, 'mask', shape, block_shape)
+
+        # brute force: the blocks that overlap with the volume covered by a set mask voxel
+        all_blocks, blocking = blocks_in_volume(shape, block_shape, return_blocking=True)
+        expected = []
+        for block_id in all_blocks:
+            block = blocking.getBlock(block_id)
+            bb = tuple(slice(beg * ms // sh, -(-end * ms // sh))
+                       for beg, end, sh, ms in zip(block.begin, block.end, shape, mask.shape))
+            if mask[bb].any():
+                expected.append(block_id)
+        self.assertEqual(block_list, expected)
+
+        # the blocks that contain foreground of the interpolated mask are a subset
+        resized_mask = load_mask(mask_path, 'mask', shape)
+        interpolated = [block_id for block_id in all_blocks
+                        if resized_mask[tuple(slice(beg, end) for beg, end
+                                              in zip(blocking.getBlock(block_id).begin,
+                                                     blocking.getBlock(block_id).end))].any()]
+        self.assertTrue(set(interpolated).issubset(set(block_list)))
+
+    def test_restrict_blocks_to_mask(self):
+        from cluster_tools.utils.volume_utils import (blocks_in_volume, file_reader,
+                                                      restrict_blocks_to_mask, BLOCK_MASK_ENV)
+        shape = (64, 128, 128)
+        block_shape = (16, 32, 32)
+        # low resolution mask that covers the lower corner of the volume
+        mask = np.zeros((16, 32, 32), dtype='uint8')
+        mask[:4, :8, :8] = 1
+        mask_path = os.path.join(self.tmp_dir, 'mask.n5')
+        with file_reader(mask_path) as f:
+            f.create_dataset('mask', data=mask, chunks=(8, 8, 8))
+
+        all_blocks, blocking = blocks_in_volume(shape, block_shape, return_blocking=True)
+        cache_dir = os.path.join(self.tmp_dir, 'block_masks')
+        with restrict_blocks_to_mask(mask_path, 'mask', cache_dir):
+            block_list = blocks_in_volume(shape, block_shape)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            # the block list is read from the cache
+            self.assertEqual(blocks_in_volume(shape, block_shape), block_list)
+            # the restriction is combined with the roi
+            roi_blocks = blocks_in_volume(shape, block_shape, roi_begin=[0, 0, 0], roi_end=[16, 64, 64])
+            # blockings of other dimension are not restricted
+            self.assertEqual(blocks_in_volume([100], [10]), list(range(10)))
+        self.assertNotIn(BLOCK_MASK_ENV, os.environ)
+        self.assertEqual(blocks_in_volume(shape, block_shape), all_blocks)
+
+        expected = [block_id for block_id in all_blocks
+                    if all(beg == 0 for beg in blocking.getBlock(block_id).begin)]
+        self.assertEqual(block_list, expected)
+        self.assertEqual(roi_blocks, expected)
+
 
 if __name__ == '__main__':
     unittest.main()